@@ -17,9 +17,15 @@
     Options:  -to 1 -> to skip Earth departure and quick velocity change
               -tl  10 -> to reduce timeline to 10 searchdays
               -o  3 -> to plot dv disc. history (use -o 2  for vervose)
+              -dtc 600 -> coarse DV disc. search (600 sec), refined down to -dt
+              -gc Moon,Earth -> gravity-compensated DV disc. search (center by SOI)
+              -nat -spk de430.bsp -> native SPK evaluator, planetary kernel for the centers
+              -ac -> propagate only the timeline arcs changed since the last run
+              -st 60 -> DV disc. sweep and fixed CPs on the cached state tables (60 sec grid)
 
     Examples:
         >> bsp2cosmic.py gen_LLO_to_NRHO_imp_ext7d_BSP.bsp -ov -o 3 -tl 1 -dt 10 -dv 20
+        >> bsp2cosmic.py gen_LLO_to_NRHO_imp_ext7d_BSP.bsp -ov -tl 1 -dtc 600 -dt 1 -dv 20
 
     Note: Use dv = 100 for LEO_to_NRHO case. (default = 10 [m/s])
 
@@ -38,10 +44,22 @@ import ntpath
 import argparse
 import json
 import os
+import sys
 
 from time import process_time
 
 import monteCop.utils.cosmicUtils as  mcpUtil
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.scanParallel as scanP
+import monteCop.utils.scanCache as scanC
+import monteCop.utils.scanHistory as scanH
+import monteCop.utils.eventStore as evStore
+import monteCop.utils.scanCheckpoint as scanK
+import monteCop.utils.batchUtils as batchU
+import monteCop.utils.arcCache as arcC
+import monteCop.utils.templateCache as tmplC
+import monteCop.utils.stateTable as stTab
 import mpylab
 
 # ============================================================================
@@ -60,7 +78,9 @@ parser = argparse.ArgumentParser()
 parser.add_argument("inputBSPfile", metavar="inputFile.bsp", help="BSP Input file")
 parser.add_argument("-n", "--outputName",
                      default="", help = "Optional output file name. Default:... ")
-parser.add_argument("-id","--spiceID", default= "-30100", help="Spice ID. defautl = '' (use non-Body id on bsp) ")
+parser.add_argument("-id","--spiceID", default=["-30100"], nargs='+',
+                    help="Spice ID(s). Several IDs (or 'all': all non-natural bodies on the bsp) -> batch mode, "
+                         "per-object outputs (outputName_<id>, myTraj_<id>_TMP). Default: -30100")
 parser.add_argument("-to","--tiniOffset", default="0", help="t0 offset- days. Default='' (use t0 from bsp)")
 parser.add_argument("-tl","--tlInterval", default="0", help="Trajectory time line interval from t0_offset. Default='' (use bsp time span)")
 parser.add_argument("-dv","--minDvSrch", default="100",
@@ -71,7 +91,35 @@ parser.add_argument("-dv","--minDvSrch", default="100",
 parser.add_argument("-dt","--dtDvSrch", default="10", help="Velocity Discontinuity Search Step Size (in sec). Default: 10 (recommended 1)")
 parser.add_argument('-o', "--outputLevel", default = 2,
                     help='outputLevel: outputLevel = 1 -> msgs; outputLevel = 2 -> save JSON files) outputLevel = 3 -> Plots;')
-parser.add_argument('-ov', action='store_true', help='Files Overwrite -> Overwrite data.json files')
+parser.add_argument('-ov', action='store_true', help='Files Overwrite -> Rescan (ignore cached scans) and overwrite data.json files')
+parser.add_argument('-nat', '--native', action='store_true',
+                    help='Use the native (numpy) SPK evaluator for the DV Disc. search instead of TrajQuery')
+parser.add_argument('-spk', '--planetSpk', default="",
+                    help="Planetary SPK kernel(s), comma separated, loaded with the bsp by the native evaluator (-nat) "
+                         "for the centers not in the bsp (e.g. de430.bsp). Default: '' (bsp only)")
+parser.add_argument("-dtc","--dtCoarse", default="0",
+                    help="Coarse-to-fine DV Disc. search: coarse step (in sec, e.g. 600), refined down to -dt. Default: 0 (off)")
+parser.add_argument('-w', '--workers', default="1",
+                    help='Number of processes for the DV Disc. sweep (0: all cores). Default: 1')
+parser.add_argument('-bd', '--boundary', action='store_true',
+                    help='DV Disc. search at SPK segment/record boundaries (sweep only segments without boundaries)')
+parser.add_argument('-gc', '--gravComp', default="",
+                    help="Gravity-compensated DV Disc. sweep, center by SOI: bodies (e.g. 'Moon,Earth'). Default: '' (off)")
+parser.add_argument('-rs', '--resume', action='store_true',
+                    help='Resume an interrupted DV Disc. sweep from its checkpoint (outputName_TMP/dvScan_*)')
+parser.add_argument('-bw', '--batchWorkers', default="0",
+                    help='Batch mode: objects processed concurrently (0: all cores). Default: 0')
+parser.add_argument('-ac', '--arcCache', action='store_true',
+                    help='Propagate only the timeline arcs changed since the last run (others from outputName_TMP/arcCache)')
+parser.add_argument('-fp', '--fullProp', action='store_true',
+                    help='Propagate all the timeline arcs (ignore cached arcs, outputName_TMP/arcCache)')
+parser.add_argument('-pw', '--propWorkers', default="1",
+                    help='Number of processes propagating the timeline arcs (0: all cores). Default: 1')
+parser.add_argument('-st', '--stateTable', default="0",
+                    help='Step [sec] of the cached state tables (one per coverage window, shared by the tools '
+                         'reading this bsp: ~/.monteCop/stateTables) used by the DV Disc. sweep (single pass '
+                         'or -dtc) and the fixed CPs: states interpolated, exact where the interpolation error '
+                         'is above tolerance. Default: 0 (off)')
 
 
 
@@ -80,6 +128,21 @@ scName = 'mySC'
 
 args = parser.parse_args()
 
+# -gc and -rs: single-pass sweep options (stream detector, checkpointed stream), used
+# together or alone; not with the boundary, coarse-to-fine or parallel searches
+sweepModes = [flag for flag, used in [('-bd', args.boundary), ('-dtc', float(args.dtCoarse) > 0),
+                                      ('-w', int(args.workers) != 1)] if used]
+streamModes = [flag for flag, used in [('-gc', args.gravComp), ('-rs', args.resume)] if used]
+if streamModes and sweepModes:
+    parser.error(', '.join(streamModes) + ' not supported with ' + ', '.join(sweepModes)
+                 + ' (single-pass DV Disc. sweep only)')
+# -st: tables of the sc wrt the search center, read by the single-center sweeps
+tableModes = [flag for flag, used in [('-bd', args.boundary), ('-w', int(args.workers) != 1),
+                                      ('-gc', args.gravComp)] if used]
+if float(args.stateTable) > 0 and tableModes:
+    parser.error('-st not supported with ' + ', '.join(tableModes)
+                 + ' (single-center DV Disc. sweep, single pass or -dtc)')
+
 # ============================================================================
 # PARSE INPUTS ::
 
@@ -90,14 +153,28 @@ if args.outputName in '':
     outputName = ntpath.basename(trajBSP).replace('.bsp','_b2m.py')
 else:
     outputName = args.outputName
-outputFolder = baseName + '_TMP'
+# Batch worker: per-object outputs (outputName_<id>, outputFolder myTraj_<id>_TMP)
+outputName = batchU.objectName(outputName)
+outputFolder = batchU.objectName(baseName) + '_TMP'
 
 # periEventFile = outputFolder + '/periEvents_out.json'
 # apoEventFile = outputFolder + '/apoEvents_out.json'
 dvDiscFile = outputFolder + '/dvDiscEvents_out.json'
+eventStoreFile = outputFolder + '/' + evStore.STORE_FILE   # scanBSP event store
+dvHistFile = outputFolder + '/dvHist'     # |DV| history on disk (-o 3 plots)
+dvScanBase = outputFolder + '/dvScan'     # DV Disc. sweep event log and checkpoint (-rs)
+
+# Batch mode (several -id, or 'all'): ephemerides loaded once, one worker per object
+scIDs = batchU.objectList(trajBSP, args.spiceID)
+if len(scIDs) > 1:
+    batchU.warmBoa([boaPlanets, trajBSP], ["frame","body","frame/IAU 2000","frame/inertial"])
+    tmplC.warmTemplate(cosmicTemp)      # workers inherit the loaded template
+    batchResults = batchU.runBatch(__file__, sys.argv[1:], ['-id', '--spiceID'], scIDs,
+                                   baseName, int(args.batchWorkers))
+    sys.exit(max(rr[1] for rr in batchResults))
 
 # Insert sc_name and spiceID
-scID = int(args.spiceID)
+scID = scIDs[0]
 
 #SpiceName.bodyInsert(scID,'mySC')
 SpiceName.bodyInsert(scID,scName)
@@ -118,6 +195,7 @@ if outputLevel >= 2:
 #DV Disc search Params:
 SminDVSrch = float(args.minDvSrch)*m/sec
 dvSrchtimeStep = float(args.dtDvSrch)*sec
+dvSrchCoarseStep = float(args.dtCoarse)*sec
 
 dvSrchDt = 5*dvSrchtimeStep  #  width of DV pulse - expected < dvSearDT. Use + and - dvSrchDt
 dvSrchCenter = 'Moon'
@@ -157,14 +235,12 @@ addDVs = [
 # -> BOA, create and load data/ephems :
 #-----------------------------------------------------------------------------
 
-# Load boa
-boa = M.BoaLoad()
-boa.load( boaPlanets )
+# Load boa (batch worker: warm Boa, already loaded)
+boa = batchU.boaLoad([boaPlanets, trajBSP])
 #boa.load( boaSats )
-boa.load( trajBSP )
 
 # Load defautls
-defaultData.loadInto(boa,["frame","body","frame/IAU 2000","frame/inertial"])
+batchU.boaLoad([], ["frame","body","frame/IAU 2000","frame/inertial"], boa)
 
 #---------------- --------------------------------------
 # Trajectory Interval set up:
@@ -179,19 +255,52 @@ tl_interval = float(args.tlInterval)*day  # Default = 0: If == 0 -> use tl_end()
 trajInterval = M.TrajSetBoa.read(boa).intervals(scName)
 traj_t0 = trajInterval[0].begin() + t0_offset
 if not tl_interval:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 else:
     traj_tf = traj_t0 +tl_interval
 
 if tl_interval == 0:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 searchInterval = TimeInterval(traj_t0,traj_tf)
 
+# Coverage windows of the sc in [traj_t0, traj_tf] (ET sec): gaps are not scanned
+scanWindows = scanU.coverageWindows(trajBSP, scID, spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf))
+
+# Gravity-compensated sweep (-gc) bodies
+gravBodies = [bb.strip() for bb in args.gravComp.split(',') if bb.strip()]
+
+# Native SPK evaluator (-nat): the bsp and the planetary kernels (-spk)
+nativeBSP = [trajBSP] + [ff.strip() for ff in args.planetSpk.split(',') if ff.strip()]
+nativeEphem = None
+if args.native:
+    nativeEphem = spkE.SpkEphem(nativeBSP)
+    # states wrt the search center (and -gc bodies) at the window ends and midpoints
+    # (nan: chain not loaded)
+    probeEt = [tt for aa, bb in scanWindows for tt in (aa, 0.5*(aa + bb), bb)]
+    missing = nativeEphem.unresolved(scID, [dvSrchCenter] + gravBodies, probeEt)
+    if missing:
+        raise ValueError('-nat: ' + ', '.join(missing) + ' not resolved by ' + ', '.join(nativeBSP)
+                         + ' (planetary kernel missing: -spk de430.bsp)')
+
+# Dense state tables (-st): sc wrt the search center, one per coverage window,
+# keyed on the bsp content (shared with scanBSP, scanForRp, devDiscPlots and later runs)
+scStates = None
+if float(args.stateTable) > 0:
+    if args.native:
+        exactStates = spkE.SpkQuery(nativeEphem, scID, dvSrchCenter, dvSrchFrame).states
+    else:
+        exactStates = scanU.trajQueryStates(TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame))
+    scStates = stTab.StateTableCache(trajBSP).windowTables(
+        scID, dvSrchCenter, dvSrchFrame, scanWindows, float(args.stateTable), exactStates,
+        source=nativeBSP[1:] if args.native else [boaPlanets])
+
 if outputLevel >= 2:
     print('... Time Interval for Scaning:')
     print('    t0 = ' + str(traj_t0))
     print('    tf = ' + str(traj_tf))
     print('    dt = ' + str(traj_tf - traj_t0))
+    if len(scanWindows) > 1:
+        print('    coverage windows: ' + str(len(scanWindows)) + ' (gaps skipped)')
 #------------------------------------------------------
 
 # ============================================================================
@@ -220,72 +329,172 @@ naturalBodies.remove(scName)
 #Find DV Method 1:  Find Dv. disct, compute DV = Vi+1-Vi
 #if findDvDiscon and not os.path.exists(dvDiscFile):
 findDvDiscon = True
-if findDvDiscon and os.path.exists(dvDiscFile) and not args.ov:
-    print('... Using DV Disc. from: ' + dvDiscFile )
-    with open(dvDiscFile, 'r') as jsonInput:
-       dvSearchDic = json.load(jsonInput)
-
-if findDvDiscon and (args.ov or not os.path.exists(dvDiscFile)):
+# Scan cache (outputFolder/scanCache): key = bsp content + sc + interval + params
+scanCache = scanC.ScanCache(outputFolder)
+dvKey = scanCache.key(trajBSP, scID, spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf),
+                      {'eventType' : 'dvDisc',
+                       'minDv' : SminDVSrch.value(),
+                       'dt' : dvSrchtimeStep.value(),
+                       'dtCoarse' : dvSrchCoarseStep.value(),
+                       'boundary' : args.boundary,
+                       'gravComp' : args.gravComp,
+                       'native' : args.native,
+                       'planetSpk' : [ntpath.basename(ff) for ff in nativeBSP[1:]],
+                       'center' : dvSrchCenter,
+                       'frame' : dvSrchFrame,
+                       'stateTable' : float(args.stateTable),
+                       })
+dvSearchDic = None
+if findDvDiscon and not args.ov:
+    dvSearchDic = scanCache.get(dvKey)
+    if dvSearchDic is not None:
+        print('... Using cached DV Disc. (same bsp and search inputs)')
+dvScanned = findDvDiscon and dvSearchDic is None
+
+if dvScanned:
     t1_cpu = process_time()
     print( '... Searching for DV discontinuities: ')
     dvSearchDic=[]
-    querySat = TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame)
     timeStep = dvSrchtimeStep
-    tList =Epoch.range(traj_t0,traj_tf, timeStep)
     numDvDisc = 0
     dvTot = 0
     dvMag_list = []
-    for tt in tList[:-1]:
-        #dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()/querySat.state(tt).vel().mag()
-        dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()
-        dvMag_list.append(dvMag)
-        if dvMag > SminDVSrch.value():
-            dv_vec = querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()
-            dvSearchDic.append({
-                'time' : str(tt),
-                'center' : dvSrchCenter ,
-                'frame' : dvSrchFrame,
-                'eventType' : 'dvDisc',
-                'value' : [dv_vec[0],
-                           dv_vec[1],
-                           dv_vec[2]],
-                'dv_mag' : dvMag,
-                'units' : 'km/sec',
-                 })
-            dvTot += dvMag
+    # |DV| of every step streamed to disk, only to plot (-rs: kept up to the checkpoint)
+    dvHist = scanH.DvHistory(dvHistFile, append=args.resume) if outputLevel >= 3 else None
+    if args.boundary:
+        # Left/right limits at the segment and record boundaries of the bsp
+        dvEvents = []
+        for ii, (aa, bb) in enumerate(scanWindows):
+            for ev in scanU.findDvBoundaries(trajBSP, scID, aa, bb, SminDVSrch.value(),
+                                             frame=dvSrchFrame, dtSweep=timeStep.value()):
+                ev['interval'] = ii
+                dvEvents.append(ev)
+        for ev in dvEvents:
+            dvSearchDic.append(dict(scanU.dvDiscEvent(ev['et'], ev['dv'], dvSrchCenter, dvSrchFrame),
+                                    interval=ev['interval']))
+            dvMag_list.append(ev['dv_mag'])
+            dvTot += ev['dv_mag']
+            numDvDisc += 1
+        if dvHist is not None:
+            dvHist.extend([ev['et'] for ev in dvEvents], dvMag_list)
+    elif dvSrchCoarseStep.value() > 0:
+        # Coarse sweep, windows refined by bisection down to timeStep
+        if scStates is not None:
+            statesFunc = scStates.states
+        elif args.native:
+            statesFunc = spkE.SpkQuery(nativeEphem, scID, dvSrchCenter, dvSrchFrame).states
+        else:
+            statesFunc = scanU.trajQueryStates(TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame))
+        dvEvents = []
+        for ii, (aa, bb) in enumerate(scanWindows):
+            for ev in scanU.findDvCoarseFine(statesFunc, aa, bb, SminDVSrch.value(),
+                                             dtCoarse=dvSrchCoarseStep.value(), dtFine=timeStep.value()):
+                ev['interval'] = ii
+                dvEvents.append(ev)
+        for ev in dvEvents:
+            dvSearchDic.append(dict(scanU.dvDiscEvent(ev['et'], ev['dv'], dvSrchCenter, dvSrchFrame),
+                                    interval=ev['interval']))
+            dvMag_list.append(ev['dv_mag'])
+            dvTot += ev['dv_mag']
             numDvDisc += 1
+        if dvHist is not None:
+            dvHist.extend([ev['et'] for ev in dvEvents], dvMag_list)
+    elif int(args.workers) != 1:
+        # Time chunks of the sweep in a process pool (kernels loaded per worker)
+        if dvHist is not None:
+            dvHist.remove()
+        dvResults = scanP.dvDiscParallel(
+            nativeBSP if args.native else trajBSP, scID, dvSrchCenter, dvSrchFrame,
+            spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf),
+            timeStep.value(), SminDVSrch.value(), numWorkers=int(args.workers), native=args.native,
+            boaFiles=[boaPlanets], boaData=["frame","body","frame/IAU 2000","frame/inertial"],
+            scName=scName, history=dvHistFile if outputLevel >= 3 else False, windows=scanWindows)
+        if outputLevel >= 3:
+            dvSearchDic, dvHist = dvResults
+        else:
+            dvSearchDic = dvResults
+        numDvDisc = len(dvSearchDic)
+        dvTot = sum(ev['dv_mag'] for ev in dvSearchDic)
+    else:
+        # Single pass on the state stream (each epoch evaluated once)
+        if args.gravComp:
+            # sc wrt each body: two-body + third-body DV removed, center by SOI
+            if args.native:
+                # all the bodies resolved by the native kernels (checked above)
+                querySat = [spkE.SpkQuery(nativeEphem, scID, bb, dvSrchFrame) for bb in gravBodies]
+                streamFunc = lambda aa, bb: scanU.blockStream(querySat, aa, bb, timeStep.value())
+            else:
+                querySat = scanU.multiStateFunc([TrajQuery( boa,scName,bb,dvSrchFrame).state
+                                                 for bb in gravBodies])
+                streamFunc = lambda aa, bb: scanU.stateStream(querySat, spkE.et2epoch(aa),
+                                                              spkE.et2epoch(bb), timeStep)
+            dvDetector = scanU.GravDvDiscDetector(SminDVSrch.value(), gravBodies, dvSrchFrame,
+                                                  timeStep.value(), keepHistory=False,
+                                                  history=dvHist)
+        elif scStates is not None:
+            # Interpolated from the state tables by blocks
+            streamFunc = lambda aa, bb: scStates.stream(aa, bb, timeStep.value())
+        elif args.native:
+            # Vectorized: states read from the bsp by blocks
+            querySat = spkE.SpkQuery(nativeEphem, scID, dvSrchCenter, dvSrchFrame)
+            streamFunc = lambda aa, bb: scanU.blockStream(querySat, aa, bb, timeStep.value())
+        else:
+            querySat = TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame)
+            streamFunc = lambda aa, bb: scanU.stateStream(querySat.state, spkE.et2epoch(aa),
+                                                          spkE.et2epoch(bb), timeStep)
+        if not args.gravComp:
+            dvDetector = scanU.DvDiscDetector(SminDVSrch.value(), dvSrchCenter, dvSrchFrame,
+                                              keepHistory=False, history=dvHist)
+        # events logged as found, checkpoints, progress and ETA (-rs: resume)
+        monitor = scanK.ScanMonitor(dvScanBase, scanWindows, [dvDetector], key=dvKey,
+                                    history=dvHist)
+        resume = monitor.resume() if args.resume else monitor.start()
+        # one stream per coverage window
+        scanU.scanIntervals(streamFunc, scanWindows, [dvDetector, monitor], resume=resume)
+        dvSearchDic = monitor.events
+        numDvDisc = len(dvSearchDic)
+        dvTot = sum(ev['dv_mag'] for ev in dvSearchDic)
 
     print('     Num of DV Disc. : ' + str(numDvDisc))
     print('     DV Total : ' + str(dvTot) + 'km/s')
     t2_cpu = process_time()
     print(f"     time: {(t2_cpu - t1_cpu)} sec")
+    scanCache.put(dvKey, dvSearchDic, info={'bsp' : ntpath.basename(trajBSP),
+                                            'eventType' : 'dvDisc',
+                                            't0' : str(traj_t0), 'tf' : str(traj_tf)})
+    # sweep results cached: log and checkpoint not needed anymore
+    scanK.removeCheckpoint(dvScanBase)
 
 # -----------------
 #Print or Save Data:
-findDvDiscon = True
-if findDvDiscon and (not os.path.exists(dvDiscFile) or args.ov):
+if findDvDiscon:
     # Data Save:
     saveDvData = True
     if saveDvData:
-        with open(dvDiscFile, 'w+' ) as outfile:
-           json.dump( dvSearchDic, outfile, indent = 4, separators=(',', ': ') )
+        # dvDisc events into the store (other event types kept), JSON export
+        if os.path.exists(eventStoreFile):
+            eventStore = evStore.EventStore.load(eventStoreFile)
+        else:
+            eventStore = evStore.EventStore()
+        eventStore.replace('dvDisc', dvSearchDic)
+        eventStore.save(eventStoreFile)
+        eventStore.exportJson(dvDiscFile, 'dvDisc')
         print('     ' + ntpath.basename(dvDiscFile) + ' Saved!' )
 
+if dvScanned:
     if outputLevel >= 3:
-        mpylab.ylabel( " Velocity Discontinuities(km/sec)" )
-        mpylab.plot(tList[:-1],dvMag_list)
-        mpylab.show()
+        # decimated (min/max per bin): spikes kept, a few thousand points
+        dvHistEt, dvHistMag = dvHist.arrays()
+        scanH.plotDvHistory(mpylab, dvHistEt, dvHistMag)
 
 # ============================================================================
 # Create Cosmic Timeline:
 # ============================================================================
 # Create Manger:
 print('... Creating Manager.')
-mgr = Manager(boa)
-# quiet manager to avoid: WARNING COSMIC/Output:0 control points, when loadInput
-mgr.quiet = True
-mgr.loadInput(cosmicTemp)
-mgr.quiet = False
+# warm template (batch worker, monteCop server job) or mgr.loadInput(cosmicTemp)
+mgr = tmplC.manager(cosmicTemp, boa)
+boa = mgr.boa        # a clean copy of the warm Boa if the template was already loaded in it
 
 # ============================================================================
 # Create traj Query:
@@ -293,6 +502,19 @@ mgr.quiet = False
 
 stQuery= M.TrajQuery( boa, scName,dvSrchCenter,dvSrchFrame)
 
+def cpCartState(cpTime):
+    """ Cartesian state of the sc at cpTime (wrt dvSrchCenter, dvSrchFrame):
+        from the state tables (-st), or stQuery
+    """
+    if scStates is not None:
+        st = scStates.states(spkE.epoch2et(cpTime))[0]
+        return [float(xx)*km for xx in st[:3]] + [float(xx)*km/sec for xx in st[3:]]
+    return [*stQuery.state(cpTime).pos()*km ,
+            *stQuery.state(cpTime).vel()*km/sec]
+
+# CPs and DVs are queued, then inserted in one pass (timeline.build())
+timeline = mcpUtil.TimelineBuilder(mgr)
+
 # ----------------------------------------------------------------------------
 # ADD CP00 (at tl_0: mgr.tl.begin())
 # ----------------------------------------------------------------------------
@@ -302,10 +524,8 @@ cpDepCenter= 'Moon'
 cpDepFrame =  'EMO2000'
 cpName = "CP00"
 cpTime = M.Epoch(traj_t0)
-cpState = [*stQuery.state(cpTime).pos()*km ,
-           *stQuery.state(cpTime).vel()*km/sec]
-mcpUtil.appendCpCart(
-    mgr,
+cpState = cpCartState(cpTime)
+timeline.addCpCart(
     cpName ,
     cpTime,
     cpState,
@@ -321,36 +541,43 @@ mcpUtil.appendCpCart(
 # # ----------------------------------------------------------------------------
 print('... Adding CPs and DVs at dvDisc.:')
 cpPeriFile = addDVs[0]['source']
-# Check if file exist:
-print('    Loading: ' + dvDiscFile )
-with open(dvDiscFile, 'r') as jsonInput:
-   dvDiscDic = json.load(jsonInput)
-
-for ii, dv in enumerate(dvDiscDic):
-    dvName ='DV'+str(ii+1).zfill(2)
-    cpName = 'CP-'+ dvName
-    cpTime = dv['time']
-    mcpUtil.appendCpCoe_V3(
-        mgr,
-        cpName,
-        str(M.Epoch(cpTime)+dvSrchDt),
-        stQuery,
-        mass=1000*kg,
-        center=dvSrchCenter,
-        frame=dvSrchFrame,
-        body=scName,
-        propagator="DIVA",
-        #controls =[]
-    )
-
-    mcpUtil.addCpBurn(
-        mgr, dvName,cpName,
-        #tDelta = -1*dvSrchDtPre,   # Use post instead  os Post to perfomr DV at DV_Disc (See CP is added at + dvSrchDt1)
-        tDelta = -1*dvSrchtimeStep,
-        frame=dv['frame'],
-        dvel=M.Dbl3Vec(dv['value']),
-        dvBound=2*dv['dv_mag']*km/s,
-    )
+# Check if file exist: the JSON (may be edited by the user) wins over the store
+if os.path.exists(dvDiscFile):
+    print('    Loading: ' + dvDiscFile )
+    with open(dvDiscFile, 'r') as jsonInput:
+       dvDiscDic = json.load(jsonInput)
+    if os.path.exists(eventStoreFile):
+        # store kept in sync with the edited JSON
+        eventStore = evStore.EventStore.load(eventStoreFile)
+        if eventStore.byType('dvDisc').toEvents() != dvDiscDic:
+            print('    ' + ntpath.basename(dvDiscFile) + ' edited, updating: ' + eventStoreFile)
+            eventStore.replace('dvDisc', dvDiscDic)
+            eventStore.save(eventStoreFile)
+else:
+    print('    Loading: ' + eventStoreFile + ' (dvDisc)')
+    dvDiscDic = evStore.EventStore.load(eventStoreFile).byType('dvDisc').toEvents()
+
+dvNames = ['DV'+str(ii+1).zfill(2) for ii in range(len(dvDiscDic))]
+cpNames = ['CP-'+ dvName for dvName in dvNames]
+timeline.addCpsCoeV3(
+    cpNames,
+    [str(M.Epoch(dv['time'])+dvSrchDt) for dv in dvDiscDic],
+    stQuery,
+    mass=1000*kg,
+    center=dvSrchCenter,
+    frame=dvSrchFrame,
+    body=scName,
+    propagator="DIVA",
+)
+timeline.addCpBurns(
+    dvNames,
+    cpNames,
+    [dv['value'] for dv in dvDiscDic],
+    #tDelta = -1*dvSrchDtPre,   # Use post instead  os Post to perfomr DV at DV_Disc (See CP is added at + dvSrchDt1)
+    tDelta = -1*dvSrchtimeStep,
+    frame=[dv['frame'] for dv in dvDiscDic],
+    dvBound=[2*dv['dv_mag']*km/s for dv in dvDiscDic],
+)
 print('    -> '+str(len(dvDiscDic))+' DVs Added!')
 #
 # ----------------------------------------------------------------------------
@@ -360,10 +587,8 @@ print('    -> '+str(len(dvDiscDic))+' DVs Added!')
 print('... Adding fix CP at traj_tf')
 cpName = "CP-END"
 cpTime = M.Epoch(traj_tf)
-cpState = [*stQuery.state(cpTime).pos()*km ,
-           *stQuery.state(cpTime).vel()*km/sec]
-mcpUtil.appendCpCart(
-    mgr,
+cpState = cpCartState(cpTime)
+timeline.addCpCart(
     cpName ,
     cpTime,
     cpState,
@@ -374,13 +599,30 @@ mcpUtil.appendCpCart(
     fixCP = True
 )
 
+timeline.build()
+
 
 # ============================================================================
 # Save Files and Data:
 # ============================================================================
 
-# Propagate  and Save Trajectory:
-mgr.tl.createTraj(boa, mgr.problem)
+# Propagate and Save Trajectory:
+if args.arcCache or int(args.propWorkers) != 1:
+    # -ac: changed arcs only (others from outputFolder/arcCache); -pw: arcs in parallel
+    incTraj = arcC.IncrementalTraj(mgr, outputFolder, modelFiles=[cosmicTemp])
+    fullProp = args.fullProp or not args.arcCache
+    if int(args.propWorkers) != 1:
+        # parallel arcs: the workers load the timeline from the checkpoint
+        mgr.saveChkPt(outputName, allowOverwrite = True)
+        incTraj.createTraj(full=fullProp, workers=int(args.propWorkers), inputFile=outputName)
+    else:
+        incTraj.createTraj(full=fullProp)
+    if incTraj.partial:
+        print('WARNING: the Boa trajectory of the Manager only covers the arcs propagated in this run'
+              + (' (none: -pw workers)' if int(args.propWorkers) != 1 else '')
+              + ', the BreakPoint states cover the whole timeline')
+else:
+    mgr.tl.createTraj(boa, mgr.problem)
 mgr.saveChkPt(outputName, allowOverwrite = True)
 
 
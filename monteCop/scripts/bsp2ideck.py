@@ -35,6 +35,7 @@ import monteCop.src.CopPy510.robocoppy as rcpy
 from monteCop.src.CopPy510.robocoppy import ColorEnum as copColor
 import monteCop.utils.spiceIDs as spiceIDs
 import monteCop.utils.copUtils as mcp
+import monteCop.utils.spkReader as spkR
 
 from copy import deepcopy
 import json
@@ -263,27 +264,18 @@ segColor = getattr(copColor,args.color)
 # ============================================================================
 # Scan BSP:
 # ============================================================================
-#Read BSP with brief to obtain t0 and tf for scID (need options -t, and -n):
+#Read BSP summaries to obtain t0 and tf for scID (no brief call needed):
 
     # NEED TO REDO THE TIMING HANDLING
     # Use a single timing convention, currently mixing all type
 
 # Need to merge bsp files to accept several bsp files:
-tmpFile = 'tmp_bspInfo.txt'
-os.system('brief ' +  bspFile +  ' -t -n -sec > '+ tmpFile )
-tmpData = open(tmpFile, "r")
-ll = tmpData.readlines()
-tmpData.close()
-os.system('rm '+ tmpFile)
-for ln in ll:
-    #Find line with scID info:
-    if len(ln) > 2 and ln.split()[0] == scID:
-        li = ln.split()
-        t0_cal ={'yy':li[1],'mm':li[2],'dd':li[3],'hh':li[4]}
-        tf_cal ={'yy':li[5],'mm':li[6],'dd':li[7],'hh':li[8]}
+scCoverage = spkR.getCoverage(bspFile, scID)
 
  #Check bsp info was found
-if 't0_cal' in locals():
+if scCoverage:
+    t0_cal = scCoverage['t0_cal']
+    tf_cal = scCoverage['tf_cal']
     print(' Data for object ' + scID + ' Found!')
     print(f" ... t0 (BSP)= {t0_cal['yy']} {t0_cal['mm']} {t0_cal['dd']} {t0_cal['hh']}")
     print(f" ... tf (BSP)= {tf_cal['yy']} {tf_cal['mm']} {tf_cal['dd']} {tf_cal['hh']}")
@@ -291,24 +283,11 @@ else:
     print(' ERROR: data for object '+ scID + ' NOT Found!')
     sys.exit()
 
-# Using Calendar Format 2
-t0_cal_F2 =t0_cal['dd']+'-'+t0_cal['mm']+'-'+t0_cal['yy']+' '+t0_cal['hh']
-tf_cal_F2 =tf_cal['dd']+'-'+tf_cal['mm']+'-'+tf_cal['yy']+' '+tf_cal['hh']
-
-Ideck_Epoch_JD = mcp.date_to_julian(t0_cal_F2)
-
-# Get t0_etsec, tf_etsec: Replace or addapt scripts to read and/or Cal, etsec
-os.system('brief ' +  bspFile +  ' -t -n -etsec -sec > '+ tmpFile )
-tmpData = open(tmpFile, "r")
-ll = tmpData.readlines()
-tmpData.close()
-os.system('rm '+ tmpFile)
-for ln in ll:
-    #Find line with scID info:
-    if len(ln) > 2 and ln.split()[0] == scID:
-        li = ln.split()
-        t0_etsec = li[1]
-        tf_etsec = li[2]
+Ideck_Epoch_JD = scCoverage['t0_jd']
+
+# Get t0_etsec, tf_etsec:
+t0_etsec = scCoverage['t0_et']
+tf_etsec = scCoverage['tf_et']
 
 if args.tiniOffset:
     t0_days = float(args.tiniOffset)
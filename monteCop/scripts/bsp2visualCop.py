@@ -26,6 +26,7 @@ version ='1.0'
        >> ./bsp2visualCop cot1_19F20_V4.bsp  -sc '-650' -c Europa -f iau_body_fixed  -bl Jupiter Europa -o cot1_EuFrame.ideck -dt 100
        >> ./bsp2visualCop ENC_NF5_2034A4.bsp -c Sun -dt 10000 -bl Sun Earth Jupiter Venus Saturn -sc -54856
        >> ./bsp2visualCop Enceladus_Tour0.bsp -sc -303 -c Saturn -bl Saturn Titan Enceladus Rhea Tethys Dione
+       >> ./bsp2visualCop Voyager_merged.bsp -sc all -c Sun -bl Sun Earth Jupiter Saturn     (one ideck per s/c)
 
  Last update: --
 
@@ -48,6 +49,8 @@ import os
 import monteCop.src.CopPy510.robocoppy as rcpy
 from monteCop.src.CopPy510.robocoppy import ColorEnum as copColor
 import monteCop.utils.spiceIDs as spiceIDs
+import monteCop.utils.spkReader as spkR
+import monteCop.utils.batchUtils as batchU
 
 from copy import deepcopy
 import json
@@ -68,7 +71,11 @@ parser.add_argument("inputBSPfile", nargs = '+', metavar="inputBSPfile.bsp",
                     help="BSP input file(s). Multiple files in beta mode. \
                     Only fist file is considered, others are added to the SPICE kernel so user can use them")
 parser.add_argument("-o", "--outputName",default="", help = "Optional output file name. Default:... ")
-parser.add_argument("-sc","--scID", default= "-999", help="Spice ID or Name (e.g. -150 or 'CASSINI PROBE'). Defautl = '-999'  ")
+parser.add_argument("-sc","--scID", default=["-999"], nargs='+',
+                    help="Spice ID(s) or Name(s) (e.g. -150 or 'CASSINI PROBE'). Several objects (or 'all': \
+                    all non-natural bodies on the bsp) -> one ideck per object. Defautl = '-999'  ")
+parser.add_argument('-bw', '--batchWorkers', default="0",
+                    help='Several objects: objects processed concurrently (0: all cores). Default: 0')
 parser.add_argument('-c', '--center', default= "Earth", help = "Body Center. Default: 'Enceladus' ")
 parser.add_argument('-f', '--frame', default="j2000", help = "Visualization Frame = 'j2000' (Some options: eclipj2000, iau_body_fixed) ")
 parser.add_argument('-bl','--bodyList', default= ["Earth","Sun","Moon"], nargs='+', help= "Body list to be included" )
@@ -86,7 +93,6 @@ args = parser.parse_args()
 # ============================================================================
 # Set User Params:
 # ============================================================================
-scID = args.scID
 visCenter = args.center
 visFrameType = args.frame
 visAuxBody = args.auxBody
@@ -100,6 +106,16 @@ bspFile = bspFile_list[0]
 
 bodies_list = args.bodyList
 
+# Several objects (or 'all'): one worker per object, ideck and log per object
+scID = args.scID[0]
+if len(args.scID) > 1 or scID.lower() == batchU.ALL_OBJECTS:
+    scIDs = batchU.objectList(bspFile, args.scID)
+    if len(scIDs) > 1:
+        batchResults = batchU.runBatch(__file__, sys.argv[1:], ['-sc', '--scID'], scIDs,
+                                       bspFile.replace('.bsp',''), int(args.batchWorkers))
+        sys.exit(max(rr[1] for rr in batchResults))
+    scID = str(scIDs[0])
+
 tOffsetDays  = 2.0/86400   # Cut ini and end of BSP to avoid conflics reading data
 
 if args.configFile:
@@ -149,25 +165,15 @@ segColor = getattr(copColor,args.color)
 # Scan BSP:
 # ============================================================================
 
-#Read BSP with brief to obtain t0 and tf for scID (need options -t, and -n):
+#Read BSP summaries to obtain t0 and tf for scID (no brief call needed):
 
 # Need to merge bsp files to accept several bsp files:
-
-tmpFile = 'tmp_bspInfo.txt'
-os.system('brief ' +  bspFile +  ' -t -n -sec > '+ tmpFile )
-tmpData = open(tmpFile, "r")
-ll = tmpData.readlines()
-tmpData.close()
-os.system('rm '+ tmpFile)
-for ln in ll:
-    #Find line with scID info:
-    if len(ln) > 2 and ln.split()[0] == scID:
-        li = ln.split()
-        t0_cal ={'yy':li[1],'mm':li[2],'dd':li[3],'hh':li[4]}
-        tf_cal ={'yy':li[5],'mm':li[6],'dd':li[7],'hh':li[8]}
+scCoverage = spkR.getCoverage(bspFile, scID)
 
  #Check bsp info was found
-if 't0_cal' in locals():
+if scCoverage:
+    t0_cal = scCoverage['t0_cal']
+    tf_cal = scCoverage['tf_cal']
     print(' Data for object ' + scID + ' Found!')
     print(f" ... t0= {t0_cal['yy']} {t0_cal['mm']} {t0_cal['dd']} {t0_cal['hh']}")
     print(f" ... tf= {tf_cal['yy']} {tf_cal['mm']} {tf_cal['dd']} {tf_cal['hh']}")
@@ -175,18 +181,9 @@ else:
     print(' ERROR: data for object '+ scID + ' NOT Found!')
     sys.exit()
 
-# Get t0_etsec, tf_etsec: Replace or addapt scripts to read and/or Cal, etsec
-os.system('brief ' +  bspFile +  ' -t -n -etsec -sec > '+ tmpFile )
-tmpData = open(tmpFile, "r")
-ll = tmpData.readlines()
-tmpData.close()
-os.system('rm '+ tmpFile)
-for ln in ll:
-    #Find line with scID info:
-    if len(ln) > 2 and ln.split()[0] == scID:
-        li = ln.split()
-        t0_etsec = li[1]
-        tf_etsec = li[2]
+# Get t0_etsec, tf_etsec:
+t0_etsec = scCoverage['t0_et']
+tf_etsec = scCoverage['tf_et']
 
 if args.tiniOffset:
     t0_julDay = float(args.tiniOffset)
@@ -214,9 +211,9 @@ print(f" Body_list: {bodies_list}")
 #-----------------------------------------------------------------
 trajIdeck=rcpy.Ideck()
 if args.outputName:
-    trajIdeck.filename = args.outputName
+    trajIdeck.filename = batchU.objectName(args.outputName)
 else:
-    trajIdeck.filename = bspFile.replace('.bsp','_VisCOP.ideck')
+    trajIdeck.filename = batchU.objectName(bspFile.replace('.bsp','_VisCOP.ideck'))
 
 #load *.bsp in tour (and remove template .bsp)
 #trajIdeck.spice.append(bspFile)
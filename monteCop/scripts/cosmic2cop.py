@@ -27,6 +27,7 @@ import Monte as M
 import os
 import json
 import argparse
+import bisect
 from copy import deepcopy
 from mpy.opt.cosmic import Manager
 
@@ -110,6 +111,11 @@ copSetup = solJson['Copernicus']
 cpList    = solJson['ControlPoints']
 impulseMvrs = solJson['ImpulseBurns']
 
+# Burns sorted by epoch (JD), to find the burns of each segment by bisection:
+burnOrder = sorted((M.Epoch(dv['Time']).julianDate('ET'), ii) for ii, dv in enumerate(impulseMvrs))
+burnJD = [jd for jd, _ in burnOrder]
+impulseMvrs = [impulseMvrs[ii] for _, ii in burnOrder]
+
 #Set First and final CP's:
 cpBeginID = copSetup['cpBegin'] if copSetup['cpBegin'] else 0
 cpEndID   = copSetup['cpEnd'] if copSetup['cpEnd'] else (len( solJson['ControlPoints'])-1)
@@ -319,10 +325,12 @@ for cp_ID in range(cpBeginID,cpEndID + 1):
 
     # --> Add maneuvers:
     # find maneuvers between iSeg and iiSeg by epoch:
-    iDV = [
-        dv for dv in impulseMvrs
-        if Epoch(cpList[cp_ID]["Time"])  < Epoch(dv["Time"])  < Epoch(cpList[cp_ID + 1]["Time"])
-    ]
+    # (strictly between the CP and the next one, none after the last CP)
+    iDV = []
+    if cp_ID + 1 < len(cpList):
+        iiSeg_t0_JD = Epoch(cpList[cp_ID + 1]['Time']).julianDate('ET')
+        iDV = impulseMvrs[bisect.bisect_right(burnJD, iSeg_t0_JD):
+                          bisect.bisect_left(burnJD, iiSeg_t0_JD)]
 
     if iDV:
         print('Dv: '+str(iDV[0]['Name'])+ ' From '+str(iDV[0]['Start']['Name']))
@@ -0,0 +1,72 @@
+#!/usr/bin/env mpython_q
+
+#===========================================================================
+#
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+#===========================================================================
+
+"""
+ Propagate the arcs of a cosmic timeline in parallel, report the BreakPoint
+ mismatches (e.g. Enceladus_NRHO_B2M.py, ELO_R1to7_90deg_24Days_B2M.py)
+
+ Examples:
+    >> cosmicProp.py Enceladus_NRHO_B2M.py -w 8 -fp      (all arcs)
+    >> cosmicProp.py Enceladus_NRHO_B2M.py -w 8          (arcs changed since the last run)
+"""
+
+#__author__  = 'Ricardo Restrepo (392M)'
+
+#===========================================================================
+# Place all imports after here.
+#
+import argparse
+import time
+
+import monteCop.utils.arcCache as arcC
+import monteCop.utils.arcParallel as arcP
+
+# Place all imports before here.
+#===========================================================================
+
+# Create and populate the parser
+parser = argparse.ArgumentParser(description = ' Propagate the arcs of a cosmic timeline in parallel ')
+parser.add_argument("inputFile", metavar="input.py", help="Cosmic input file to be used")
+parser.add_argument('-w', '--workers', default="0",
+                    help='Number of processes (0: all cores, 1: serial createTraj). Default: 0')
+parser.add_argument('-ac', '--arcCache', default=None, metavar='folder',
+                    help='Arc cache folder (folder/arcCache): only the arcs changed since the last run are propagated. Default: input_TMP')
+parser.add_argument('-fp', '--fullProp', action='store_true',
+                    help='Propagate all the arcs (ignore cached arcs, e.g. benchmarks)')
+parser.add_argument('-n', '--numMismatch', default="10",
+                    help='Largest BreakPoint mismatches printed. Default: 10')
+
+args = parser.parse_args()
+
+workers = int(args.workers)
+
+#===========================================================================
+# Propagate:
+#===========================================================================
+wall0 = time.time()
+mgr = arcP.loadManager(args.inputFile)
+print(' ... Timeline loaded: ' + args.inputFile + ' ({0:.1f} sec)'.format(time.time() - wall0))
+
+arcFolder = args.arcCache or args.inputFile.replace('.py', '_TMP')
+incTraj = arcC.IncrementalTraj(mgr, arcFolder, modelFiles=[args.inputFile])
+incTraj.createTraj(full=args.fullProp, workers=workers, inputFile=args.inputFile)
+bpMismatch = incTraj.mismatches()
+numArcs = len(incTraj.arcs)
+
+#===========================================================================
+# Report:
+#===========================================================================
+print(' ... ' + str(numArcs) + ' arcs, ' + str(len(bpMismatch)) + ' BreakPoints ({0:.1f} sec)'
+      .format(time.time() - wall0))
+if bpMismatch:
+    print('     {0:<24s} {1:>14s} {2:>14s}'.format('BreakPoint', '|dPos| [km]', '|dVel| [km/s]'))
+    for bpName, dPos, dVel in sorted(bpMismatch, key=lambda mm: -mm[1])[:int(args.numMismatch)]:
+        print('     {0:<24s} {1:14.6e} {2:14.6e}'.format(bpName, dPos, dVel))
@@ -32,6 +32,8 @@ import os
 from time import process_time
 
 import monteCop.utils.cosmicUtils as  mcpUtil
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.spkEphem as spkE
 
 # ============================================================================
 
@@ -232,13 +234,16 @@ tl_interval = float(args.tlInterval)*day  # Default = 0: If == 0 -> use tl_end()
 trajInterval = M.TrajSetBoa.read(boa).intervals(scName)
 traj_t0 = trajInterval[0].begin() + t0_offset
 if not tl_interval:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 else:
     traj_tf = traj_t0 +tl_interval
 
 if tl_interval == 0:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 searchInterval = TimeInterval(traj_t0,traj_tf)
+# Coverage windows of the sc (ET sec): every window is scanned, gaps skipped
+scanWindows = scanU.coverageWindows(trajBSP, scID, spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf))
+searchIntervals = [TimeInterval(spkE.et2epoch(aa), spkE.et2epoch(bb)) for aa, bb in scanWindows]
 
 if outputLevel >= 2:
     print('... Time Interval for Scaning:')
@@ -264,7 +269,7 @@ if findPerisEnc:
     # TODO: Replace by search intervals below minAlt. then search for Peris.
     # Strategy, search per searchBodies, and do the follow:
     ev = ApsisEvent( TrajQuery( boa, scName, "Enceladus" ), ApsisEvent.PERIAPSIS )
-    r = ev.search(searchInterval, apsisSearchStep )
+    r = [xx for intv in searchIntervals for xx in ev.search(intv, apsisSearchStep )]
     #Filter Periapsis by Min Alt:
     periEvents = [xx  for xx in r if xx.value() < searchBodies[0]['minAlt']]
     #Save to Json
@@ -297,7 +302,7 @@ if findPeriNoFBs:
     # TODO: Replace by search intervals below minAlt. then search for Peris.
     # Strategy, search per searchBodies, and do the follow:
     ev = ApsisEvent( TrajQuery( boa, scName, "Saturn" ), ApsisEvent.PERIAPSIS )
-    r = ev.search( searchInterval, apsisSearchStep )
+    r = [xx for intv in searchIntervals for xx in ev.search( intv, apsisSearchStep )]
     encQuery = TrajQuery( boa, scName, "Enceladus" )
     #check that peri is far from Enceladus (above minAlt)
     #encAlt = encQuery.state(x.time(),'EMO2000',3).posMag()
@@ -330,7 +335,7 @@ if findPeriNoFBs:
 findApos = True
 if findApos:
     ev = ApsisEvent( TrajQuery( boa, scName, "Enceladus" ), ApsisEvent.APOAPSIS)
-    r = ev.search( searchInterval, apsisSearchStep )
+    r = [xx for intv in searchIntervals for xx in ev.search( intv, apsisSearchStep )]
     #Filter Periapsis by Min Alt:
     #periEvents = [xx  for xx in r if xx.value() < searchBodies[1]['minAlt']]
     apoEvents = r
@@ -369,33 +374,18 @@ if findDvDiscon and os.path.exists(dvDiscFile):
 if findDvDiscon and not os.path.exists(dvDiscFile):
     t1_cpu = process_time()
     print( '... Searching for DV discontinuities: ')
-    dvSearchDic=[]
     querySat = TrajQuery( boa,scName,dvSearchCenter,dvSearchFrame)
     timeStep = dvSearchtimeStep
-    tList =Epoch.range(traj_t0,traj_tf, timeStep)
-    numDvDisc = 0
-    dvTot = 0
-    dvMag_list = []
-    for tt in tList[:-1]:
-        #dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()/querySat.state(tt).vel().mag()
-        #dvMag = abs(querySat.state(tt+timeStep).vel().mag() - querySat.state(tt).vel().mag())
-        dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()
-        dvMag_list.append(dvMag)
-        if dvMag > minDVSearch.value():
-            dv_vec = querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()
-            dvSearchDic.append({
-                'time' : str(tt),
-                'center' : dvSearchCenter ,
-                'frame' : dvSearchFrame,
-                'eventType' : 'dvDisc',
-                'value' : [dv_vec[0],
-                           dv_vec[1],
-                           dv_vec[2]],
-                'dv_mag' : dvMag,
-                'units' : 'km/sec',
-                 })
-            dvTot += dvMag
-            numDvDisc += 1
+    dvDetector = scanU.DvDiscDetector(minDVSearch.value(), dvSearchCenter, dvSearchFrame)
+    # one stream per coverage window
+    streamFunc = lambda aa, bb: scanU.stateStream(querySat.state, spkE.et2epoch(aa),
+                                                  spkE.et2epoch(bb), timeStep)
+    scanU.scanIntervals(streamFunc, scanWindows, [dvDetector])
+    dvSearchDic = dvDetector.events
+    dvMag_list = dvDetector.dvMag
+    tList = dvDetector.epochs
+    numDvDisc = len(dvSearchDic)
+    dvTot = dvDetector.dvTot
     print('     Num of DV Disc. : ' + str(numDvDisc))
     print('     DV Total : ' + str(dvTot) + 'km/s')
     t2_cpu = process_time()
@@ -42,6 +42,8 @@ import os
 from time import process_time
 
 import monteCop.utils.cosmicUtils as  mcpUtil
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.spkEphem as spkE
 import mpylab
 
 # ============================================================================
@@ -183,13 +185,15 @@ tl_interval = float(args.tlInterval)*day  # Default = 0: If == 0 -> use tl_end()
 trajInterval = M.TrajSetBoa.read(boa).intervals(scName)
 traj_t0 = trajInterval[0].begin() + t0_offset
 if not tl_interval:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 else:
     traj_tf = traj_t0 +tl_interval
 
 if tl_interval == 0:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 searchInterval = TimeInterval(traj_t0,traj_tf)
+# Coverage windows of the sc (ET sec): every window is scanned, gaps skipped
+scanWindows = scanU.coverageWindows(trajBSP, scID, spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf))
 
 if outputLevel >= 2:
     print('... Time Interval for Scaning:')
@@ -232,33 +236,18 @@ if findDvDiscon and os.path.exists(dvDiscFile) and not args.ov:
 if findDvDiscon and (args.ov or not os.path.exists(dvDiscFile)):
     t1_cpu = process_time()
     print( '... Searching for DV discontinuities: ')
-    dvSearchDic=[]
     querySat = TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame)
     timeStep = dvSrchtimeStep
-    tList =Epoch.range(traj_t0,traj_tf, timeStep)
-    numDvDisc = 0
-    dvTot = 0
-    dvMag_list = []
-    for tt in tList[:-1]:
-        #dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()/querySat.state(tt).vel().mag()
-        #dvMag = abs(querySat.state(tt+timeStep).vel().mag() - querySat.state(tt).vel().mag())
-        dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()
-        dvMag_list.append(dvMag)
-        if dvMag > SminDVSrch.value():
-            dv_vec = querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()
-            dvSearchDic.append({
-                'time' : str(tt),
-                'center' : dvSrchCenter ,
-                'frame' : dvSrchFrame,
-                'eventType' : 'dvDisc',
-                'value' : [dv_vec[0],
-                           dv_vec[1],
-                           dv_vec[2]],
-                'dv_mag' : dvMag,
-                'units' : 'km/sec',
-                 })
-            dvTot += dvMag
-            numDvDisc += 1
+    dvDetector = scanU.DvDiscDetector(SminDVSrch.value(), dvSrchCenter, dvSrchFrame)
+    # one stream per coverage window
+    streamFunc = lambda aa, bb: scanU.stateStream(querySat.state, spkE.et2epoch(aa),
+                                                  spkE.et2epoch(bb), timeStep)
+    scanU.scanIntervals(streamFunc, scanWindows, [dvDetector])
+    dvSearchDic = dvDetector.events
+    dvMag_list = dvDetector.dvMag
+    tList = dvDetector.epochs
+    numDvDisc = len(dvSearchDic)
+    dvTot = dvDetector.dvTot
 
     print('     Num of DV Disc. : ' + str(numDvDisc))
     print('     DV Total : ' + str(dvTot) + 'km/s')
@@ -278,7 +267,7 @@ if findDvDiscon and (not os.path.exists(dvDiscFile) or args.ov):
 
     if outputLevel >= 3:
         mpylab.ylabel( " Velocity Discontinuities(km/sec)" )
-        mpylab.plot(tList[:-1],dvMag_list)
+        mpylab.plot(tList,dvMag_list)
         mpylab.show()
 
 # ============================================================================
@@ -39,6 +39,8 @@ import os
 from time import process_time
 
 import monteCop.utils.cosmicUtils as  mcpUtil
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.spkEphem as spkE
 import mpylab
 
 # ============================================================================
@@ -174,13 +176,15 @@ tl_interval = float(args.tlInterval)*day  # Default = 0: If == 0 -> use tl_end()
 trajInterval = M.TrajSetBoa.read(boa).intervals(scName)
 traj_t0 = trajInterval[0].begin() + t0_offset
 if not tl_interval:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 else:
     traj_tf = traj_t0 +tl_interval
 
 if tl_interval == 0:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 searchInterval = TimeInterval(traj_t0,traj_tf)
+# Coverage windows of the sc (ET sec): every window is scanned, gaps skipped
+scanWindows = scanU.coverageWindows(trajBSP, scID, spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf))
 
 if outputLevel >= 2:
     print('... Time Interval for Scaning:')
@@ -276,43 +280,47 @@ if findDvDiscon and (args.ov or not os.path.exists(dvDiscFile)):
     M.BodyVelDirFrame( boa, velFrame ,'EMO2000',TimeInterval(),scName,dvSrchCenter)
     querySat = TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame)
     timeStep = dvSrchtimeStep
-    tList =Epoch.range(traj_t0,traj_tf, timeStep)
+    tList = []
     numDvDisc = 0
     dvTot = 0
     dvMag_list = []
     dvSrchDtPost = dvSrchDt1
     skipBellowThisTime =  Epoch.distantPast()
-    for tt in tList[:-1]:
-        #NOTE: dvSrchDt : width of DV pulse - expected < dvSearDT. Use + and - dvSrchDt
-        #      When pulse/dv detected,SKIP skip search till tt > skipTimeMax (till tt > DV_time + dvSrchDt)
-        dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()
-        dvMag_list.append(dvMag)
-        if tt < skipBellowThisTime:
-            continue
-        if dvMag > SminDVSrch.value():
-            skipBellowThisTime = tt + dvSrchDt1
-            # to fix finite burn at LOI
-            dvSrchDtPre = dvSrchDt2 if numDvDisc == 0 else dvSrchDtPre
-            #  TODO: Discrivbe this logic here!!  -45min  AND +5min for LOI1, -5 to 5 min for LOI3...5
-            sma1 = M.Conic.semiMajorAxis(querySat.state(tt-dvSrchDtPre))
-            sma2 = M.Conic.semiMajorAxis(querySat.state(tt+dvSrchDtPost))
-            range = M.Conic.radius(querySat.state(tt))
-            dvMag = geDVfromSMAs(sma2, sma1, range, dvSrchCenter)
-            print(f"dv={dvMag} epoch:{tt}")
-            dv_vec =  [0, 1*dvMag.value(),  0 ]
-            dvSearchDic.append({
-                'time' : str(tt),
-                'center' : dvSrchCenter ,
-                'frame' : velFrame,
-                'eventType' : 'dvDisc',
-                'value' : [dv_vec[0],
-                           dv_vec[1],
-                           dv_vec[2]],
-                'dv_mag' : abs(dvMag.value()),
-                'units' : 'km/sec',
-                 })
-            dvTot += dvMag
-            numDvDisc += 1
+    # one stream per coverage window (no step across the gaps)
+    for aa, bb in scanWindows:
+        stateStream = scanU.stateStream(querySat.state, spkE.et2epoch(aa), spkE.et2epoch(bb), timeStep)
+        for (tt, state1), (tt2, state2) in scanU.slidingWindow(stateStream, 2):
+            #NOTE: dvSrchDt : width of DV pulse - expected < dvSearDT. Use + and - dvSrchDt
+            #      When pulse/dv detected,SKIP skip search till tt > skipTimeMax (till tt > DV_time + dvSrchDt)
+            dvMag = (state2.vel() - state1.vel()).mag()
+            tList.append(tt)
+            dvMag_list.append(dvMag)
+            if tt < skipBellowThisTime:
+                continue
+            if dvMag > SminDVSrch.value():
+                skipBellowThisTime = tt + dvSrchDt1
+                # to fix finite burn at LOI
+                dvSrchDtPre = dvSrchDt2 if numDvDisc == 0 else dvSrchDtPre
+                #  TODO: Discrivbe this logic here!!  -45min  AND +5min for LOI1, -5 to 5 min for LOI3...5
+                sma1 = M.Conic.semiMajorAxis(querySat.state(tt-dvSrchDtPre))
+                sma2 = M.Conic.semiMajorAxis(querySat.state(tt+dvSrchDtPost))
+                range = M.Conic.radius(querySat.state(tt))
+                dvMag = geDVfromSMAs(sma2, sma1, range, dvSrchCenter)
+                print(f"dv={dvMag} epoch:{tt}")
+                dv_vec =  [0, 1*dvMag.value(),  0 ]
+                dvSearchDic.append({
+                    'time' : str(tt),
+                    'center' : dvSrchCenter ,
+                    'frame' : velFrame,
+                    'eventType' : 'dvDisc',
+                    'value' : [dv_vec[0],
+                               dv_vec[1],
+                               dv_vec[2]],
+                    'dv_mag' : abs(dvMag.value()),
+                    'units' : 'km/sec',
+                     })
+                dvTot += dvMag
+                numDvDisc += 1
 
     print('     Num of DV Disc. : ' + str(numDvDisc))
     print('     DV Total : ' + str(dvTot) + 'km/s')
@@ -331,7 +339,7 @@ if findDvDiscon and (not os.path.exists(dvDiscFile) or args.ov):
         print('     ' + ntpath.basename(dvDiscFile) + ' Saved!' )
 
     if outputLevel >= 3:
-        mpylab.plot(tList[:-1],dvMag_list)
+        mpylab.plot(tList,dvMag_list)
         mpylab.show()
 
 # ============================================================================
@@ -354,7 +362,7 @@ cpDepCenter= 'Earth'
 cpDepFrame =  'EMO2000'
 stDepQuery= M.TrajQuery( boa, scName,cpDepCenter,cpDepFrame)
 cpName = "CP00"
-cpTime = M.TrajSetBoa.read(boa).intervals(scName)[0].begin()
+cpTime = spkE.et2epoch(scanWindows[0][0])
 cpState = [*stDepQuery.state(cpTime).pos()*km ,
            *stDepQuery.state(cpTime).vel()*km/sec]
 mcpUtil.appendCpCart(
@@ -0,0 +1,104 @@
+#!/usr/bin/env mpython_q
+
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+'''
+    Local monteCop server: Boa, planetary kernels (de430, sat375l) and default
+    frame/body data loaded once, conversion jobs run on the warm Boa.
+
+    Commands:  start  -> start the server (foreground; use nohup/& to detach)
+               status -> server info and job counts
+               stop   -> stop the server (running jobs are completed)
+               run    -> run a job (bsp2cosmic, scanBSP, cosmic2json, cosmic2cop,
+                         bsp2visualCop, bsp2ideck or a script file) on the server,
+                         or in this process if no server is running
+
+    Examples:
+        >> monteCopServer.py start -w 4 &
+        >> monteCopServer.py run bsp2cosmic gen_LLO_to_NRHO_imp_ext7d_BSP.bsp -tl 1 -dt 10 -dv 20
+        >> monteCopServer.py run scanBSP Enceladus_2048.bsp -id -303
+        >> monteCopServer.py stop
+
+    Note: the socket defaults to $TMPDIR/monteCop_<user>.sock (env. MONTECOP_SERVER, or -a)
+
+'''
+
+# ============================================================================
+# Imports here:
+
+import argparse
+import sys
+
+import monteCop.utils.boaServer as boaS
+import monteCop.utils.batchUtils as batchU
+
+# ============================================================================
+
+
+# ============================================================================
+# Parse User Inputs:
+# ============================================================================
+parser = argparse.ArgumentParser()
+parser.add_argument('-a', '--address', default=boaS.SERVER_ADDRESS,
+                    help='Server socket. Default: ' + boaS.SERVER_ADDRESS)
+commands = parser.add_subparsers(dest='command')
+
+startCmd = commands.add_parser('start', help='Start the server (foreground)')
+startCmd.add_argument('-w', '--workers', default="0",
+                      help='Jobs run concurrently (0: all cores). Default: 0')
+startCmd.add_argument('-bp', '--boaPlanets', default=boaS.BOA_PLANETS,
+                      help='Planetary ephemeris kept loaded. Default: ' + boaS.BOA_PLANETS)
+startCmd.add_argument('-bs', '--boaSats', default=boaS.BOA_SATS,
+                      help="Satellites ephemeris kept loaded ('' for none). Default: " + boaS.BOA_SATS)
+startCmd.add_argument('-bl', '--boaList', default=[], nargs='+',
+                      help='Other Boa/bsp files kept loaded')
+startCmd.add_argument('-tp', '--templates', default=[], nargs='+',
+                      help='Cosmic templates kept loaded (e.g. the bsp2cosmic template)')
+
+commands.add_parser('status', help='Server info')
+commands.add_parser('stop', help='Stop the server')
+
+runCmd = commands.add_parser('run', help='Run a job (in process if no server is running)')
+runCmd.add_argument('-ns', '--noServer', action='store_true',
+                    help='Run the job in this process, even if a server is running')
+runCmd.add_argument('job', help='Job: ' + ', '.join(sorted(boaS.JOB_SCRIPTS)) + ', or a script file')
+runCmd.add_argument('jobArgs', nargs=argparse.REMAINDER, help='Job arguments')
+
+args = parser.parse_args()
+
+# ============================================================================
+# Commands:
+# ============================================================================
+
+if args.command == 'start':
+    files = [args.boaPlanets, args.boaSats] + args.boaList
+    boaS.BoaServer(args.address, files, numWorkers=int(args.workers),
+                   templates=args.templates).serve()
+
+elif args.command in ['status', 'stop']:
+    info = boaS.request({'request' : args.command}, args.address)
+    if info is None:
+        print(' ... No monteCop server running: ' + args.address)
+        sys.exit(1)
+    print(' ... monteCop server: ' + info['address'] + ' (pid ' + str(info['pid']) + ')')
+    print('     warm Boa: ' + ', '.join(info['files'] + info['data']))
+    if info.get('templates'):
+        print('     warm templates: ' + ', '.join(info['templates']))
+    print('     workers: ' + str(info['workers']) + ', jobs running: ' + str(info['running'])
+          + ', jobs done: ' + str(info['done']))
+    if info['stopping']:
+        print('     stopping')
+
+elif args.command == 'run':
+    if args.noServer:
+        sys.exit(batchU.runScript(boaS.jobScript(args.job), args.jobArgs))
+    sys.exit(boaS.runJob(args.job, args.jobArgs, args.address))
+
+else:
+    parser.print_help()
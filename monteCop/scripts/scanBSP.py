@@ -18,14 +18,26 @@ from mpy.opt.cosmic import Manager
 from mpy.units import s, hour, m, km, day, deg, rad, kg
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 import ntpath
 import argparse
 import json
 import os
+import sys
 
 from time import process_time
 
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.scanParallel as scanP
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.scanCache as scanC
+import monteCop.utils.scanHistory as scanH
+import monteCop.utils.scanEngine as scanE
+import monteCop.utils.eventStore as evStore
+import monteCop.utils.batchUtils as batchU
+import monteCop.utils.stateTable as stTab
+
 # ============================================================================
 
 
@@ -36,11 +48,33 @@ parser = argparse.ArgumentParser()
 parser.add_argument("inputBSPfile", metavar="inputFile.bsp", help="BSP Input file")
 parser.add_argument("-n", "--outputName",
                      default="", help = "Optional output file name. Default:... ")
-parser.add_argument("-id","--spiceID", default= "-303", help="Spice ID. defautl = '' (use non-Body id on bsp) ")
+parser.add_argument("-id","--spiceID", default=["-303"], nargs='+',
+                    help="Spice ID(s). Several IDs (or 'all': all non-natural bodies on the bsp) -> batch mode, "
+                         "per-object outputs (outputName_<id>_TMP). Default: -303")
 parser.add_argument("-to","--tiniOffset", default="0", help="t0 offset- days. Default='' (use t0 from bsp)")
 parser.add_argument("-tl","--tlInterval", default="0", help="Trajectory time line interval from t0_offset. Default='' (use bsp time span)")
 parser.add_argument('-o', "--outputLevel", default = 2,
                     help='outputLevel: outputLevel = 1 -> msgs; outputLevel = 2 -> save JSON files) outputLevel = 3 -> Plots;')
+parser.add_argument('-w', '--workers', default="1",
+                    help='Number of processes for the scans (time chunks, 0: all cores). Default: 1')
+parser.add_argument('-ov', action='store_true',
+                    help='Rescan: ignore the cached scans (outputName_TMP/scanCache)')
+parser.add_argument('-kp', '--kepler', action='store_true',
+                    help='Apsis search with the conic predictor (next apsis from the osculating conic)')
+parser.add_argument('-g', '--gated', action='store_true',
+                    help='Altitude-gated Peri/periNoFB: coarse range pass, periapses only below minAlt')
+parser.add_argument('-f', '--fused', action='store_true',
+                    help='Fused scan: all the searches (Peri/Apo/DV) in one pass over the trajectory')
+parser.add_argument('-st', '--stateTable', default="0",
+                    help='Step [sec] of the cached state tables (one per coverage window, shared by the tools '
+                         'reading this bsp: ~/.monteCop/stateTables) used by the '
+                         'conic (-kp) and gated (-g) apsis searches: states interpolated, exact where the '
+                         'interpolation error is above tolerance. Default: 0 (off)')
+parser.add_argument('-bw', '--batchWorkers', default="0",
+                    help='Batch mode: objects processed concurrently (0: all cores). Default: 0')
+parser.add_argument('-ib', '--incBase', metavar='previous.bsp', default='',
+                    help='Earlier revision of the bsp (its _TMP scan cache): rescan only the changed time ranges. '
+                         'Default: earlier scans in this bsp scan cache')
 
 # parser.add_argument('-b','--bodyList', nargs='+', help='<Required> Set flag')
 # parser.add_argument('-c', '--bodyCenter',help = 'Body Center. \
@@ -86,29 +120,41 @@ if args.outputName in '':
     outputName = ntpath.basename(trajBSP).replace('.bsp','_out.py')
 else:
     outputName = args.outputName
-outputFolder = baseName + '_TMP'
+# Batch worker: per-object outputs (outputName_<id>, outputFolder myTraj_<id>_TMP)
+outputName = batchU.objectName(outputName)
+outputFolder = batchU.objectName(baseName) + '_TMP'
 
 periEventFile = outputFolder + '/periEvents_out.json'
 periNoFBsEventFile = outputFolder + '/periNoFBsEvents_out.json'
 apoEventFile = outputFolder + '/apoEvents_out.json'
 dvDiscFile = outputFolder + '/dvDiscEvents_out.json'
-
-# Insert sc_name and spiceID
-scID = int(args.spiceID)
-SpiceName.bodyInsert(scID,'mySC')
+dvHistFile = outputFolder + '/dvHist'     # |DV| history on disk (-o 3 plots)
+eventStoreFile = outputFolder + '/' + evStore.STORE_FILE   # all events, by time
 
 outputLevel = int(args.outputLevel)
+numWorkers = int(args.workers)
 
 # -> Default data:
 cosmicTemp  = 'inputs/cosmicTemp.py'    # IF NOT in local folder, use default (lib/Templates)
 boaPlanets = '/nav/common/import/ephem/de430.boa'
 boaSats    = '/nav/common/import/ephem/sat375l.boa'
 
-# Load boa
-boa = M.BoaLoad()
+# Batch mode (several -id, or 'all'): ephemerides loaded once, one worker per object
+scIDs = batchU.objectList(trajBSP, args.spiceID)
+if len(scIDs) > 1:
+    batchU.warmBoa([trajBSP, boaPlanets, boaSats], ["frame","body"])
+    batchResults = batchU.runBatch(__file__, sys.argv[1:], ['-id', '--spiceID'], scIDs,
+                                   baseName, int(args.batchWorkers))
+    sys.exit(max(rr[1] for rr in batchResults))
+
+# Insert sc_name and spiceID
+scID = scIDs[0]
+SpiceName.bodyInsert(scID,'mySC')
+
+# Load boa (batch worker: warm Boa, already loaded)
+boa = batchU.boaLoad([trajBSP])
 #boa.load( boaPlanets )
 #boa.load( boaSats )
-boa.load( trajBSP )
 
 
 #raise Exception('exit')
@@ -122,19 +168,27 @@ boa.load( trajBSP )
 trajInterval = M.TrajSetBoa.read(boa).intervals('mySC')
 traj_t0 = trajInterval[0].begin() + t0_offset
 if not tl_interval:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 else:
     traj_tf = traj_t0 +tl_interval
 
 if tl_interval == 0:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 searchInterval = TimeInterval(traj_t0,traj_tf)
+# Parallel scans (numWorkers != 1): ET sec interval, kernels loaded per worker
+search_t0 = spkE.epoch2et(traj_t0)
+search_tf = spkE.epoch2et(traj_tf)
+# Coverage windows of the sc (ET sec): every window is scanned, gaps skipped
+scanWindows = scanU.coverageWindows(trajBSP, scID, search_t0, search_tf)
+searchIntervals = [TimeInterval(spkE.et2epoch(aa), spkE.et2epoch(bb)) for aa, bb in scanWindows]
 
 if outputLevel >= 2:
     print(' ... Time Interval for Scaning:')
     print('     t0 = ' + str(traj_t0))
     print('     tf = ' + str(traj_tf))
     print('     dt = ' + str(traj_tf - traj_t0))
+    if len(scanWindows) > 1:
+        print('     coverage windows: ' + str(len(scanWindows)) + ' (gaps skipped)')
 
 # ------------------------------------------------------
 
@@ -144,12 +198,8 @@ if outputLevel >= 2:
 naturalBodies =  TrajSetBoa.read(boa).getAll()
 naturalBodies.remove('mySC')
 
-#Load additinoal ephemeris kernels
-boa.load( boaPlanets )
-boa.load( boaSats )
-
-# Load defautls
-defaultData.loadInto(boa,["frame","body"])
+#Load additinoal ephemeris kernels, and defautls
+batchU.boaLoad([boaPlanets, boaSats], ["frame","body"], boa)
 
 if outputLevel >= 2:
     if not  os.path.exists(outputFolder):
@@ -166,6 +216,7 @@ searchBodies = [
       'minAlt' : 30000.0*km, #(??)
       'searchType' : 'periNoFB',
       'searchFrame' : 'EMO2000',
+      'flybyBody' : 'Enceladus',
       },
     {'bodyName' : 'Saturn',
      'minAlt' : 10000.0*km, #(??)
@@ -175,68 +226,296 @@ searchBodies = [
 ]
 
 #-----------------------------------------------------------------------------
-# Seach for Peris at Enceladus:
+# Scan cache (outputName_TMP/scanCache): key = bsp content + sc + interval + params
+scanCache = scanC.ScanCache(outputFolder)
+
+# Event store: the searches run now replace their event type, others are kept
+if os.path.exists(eventStoreFile) and not args.ov:
+    eventStore = evStore.EventStore.load(eventStoreFile)
+else:
+    eventStore = evStore.EventStore()
+
+# Incremental rescans: base scans of an earlier kernel revision (-ib), or this cache
+incBaseCache = None
+if args.incBase:
+    incBaseFolder = batchU.objectName(args.incBase.replace('.bsp','')) + '_TMP'
+    if os.path.isdir(incBaseFolder):
+        incBaseCache = scanC.ScanCache(incBaseFolder)
+    else:
+        print('WARNING: no scan cache of ' + args.incBase + ' (' + incBaseFolder + '), full scans')
+
+def incMargin(step):
+    """ incremental rescan margin [sec] of a search with time step step """
+    return scanC.INC_MARGIN_STEPS*step.value()
+
+def monteIntervals(windows):
+    """ Monte TimeIntervals of ET sec windows """
+    return [TimeInterval(spkE.et2epoch(aa), spkE.et2epoch(bb)) for aa, bb in windows]
+
+def apsisParams(ii, apsis, **filters):
+    """ cache key parameters of the searchBodies[ii] apsis search """
+    params = {'eventType' : searchBodies[ii]['searchType'],
+              'apsis' : apsis,
+              'center' : searchBodies[ii]['bodyName'],
+              'frame' : searchBodies[ii]['searchFrame'],
+              'step' : apsisSearchStep.value(),
+              'ephem' : [boaPlanets, boaSats],
+              }
+    if args.gated:
+        params['method'] = 'gated'
+    elif args.kepler:
+        params['method'] = 'kepler'
+    if stateTables is not None and (args.gated or args.kepler):
+        params['stateTable'] = float(args.stateTable)
+    params.update(filters)
+    return params
+
+# Dense state tables (-st): one per coverage window, keyed on the bsp content
+# (shared with the other tools and runs on this bsp)
+stateTables = stTab.StateTableCache(trajBSP) if float(args.stateTable) > 0 else None
+def tableStates(center, statesFunc):
+    """ states of the sc wrt center: statesFunc, or interpolated from the
+        cached state tables (-st) of the coverage windows
+    """
+    if stateTables is None:
+        return statesFunc
+    return stateTables.windowTables(scID, center, 'EME2000', scanWindows, float(args.stateTable),
+                                    statesFunc, source=[boaPlanets, boaSats]).states
+
+def keplerApsides(ii, center, apsis, keep=None, windows=None):
+    """ searchBodies[ii] apsides wrt center on every coverage window (or
+        windows), conic predictor (keep(et, range): filter)
+    """
+    statesFunc = tableStates(center, scanU.trajQueryStates(TrajQuery(boa, 'mySC', center)))
+    events = []
+    for jj, (aa, bb) in enumerate(scanWindows if windows is None else windows):
+        for ap in scanU.findApsides(statesFunc, aa, bb, scanU.bodyGM[center], apsis,
+                                    apsisSearchStep.value()):
+            if keep is None or keep(ap['et'], ap['range']):
+                events.append(scanE.eventDic(ap['et'], ap['range'], searchBodies[ii]['bodyName'],
+                                             searchBodies[ii]['searchFrame'],
+                                             searchBodies[ii]['searchType'], interval=jj))
+    return events
+
+coarsePass = {}
+def flybyGates(body, threshold, windows=None):
+    """ coarse pass (apsisSearchStep) of the sc states wrt body, done once per
+        body and windows: (statesFunc, per coverage window (or windows):
+        (etGrid, states, windows where the range may be below threshold))
+    """
+    windows = scanWindows if windows is None else windows
+    passKey = (body, tuple(tuple(ww) for ww in windows))
+    if passKey not in coarsePass:
+        statesFunc = tableStates(body, scanU.trajQueryStates(TrajQuery(boa, 'mySC', body)))
+        coarsePass[passKey] = (statesFunc, [scanU.coarseStates(statesFunc, aa, bb, apsisSearchStep.value())
+                                            for aa, bb in windows])
+    statesFunc, grids = coarsePass[passKey]
+    return statesFunc, [(etGrid, states, scanU.rangeWindows(etGrid, states, threshold, scanU.bodyGM[body]))
+                        for etGrid, states in grids]
+
+#-----------------------------------------------------------------------------
+# Searches:
 findPerisEnc = True
-if findPerisEnc:
-    # TODO: Replace by search intervals below minAlt. then search for Peris.
-    # Strategy, search per searchBodies, and do the follow:
-    ev = ApsisEvent( TrajQuery( boa, "mySC", "Enceladus" ), ApsisEvent.PERIAPSIS )
-    r = ev.search(searchInterval, apsisSearchStep )
-    #Filter Periapsis by Min Alt:
-    periEvents = [xx  for xx in r if xx.value() < searchBodies[0]['minAlt']]
-    #Save to Json
-    # Epoch, rpRange, Center, Frame
-    periEventDic=[]
-    numPeris = 0
-    for pp in periEvents:
-        periEventDic.append({
-            'time' : str(pp.time()),
-            'value': str(pp.value()),
-            'center' : searchBodies[0]['bodyName'],
-            'frame' : searchBodies[0]['searchFrame'],
-            'eventType' : searchBodies[0]['searchType'],
-             })
-        numPeris += 1
+findPeriNoFBs = False
+findApos = True
+#findDvDiscon = True
+findDvDiscon = False
+
+#-----------------------------------------------------------------------------
+# Fused scan (-f): one pass, every search on the same states (scanEngine)
+if args.fused:
+    fusedSearch = [sb for sb, find in zip(searchBodies, [findPerisEnc, findPeriNoFBs, findApos]) if find]
+    fusedStep = dvSearchtimeStep if findDvDiscon else apsisSearchStep
+    fusedPlan = scanCache.plan(trajBSP, scID, search_t0, search_tf,
+                               {'eventType' : 'fused',
+                                'engine' : scanE.ENGINE_VERSION,
+                                'searchBodies' : fusedSearch,
+                                'step' : fusedStep.value(),
+                                'minDv' : minDVSearch.value() if findDvDiscon else None,
+                                'dvCenter' : dvSearchCenter,
+                                'frame' : dvSearchFrame,
+                                'ephem' : [boaPlanets, boaSats],
+                                },
+                               scanWindows, incMargin(fusedStep), base=incBaseCache, rescan=args.ov)
+    fusedEvents = fusedPlan.events
+    if fusedEvents is None:
+        t1_cpu = process_time()
+        print(' ... Fused scan: ' + ', '.join(sb['searchType'] for sb in fusedSearch)
+              + (', dvDisc' if findDvDiscon else '') + ' (' + fusedPlan.summary() + ')')
+        engine = scanE.fromSearchBodies(fusedSearch, frame=dvSearchFrame,
+                                        minDv=minDVSearch.value() if findDvDiscon else None,
+                                        dvCenter=dvSearchCenter)
+        fusedEvents = engine.run(engine.monteStream(boa, 'mySC', fusedStep), fusedPlan.windows)
+        t2_cpu = process_time()
+        print(f"     time: {(t2_cpu - t1_cpu)} sec")
+        fusedEvents = fusedPlan.finish(fusedEvents, info={'bsp' : ntpath.basename(trajBSP),
+                                                          'eventType' : 'fused'})
+    else:
+        print(' ... Using cached fused scan.')
+
+    fusedByType = {}
+    for ev in fusedEvents:
+        fusedByType.setdefault(ev['eventType'], []).append(ev)
+    fusedFiles = [(findPerisEnc, 'Peri', periEventFile),
+                  (findPeriNoFBs, 'periNoFB', periNoFBsEventFile),
+                  (findApos, 'Apo', apoEventFile),
+                  (findDvDiscon and saveDvData, 'dvDisc', dvDiscFile)]
+    for find, eventType, eventFile in fusedFiles:
+        if not find:
+            continue
+        typeEvents = fusedByType.get(eventType, [])
+        eventStore.replace(eventType, typeEvents)
+        print('     ' + eventType + ' Events Found: ' + str(len(typeEvents)))
+        if outputLevel >= 2:
+            eventStore.exportJson(eventFile, eventType)
+            print('     ' + ntpath.basename(eventFile) + ' Saved!' )
 
+#-----------------------------------------------------------------------------
+# Seach for Peris at Enceladus:
+if findPerisEnc and not args.fused:
+    # Strategy, search per searchBodies, and do the follow (-g: only in the
+    # intervals below minAlt):
+    periPlan = scanCache.plan(trajBSP, scID, search_t0, search_tf,
+                              apsisParams(0, 'Peri', maxAlt=searchBodies[0]['minAlt'].value()),
+                              scanWindows, incMargin(apsisSearchStep), base=incBaseCache, rescan=args.ov)
+    periEventDic = periPlan.events
+    periScanned = periEventDic is None
+    periWindows = periPlan.windows
+    if periScanned and periPlan.incremental:
+        print(' ... Peri Events, ' + periPlan.summary())
+    if not periScanned:
+        print(' ... Using cached Peri Events')
+        numPeris = len(periEventDic)
+    elif args.gated:
+        # periapses only inside the windows below minAlt
+        minAlt = searchBodies[0]['minAlt'].value()
+        encStates, encGates = flybyGates("Enceladus", minAlt, periWindows)
+        periEventDic = []
+        for ii, (etGrid, states, gates) in enumerate(encGates):
+            for ap in scanU.gatedApsides(encStates, gates, scanU.bodyGM["Enceladus"], 'Peri',
+                                         apsisSearchStep.value()):
+                if ap['range'] < minAlt:
+                    periEventDic.append(scanE.eventDic(ap['et'], ap['range'], searchBodies[0]['bodyName'],
+                                                       searchBodies[0]['searchFrame'],
+                                                       searchBodies[0]['searchType'], interval=ii))
+        numPeris = len(periEventDic)
+    elif args.kepler:
+        periEventDic = keplerApsides(0, "Enceladus", 'Peri',
+                                     lambda et, rng: rng < searchBodies[0]['minAlt'].value(),
+                                     periWindows)
+        numPeris = len(periEventDic)
+    elif numWorkers != 1 and periWindows:
+        periEventDic = scanP.apsisParallel(
+            [trajBSP, boaPlanets, boaSats], scID, 'mySC', "Enceladus", 'Peri',
+            search_t0, search_tf, apsisSearchStep.value(), numWorkers,
+            frame=searchBodies[0]['searchFrame'], eventCenter=searchBodies[0]['bodyName'],
+            eventType=searchBodies[0]['searchType'], maxAlt=searchBodies[0]['minAlt'].value(),
+            windows=periWindows)
+        numPeris = len(periEventDic)
+    else:
+        ev = ApsisEvent( TrajQuery( boa, "mySC", "Enceladus" ), ApsisEvent.PERIAPSIS )
+        periEventDic=[]
+        numPeris = 0
+        for ii, searchWin in enumerate(monteIntervals(periWindows)):
+            r = ev.search(searchWin, apsisSearchStep )
+            #Filter Periapsis by Min Alt:
+            periEvents = [xx  for xx in r if xx.value() < searchBodies[0]['minAlt']]
+            #Save to Json
+            # Epoch, rpRange, Center, Frame
+            for pp in periEvents:
+                periEventDic.append({
+                    'time' : str(pp.time()),
+                    'value': str(pp.value()),
+                    'center' : searchBodies[0]['bodyName'],
+                    'frame' : searchBodies[0]['searchFrame'],
+                    'eventType' : searchBodies[0]['searchType'],
+                    'interval' : ii,
+                     })
+                numPeris += 1
+
+    if periScanned:
+        periEventDic = periPlan.finish(periEventDic, info={'bsp' : ntpath.basename(trajBSP),
+                                                           'eventType' : 'Peri'})
+        numPeris = len(periEventDic)
+
+    eventStore.replace(searchBodies[0]['searchType'], periEventDic)
     if outputLevel >= 2:
-        #TODO: add periEventDic Info!
-        # ONLY IF Not existing file
-        with open(periEventFile, 'w+' ) as outfile:
-           json.dump( periEventDic, outfile, indent = 4, separators=(',', ': ') )
+        # JSON export of the store (compatibility)
+        eventStore.exportJson(periEventFile, searchBodies[0]['searchType'])
         print(' ... ' + ntpath.basename(periEventFile) + ' Saved!' )
         print('     Peri Events Found: ' + str(numPeris))
     #encBFframe='IAU Enceladus Fixed'
 
 #-----------------------------------------------------------------------------
 # Seach for Peris of Sturn with not Enceladus Flyby:
-findPeriNoFBs = False
-if findPeriNoFBs:
-    # TODO: Replace by search intervals below minAlt. then search for Peris.
-    # Strategy, search per searchBodies, and do the follow:
-    ev = ApsisEvent( TrajQuery( boa, "mySC", "Saturn" ), ApsisEvent.PERIAPSIS )
-    r = ev.search( searchInterval, apsisSearchStep )
-    encQuery = TrajQuery( boa, "mySC", "Enceladus" )
-    #check that peri is far from Enceladus (above minAlt)
-    #encAlt = encQuery.state(x.time(),'EMO2000',3).posMag()
-    #Filter Periapsis by Min Alt:
-    periNoFBsEvents = [xx  for xx in r if encQuery.state(xx.time(),searchBodies[1]['searchFrame'],3).posMag() > searchBodies[1]['minAlt']]
-    periNoFBsEventDic=[]
-    numPerisNoFBs = 0
-    for pp in periNoFBsEvents:
-        periNoFBsEventDic.append({
-            'time' : str(pp.time()),
-            'value': str(pp.value()),
-            'center' : searchBodies[1]['bodyName'],
-            'frame' : searchBodies[1]['searchFrame'],
-            'eventType' : searchBodies[1]['searchType'],
-             })
-        numPerisNoFBs += 1
-
+if findPeriNoFBs and not args.fused:
+    # Strategy, search per searchBodies, and do the follow (-g: flyby filter
+    # from the Enceladus coarse pass):
+    periNoFBsPlan = scanCache.plan(trajBSP, scID, search_t0, search_tf,
+                                   apsisParams(1, 'Peri', altBody='Enceladus', minAltBody=searchBodies[1]['minAlt'].value()),
+                                   scanWindows, incMargin(apsisSearchStep), base=incBaseCache, rescan=args.ov)
+    periNoFBsEventDic = periNoFBsPlan.events
+    periNoFBsScanned = periNoFBsEventDic is None
+    periNoFBsWindows = periNoFBsPlan.windows
+    if periNoFBsScanned and periNoFBsPlan.incremental:
+        print(' ... periNoFB Events, ' + periNoFBsPlan.summary())
+    if not periNoFBsScanned:
+        print(' ... Using cached periNoFB Events')
+        numPerisNoFBs = len(periNoFBsEventDic)
+    elif args.gated:
+        # Enceladus range from the coarse pass: exact range only inside its gates
+        minAlt = searchBodies[1]['minAlt'].value()
+        encStates, encGates = flybyGates("Enceladus", minAlt, periNoFBsWindows)
+        periNoFBsEventDic = keplerApsides(
+            1, "Saturn", 'Peri',
+            lambda et, rng: (not any(scanU.inWindows(et, gates) for etGrid, states, gates in encGates)
+                             or np.linalg.norm(encStates([et])[0, :3]) > minAlt),
+            periNoFBsWindows)
+        numPerisNoFBs = len(periNoFBsEventDic)
+    elif args.kepler:
+        encStates = scanU.trajQueryStates(TrajQuery( boa, "mySC", "Enceladus" ))
+        periNoFBsEventDic = keplerApsides(
+            1, "Saturn", 'Peri', lambda et, rng: np.linalg.norm(encStates([et])[0, :3]) > searchBodies[1]['minAlt'].value(),
+            periNoFBsWindows)
+        numPerisNoFBs = len(periNoFBsEventDic)
+    elif numWorkers != 1 and periNoFBsWindows:
+        periNoFBsEventDic = scanP.apsisParallel(
+            [trajBSP, boaPlanets, boaSats], scID, 'mySC', "Saturn", 'Peri',
+            search_t0, search_tf, apsisSearchStep.value(), numWorkers,
+            frame=searchBodies[1]['searchFrame'], eventCenter=searchBodies[1]['bodyName'],
+            eventType=searchBodies[1]['searchType'], altBody="Enceladus",
+            minAltBody=searchBodies[1]['minAlt'].value(), windows=periNoFBsWindows)
+        numPerisNoFBs = len(periNoFBsEventDic)
+    else:
+        ev = ApsisEvent( TrajQuery( boa, "mySC", "Saturn" ), ApsisEvent.PERIAPSIS )
+        encQuery = TrajQuery( boa, "mySC", "Enceladus" )
+        periNoFBsEventDic=[]
+        numPerisNoFBs = 0
+        for ii, searchWin in enumerate(monteIntervals(periNoFBsWindows)):
+            r = ev.search( searchWin, apsisSearchStep )
+            #check that peri is far from Enceladus (above minAlt)
+            #encAlt = encQuery.state(x.time(),'EMO2000',3).posMag()
+            #Filter Periapsis by Min Alt:
+            periNoFBsEvents = [xx  for xx in r if encQuery.state(xx.time(),searchBodies[1]['searchFrame'],3).posMag() > searchBodies[1]['minAlt']]
+            for pp in periNoFBsEvents:
+                periNoFBsEventDic.append({
+                    'time' : str(pp.time()),
+                    'value': str(pp.value()),
+                    'center' : searchBodies[1]['bodyName'],
+                    'frame' : searchBodies[1]['searchFrame'],
+                    'eventType' : searchBodies[1]['searchType'],
+                    'interval' : ii,
+                     })
+                numPerisNoFBs += 1
+
+    if periNoFBsScanned:
+        periNoFBsEventDic = periNoFBsPlan.finish(periNoFBsEventDic, info={'bsp' : ntpath.basename(trajBSP),
+                                                                          'eventType' : 'periNoFB'})
+        numPerisNoFBs = len(periNoFBsEventDic)
+
+    eventStore.replace(searchBodies[1]['searchType'], periNoFBsEventDic)
     if outputLevel >= 2:
-        #TODO: add periNoFBsEventDic Info!
-        # ONLY IF Not existing file
-        with open(periNoFBsEventFile, 'w+' ) as outfile:
-           json.dump( periNoFBsEventDic, outfile, indent = 4, separators=(',', ': ') )
+        eventStore.exportJson(periNoFBsEventFile, searchBodies[1]['searchType'])
         print(' ... ' + ntpath.basename(periNoFBsEventFile) + ' Saved!' )
         print('     Peri w No FBs Events Found: ' + str(numPerisNoFBs))
     #encBFframe='IAU Enceladus Fixed'
@@ -244,33 +523,58 @@ if findPeriNoFBs:
 
 #-----------------------------------------------------------------------------
 # Seach for Apoapsis of 'searchBodies':
-findApos = True
-if findApos:
-    ev = ApsisEvent( TrajQuery( boa, "mySC", "Enceladus" ), ApsisEvent.APOAPSIS)
-    r = ev.search( searchInterval, apsisSearchStep )
-    #Filter Periapsis by Min Alt:
-    #periEvents = [xx  for xx in r if xx.value() < searchBodies[1]['minAlt']]
-    apoEvents = r
-
-    #Save to Json
-    # Epoch, rpRange, Center, Frame
-    apoEventDic=[]
-    numApos = 0
-    for pp in apoEvents:
-        apoEventDic.append({
-            'time' : str(pp.time()),
-            'value': str(pp.value()),
-            'center' : searchBodies[2]['bodyName'],
-            'frame' : searchBodies[2]['searchFrame'],
-            'eventType' : searchBodies[2]['searchType'],
-             })
-        numApos += 1
-
+if findApos and not args.fused:
+    apoPlan = scanCache.plan(trajBSP, scID, search_t0, search_tf, apsisParams(2, 'Apo'),
+                             scanWindows, incMargin(apsisSearchStep), base=incBaseCache, rescan=args.ov)
+    apoEventDic = apoPlan.events
+    apoScanned = apoEventDic is None
+    apoWindows = apoPlan.windows
+    if apoScanned and apoPlan.incremental:
+        print(' ... Apo Events, ' + apoPlan.summary())
+    if not apoScanned:
+        print(' ... Using cached Apo Events')
+        numApos = len(apoEventDic)
+    elif args.kepler:
+        apoEventDic = keplerApsides(2, "Enceladus", 'Apo', windows=apoWindows)
+        numApos = len(apoEventDic)
+    elif numWorkers != 1 and apoWindows:
+        apoEventDic = scanP.apsisParallel(
+            [trajBSP, boaPlanets, boaSats], scID, 'mySC', "Enceladus", 'Apo',
+            search_t0, search_tf, apsisSearchStep.value(), numWorkers,
+            frame=searchBodies[2]['searchFrame'], eventCenter=searchBodies[2]['bodyName'],
+            eventType=searchBodies[2]['searchType'], windows=apoWindows)
+        numApos = len(apoEventDic)
+    else:
+        ev = ApsisEvent( TrajQuery( boa, "mySC", "Enceladus" ), ApsisEvent.APOAPSIS)
+        apoEventDic=[]
+        numApos = 0
+        for ii, searchWin in enumerate(monteIntervals(apoWindows)):
+            r = ev.search( searchWin, apsisSearchStep )
+            #Filter Periapsis by Min Alt:
+            #periEvents = [xx  for xx in r if xx.value() < searchBodies[1]['minAlt']]
+            apoEvents = r
+
+            #Save to Json
+            # Epoch, rpRange, Center, Frame
+            for pp in apoEvents:
+                apoEventDic.append({
+                    'time' : str(pp.time()),
+                    'value': str(pp.value()),
+                    'center' : searchBodies[2]['bodyName'],
+                    'frame' : searchBodies[2]['searchFrame'],
+                    'eventType' : searchBodies[2]['searchType'],
+                    'interval' : ii,
+                     })
+                numApos += 1
+
+    if apoScanned:
+        apoEventDic = apoPlan.finish(apoEventDic, info={'bsp' : ntpath.basename(trajBSP),
+                                                        'eventType' : 'Apo'})
+        numApos = len(apoEventDic)
+
+    eventStore.replace(searchBodies[2]['searchType'], apoEventDic)
     if outputLevel >= 2:
-        #TODO: add periEventDic Info!
-        # ONLY IF Not existing file
-        with open(apoEventFile, 'w+' ) as outfile:
-           json.dump( apoEventDic, outfile, indent = 4, separators=(',', ': ') )
+        eventStore.exportJson(apoEventFile, searchBodies[2]['searchType'])
         print(' ... ' + ntpath.basename(apoEventFile) + ' Saved!' )
         print('     Apo Events Found: ' + str(numApos))
 
@@ -278,58 +582,69 @@ if findApos:
 
 # ----------------------------------------------------------------------------
 #Find DV discontinuities:
-#findDvDiscon = True
-findDvDiscon = False
-if findDvDiscon and os.path.exists(dvDiscFile):
-    print(' ... Using DV Disc. from: ' + dvDiscFile )
-    with open(dvDiscFile, 'r') as jsonInput:
-       dvSearchDic = json.load(jsonInput)
-
-if findDvDiscon and not os.path.exists(dvDiscFile):
+if findDvDiscon and not args.fused:
+    dvPlan = scanCache.plan(trajBSP, scID, search_t0, search_tf,
+                            {'eventType' : 'dvDisc',
+                             'minDv' : minDVSearch.value(),
+                             'dt' : dvSearchtimeStep.value(),
+                             'center' : dvSearchCenter,
+                             'frame' : dvSearchFrame,
+                             },
+                            scanWindows, incMargin(dvSearchtimeStep), base=incBaseCache, rescan=args.ov)
+    dvSearchDic = dvPlan.events
+    if dvSearchDic is not None:
+        print(' ... Using cached DV Disc.')
+
+if findDvDiscon and not args.fused and dvSearchDic is None:
     t1_cpu = process_time()
-    print( ' ... Searching for DV discontinuities: ')
-    dvSearchDic=[]
-    querySat = TrajQuery( boa,'mySC',dvSearchCenter,dvSearchFrame)
+    print( ' ... Searching for DV discontinuities: (' + dvPlan.summary() + ')')
     timeStep = dvSearchtimeStep
-    tList =Epoch.range(traj_t0,traj_tf, timeStep)
-    numDvDisc = 0
-    dvTot = 0
-    dvMag_list = []
-    for tt in tList[:-1]:
-        #dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()/querySat.state(tt).vel().mag()
-        dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()
-        dvMag_list.append(dvMag)
-        if dvMag > minDVSearch.value():
-            dv_vec = querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()
-            dvSearchDic.append({
-                'time' : str(tt),
-                'center' : dvSearchCenter ,
-                'frame' : dvSearchFrame,
-                'eventType' : 'dvDisc',
-                'value' : [dv_vec[0],
-                           dv_vec[1],
-                           dv_vec[2]],
-                'dv_mag' : dvMag,
-                'units' : 'km/sec',
-                 })
-            dvTot += dvMag
-            numDvDisc += 1
+    if numWorkers != 1 and dvPlan.windows:
+        dvResults = scanP.dvDiscParallel(
+            trajBSP, scID, dvSearchCenter, dvSearchFrame, search_t0, search_tf,
+            timeStep.value(), minDVSearch.value(), numWorkers=numWorkers, native=False,
+            boaFiles=[boaPlanets, boaSats], scName='mySC',
+            history=dvHistFile if outputLevel >= 3 else False, windows=dvPlan.windows)
+        if outputLevel >= 3:
+            dvSearchDic, dvHist = dvResults
+        else:
+            dvSearchDic = dvResults
+    else:
+        # |DV| of every step streamed to disk, only to plot
+        dvHist = scanH.DvHistory(dvHistFile) if outputLevel >= 3 else None
+        querySat = TrajQuery( boa,'mySC',dvSearchCenter,dvSearchFrame)
+        dvDetector = scanU.DvDiscDetector(minDVSearch.value(), dvSearchCenter, dvSearchFrame,
+                                          keepHistory=False, history=dvHist)
+        scanU.scanIntervals(lambda aa, bb: scanU.stateStream(querySat.state, spkE.et2epoch(aa),
+                                                             spkE.et2epoch(bb), timeStep),
+                            dvPlan.windows, [dvDetector])
+        dvSearchDic = dvDetector.events
+    dvSearchDic = dvPlan.finish(dvSearchDic, info={'bsp' : ntpath.basename(trajBSP),
+                                                   'eventType' : 'dvDisc'})
+    numDvDisc = len(dvSearchDic)
+    dvTot = sum(ev['dv_mag'] for ev in dvSearchDic)
     print('     Num of DV Disc. : ' + str(numDvDisc))
     print('     DV Total : ' + str(dvTot) + 'km/s')
     t2_cpu = process_time()
     print(f"     time: {(t2_cpu - t1_cpu)} sec")
 
     if outputLevel >= 3:
-        xx = range(0,len(dvMag_list))
-        xx = [rr*(timeStep/86400/sec)  for rr in xx]
-        plt.plot(xx,dvMag_list)
-        plt.show()
+        # decimated (min/max per bin): spikes kept, a few thousand points
+        dvHistEt, dvHistMag = dvHist.arrays()
+        scanH.plotDvHistory(plt, dvHistEt, dvHistMag)
 
+    eventStore.replace('dvDisc', dvSearchDic)
     if saveDvData:
-        with open(dvDiscFile, 'w+' ) as outfile:
-           json.dump( dvSearchDic, outfile, indent = 4, separators=(',', ': ') )
+        eventStore.exportJson(dvDiscFile, 'dvDisc')
         print('     ' + ntpath.basename(dvDiscFile) + ' Saved!' )
 
+# ----------------------------------------------------------------------------
+# Save the event store (all event types, sorted by time):
+if len(eventStore):
+    eventStore.save(eventStoreFile)
+    print(' ... ' + ntpath.basename(eventStoreFile) + ' Saved! (' + str(len(eventStore))
+          + ' events: ' + ', '.join(eventStore.types()) + ')')
+
 # ----------------------------------------------------------------------------
 
 # NEXT:
@@ -28,6 +28,12 @@ import Monte as M
 from mpy.opt.cosmic import Manager
 
 import math
+import numpy as np
+
+import monteCop.utils.conicUtils as conicU
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.stateTable as stTab
 
 # Place all imports before here.
 #===========================================================================
@@ -46,6 +52,11 @@ parser.add_argument('-sc', '--scName', default="encnf5", help = "Spacecraft Name
 parser.add_argument("-to","--tiniOffset", default="0", help="t0 offset- days. Default='' (use t0 from bsp)")
 parser.add_argument("-tl","--tlInterval", default="0", help="Trajectory time line interval from t0_offset. Default='' (use bsp time span)")
 parser.add_argument('-dt', '--timeStep', default=10, help = "Step time for plotting (in minutes). Default: 10 (min)" )
+parser.add_argument('-st', '--stateTable', default="0",
+                    help='Step [sec] of the cached state tables (keyed on the input file content, shared by the '
+                         'tools: ~/.monteCop/stateTables) used by the Rp/Ra searches and the AOP/RAAN at the peris: '
+                         'states interpolated, exact where the interpolation error is above tolerance. '
+                         'Default: 0 (off)')
 #parser.add_argument('-s','--savePlot', action='store_true', help='save plots')
 
 # TODO: Add Epoch Calendar format: ...
@@ -97,23 +108,52 @@ srchInterval = TimeInterval(t0,tf)
 rpSrchStep = 10*minute
 raSrchStep = 10*minute
 
-ev = ApsisEvent( TrajQuery( boa, scName, "Enceladus" ), ApsisEvent.PERIAPSIS )
-rp_srch = ev.search(srchInterval, rpSrchStep )
-rp_arr = [r.value() for r in rp_srch]
-rp_tarr = [r.time() for r in rp_srch]
-
-
-ev = ApsisEvent( TrajQuery( boa, scName, "Enceladus" ), ApsisEvent.APOAPSIS )
-ra_srch = ev.search(srchInterval, raSrchStep )
-ra_arr = [r.value() for r in ra_srch]
-ra_tarr = [r.time() for r in ra_srch]
-
-#Find APOs at apo:
-aop_arr=[]
-ran_arr=[]
-for tt in rp_tarr:
-    aop_arr.append(Conic.argumentOfPeriapsis(query.state(tt)))
-    ran_arr.append(Conic.longitudeOfNode(query.state(tt)))
+if float(args.stateTable) > 0:
+    # Dense state tables (-st): the propagated timeline is one window, key = input content
+    stateTables = stTab.StateTableCache(args.inputFile)
+    srch_t0, srch_tf = spkE.epoch2et(t0), spkE.epoch2et(tf)
+    srchWindows = [(srch_t0, srch_tf)]
+    encStates = stateTables.windowTables(
+        scName, 'Enceladus', 'EME2000', srchWindows, float(args.stateTable),
+        scanU.trajQueryStates(TrajQuery( boa, scName, "Enceladus" )), source=[args.inputFile]).states
+    queryStates = stateTables.windowTables(
+        scName, bodyCenter, plotFrame, srchWindows, float(args.stateTable),
+        scanU.trajQueryStates(query), source=[args.inputFile]).states
+
+    rp_srch = scanU.findApsides(encStates, srch_t0, srch_tf, scanU.bodyGM['Enceladus'], 'Peri',
+                                rpSrchStep.value())
+    rp_arr = [ap['range']*km for ap in rp_srch]
+    rp_tarr = [spkE.et2epoch(ap['et']) for ap in rp_srch]
+
+    ra_srch = scanU.findApsides(encStates, srch_t0, srch_tf, scanU.bodyGM['Enceladus'], 'Apo',
+                                raSrchStep.value())
+    ra_arr = [ap['range']*km for ap in ra_srch]
+    ra_tarr = [spkE.et2epoch(ap['et']) for ap in ra_srch]
+else:
+    queryStates = None
+
+    ev = ApsisEvent( TrajQuery( boa, scName, "Enceladus" ), ApsisEvent.PERIAPSIS )
+    rp_srch = ev.search(srchInterval, rpSrchStep )
+    rp_arr = [r.value() for r in rp_srch]
+    rp_tarr = [r.time() for r in rp_srch]
+
+    ev = ApsisEvent( TrajQuery( boa, scName, "Enceladus" ), ApsisEvent.APOAPSIS )
+    ra_srch = ev.search(srchInterval, raSrchStep )
+    ra_arr = [r.value() for r in ra_srch]
+    ra_tarr = [r.time() for r in ra_srch]
+
+#Find AOP/RAAN at peris (all at once):
+# (GM of the Boa, as Monte Conic)
+aop_arr = []
+ran_arr = []
+if rp_tarr:
+    if queryStates is not None:
+        rpStates = queryStates(np.array([spkE.epoch2et(tt) for tt in rp_tarr]))
+    else:
+        rpStates = np.array([scanU.stateArray(query.state(tt)) for tt in rp_tarr])
+    rpCoe = conicU.classical(rpStates, conicU.monteConstants(query.state(rp_tarr[0]))[0])
+    aop_arr = [aop*rad for aop in rpCoe['aop']]
+    ran_arr = [ran*rad for ran in rpCoe['raan']]
 
 # Plot Ra/Rp: Separate figures
 
@@ -0,0 +1,393 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Incremental trajectory creation of Cosmic timelines (dirty arcs only).
+
+An arc of a timeline is the propagation of one control point, backward to
+the previous BreakPoint and forward to the next one. Each arc is keyed by
+everything its propagation depends on: the CP (state, time, mass, center,
+frame, propagator), the epochs of the bounding BreakPoints, the burns inside
+the arc, the force model/propagator tolerances (content of the template
+files and of the files they import or name, e.g. gravity fields) and the
+ephemerides loaded into the Boa (content of the files loaded by
+batchU.boaLoad, or boaFiles). The results of an arc (states at both ends) are cached in the _TMP
+folder under that key:
+
+    >>> import monteCop.utils.arcCache as arcC
+    >>> incTraj = arcC.IncrementalTraj(mgr, 'myTraj_TMP', modelFiles=[cosmicTemp])
+    >>> incTraj.createTraj()            # propagates the dirty arcs only
+    >>> sMinus, sPlus = incTraj.bpStates('CP01->CP02')
+    >>> incTraj.createTraj(workers=8, inputFile=chkPtFile)   # dirty arcs in parallel (arcParallel)
+
+An arc is dirty if its key is not cached (CP, burn or BreakPoint changed) or
+if it was marked with touch(). Only the dirty arcs are propagated: the CPs of
+the clean arcs are deactivated for createTraj, and their results come from
+the cache. With no dirty arcs, createTraj is not called at all.
+
+Note: the Boa trajectory (mgr.boa) only covers the arcs propagated in the
+last call (incTraj.partial is True if cached arcs were skipped): use the
+BreakPoint states (bpStates), which cover the whole timeline, or
+createTraj(full=True) for a complete Boa trajectory.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+import monteCop.utils.batchUtils as batchU
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.templateCache as tmplC
+from monteCop.utils.scanCache import fileDigest, canonical, knownDigest, readManifest, writeJson
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+ARC_FOLDER = 'arcCache'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 2
+
+# Max. number of cached arcs (least recently used evicted)
+ARC_MAX_ENTRIES = 20000
+
+# Checkpoint files (template + timeline): only the template part is the model
+TIMELINE_MARKER = b'Timeline = ['
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def modelDigest(fileName):
+    """ sha256 (hex) of a model file (force models, propagators, tolerances,
+        ephemerides). For checkpoints (template + 'Timeline = [...]') only the
+        template part is hashed, so editing the timeline does not change the model.
+    """
+    if not fileName.endswith('.py'):
+        return fileDigest(fileName)
+    with open(fileName, 'rb') as inFile:
+        text = inFile.read()
+    if TIMELINE_MARKER not in text:
+        return fileDigest(fileName)
+    return hashlib.sha256(text.split(TIMELINE_MARKER, 1)[0]).hexdigest()
+
+# ----------------------------------------------------------------------------
+def _epochStr(epoch):
+    return epoch.format('full')
+
+# ----------------------------------------------------------------------------
+def timelineArcs(mgr):
+    """ Arcs of the timeline of a Manager, in time order.
+
+    = RETURN VALUE
+    - list of dict: 'cp' (CP name), 'index' (CP index on the timeline),
+      'before'/'after' (bounding BreakPoint names, None at the timeline ends),
+      't0'/'tf' (arc span [ET sec]), 'burns' (burn names inside the arc)
+    """
+    import Monte as M
+    timeline = mgr.cosmic.timeline()
+    cps = [timeline.controlPoint(ii) for ii in range(timeline.numControl())]
+    bps = [timeline.breakPoint(ii) for ii in range(timeline.numBreak())]
+    cpEts = [spkE.epoch2et(cp.time()) for cp in cps]
+    bpEts = np.array([spkE.epoch2et(bp.time()) for bp in bps])
+    bpOrder = np.argsort(bpEts, kind='stable')
+    bpEts = bpEts[bpOrder]
+
+    burnList = M.ImpulseBurnMgrBoa.read(mgr.boa, timeline.body())
+    burns = [(burnList[ii].name(), spkE.epoch2et(burnList[ii].time()))
+             for ii in range(len(burnList))]
+
+    # first/last arcs: to the timeline ends
+    tlBegin = spkE.epoch2et(mgr.tl.begin())
+    tlEnd = spkE.epoch2et(mgr.tl.end())
+
+    arcs = []
+    for ii, (cp, et) in enumerate(zip(cps, cpEts)):
+        jj = int(np.searchsorted(bpEts, et, side='right'))
+        before = bps[bpOrder[jj - 1]] if jj > 0 else None
+        after = bps[bpOrder[jj]] if jj < len(bps) else None
+        t0 = bpEts[jj - 1] if before is not None else min(tlBegin, et)
+        tf = bpEts[jj] if after is not None else max(tlEnd, et)
+        arcs.append({'cp' : cp.name(),
+                     'index' : ii,
+                     'before' : before.name() if before is not None else None,
+                     'after' : after.name() if after is not None else None,
+                     't0' : float(t0),
+                     'tf' : float(tf),
+                     'burns' : [nn for nn, tt in burns if t0 <= tt <= tf],
+                     })
+    return arcs
+
+# ===========================================================================
+# Arc Cache:
+# ===========================================================================
+
+class ArcCache(object):
+    """ Propagated arcs (states at both ends) in outputFolder/arcCache """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, outputFolder, maxEntries=ARC_MAX_ENTRIES):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - outputFolder   output folder (e.g. baseName + '_TMP')
+        - maxEntries     max. number of cached arcs
+        """
+        self.folder = os.path.join(outputFolder, ARC_FOLDER)
+        self.manifestFile = os.path.join(self.folder, MANIFEST_FILE)
+        self.maxEntries = maxEntries
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        self.manifest = self._readManifest()
+
+    #-----------------------------------------------------------------------
+    def _readManifest(self):
+        """ manifest dict (empty if missing, unreadable or other version) """
+        empty = {'version' : MANIFEST_VERSION, 'models' : {}, 'entries' : {}}
+        return readManifest(self.manifestFile, empty, 'arc cache')
+
+    #-----------------------------------------------------------------------
+    def save(self):
+        self._evict()
+        writeJson(self.manifestFile, self.manifest)
+
+    #-----------------------------------------------------------------------
+    def digest(self, fileName):
+        """ model digest of a file, re-hashed only if its size/mtime changed """
+        return knownDigest(self.manifest['models'], fileName, modelDigest)[0]
+
+    #-----------------------------------------------------------------------
+    def get(self, key):
+        """ cached arc of key ({'back': (6,), 'fwd': (6,)} [km, km/s]), or None """
+        entry = self.manifest['entries'].get(key)
+        if entry is None:
+            return None
+        entry['lastUsed'] = time.time()
+        return {side : None if entry[side] is None else np.array(entry[side])
+                for side in ['back', 'fwd']}
+
+    #-----------------------------------------------------------------------
+    def put(self, key, cpName, back, fwd):
+        """ store the end states of an arc (None: no BreakPoint on that side) """
+        now = time.time()
+        self.manifest['entries'][key] = {
+            'cp' : cpName,
+            'back' : None if back is None else [float(xx) for xx in back],
+            'fwd' : None if fwd is None else [float(xx) for xx in fwd],
+            'created' : now,
+            'lastUsed' : now,
+            }
+
+    #-----------------------------------------------------------------------
+    def _evict(self):
+        """ remove least recently used arcs above maxEntries """
+        entries = self.manifest['entries']
+        if len(entries) <= self.maxEntries:
+            return
+        lru = sorted(entries, key=lambda kk: entries[kk]['lastUsed'])
+        for key in lru[:len(entries) - self.maxEntries]:
+            del entries[key]
+
+    #-----------------------------------------------------------------------
+    def clear(self):
+        """ remove all cached arcs """
+        self.manifest['entries'] = {}
+        writeJson(self.manifestFile, self.manifest)
+
+# ===========================================================================
+# Incremental Trajectory:
+# ===========================================================================
+
+class IncrementalTraj(object):
+    """ createTraj of a Manager timeline, dirty arcs only """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, mgr, outputFolder, modelFiles=(), params=None, boaFiles=None):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - mgr            Cosmic Manager
+        - outputFolder   arc cache folder (outputFolder/arcCache)
+        - modelFiles     files defining force models and propagators (e.g. the
+                         Cosmic template, or a checkpoint: template part only).
+                         The files they import or name (gravity fields, Boa
+                         files) are part of the model too
+        - params         other propagation settings in the arc keys (dict)
+        - boaFiles       files loaded into mgr.boa before the template (default:
+                         batchU.loadedFiles(mgr.boa))
+        """
+        self.mgr = mgr
+        self.cache = ArcCache(outputFolder)
+        self.boaFiles = (list(boaFiles) if boaFiles is not None
+                         else batchU.loadedFiles(mgr.boa))
+        depFiles = []
+        for ff in modelFiles:
+            depFiles += [dd for dd in tmplC.templateDeps(ff)[1:] if dd not in depFiles]
+        self.model = {'files' : [self.cache.digest(ff) for ff in modelFiles],
+                      'deps' : [self.cache.digest(ff) for ff in depFiles],
+                      'boa' : [self.cache.digest(ff) for ff in self.boaFiles],
+                      'params' : canonical(params or {}),
+                      }
+        self.arcs = []
+        self.results = {}
+        self.partial = False
+        self._touched = set()
+
+    #-----------------------------------------------------------------------
+    def touch(self, *names):
+        """ mark CPs, burns or BreakPoints as changed (their arcs are re-propagated) """
+        self._touched.update(names)
+
+    #-----------------------------------------------------------------------
+    def arcKey(self, arc):
+        """ cache key of an arc: CP, bounding BreakPoint epochs, burns, model """
+        import Monte as M
+        mgr = self.mgr
+        cp = mgr.cp[arc['cp']]
+        burnList = M.ImpulseBurnMgrBoa.read(mgr.boa, mgr.cosmic.timeline().body())
+        burns = []
+        for ii in range(len(burnList)):
+            burn = burnList[ii]
+            if burn.name() in arc['burns']:
+                burns.append([burn.name(), _epochStr(burn.time()), burn.frame(),
+                              [repr(float(dv)) for dv in burn.dvel()], str(burn)])
+        keyData = {'cp' : [cp.name(), _epochStr(cp.time()), str(cp.mass()), str(cp),
+                           [repr(float(xx)) for xx in scanU.stateArray(cp.state())]],
+                   'span' : [repr(arc['t0']), repr(arc['tf'])],
+                   'bps' : [arc['before'], arc['after']],
+                   'burns' : burns,
+                   'model' : self.model,
+                   }
+        keyStr = json.dumps(keyData, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(keyStr.encode('utf-8')).hexdigest()
+
+    #-----------------------------------------------------------------------
+    def _isTouched(self, arc):
+        names = [arc['cp'], arc['before'], arc['after']] + arc['burns']
+        return any(nn in self._touched for nn in names if nn is not None)
+
+    #-----------------------------------------------------------------------
+    def dirty(self):
+        """ arcs (timelineArcs dicts, with 'key') to be propagated """
+        self.arcs = timelineArcs(self.mgr)
+        for arc in self.arcs:
+            arc['key'] = self.arcKey(arc)
+        return [arc for arc in self.arcs
+                if self._isTouched(arc) or self.cache.get(arc['key']) is None]
+
+    #-----------------------------------------------------------------------
+    def createTraj(self, *args, **kwargs):
+        """ Propagate the dirty arcs (mgr.tl.createTraj(boa, problem, *args)).
+
+        = INPUT VARIABLES
+        - args         createTraj arguments after (boa, problem)
+        - full         propagate all the arcs (kwargs, default False)
+        - workers      processes propagating the dirty arcs (kwargs, default 1:
+                       createTraj of mgr; 0: all cores), see arcParallel
+        - inputFile    Cosmic input file of the timeline, loaded by the
+                       workers (kwargs, required if workers != 1)
+
+        = RETURN VALUE
+        - number of arcs propagated. If cached arcs were skipped (self.partial),
+          the Boa trajectory of mgr only covers the arcs propagated
+        """
+        mgr = self.mgr
+        full = kwargs.get('full', False)
+        workers = kwargs.get('workers', 1)
+        inputFile = kwargs.get('inputFile')
+        if workers != 1 and not inputFile:
+            raise ValueError('IncrementalTraj.createTraj: workers need the inputFile of the timeline')
+        wall0 = time.time()
+        dirty = self.dirty()
+        if full:
+            dirty = list(self.arcs)
+        dirtyCps = set(arc['cp'] for arc in dirty)
+
+        if dirty and workers != 1:
+            import monteCop.utils.arcParallel as arcP
+            results = arcP.propagateArcs(inputFile, workers, arcs=dirty, createArgs=args,
+                                         boaFiles=self.boaFiles)
+            for arc in dirty:
+                self.cache.put(arc['key'], arc['cp'], results[arc['cp']]['back'],
+                               results[arc['cp']]['fwd'])
+        elif dirty:
+            clean = [mgr.cp[arc['cp']] for arc in self.arcs if arc['cp'] not in dirtyCps]
+            clean = [cp for cp in clean if cp.isActive()]
+            for cp in clean:
+                cp.setActive(False)
+            try:
+                mgr.tl.createTraj(mgr.boa, mgr.problem, *args)
+            finally:
+                for cp in clean:
+                    cp.setActive(True)
+            self._storeArcs(dirty)
+
+        self.results = {arc['cp'] : self.cache.get(arc['key']) for arc in self.arcs}
+        # Boa trajectory: dirty arcs only (none with workers)
+        self.partial = len(dirty) < len(self.arcs) or (bool(dirty) and workers != 1)
+        self.cache.save()
+        self._touched = set()
+        print(' ... Trajectory: {0} arcs propagated, {1} cached ({2:.1f} sec)'
+              .format(len(dirty), len(self.arcs) - len(dirty), time.time() - wall0))
+        return len(dirty)
+
+    #-----------------------------------------------------------------------
+    def _storeArcs(self, arcs):
+        """ cache the end states of propagated arcs (BreakPoint minus/plus states) """
+        import Monte as M
+        timeline = self.mgr.cosmic.timeline()
+        bpStates = {}
+        for ii in range(timeline.numBreak()):
+            bp = timeline.breakPoint(ii)
+            sMinus = M.State()
+            sPlus = M.State()
+            bp.state(sMinus, sPlus)
+            bpStates[bp.name()] = (scanU.stateArray(sMinus), scanU.stateArray(sPlus))
+
+        for arc in arcs:
+            # backward to 'before' (its plus side), forward to 'after' (its minus side)
+            back = bpStates[arc['before']][1] if arc['before'] is not None else None
+            fwd = bpStates[arc['after']][0] if arc['after'] is not None else None
+            self.cache.put(arc['key'], arc['cp'], back, fwd)
+
+    #-----------------------------------------------------------------------
+    def bpStates(self, bpName):
+        """ (minus, plus) states of a BreakPoint [km, km/s], (6,) arrays """
+        sMinus = sPlus = None
+        for arc in self.arcs:
+            result = self.results.get(arc['cp'])
+            if result is None:
+                continue
+            if arc['after'] == bpName:
+                sMinus = result['fwd']
+            if arc['before'] == bpName:
+                sPlus = result['back']
+        return sMinus, sPlus
+
+    #-----------------------------------------------------------------------
+    def mismatches(self):
+        """ BreakPoint mismatches: list of (name, |dPos| [km], |dVel| [km/s]) """
+        import monteCop.utils.arcParallel as arcP
+        results = dict(self.results)
+        results['arcs'] = self.arcs
+        return arcP.mismatches(results)
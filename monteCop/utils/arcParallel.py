@@ -0,0 +1,206 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Parallel arc propagation of multiple-shooting Cosmic timelines.
+
+Given the CP states, the arcs of a timeline (each CP propagated backward and
+forward to its BreakPoints) are independent. The arcs are split in groups of
+consecutive CPs, propagated by a process pool: each worker builds its own
+Boa and Manager from the same Cosmic input file (template + timeline),
+deactivates the CPs of the other groups and calls createTraj. The workers
+return the arc end states (BreakPoint minus/plus sides) and, optionally,
+the arc trajectories sampled on a grid:
+
+    >>> import monteCop.utils.arcParallel as arcP
+    >>> arcs = arcP.propagateArcs('Enceladus_NRHO_B2M.py', numWorkers=8,
+    ...                           sampleStep=600.0, center='Enceladus', frame='EMO2000')
+    >>> for bpName, dPos, dVel in arcP.mismatches(arcs):
+    ...     print(bpName, dPos, dVel)
+
+arcCache.IncrementalTraj(...).createTraj(workers=8, inputFile=...) fans out
+the dirty arcs only, and caches the results.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import time
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.scanUtils as scanU
+from monteCop.utils.scanParallel import poolSize, runChunks
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Arc groups per worker (load balance: arcs have different lengths/dynamics)
+GROUPS_PER_WORKER = 2
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def arcGroups(arcs, numGroups):
+    """ Split arcs (timelineArcs order) in min(numGroups, len(arcs)) non-empty
+        groups of consecutive arcs, balanced by propagated span. Consecutive
+        arcs share their BreakPoint, so most BreakPoints get both sides from
+        the same worker.
+    """
+    if not arcs:
+        return []
+    numArcs = len(arcs)
+    numGroups = max(1, min(numGroups, numArcs))
+    cumSpan = np.cumsum([arc['tf'] - arc['t0'] for arc in arcs])
+    # greedy cut at each span threshold: arcs ending before it, at least one
+    # arc per group, and one arc left for each of the next groups
+    bounds = [0]
+    for kk in range(1, numGroups):
+        cut = int(np.searchsorted(cumSpan, cumSpan[-1]*kk/numGroups, side='right'))
+        bounds.append(min(max(cut, bounds[-1] + 1), numArcs - (numGroups - kk)))
+    bounds.append(numArcs)
+    return [arcs[b0:b1] for b0, b1 in zip(bounds[:-1], bounds[1:])]
+
+# ----------------------------------------------------------------------------
+def loadManager(inputFile, boaFiles=()):
+    """ Boa + Cosmic Manager of a worker, from a Cosmic input file """
+    import Monte as M
+    from mpy.opt.cosmic import Manager
+    boa = M.BoaLoad()
+    for boaFile in boaFiles:
+        boa.load(boaFile)
+    mgr = Manager(boa)
+    # quiet manager to avoid: WARNING COSMIC/Output:0 control points, when loadInput
+    mgr.quiet = True
+    mgr.loadInput(inputFile)
+    mgr.quiet = False
+    return mgr
+
+# ----------------------------------------------------------------------------
+def _arcGroup(task):
+    """ propagate a group of arcs -> {cp: {'back', 'fwd', 'samples'}}, wall time """
+    import Monte as M
+    wall0 = time.time()
+    mgr = loadManager(task['inputFile'], task['boaFiles'])
+    timeline = mgr.cosmic.timeline()
+    mine = set(arc['cp'] for arc in task['arcs'])
+    for ii in range(timeline.numControl()):
+        cp = timeline.controlPoint(ii)
+        if cp.name() not in mine and cp.isActive():
+            cp.setActive(False)
+
+    mgr.tl.createTraj(mgr.boa, mgr.problem, *task['createArgs'])
+
+    bpStates = {}
+    for ii in range(timeline.numBreak()):
+        bp = timeline.breakPoint(ii)
+        sMinus = M.State()
+        sPlus = M.State()
+        bp.state(sMinus, sPlus)
+        bpStates[bp.name()] = (scanU.stateArray(sMinus), scanU.stateArray(sPlus))
+
+    query = None
+    if task['sampleStep']:
+        query = M.TrajQuery(mgr.boa, timeline.body(), task['center'], task['frame'])
+
+    results = {}
+    for arc in task['arcs']:
+        result = {'back' : bpStates[arc['before']][1] if arc['before'] is not None else None,
+                  'fwd' : bpStates[arc['after']][0] if arc['after'] is not None else None,
+                  'samples' : None,
+                  }
+        if query is not None:
+            ets = spkE.epochGrid(arc['t0'], arc['tf'], task['sampleStep'])
+            states = np.array([scanU.stateArray(query.state(spkE.et2epoch(et))) for et in ets])
+            result['samples'] = (ets, states)
+        results[arc['cp']] = result
+    return results, time.time() - wall0
+
+# ----------------------------------------------------------------------------
+def propagateArcs(inputFile, numWorkers=0, arcs=None, createArgs=(), boaFiles=(),
+                  sampleStep=None, center=None, frame=None, mgr=None):
+    """ Propagate the arcs of a Cosmic timeline in parallel.
+
+    = INPUT VARIABLES
+    - inputFile    Cosmic input file (template + timeline, e.g. a saveChkPt file)
+    - numWorkers   processes (0: all cores)
+    - arcs         arcs to propagate (arcCache.timelineArcs dicts). Default: all
+    - createArgs   createTraj arguments after (boa, problem)
+    - boaFiles     Boa/bsp files loaded before the input file
+    - sampleStep   arc trajectories sampled every sampleStep [sec] (None: no samples)
+    - center, frame  samples center and frame
+    - mgr          Manager of inputFile (arcs, if not given), loaded if None
+
+    = RETURN VALUE
+    - dict cp name -> {'back': (6,) state at the previous BreakPoint (plus side),
+                       'fwd': (6,) state at the next BreakPoint (minus side),
+                       'samples': (ets, (N,6) states) or None}   [km, km/s]
+      plus 'arcs': the arcs, in timeline order
+    """
+    import monteCop.utils.arcCache as arcC
+    if sampleStep and (center is None or frame is None):
+        raise ValueError('propagateArcs: sampleStep needs center and frame')
+    if arcs is None:
+        if mgr is None:
+            mgr = loadManager(inputFile, boaFiles)
+        arcs = arcC.timelineArcs(mgr)
+
+    wall0 = time.time()
+    workers = poolSize(numWorkers)
+    groups = arcGroups(arcs, workers*GROUPS_PER_WORKER)
+    tasks = [{'inputFile' : inputFile,
+              'boaFiles' : list(boaFiles),
+              'arcs' : group,
+              'createArgs' : tuple(createArgs),
+              'sampleStep' : sampleStep,
+              'center' : center,
+              'frame' : frame,
+              } for group in groups]
+    print(' ... Propagating ' + str(len(arcs)) + ' arcs: ' + str(len(groups)) + ' groups, '
+          + str(min(workers, len(groups))) + ' workers')
+    outputs = runChunks(_arcGroup, tasks, workers)
+
+    results = {'arcs' : arcs}
+    for groupResults, wall in outputs:
+        results.update(groupResults)
+    print('     {0} arcs propagated ({1:.1f} sec, {2:.1f} sec in workers)'
+          .format(len(arcs), time.time() - wall0, sum(wall for res, wall in outputs)))
+    return results
+
+# ----------------------------------------------------------------------------
+def mismatches(results):
+    """ BreakPoint mismatches of propagated arcs (propagateArcs results)
+
+    = RETURN VALUE
+    - list of (BreakPoint name, |dPos| [km], |dVel| [km/s]), timeline order,
+      for the BreakPoints with both sides propagated
+    """
+    arcs = results['arcs']
+    out = []
+    for prevArc, nextArc in zip(arcs[:-1], arcs[1:]):
+        bpName = prevArc['after']
+        if bpName is None or bpName != nextArc['before']:
+            continue
+        sMinus = results.get(prevArc['cp'], {}).get('fwd')
+        sPlus = results.get(nextArc['cp'], {}).get('back')
+        if sMinus is None or sPlus is None:
+            continue
+        diff = sPlus - sMinus
+        out.append((bpName, float(np.linalg.norm(diff[:3])), float(np.linalg.norm(diff[3:]))))
+    return out
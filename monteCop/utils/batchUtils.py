@@ -0,0 +1,357 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Batch mode of the bsp scripts: several objects of one kernel in one run.
+
+The ephemerides (bsp, de430, sat375l, default data) are loaded once into a
+warm Boa in the parent process. Each object is then run by its own worker
+process, forked from the parent (the warm Boa is inherited, not reloaded),
+with the script arguments of that object. Objects run concurrently, and the
+output of each one goes to its own log:
+
+    >>> import monteCop.utils.batchUtils as batchU
+    >>> scIDs = batchU.objectList(trajBSP, args.spiceID)   # ['all']: non-natural bodies
+    >>> if len(scIDs) > 1:
+    ...     batchU.warmBoa([trajBSP, boaPlanets], ["frame","body"])
+    ...     batchU.runBatch(__file__, sys.argv[1:], ['-id', '--spiceID'], scIDs, baseName)
+    >>> boa = batchU.boaLoad([trajBSP])                   # warm Boa in a batch worker
+    >>> outputFolder = batchU.objectName(baseName) + '_TMP'   # 'myTraj_-303_TMP' in a batch
+
+Outside a batch, boaLoad creates and loads a new Boa and objectName returns
+the name unchanged, so the scripts work as before for a single object.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import multiprocessing
+import os
+import re
+import runpy
+import sys
+import time
+import traceback
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+import monteCop.utils.spkReader as spkR
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Object list keyword: all the non-natural bodies (spacecraft) on the bsp
+ALL_OBJECTS = 'all'
+
+# Worker processes start method (workers inherit the warm Boa)
+START_METHOD = 'fork'
+
+# Worker results polling period [sec] (crashed workers detection)
+POLL_SEC = 5.0
+
+# Warm Boa of the batch (parent process), and files/data loaded into it
+_warm = {'boa' : None, 'files' : [], 'data' : []}
+
+# Files loaded by boaLoad into each Boa of this process: list of (boa, files)
+_boaFiles = []
+
+# Object tag of a batch worker (None: not in a batch)
+_objectTag = None
+
+_negativeNumber = re.compile(r'^-\d+$')
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def naturalBody(objID):
+    """ True for natural bodies (SPICE IDs >= 0), False for spacecraft """
+    return int(objID) >= 0
+
+# ----------------------------------------------------------------------------
+def objectList(bspFile, ids):
+    """ Objects of a batch.
+
+    = INPUT VARIABLES
+    - bspFile     SPK kernel
+    - ids         list of SPICE IDs or names (or a str), comma separated
+                  lists accepted, 'all' -> all the non-natural bodies on bspFile
+
+    = RETURN VALUE
+    - list of SPICE IDs (int), in input (bsp) order, no duplicates
+    """
+    if isinstance(ids, (str, int)):
+        ids = [ids]
+    objIDs = []
+    for item in ids:
+        for objID in str(item).split(','):
+            objID = objID.strip()
+            if not objID:
+                continue
+            if objID.lower() == ALL_OBJECTS:
+                found = [oo for oo in spkR.bspObjects(bspFile) if not naturalBody(oo)]
+                if not found:
+                    sys.exit('ERROR: no non-natural bodies on ' + bspFile)
+                newIDs = found
+            else:
+                newID = spkR.objectID(objID)
+                if newID is None:
+                    sys.exit('ERROR: invalid SPICE Body Name or ID: ' + objID)
+                newIDs = [newID]
+            objIDs += [oo for oo in newIDs if oo not in objIDs]
+    return objIDs
+
+# ----------------------------------------------------------------------------
+def inBatch():
+    """ object tag of a batch worker, or None (not in a batch) """
+    return _objectTag
+
+# ----------------------------------------------------------------------------
+def objectName(fileName):
+    """ per-object output name in a batch worker, tag before the extension:
+        'myTraj_b2m.py' -> 'myTraj_b2m_-303.py', 'myTraj' -> 'myTraj_-303'.
+        Unchanged outside a batch.
+    """
+    if _objectTag is None or not fileName:
+        return fileName
+    root, ext = os.path.splitext(fileName)
+    return root + '_' + _objectTag + ext
+
+# ----------------------------------------------------------------------------
+def warmBoa(files, data=()):
+    """ load the shared ephemerides into the warm Boa (parent process)
+
+    = INPUT VARIABLES
+    - files       Boa/bsp files to load (loaded once)
+    - data        mpy.io.data default data (e.g. ["frame","body"])
+
+    = RETURN VALUE
+    - warm Boa
+    """
+    import Monte as M
+    if _warm['boa'] is None:
+        _warm['boa'] = M.BoaLoad()
+    return boaLoad(files, data, _warm['boa'])
+
+# ----------------------------------------------------------------------------
+def isWarmBoa(boa):
+    """ True if boa is the warm Boa of this process """
+    return boa is not None and boa is _warm['boa']
+
+# ----------------------------------------------------------------------------
+def boaCopy():
+    """ new Boa with the files/data of the warm Boa loaded (a clean Boa with the
+        same ephemerides, e.g. for a Cosmic input already executed in the warm Boa)
+    """
+    if _warm['boa'] is None:
+        raise RuntimeError('No warm Boa in this process')
+    import Monte as M
+    return boaLoad(_warm['files'], _warm['data'], M.BoaLoad())
+
+# ----------------------------------------------------------------------------
+def loadedFiles(boa):
+    """ files loaded into boa by boaLoad/warmBoa (abs. paths, in load order) """
+    for bb, files in _boaFiles:
+        if bb is boa:
+            return list(files)
+    return []
+
+# ----------------------------------------------------------------------------
+def _addLoaded(boa, fileName):
+    path = os.path.abspath(fileName)
+    for bb, files in _boaFiles:
+        if bb is boa:
+            if path not in files:
+                files.append(path)
+            return
+    _boaFiles.append((boa, [path]))
+
+# ----------------------------------------------------------------------------
+def boaLoad(files=(), data=(), boa=None):
+    """ Boa with files and default data loaded.
+
+    In a batch worker, the warm Boa of the batch (inherited from the parent)
+    is returned, and the files/data already in it are not loaded again.
+    Otherwise a new Boa is created (boa=None) and everything is loaded.
+
+    = INPUT VARIABLES
+    - files       Boa/bsp files to load
+    - data        mpy.io.data default data (e.g. ["frame","body"])
+    - boa         Boa to load into (default: warm Boa or a new Boa)
+    """
+    if boa is None:
+        if _warm['boa'] is not None:
+            boa = _warm['boa']
+        else:
+            import Monte as M
+            boa = M.BoaLoad()
+
+    isWarm = boa is _warm['boa']
+    for ff in files:
+        if isWarm and ff in _warm['files']:
+            continue
+        boa.load(ff)
+        _addLoaded(boa, ff)
+        if isWarm:
+            _warm['files'].append(ff)
+
+    newData = [dd for dd in data if not (isWarm and dd in _warm['data'])]
+    if newData:
+        import mpy.io.data as defaultData
+        defaultData.loadInto(boa, newData)
+        if isWarm:
+            _warm['data'] += newData
+    return boa
+
+# ----------------------------------------------------------------------------
+def objectArgv(argv, flags, objID):
+    """ script arguments of one object: the object list after flags
+        (e.g. ['-id','--spiceID']) replaced by objID
+    """
+    newArgv = []
+    ii = 0
+    while ii < len(argv):
+        arg = argv[ii]
+        if arg in flags:
+            ii += 1
+            while (ii < len(argv) and
+                   (not argv[ii].startswith('-') or _negativeNumber.match(argv[ii].split(',')[0]))):
+                ii += 1
+            continue
+        if any(arg.startswith(ff + '=') for ff in flags):
+            ii += 1
+            continue
+        newArgv.append(arg)
+        ii += 1
+    return newArgv + [flags[0], str(objID)]
+
+# ----------------------------------------------------------------------------
+def runScript(script, argv, logFile=None, sysArgv0=None):
+    """ run a script (as __main__) in this process, e.g. in a forked worker
+
+    = INPUT VARIABLES
+    - script      script file
+    - argv        script arguments
+    - logFile     script output (stdout/stderr file descriptors, Monte output
+                  included). Default: None (no redirection)
+    - sysArgv0    sys.argv[0] of the script (default: script)
+
+    = RETURN VALUE
+    - exit status (0: ok; sys.exit code, or 1 on an exception)
+    """
+    status = 0
+    log = None
+    if logFile is not None:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        log = open(logFile, 'w')
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+
+    sys.argv = [sysArgv0 or script] + list(argv)
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as exc:
+        if exc.code not in (None, 0):
+            if not isinstance(exc.code, int):
+                print(exc.code)
+            status = exc.code if isinstance(exc.code, int) else 1
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if log is not None:
+        log.close()
+    return status
+
+# ----------------------------------------------------------------------------
+def _runObject(job, results):
+    """ batch worker: run the script for one object, output to its log """
+    global _objectTag
+    script, argv, tag, logFile = job
+    _objectTag = tag
+    wall0 = time.time()
+    status = runScript(script, argv, logFile)
+    results.put((tag, status, time.time() - wall0, logFile))
+
+# ----------------------------------------------------------------------------
+def runBatch(script, argv, flags, objIDs, logBase, numWorkers=0):
+    """ Run script for each object, concurrently (forked worker processes).
+
+    Each object gets a fresh process forked from the parent: the warm Boa is
+    inherited and no state is left by the previous object (e.g. SpiceName).
+    Workers are not daemonic, so the scripts can still run parallel scans (-w).
+
+    = INPUT VARIABLES
+    - script      script file (__file__)
+    - argv        script arguments (sys.argv[1:])
+    - flags       object list option (e.g. ['-id','--spiceID']), replaced by each object
+    - objIDs      objects (objectList)
+    - logBase     per-object logs: logBase + '_<objID>_batch.log'
+    - numWorkers  objects processed concurrently (0: all cores)
+
+    = RETURN VALUE
+    - list of (objID tag, status (0: ok), wall time [sec], log file), in objIDs order
+    """
+    jobs = [(script, objectArgv(argv, flags, objID), str(objID),
+             logBase + '_' + str(objID) + '_batch.log') for objID in objIDs]
+    if numWorkers <= 0:
+        numWorkers = multiprocessing.cpu_count()
+    numWorkers = min(numWorkers, len(jobs))
+
+    print(' ... Batch: ' + str(len(jobs)) + ' objects (' + ', '.join(jj[2] for jj in jobs)
+          + '), ' + str(numWorkers) + ' workers')
+    sys.stdout.flush()
+
+    ctx = multiprocessing.get_context(START_METHOD)
+    queue = ctx.Queue()
+    pending = list(jobs)
+    running = {}
+    results = {}
+    while pending or running:
+        while pending and len(running) < numWorkers:
+            job = pending.pop(0)
+            proc = ctx.Process(target=_runObject, args=(job, queue))
+            proc.start()
+            running[job[2]] = (proc, job)
+
+        try:
+            tag, status, wall, logFile = queue.get(timeout=POLL_SEC)
+        except Empty:
+            # worker died without a result (e.g. a crash in Monte)
+            dead = [tt for tt, (proc, job) in running.items()
+                    if not proc.is_alive() and proc.exitcode != 0]
+            if not dead:
+                continue
+            tag = dead[0]
+            status, wall, logFile = 1, 0.0, running[tag][1][3]
+        proc, job = running.pop(tag)
+        proc.join()
+        results[tag] = (tag, status, wall, logFile)
+        print('     [{0}/{1}] {2}: {3} ({4:.1f} sec), log: {5}'
+              .format(len(results), len(jobs), tag, 'done' if status == 0 else 'FAILED',
+                      wall, logFile))
+        sys.stdout.flush()
+
+    failed = [jj[2] for jj in jobs if results[jj[2]][1] != 0]
+    if failed:
+        print(' ... Batch: ' + str(len(failed)) + ' objects FAILED: ' + ', '.join(failed))
+    return [results[jj[2]] for jj in jobs]
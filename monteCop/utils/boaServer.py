@@ -0,0 +1,285 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Local conversion server: Boa, planetary kernels and default data kept warm.
+
+The server loads the planetary ephemerides (de430, sat375l) and the default
+frame/body data once, into the warm Boa of batchUtils, and listens on a Unix
+socket. Each conversion job (bsp2cosmic, scanBSP, cosmic2json, cosmic2cop,
+...) runs in a worker process forked from the server: the warm Boa is
+inherited, and the scripts only load what is missing (batchU.boaLoad), e.g.
+the job bsp. The job output is streamed back to the client:
+
+    >>> import monteCop.utils.boaServer as boaS
+    >>> boaS.BoaServer(numWorkers=4).serve()               # server (blocks)
+
+    >>> status = boaS.runJob('bsp2cosmic', ['traj.bsp', '-id', '-303'])
+
+runJob falls back to running the job in the client process when no server
+is running.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import getpass
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import monteCop.utils.batchUtils as batchU
+import monteCop.utils.templateCache as tmplC
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Server socket (env. MONTECOP_SERVER overrides)
+SERVER_ADDRESS = os.environ.get('MONTECOP_SERVER',
+                                os.path.join(tempfile.gettempdir(),
+                                             'monteCop_' + getpass.getuser() + '.sock'))
+
+# Warm ephemerides and default data
+BOA_PLANETS = '/nav/common/import/ephem/de430.boa'
+BOA_SATS = '/nav/common/import/ephem/sat375l.boa'
+WARM_DATA = ["frame", "body", "frame/IAU 2000", "frame/inertial"]
+
+# Job names -> scripts (monteCop/scripts, monteCop/utils)
+_monteCopDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_SCRIPTS = {
+    'bsp2cosmic' : os.path.join(_monteCopDir, 'scripts', 'bsp2cosmic.py'),
+    'scanBSP' : os.path.join(_monteCopDir, 'scripts', 'scanBSP.py'),
+    'cosmic2cop' : os.path.join(_monteCopDir, 'scripts', 'cosmic2cop.py'),
+    'cosmic2json' : os.path.join(_monteCopDir, 'utils', 'cosmic2json.py'),
+    'bsp2visualCop' : os.path.join(_monteCopDir, 'scripts', 'bsp2visualCop.py'),
+    'bsp2ideck' : os.path.join(_monteCopDir, 'scripts', 'bsp2ideck.py'),
+}
+
+# Job output streaming period [sec]
+STREAM_SEC = 0.5
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def jobScript(name):
+    """ script file of a job: job name (JOB_SCRIPTS, '.py' optional) or script path """
+    name = str(name)
+    jobName = name[:-3] if name.endswith('.py') else name
+    if jobName in JOB_SCRIPTS:
+        return JOB_SCRIPTS[jobName]
+    if os.path.isfile(name):
+        return os.path.abspath(name)
+    raise ValueError('Unknown job: ' + name + ' (jobs: ' + ', '.join(sorted(JOB_SCRIPTS)) + ')')
+
+# ----------------------------------------------------------------------------
+def connect(address=None):
+    """ connection to a running server, or None (no server) """
+    address = address or SERVER_ADDRESS
+    if not os.path.exists(address):
+        return None
+    try:
+        return Client(address, family='AF_UNIX')
+    except (OSError, EOFError):
+        return None
+
+# ----------------------------------------------------------------------------
+def request(message, address=None):
+    """ send a request ({'request': 'status'/'stop'}) to the server, or None (no server) """
+    conn = connect(address)
+    if conn is None:
+        return None
+    with conn:
+        conn.send(message)
+        return conn.recv()
+
+# ----------------------------------------------------------------------------
+def runJob(job, argv, address=None, fallback=True):
+    """ Run a conversion job on the server (output printed as it comes).
+
+    = INPUT VARIABLES
+    - job         job name (e.g. 'bsp2cosmic') or script file
+    - argv        job (script) arguments
+    - address     server socket (default: SERVER_ADDRESS)
+    - fallback    no server running: run the job in this process (False: IOError)
+
+    = RETURN VALUE
+    - job exit status (0: ok)
+    """
+    script = jobScript(job)
+    conn = connect(address)
+    if conn is None:
+        if not fallback:
+            raise IOError('No monteCop server running: ' + str(address or SERVER_ADDRESS))
+        print(' ... No monteCop server running, job run in process')
+        return batchU.runScript(script, argv)
+
+    with conn:
+        conn.send({'request' : 'run', 'script' : script, 'argv' : list(argv),
+                   'cwd' : os.getcwd()})
+        while True:
+            reply = conn.recv()
+            if 'output' in reply:
+                sys.stdout.write(reply['output'])
+                sys.stdout.flush()
+            if 'status' in reply:
+                return reply['status']
+
+# ----------------------------------------------------------------------------
+def _runJob(script, argv, cwd, logFile):
+    """ server worker: run a job in the client working directory """
+    os.chdir(cwd)
+    sys.exit(batchU.runScript(script, argv, logFile))
+
+# ===========================================================================
+# Server:
+# ===========================================================================
+
+class BoaServer(object):
+    """ Conversion jobs server, warm Boa """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, address=None, files=(BOA_PLANETS, BOA_SATS), data=WARM_DATA,
+                 numWorkers=0, templates=()):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - address      server socket (default: SERVER_ADDRESS)
+        - files        Boa/bsp files kept loaded
+        - data         mpy.io.data default data kept loaded
+        - numWorkers   jobs run concurrently (0: all cores), others wait
+        - templates    Cosmic templates kept loaded (templateCache warm Managers)
+        """
+        self.address = address or SERVER_ADDRESS
+        self.files = [ff for ff in files if ff]
+        self.data = list(data)
+        self.templates = [tt for tt in templates if tt]
+        self.numWorkers = numWorkers if numWorkers > 0 else multiprocessing.cpu_count()
+        self._slots = threading.BoundedSemaphore(self.numWorkers)
+        self._ctx = multiprocessing.get_context(batchU.START_METHOD)
+        self._lock = threading.Lock()
+        self._forkLock = threading.Lock()
+        self._running = 0
+        self._done = 0
+        self._stop = False
+        self._jobs = []
+
+    #-----------------------------------------------------------------------
+    def serve(self):
+        """ load the warm Boa, then serve jobs until a 'stop' request """
+        if connect(self.address) is not None:
+            sys.exit('ERROR: a monteCop server is already running: ' + self.address)
+        if os.path.exists(self.address):
+            os.remove(self.address)       # stale socket
+
+        wall0 = time.time()
+        batchU.warmBoa(self.files, self.data)
+        print(' ... Warm Boa: ' + ', '.join(self.files + self.data)
+              + ' ({0:.1f} sec)'.format(time.time() - wall0))
+        for template in self.templates:
+            tmplC.warmTemplate(template)
+
+        listener = Listener(self.address, family='AF_UNIX')
+        os.chmod(self.address, 0o600)
+        print(' ... monteCop server: ' + self.address + ' (pid ' + str(os.getpid()) + ', '
+              + str(self.numWorkers) + ' workers)')
+        sys.stdout.flush()
+        try:
+            while not self._stop:
+                conn = listener.accept()
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    conn.close()
+                    continue
+                if message.get('request') == 'run':
+                    thread = threading.Thread(target=self._serveJob, args=(conn, message))
+                    thread.start()
+                    self._jobs = [tt for tt in self._jobs if tt.is_alive()] + [thread]
+                else:
+                    with conn:
+                        conn.send(self._reply(message))
+        finally:
+            listener.close()
+            if os.path.exists(self.address):
+                os.remove(self.address)
+        for thread in self._jobs:
+            thread.join()                 # running jobs are completed
+        print(' ... monteCop server stopped')
+
+    #-----------------------------------------------------------------------
+    def _reply(self, message):
+        """ status/stop requests """
+        if message.get('request') == 'stop':
+            self._stop = True
+        return {'pid' : os.getpid(),
+                'address' : self.address,
+                'files' : self.files,
+                'data' : self.data,
+                'templates' : [path for path, key, wall in tmplC.warmTemplates()],
+                'workers' : self.numWorkers,
+                'running' : self._running,
+                'done' : self._done,
+                'stopping' : self._stop,
+                }
+
+    #-----------------------------------------------------------------------
+    def _serveJob(self, conn, message):
+        """ run a job in a forked worker, stream its output back """
+        logFd, logFile = tempfile.mkstemp(prefix='monteCopJob_', suffix='.log')
+        os.close(logFd)
+        proc = None
+        try:
+            with self._slots:
+                with self._lock:
+                    self._running += 1
+                try:
+                    proc = self._ctx.Process(target=_runJob,
+                                             args=(message['script'], message['argv'],
+                                                   message['cwd'], logFile))
+                    with self._forkLock:
+                        # templates edited since the last job are reloaded first
+                        tmplC.refresh()
+                        proc.start()
+                    with open(logFile, 'r') as log:
+                        while proc.is_alive():
+                            proc.join(STREAM_SEC)
+                            self._send(conn, log.read())
+                        self._send(conn, log.read())
+                finally:
+                    with self._lock:
+                        self._running -= 1
+                        self._done += 1
+            status = proc.exitcode
+            conn.send({'status' : status if status and status > 0 else int(status != 0)})
+        except (OSError, EOFError):
+            # client gone (e.g. Ctrl-C): the job is stopped
+            if proc is not None and proc.is_alive():
+                proc.terminate()
+                proc.join()
+        finally:
+            conn.close()
+            os.remove(logFile)
+
+    #-----------------------------------------------------------------------
+    def _send(self, conn, output):
+        if output:
+            conn.send({'output' : output})
@@ -0,0 +1,363 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Vectorized conic elements (NumPy), Monte Conic conventions.
+
+Whole timelines of (N,6) Cartesian states [km, km/s] are converted at once
+to classical, apsis-altitude and hyperbolic/B-plane elements, and back:
+
+    >>> import monteCop.utils.conicUtils as conicU
+    >>> coe = conicU.classical(states, conicU.bodyGM['Enceladus'])
+    >>> fb = conicU.hyperbolic(states, conicU.bodyGM['Saturn'])
+    >>> states = conicU.coe2cart(coe, conicU.bodyGM['Enceladus'])
+
+coordinates() evaluates a list of Monte coordinate names (e.g. cosmic2json
+StateParams: 'Conic.periapsisAltitude', 'Cartesian.x', ...) on all the
+states, in Monte base units (km, km/s, rad, sec).
+
+The bodyGM/bodyRadius tables are nominal values: to match Monte Conic, take
+the Boa values of the center with monteConstants(state).
+
+gm (and radius) are scalars or (N,) arrays: one GM per state. Angles [rad]:
+inc in [0, pi], raan and aop in [0, 2pi), true anomaly in (-pi, pi].
+B-plane: T = S x pole/|S x pole|, R = S x T (pole: frame z axis),
+bPlaneTheta = atan2(B.R, B.T), S the inbound asymptote.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import numpy as np
+
+from monteCop.utils.scanUtils import bodyGM
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Mean/equatorial radius [km] (IAU 2009), altitudes of the apsides
+bodyRadius = {
+    'Sun'       : 696000.0,
+    'Mercury'   : 2439.7,
+    'Venus'     : 6051.8,
+    'Earth'     : 6378.1366,
+    'Moon'      : 1737.4,
+    'Mars'      : 3396.19,
+    'Jupiter'   : 71492.0,
+    'Io'        : 1821.46,
+    'Europa'    : 1562.09,
+    'Ganymede'  : 2631.2,
+    'Callisto'  : 2410.3,
+    'Saturn'    : 60268.0,
+    'Enceladus' : 252.1,
+    'Dione'     : 561.4,
+    'Rhea'      : 763.8,
+    'Titan'     : 2575.0,
+}
+
+# Below this eccentricity/inclination, the node/periapsis are undefined:
+# raan = 0 (equatorial), aop = 0 (circular)
+SINGULAR_TOL = 1e-11
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def _dot(aa, bb):
+    return np.einsum('ij,ij->i', aa, bb)
+
+# ----------------------------------------------------------------------------
+def _unit(aa):
+    return aa/np.linalg.norm(aa, axis=1)[:, None]
+
+# ----------------------------------------------------------------------------
+def _column(value, nn):
+    """ (nn,) array of a scalar or array """
+    return np.broadcast_to(np.asarray(value, dtype=float), (nn,))
+
+# ----------------------------------------------------------------------------
+def _states(states):
+    states = np.asarray(states, dtype=float)
+    return states[None, :] if states.ndim == 1 else states
+
+# ----------------------------------------------------------------------------
+def _basics(states, gm):
+    """ r, v, |r|, h, |h|, e vector, ecc, energy, semi-latus rectum """
+    states = _states(states)
+    gm = _column(gm, len(states))
+    rr, vv = states[:, :3], states[:, 3:]
+    rMag = np.linalg.norm(rr, axis=1)
+    hh = np.cross(rr, vv)
+    hMag = np.linalg.norm(hh, axis=1)
+    eVec = np.cross(vv, hh)/gm[:, None] - rr/rMag[:, None]
+    ecc = np.linalg.norm(eVec, axis=1)
+    energy = 0.5*_dot(vv, vv) - gm/rMag
+    return rr, vv, rMag, hh, hMag, eVec, ecc, energy, hMag**2/gm, gm
+
+# ----------------------------------------------------------------------------
+def _angle(yy, xx):
+    """ atan2 in [0, 2pi) """
+    return np.mod(np.arctan2(yy, xx), 2*np.pi)
+
+# ----------------------------------------------------------------------------
+def classical(states, gm):
+    """ Classical elements of (N,6) states
+
+    = RETURN VALUE
+    - dict of (N,) arrays: 'sma' [km] (< 0 open conics, inf parabolic),
+      'ecc', 'inc', 'raan', 'aop', 'tra' [rad]
+    """
+    rr, vv, rMag, hh, hMag, eVec, ecc, energy, pp, gm = _basics(states, gm)
+    with np.errstate(divide='ignore'):
+        sma = -0.5*gm/energy
+    inc = np.arccos(np.clip(hh[:, 2]/hMag, -1.0, 1.0))
+    node = np.c_[-hh[:, 1], hh[:, 0], np.zeros(len(hh))]
+    nMag = np.linalg.norm(node, axis=1)
+    equatorial = nMag < SINGULAR_TOL*hMag
+    circular = ecc < SINGULAR_TOL
+    # reference directions: node (x axis if equatorial), periapsis (node if circular)
+    nHat = np.where(equatorial[:, None], [1.0, 0.0, 0.0], node/np.where(equatorial, 1.0, nMag)[:, None])
+    hHat = hh/hMag[:, None]
+    pHat = np.where(circular[:, None], nHat, eVec/np.where(circular, 1.0, ecc)[:, None])
+    raan = np.where(equatorial, 0.0, _angle(nHat[:, 1], nHat[:, 0]))
+    aop = np.where(circular, 0.0, _angle(_dot(np.cross(nHat, pHat), hHat), _dot(nHat, pHat)))
+    tra = np.arctan2(_dot(np.cross(pHat, rr), hHat), _dot(pHat, rr))
+    return {'sma' : sma, 'ecc' : ecc, 'inc' : inc, 'raan' : raan, 'aop' : aop, 'tra' : tra}
+
+# ----------------------------------------------------------------------------
+def apsides(states, gm, radius=0.0):
+    """ Periapsis and apoapsis range (radius = 0) or altitude [km]
+
+    = RETURN VALUE
+    - (rp, ra): (N,) arrays, ra = inf on open conics
+    """
+    rr, vv, rMag, hh, hMag, eVec, ecc, energy, pp, gm = _basics(states, gm)
+    radius = _column(radius, len(ecc))
+    rp = pp/(1.0 + ecc) - radius
+    with np.errstate(divide='ignore'):
+        ra = np.where(ecc < 1.0, pp/(1.0 - ecc), np.inf) - radius
+    return rp, ra
+
+# ----------------------------------------------------------------------------
+def hyperbolic(states, gm, pole=(0.0, 0.0, 1.0)):
+    """ Hyperbolic (flyby) elements of (N,6) states, nan on closed conics
+
+    = INPUT VARIABLES
+    - pole         B-plane reference pole (frame z axis)
+
+    = RETURN VALUE
+    - dict of (N,) arrays: 'vInfinity' [km/s], 'inboundRA', 'inboundDec',
+      'outboundRA', 'outboundDec', 'bPlaneTheta' [rad], 'bDotT', 'bDotR',
+      'bMag' [km]
+    """
+    rr, vv, rMag, hh, hMag, eVec, ecc, energy, pp, gm = _basics(states, gm)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vInf = np.sqrt(2.0*energy)
+        pHat = eVec/ecc[:, None]
+        qHat = np.cross(hh/hMag[:, None], pHat)
+        sinInf = np.sqrt(1.0 - 1.0/ecc**2)
+        sIn = pHat/ecc[:, None] + sinInf[:, None]*qHat
+        sOut = -pHat/ecc[:, None] + sinInf[:, None]*qHat
+        bMag = gm/vInf**2*np.sqrt(ecc**2 - 1.0)
+        bVec = bMag[:, None]*np.cross(sIn, hh/hMag[:, None])
+        tHat = _unit(np.cross(sIn, np.broadcast_to(np.asarray(pole, dtype=float), sIn.shape)))
+        rHat = np.cross(sIn, tHat)
+        bDotT = _dot(bVec, tHat)
+        bDotR = _dot(bVec, rHat)
+    return {'vInfinity' : vInf,
+            'inboundRA' : np.arctan2(sIn[:, 1], sIn[:, 0]),
+            'inboundDec' : np.arcsin(np.clip(sIn[:, 2], -1.0, 1.0)),
+            'outboundRA' : np.arctan2(sOut[:, 1], sOut[:, 0]),
+            'outboundDec' : np.arcsin(np.clip(sOut[:, 2], -1.0, 1.0)),
+            'bPlaneTheta' : np.arctan2(bDotR, bDotT),
+            'bDotT' : bDotT,
+            'bDotR' : bDotR,
+            'bMag' : bMag,
+            }
+
+# ----------------------------------------------------------------------------
+def _perifocal2cart(pHat, qHat, pp, ecc, tra, gm):
+    """ states at true anomaly tra of the conics (pHat, qHat, p, e) """
+    cosT = np.cos(tra)[:, None]
+    sinT = np.sin(tra)[:, None]
+    rMag = (pp/(1.0 + ecc*np.cos(tra)))[:, None]
+    vFac = np.sqrt(gm/pp)[:, None]
+    pos = rMag*(cosT*pHat + sinT*qHat)
+    vel = vFac*(-sinT*pHat + (ecc[:, None] + cosT)*qHat)
+    return np.hstack((pos, vel))
+
+# ----------------------------------------------------------------------------
+def _rotation(inc, raan, aop):
+    """ perifocal unit vectors P, Q of (inc, raan, aop) """
+    cO, sO = np.cos(raan), np.sin(raan)
+    cw, sw = np.cos(aop), np.sin(aop)
+    ci, si = np.cos(inc), np.sin(inc)
+    pHat = np.c_[cO*cw - sO*sw*ci, sO*cw + cO*sw*ci, sw*si]
+    qHat = np.c_[-cO*sw - sO*cw*ci, -sO*sw + cO*cw*ci, cw*si]
+    return pHat, qHat
+
+# ----------------------------------------------------------------------------
+def coe2cart(coe, gm):
+    """ (N,6) states of classical elements (dict as returned by classical) """
+    ecc = np.atleast_1d(np.asarray(coe['ecc'], dtype=float))
+    nn = len(ecc)
+    gm = _column(gm, nn)
+    sma = _column(coe['sma'], nn)
+    pHat, qHat = _rotation(_column(coe['inc'], nn), _column(coe['raan'], nn), _column(coe['aop'], nn))
+    return _perifocal2cart(pHat, qHat, sma*(1.0 - ecc**2), ecc, _column(coe['tra'], nn), gm)
+
+# ----------------------------------------------------------------------------
+def apsisAlt2cart(rpAlt, raAlt, inc, raan, aop, tra, gm, radius=0.0):
+    """ (N,6) states of apsis altitudes [km] (closed conics) and angles [rad] """
+    rp = np.atleast_1d(np.asarray(rpAlt, dtype=float)) + radius
+    ra = np.asarray(raAlt, dtype=float) + radius
+    return coe2cart({'sma' : 0.5*(rp + ra),
+                     'ecc' : (ra - rp)/(ra + rp),
+                     'inc' : inc, 'raan' : raan, 'aop' : aop, 'tra' : tra}, gm)
+
+# ----------------------------------------------------------------------------
+def flyby2cart(periAlt, bPlaneTheta, vInf, inboundDec, inboundRA, tra, gm, radius=0.0,
+               pole=(0.0, 0.0, 1.0)):
+    """ (N,6) states of flyby elements (appendCpFBs state parameters):
+        periapsis altitude [km], bPlaneTheta [rad], vInfinity [km/s],
+        inbound asymptote Dec/RA [rad], true anomaly [rad]
+    """
+    vInf = np.atleast_1d(np.asarray(vInf, dtype=float))
+    nn = len(vInf)
+    gm = _column(gm, nn)
+    rp = _column(periAlt, nn) + radius
+    dec = _column(inboundDec, nn)
+    ra = _column(inboundRA, nn)
+    theta = _column(bPlaneTheta, nn)
+    ecc = 1.0 + rp*vInf**2/gm
+    sinInf = np.sqrt(1.0 - 1.0/ecc**2)
+    sIn = np.c_[np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra), np.sin(dec)]
+    tHat = _unit(np.cross(sIn, np.broadcast_to(np.asarray(pole, dtype=float), sIn.shape)))
+    rHat = np.cross(sIn, tHat)
+    bHat = np.cos(theta)[:, None]*tHat + np.sin(theta)[:, None]*rHat
+    # S = P/e + sinInf*Q, B = b*(S x h)
+    pHat = sIn/ecc[:, None] + sinInf[:, None]*bHat
+    qHat = sinInf[:, None]*sIn - bHat/ecc[:, None]
+    return _perifocal2cart(pHat, qHat, gm/vInf**2*(ecc**2 - 1.0), ecc, _column(tra, nn), gm)
+
+# ===========================================================================
+# Monte coordinate names:
+# ===========================================================================
+
+# Monte coordinate -> (element set, key)
+_COORDINATES = {
+    'Cartesian.x' : ('cart', 0),
+    'Cartesian.y' : ('cart', 1),
+    'Cartesian.z' : ('cart', 2),
+    'Cartesian.dx' : ('cart', 3),
+    'Cartesian.dy' : ('cart', 4),
+    'Cartesian.dz' : ('cart', 5),
+    'Conic.semiMajorAxis' : ('coe', 'sma'),
+    'Conic.eccentricity' : ('coe', 'ecc'),
+    'Conic.inclination' : ('coe', 'inc'),
+    'Conic.longitudeOfNode' : ('coe', 'raan'),
+    'Conic.argumentOfPeriapsis' : ('coe', 'aop'),
+    'Conic.trueAnomaly' : ('coe', 'tra'),
+    'Conic.periapsisRange' : ('range', 0),
+    'Conic.apoapsisRange' : ('range', 1),
+    'Conic.periapsisAltitude' : ('alt', 0),
+    'Conic.apoapsisAltitude' : ('alt', 1),
+    'Conic.vInfinity' : ('hyp', 'vInfinity'),
+    'Conic.inboundRA' : ('hyp', 'inboundRA'),
+    'Conic.inboundDec' : ('hyp', 'inboundDec'),
+    'Conic.outboundRA' : ('hyp', 'outboundRA'),
+    'Conic.outboundDec' : ('hyp', 'outboundDec'),
+    'Conic.bPlaneTheta' : ('hyp', 'bPlaneTheta'),
+}
+
+# Monte base unit of each coordinate
+PARAM_UNITS = {}
+for _name, (_kind, _key) in _COORDINATES.items():
+    if _kind == 'cart':
+        PARAM_UNITS[_name] = 'km' if _key < 3 else 'km/s'
+    elif _kind in ('range', 'alt') or _key == 'sma':
+        PARAM_UNITS[_name] = 'km'
+    elif _key == 'ecc':
+        PARAM_UNITS[_name] = ''
+    elif _key == 'vInfinity':
+        PARAM_UNITS[_name] = 'km/s'
+    else:
+        PARAM_UNITS[_name] = 'rad'
+del _name, _kind, _key
+
+# ----------------------------------------------------------------------------
+def supported(params):
+    """ True if all the coordinate names are computed here """
+    return all(param in _COORDINATES for param in params)
+
+# ----------------------------------------------------------------------------
+def coordinates(states, params, gm, radius=0.0, pole=(0.0, 0.0, 1.0)):
+    """ Monte coordinates of (N,6) states, each element set computed once
+
+    = INPUT VARIABLES
+    - states       (N,6) states [km, km/s]
+    - params       Monte coordinate names (see PARAM_UNITS)
+    - gm, radius   center GM [km^3/s^2] and radius [km] (altitudes)
+
+    = RETURN VALUE
+    - (N, len(params)) array, Monte base units (PARAM_UNITS)
+    - ValueError on apoapsis coordinates of open conics (ecc >= 1)
+    """
+    states = _states(states)
+    sets = {}
+    out = np.empty((len(states), len(params)))
+    for jj, param in enumerate(params):
+        if param not in _COORDINATES:
+            raise ValueError('Unsupported coordinate: ' + str(param))
+        kind, key = _COORDINATES[param]
+        if kind not in sets:
+            if kind == 'cart':
+                sets[kind] = states.T
+            elif kind == 'coe':
+                sets[kind] = classical(states, gm)
+            elif kind == 'range':
+                sets[kind] = apsides(states, gm)
+            elif kind == 'alt':
+                sets[kind] = apsides(states, gm, radius)
+            else:
+                sets[kind] = hyperbolic(states, gm, pole)
+        if kind in ('range', 'alt') and key == 1 and not np.all(np.isfinite(sets[kind][key])):
+            raise ValueError('Apoapsis coordinates of open conics (ecc >= 1): ' + str(param))
+        out[:, jj] = sets[kind][key]
+    return out
+
+# ----------------------------------------------------------------------------
+def monteConstants(state):
+    """ GM [km^3/s^2] and radius [km] of the center of a Monte State, as used
+        by Monte Conic (Boa values): radius = rp - periapsis altitude,
+        GM = h^2/(rp*(1 + ecc))
+    """
+    import Monte as M
+    from mpy.units import km
+    rp = M.Conic.periapsisRange(state)/km
+    radius = rp - M.Conic.periapsisAltitude(state)/km
+    ecc = float(M.Conic.eccentricity(state))
+    pos, vel = state.pos(), state.vel()
+    hh = np.cross([pos[0], pos[1], pos[2]], [vel[0], vel[1], vel[2]])
+    return float(np.dot(hh, hh))/(rp*(1.0 + ecc)), radius
+
+# ----------------------------------------------------------------------------
+def quantities(values, params):
+    """ mpy.units quantities of a row of coordinates() (Monte Coordinate inputs) """
+    from mpy.units import km, sec, rad
+    units = {'km' : km, 'km/s' : km/sec, 'rad' : rad, '' : 1.0}
+    return [float(value)*units[PARAM_UNITS[param]] for value, param in zip(values, params)]
@@ -28,10 +28,17 @@ import sys
 import re
 import json
 
+import numpy as np
+
 import Monte as M
 from mpy.opt.cosmic import Manager
 from mpy.units import s, km, deg, year, hour, day, sec
 
+import monteCop.utils.conicUtils as conicU
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.batchUtils as batchU
+import monteCop.utils.arcCache as arcC
+
 # Place all imports before here.
 #===========================================================================
 #Globals:
@@ -106,12 +113,66 @@ def formatControlBounds( controls) :
    return bounds
 
 #===========================================================================
-def controlPointJSON( cp ):
+def _cpState( cp ):
+   """ control point state, in the output frame """
+   state = cp.state()
+   if frame is not None:
+      state = state.relativeTo(cp.state().center(), frame)
+   return state
+
+#===========================================================================
+def _cpStateParams( cp ):
+   """ (StateParams, StateParamsType) of a control point """
+   if any(x in cp.name() for x in ['Apo', 'Peri']):
+      return apoStateParams, 'apoStateParams'
+   return flybyStateParams, 'flybyStateParams'
+
+#===========================================================================
+def controlPointStates( cps ):
+   """ State coordinates (str) of all the control points, as in
+   controlPointJSON, computed at once (conicUtils) per center and StateParams.
+
+   = INPUT VARIABLES
+   - cps          list of controlPoints
+
+   = RETURN VALUE
+   - list of state lists (str); None for the control points left to Monte
+     (unsupported StateParams, apoapsis coordinates of open conics)
+
+   GM/radius of each center are the Boa values used by Monte Conic
+   (conicU.monteConstants of the first state of the center).
+   """
+   out = [None]*len(cps)
+   groups = OrderedDict()
+   for ii, cp in enumerate(cps):
+      state = _cpState(cp)
+      params = _cpStateParams(cp)[0]
+      if conicU.supported(params):
+         groups.setdefault((state.center(), tuple(params)), []).append((ii, state))
+
+   constants = {}
+   for (center, params), items in groups.items():
+      if center not in constants:
+         constants[center] = conicU.monteConstants(items[0][1])
+      gm, radius = constants[center]
+      states = np.array([scanU.stateArray(state) for ii, state in items])
+      try:
+         values = conicU.coordinates(states, params, gm, radius)
+      except ValueError:
+         continue
+      for (ii, state), row in zip(items, values):
+         out[ii] = [str(xx) for xx in conicU.quantities(row, params)]
+   return out
+
+#===========================================================================
+def controlPointJSON( cp, stateStr=None ):
    """ Create a dictionary with the control point information. This dictionary
    can be easily translated into JSON format.
 
    = INPUT VARIABLES
    - cp           controlPoint to format
+   - stateStr     state coordinates (str), e.g. from controlPointStates
+                  (None: Monte coordinate functions)
 
    = RETURN VALUE
    - An OrderedDict containing the controlPoint information
@@ -128,9 +189,7 @@ def controlPointJSON( cp ):
    cpJson[ 'Center' ] = cp.state().center()
    cpJson[ 'Mass' ]   = str(cp.mass())
 
-   state = cp.state()
-   if frame is not None:
-      state = state.relativeTo(cp.state().center(), frame)
+   state = _cpState(cp)
    cpJson[ 'Frame' ]  = state.frame()
 
 
@@ -159,30 +218,26 @@ def controlPointJSON( cp ):
    #    -> timeFromPeriapsis to trueAnomaly
    #    -> periapsisAltitude to periapsisRange
 
-   if any(x in cpJson[ 'Name' ] for x in ['Apo', 'Peri']):
-      cpJson[ 'StateParams' ] = apoStateParams
-      cpJson[ 'State' ]  = [
-         str( makeCoordinateFunc( param )( state ) ) for param in apoStateParams
-      ]
-      cpJson['StateParamsType'] = 'apoStateParams'
-   else:
-      cpJson[ 'StateParams' ] = flybyStateParams
-      cpJson[ 'State' ]  = [
-         str( makeCoordinateFunc( param )( state ) ) for param in flybyStateParams
-      ]
-      cpJson['StateParamsType'] = 'flybyStateParams'
+   params, paramsType = _cpStateParams(cp)
+   cpJson[ 'StateParams' ] = params
+   if stateStr is None:
+      stateStr = [ str( makeCoordinateFunc( param )( state ) ) for param in params ]
+   cpJson[ 'State' ]  = stateStr
+   cpJson['StateParamsType'] = paramsType
    cpJson['ControlParams'] = [par.rsplit('/',1)[-1] for par in cp.controls().params().params()]
    cpJson['ControlBounds'] = formatControlBounds(cp.controls())
 
    return cpJson
 
 #===========================================================================
-def breakPointJSON( bp ):
+def breakPointJSON( bp, states=None ):
    """ Create a dictionary with the break point information. This dictionary
    can be easily translated into JSON format.
 
    = INPUT VARIABLES
    - bp           breakPoint to format
+   - states       (minus, plus) states [km, km/s], e.g. from arcCache.IncrementalTraj
+                  (None: bp.state)
 
    = RETURN VALUE
    - An OrderedDict containing the breakPoint information
@@ -226,16 +281,19 @@ def breakPointJSON( bp ):
    bpJson[ 'MassTol'] = str(bp.massTol())
 
    # Get the states and difference
-   sMinus = M.State()
-   sPlus  = M.State()
-   bp.state(sMinus, sPlus)
+   if states is None:
+      sMinus = M.State()
+      sPlus  = M.State()
+      bp.state(sMinus, sPlus)
+      states = (scanU.stateArray(sMinus), scanU.stateArray(sPlus))
+   minus, plus = states
    bpJson[ 'State'] = OrderedDict()
-   bpJson[ 'State' ][ 'Minus' ] = [str(x *km) for x in sMinus.pos()] + \
-                                  [str(x *km/s) for x in sMinus.vel()]
-   bpJson[ 'State' ][ 'Plus' ]  = [str(x *km) for x in sPlus.pos()] + \
-                                  [str(x *km/s) for x in sPlus.vel()]
-   bpJson[ 'State' ][ 'Diff' ]  = [str(x *km) for x in sPlus.pos() - sMinus.pos()] + \
-                                  [str(x *km/s) for x in sPlus.vel() - sMinus.vel()]
+   bpJson[ 'State' ][ 'Minus' ] = [str(float(x) *km) for x in minus[:3]] + \
+                                  [str(float(x) *km/s) for x in minus[3:]]
+   bpJson[ 'State' ][ 'Plus' ]  = [str(float(x) *km) for x in plus[:3]] + \
+                                  [str(float(x) *km/s) for x in plus[3:]]
+   bpJson[ 'State' ][ 'Diff' ]  = [str(float(x) *km) for x in plus[:3] - minus[:3]] + \
+                                  [str(float(x) *km/s) for x in plus[3:] - minus[3:]]
 
    return bpJson
 
@@ -250,8 +308,13 @@ def makeCoordinateFunc( funcStr ):
    = RETURN VALUE
    - state coordinate method
    """
-   mod, method = funcStr.split( '.' )
-   return getattr( getattr( M, mod ), method )
+   if funcStr not in _coordinateFuncs:
+      mod, method = funcStr.split( '.' )
+      _coordinateFuncs[ funcStr ] = getattr( getattr( M, mod ), method )
+   return _coordinateFuncs[ funcStr ]
+
+# Coordinate methods, by name
+_coordinateFuncs = {}
 
 #===========================================================================
 def impulseBurnJSON( burn, burn2 ):
@@ -300,7 +363,7 @@ def impulseBurnJSON( burn, burn2 ):
 # Main
 # ======================================================================
 
-def cosmic2json(inputFile,jsonTemplate,saveToFile = False,jsonFileOut=None):
+def cosmic2json(inputFile,jsonTemplate,saveToFile = False,jsonFileOut=None,arcFolder=None):
     """ Main function of cosmic2json module
 
     Convert a Cosmic input.py file into a json solution. json2cosmic use a json template with user
@@ -311,10 +374,14 @@ def cosmic2json(inputFile,jsonTemplate,saveToFile = False,jsonFileOut=None):
     - jsonTemplate      json template with predefined setup information
     - saveToFile        save json solution to file (default: False)
     - jsonFileOut       name of json file to be generated. if None, cosmic name is used
+    - arcFolder         propagate only the arcs changed since the last run, others
+                        from arcFolder/arcCache (None: all the arcs are propagated)
 
     = RETURN VALUE
     - solJson           json solution
-    - mgr               cosmic Manager
+    - mgr               cosmic Manager. With arcFolder, its Boa trajectory only covers
+                        the arcs propagated in this run (cached arcs skipped): the
+                        BreakPoint states of solJson cover the whole timeline
     """
 
     global frame
@@ -360,27 +427,36 @@ def cosmic2json(inputFile,jsonTemplate,saveToFile = False,jsonFileOut=None):
     #===========================================================================
     #raise Exception('exit')
     print('Generating trajectory ... ')
-    boa=M.BoaLoad()
+    boa=batchU.boaLoad()      # warm Boa in a batch/server job
     mgr=Manager(boa)
     mgr.loadInput(inputFile)
-    mgr.tl.createTraj(mgr.boa, mgr.problem, True, False, False)
+    incTraj = None
+    if arcFolder:
+       incTraj = arcC.IncrementalTraj(mgr, arcFolder, modelFiles=[inputFile])
+       incTraj.createTraj(True, False, False)
+       if incTraj.partial:
+          print('NOTE: Boa trajectory of the Manager: propagated arcs only (others from ' + arcFolder + ')')
+    else:
+       mgr.tl.createTraj(mgr.boa, mgr.problem, True, False, False)
     print('Trajectory created. ')
 
 
 #    raise
 
     # Read and add Control Points
-    controlPoints = []
-    for i in range(mgr.cosmic.timeline().numControl()):
-       cp = mgr.cosmic.timeline().controlPoint(i)
-       controlPoints.append(controlPointJSON(cp))
+    cps = [mgr.cosmic.timeline().controlPoint(i) for i in range(mgr.cosmic.timeline().numControl())]
+    cpStates = controlPointStates(cps)
+    controlPoints = [controlPointJSON(cp, stateStr) for cp, stateStr in zip(cps, cpStates)]
     solJson['ControlPoints'] = controlPoints
 
     # Read and add Breakpoints
     breakPoints = []
     for i in range(mgr.cosmic.timeline().numBreak()):
        bp = mgr.cosmic.timeline().breakPoint(i)
-       breakPoints.append(breakPointJSON(bp))
+       states = incTraj.bpStates(bp.name()) if incTraj is not None else None
+       if states is not None and any(ss is None for ss in states):
+          states = None
+       breakPoints.append(breakPointJSON(bp, states))
     solJson['breakPoints'] = breakPoints
 
     # Read and add Burns
@@ -398,3 +474,18 @@ def cosmic2json(inputFile,jsonTemplate,saveToFile = False,jsonFileOut=None):
            json.dump( solJson, outfile, indent = 4, separators=(',', ': ') )
 
     return solJson, mgr
+
+
+#===========================================================================
+# Script (e.g. a monteCopServer job):
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a Cosmic input file into a json solution')
+    parser.add_argument("inputFile", metavar="cosmicFile.py", help='Cosmic Input file (Timeline)')
+    parser.add_argument("jsonTemplate", help='json template with predefined setup information')
+    parser.add_argument('-o', '--jsonFileOut', default=None,
+                        help='Output json file. Default: cosmicFile.json')
+    parser.add_argument('-ac', '--arcCache', default=None, metavar='folder',
+                        help='Propagate only the arcs changed since the last run (cache in folder/arcCache)')
+    args = parser.parse_args()
+    cosmic2json(args.inputFile, args.jsonTemplate, saveToFile=True, jsonFileOut=args.jsonFileOut,
+                arcFolder=args.arcCache)
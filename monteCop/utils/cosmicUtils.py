@@ -22,10 +22,21 @@ from mpy.units import s, sec, hour, m, km, day, deg, rad, kg
 
 from cosmicUtils import *
 
+import ast
+import datetime
+import json
+import os
+import re
+import time
+
+import numpy as np
+
 # import bdaLib.util.cosmicUtils as bdalib
 # import atnLib.utilities.trajInspector as insp
 
 import mmath
+
+from monteCop.utils.scanCache import fileDigest
 # ===========================================================================
 
 
@@ -39,6 +50,11 @@ sc_ID = -99999   # TODO: Move to default (-99999)
 centerDefault = 'Earth'    # TODO: Move to default
 frameDefault = 'EME2000'
 
+# Binary checkpoints (saveChkPtBin/loadChkPtBin)
+CHKPT_BIN_FORMAT = 'monteCopChkPt'
+CHKPT_BIN_VERSION = 2
+CHKPT_BIN_SUFFIX = '.npz'
+
 # ADD:
 # NewDivaPropagator
 # - ...
@@ -103,12 +119,531 @@ def mgrIsSilent(mgr):
 # ===========================================================================
 # ADD CONTROL POINTS (BPs) and MANEUVERS (DVs)
 
+# ---------------------------------------------------------------------------
+# CP state Coordinates
+def cpCoordinates(cpState, params):
+    """ Monte Coordinates (e.g. 'Conic.periapsisAltitude') of a state.
+
+    Monte Conic is used: the GM/radius of the center come from the Boa.
+    Apoapsis coordinates are rejected on open conics (ecc >= 1).
+    """
+    if (any(pp.startswith('Conic.apoapsis') for pp in params)
+            and float(M.Conic.eccentricity(cpState)) >= 1.0):
+        raise ValueError('Apoapsis coordinates of an open conic (ecc >= 1) at '
+                         + str(cpState.time()) + ', center ' + cpState.center())
+    funcs = [getattr(getattr(M, mod), name) for mod, name in (pp.split('.') for pp in params)]
+    # Seems redundant, but needed in order to make newState a 'Coordinate' list
+    return [func(func(cpState)) for func in funcs]
+
 # ---------------------------------------------------------------------------
 # Add DVs
 
 
 
 
+# ===========================================================================
+# CP states and controls (shared by the append functions and TimelineBuilder)
+#   -> (newState, controls), controls: [(param, lower, upper), ...] or None (fixed CP)
+
+# ---------------------------------------------------------------------------
+# OE: sma + ecc
+def _cpCoe(sma, ecc, inc, aop, raan, tra):
+    newState = [
+        M.Conic.semiMajorAxis(sma),
+        M.Conic.eccentricity(ecc),
+        M.Conic.inclination(inc),
+        M.Conic.longitudeOfNode(raan),
+        M.Conic.argumentOfPeriapsis(aop),
+        M.Conic.trueAnomaly(tra),
+    ]
+
+    lbound = -mmath.inf
+    ubound = mmath.inf
+
+    controls = [
+        ("TIME", -3600 * s, 3600 * s),
+        ("Conic.semiMajorAxis", 0.9 * sma, 1.1 * sma),
+        ("Conic.eccentricity", 1e-5, ubound),
+        ("Conic.inclination", 0.95 * inc, 1.05 * inc),
+        #("Conic.inclination", 88*deg, 108*deg),
+        ("Conic.longitudeOfNode", lbound, ubound),
+        ("Conic.argumentOfPeriapsis", lbound, ubound),
+        ("Conic.trueAnomaly", lbound, ubound),
+    ]
+    return newState, controls
+
+# ---------------------------------------------------------------------------
+# OE_V2: ecc + rpAlt
+def _cpCoeV2(ecc, rpAlt, inc, aop, raan, tra):
+    newState = [
+        #M.Conic.semiMajorAxis(sma),
+        M.Conic.eccentricity(ecc),
+        M.Conic.periapsisAltitude(rpAlt),
+        M.Conic.inclination(inc),
+        M.Conic.longitudeOfNode(raan),
+        M.Conic.argumentOfPeriapsis(aop),
+        M.Conic.trueAnomaly(tra),
+    ]
+
+    lbound = -mmath.inf
+    ubound = mmath.inf
+
+    controls = [
+        #("TIME", -3600 * s, 3600 * s),
+        ("TIME", -86400 * s, 86400 * s),
+        ("Conic.eccentricity", 1e-5, 0.07),
+        #("Conic.periapsisAltitude", 10*km, 35*km),
+        ("Conic.periapsisAltitude", 10*km, ubound),
+        ("Conic.inclination", 85*deg, 105*deg),
+        ("Conic.longitudeOfNode", lbound, ubound),
+        ("Conic.argumentOfPeriapsis", lbound, ubound),
+        ("Conic.trueAnomaly", lbound, ubound),
+    ]
+    return newState, controls
+
+# ---------------------------------------------------------------------------
+# OE3: rpAlt, raAlt, inc, ... (state from a TrajQuery)
+def _cpCoeV3(stQuery, cpTime, frame):
+    #Read state from Query
+    cpState= stQuery.state(cpTime).rotate(frame)
+
+    newState = cpCoordinates(cpState, [
+        "Conic.periapsisAltitude",
+        "Conic.apoapsisAltitude",
+        "Conic.inclination",
+        "Conic.longitudeOfNode",
+        "Conic.argumentOfPeriapsis",
+        "Conic.trueAnomaly",
+    ])
+
+    lbound = -mmath.inf
+    ubound = mmath.inf
+
+    controls = [
+        ("TIME", -5*3600 * s, 5*3600 * s),
+        #("Conic.periapsisAltitude", 0.9 * sma, 1.1 * sma),
+        #("Conic.apoapsisAltitude", 1e-5, ubound),
+        #("Conic.inclination", 88*deg, 108*deg),
+        ("Conic.longitudeOfNode", lbound, ubound),
+        ("Conic.argumentOfPeriapsis", lbound, ubound),
+        ("Conic.trueAnomaly", lbound, ubound),
+    ]
+    return newState, controls
+
+# ---------------------------------------------------------------------------
+# Cartesian: x, y, z, dx, dy, dz
+def _cpCart(xx, fixCP=False, posBOX=20*km, velBOX=0.01*km/s):
+    newState = [
+        M.Cartesian.x(xx[0]),
+        M.Cartesian.y(xx[1]),
+        M.Cartesian.z(xx[2]),
+        M.Cartesian.dx(xx[3]),
+        M.Cartesian.dy(xx[4]),
+        M.Cartesian.dz(xx[5]),
+    ]
+    if fixCP:
+        return newState, None
+
+    lbound = -mmath.inf
+    ubound = mmath.inf
+
+    controls = [
+        ("TIME", lbound, ubound),
+        ("Cartesian.x", xx[0]-posBOX, xx[0]+posBOX),
+        ("Cartesian.y", xx[1]-posBOX, xx[1]+posBOX),
+        ("Cartesian.z", xx[2]-posBOX, xx[2]+posBOX),
+        ("Cartesian.dx", xx[3]-velBOX, xx[3]+velBOX),
+        ("Cartesian.dy", xx[4]-velBOX, xx[4]+velBOX),
+        ("Cartesian.dz", xx[5]-velBOX, xx[5]+velBOX),
+    ]
+    return newState, controls
+
+# ---------------------------------------------------------------------------
+# Flyby params (as in Europa Clipper, state from a TrajQuery)
+def _cpFBs(stQuery, cpTime, frame):
+    #Read state from Query
+    cpState= stQuery.state(cpTime).rotate(frame)
+
+    newState = cpCoordinates(cpState, [
+        "Conic.periapsisAltitude",
+        "Conic.bPlaneTheta",
+        "Conic.vInfinity",
+        "Conic.inboundDec",
+        "Conic.inboundRA",
+        "Conic.trueAnomaly",
+    ])
+
+    controls = [
+        #("TIME", -3600 * s, 3600 * s),
+        ("TIME", -86400 * s, 86400 * s),
+        ("Conic.bPlaneTheta", -360*deg, 360*deg),
+        ("Conic.periapsisAltitude", 40*km, 200*km),
+        ("Conic.vInfinity", 0.2*km/sec, 1.0*km/sec),
+        ("Conic.inboundDec", -360*deg, 360*deg),
+        ("Conic.inboundRA", -360*deg, 360*deg),
+        #("Conic.trueAnomaly", lbound, ubound),
+    ]
+    return newState, controls
+
+# ---------------------------------------------------------------------------
+# per-item value of a bulk argument (scalar: same value for all the items)
+def _perItem(value, num):
+    if isinstance(value, (list, tuple, np.ndarray)) and len(value) == num:
+        return list(value)
+    return [value]*num
+
+# ===========================================================================
+# Timeline builder: CPs and burns inserted in one pass
+# ===========================================================================
+
+class TimelineBuilder(object):
+    """ Bulk insertion of control points and burns.
+
+    CPs, BreakPoints and burns are queued (same states and controls as the
+    append/add functions), then build() creates all the ControlPoints,
+    OptControlLists, BreakPoints, ImpulseBurns and OptBurnControls in one pass:
+    one silence window, CPs and BreakPoints inserted in epoch order (or queue
+    order, as in a checkpoint Timeline), then the burns (CP-event burns need
+    their CP). Cosmic creates the 'CPxx->CPyy' BreakPoints between CPs: a
+    queued BreakPoint already in the timeline is not appended again.
+
+        >>> builder = mcpUtil.TimelineBuilder(mgr)
+        >>> builder.addCpCart('CP00', t0, xx0, fixCP=True, center='Moon', frame='EMO2000')
+        >>> builder.addCpsCoeV3(cpNames, cpTimes, stQuery, frame='EMO2000')
+        >>> builder.addCpBurns(dvNames, cpNames, dvels, tDelta=-10*s, dvBound=dvBounds)
+        >>> builder.build()
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, mgr, silent=True, sort=True):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - mgr         Cosmic Manager
+        - silent      manager silenced while building (restored after)
+        - sort        insert the CPs in epoch order (False: queue order)
+        """
+        self.mgr = mgr
+        self.silent = silent
+        self.sort = sort
+        self.buildTime = 0.0
+        self._items = []
+        self._burns = []
+        self._begin = None
+        self._end = None
+
+    #-----------------------------------------------------------------------
+    def addCp(self, cpName, cpTime, newState, controls=None, mass=1000*kg,
+              center=centerDefault, frame=frameDefault, body=scName, propagator="DIVA",
+              active=True):
+        """ queue a CP
+
+        = INPUT VARIABLES
+        - cpName      CP name
+        - cpTime      CP epoch (Epoch or str)
+        - newState    list of Monte Coordinates (e.g. M.Cartesian.x(x0))
+        - controls    [(param, lower, upper), ...] (e.g. ("TIME", -1*hour, 1*hour)),
+                      None: fixed CP (no control list)
+        - mass, center, frame, body, propagator: M.ControlPoint arguments
+        - active      False: CP deactivated (e.g. from a checkpoint)
+        """
+        self._items.append({'kind' : _CP,
+                            'name' : cpName,
+                            'time' : cpTime,
+                            'state' : newState,
+                            'controls' : controls,
+                            'mass' : mass,
+                            'center' : center,
+                            'frame' : frame,
+                            'body' : body,
+                            'propagator' : propagator,
+                            'active' : active,
+                            })
+
+    #-----------------------------------------------------------------------
+    def addCpCoe(self, cpName, cpTime, sma, ecc, inc, aop, raan, tra, **cpArgs):
+        """ queue a CP in Classical Orbital Elements (as appendCpCoe) """
+        self.addCp(cpName, cpTime, *_cpCoe(sma, ecc, inc, aop, raan, tra), **cpArgs)
+
+    #-----------------------------------------------------------------------
+    def addCpCoeV2(self, cpName, cpTime, ecc, rpAlt, inc, aop, raan, tra, **cpArgs):
+        """ queue a CP in Classical Orbital Elements, ecc + rpAlt (as appendCpCoe_V2) """
+        self.addCp(cpName, cpTime, *_cpCoeV2(ecc, rpAlt, inc, aop, raan, tra), **cpArgs)
+
+    #-----------------------------------------------------------------------
+    def addCpCoeV3(self, cpName, cpTime, stQuery, frame=frameDefault, **cpArgs):
+        """ queue a CP in rpAlt, raAlt, inc, ... from stQuery (as appendCpCoe_V3) """
+        self.addCp(cpName, cpTime, *_cpCoeV3(stQuery, cpTime, frame), frame=frame, **cpArgs)
+
+    #-----------------------------------------------------------------------
+    def addCpCart(self, cpName, cpTime, xx, fixCP=False, **cpArgs):
+        """ queue a CP in Cartesian coordinates (as appendCpCart) """
+        self.addCp(cpName, cpTime, *_cpCart(xx, fixCP), **cpArgs)
+
+    #-----------------------------------------------------------------------
+    def addCpFBs(self, cpName, cpTime, stQuery, frame=frameDefault, **cpArgs):
+        """ queue a CP in flyby params from stQuery (as appendCpFBs) """
+        self.addCp(cpName, cpTime, *_cpFBs(stQuery, cpTime, frame), frame=frame, **cpArgs)
+
+    #-----------------------------------------------------------------------
+    def addCpsCart(self, cpNames, cpTimes, states, fixCP=False, posBOX=20*km,
+                   velBOX=0.01*km/s, mass=1000*kg, center=centerDefault,
+                   frame=frameDefault, body=scName, propagator="DIVA"):
+        """ queue CPs in Cartesian coordinates
+
+        = INPUT VARIABLES
+        - cpNames     CP names
+        - cpTimes     CP epochs (Epoch or str)
+        - states      CP states, (N,6) array [km, km/s]
+        - fixCP       fixed CPs (no control lists)
+        - posBOX, velBOX, mass, center, frame: one value, or one per CP
+        - body, propagator: M.ControlPoint arguments
+        """
+        num = len(cpNames)
+        states = np.asarray(states, dtype=float).reshape(num, 6)
+        units = [km, km, km, km/sec, km/sec, km/sec]
+        for name, cpTime, state, pBox, vBox, mm, cc, ff in zip(
+                cpNames, cpTimes, states, _perItem(posBOX, num), _perItem(velBOX, num),
+                _perItem(mass, num), _perItem(center, num), _perItem(frame, num)):
+            xx = [float(value)*unit for value, unit in zip(state, units)]
+            self.addCp(name, cpTime, *_cpCart(xx, fixCP, pBox, vBox), mass=mm, center=cc,
+                       frame=ff, body=body, propagator=propagator)
+
+    #-----------------------------------------------------------------------
+    def addCpsCoeV3(self, cpNames, cpTimes, stQuery, mass=1000*kg, center=centerDefault,
+                    frame=frameDefault, body=scName, propagator="DIVA"):
+        """ queue CPs in rpAlt, raAlt, inc, ... from stQuery
+
+        = INPUT VARIABLES
+        - cpNames     CP names
+        - cpTimes     CP epochs (Epoch or str)
+        - stQuery     TrajQuery of the reference trajectory
+        - mass, center, frame: one value, or one per CP
+        - body, propagator: M.ControlPoint arguments
+        """
+        num = len(cpNames)
+        for name, cpTime, mm, cc, ff in zip(cpNames, cpTimes, _perItem(mass, num),
+                                          _perItem(center, num), _perItem(frame, num)):
+            self.addCpCoeV3(name, cpTime, stQuery, frame=ff, mass=mm, center=cc, body=body,
+                            propagator=propagator)
+
+    #-----------------------------------------------------------------------
+    def addBp(self, bpName, bpTime, mode='MATCH_ELEM', posTol=1.0e-1*km,
+              velTol=1.0e-4*km/sec, massTol=0*kg):
+        """ queue a BreakPoint
+
+        = INPUT VARIABLES
+        - bpName      BreakPoint name (e.g. 'CP01->CP02')
+        - bpTime      BreakPoint epoch (Epoch or str)
+        - mode        M.BreakPoint.Mode name (e.g. 'MATCH_ELEM')
+        - posTol, velTol, massTol: match tolerances
+        """
+        self._items.append({'kind' : _BP,
+                            'name' : bpName,
+                            'time' : bpTime,
+                            'mode' : mode,
+                            'tols' : (posTol, velTol, massTol),
+                            })
+
+    #-----------------------------------------------------------------------
+    def setBounds(self, begin=None, end=None):
+        """ timeline Begin/End epochs (Epoch or str), set by build() (None: unchanged) """
+        if begin is not None:
+            self._begin = begin
+        if end is not None:
+            self._end = end
+
+    #-----------------------------------------------------------------------
+    def addBurn(self, burnName, burnTime, cpName=None, frame="EMO2000", dmass=0 * kg,
+                dvel=M.Dbl3Vec([1e-5] * 3), controls=()):
+        """ queue a burn with explicit controls (e.g. from a checkpoint)
+
+        = INPUT VARIABLES
+        - burnName    burn name
+        - burnTime    burn epoch (cpName None), or delta from the cpName CP event
+        - cpName      CP of a CP-event based burn (None: time-based)
+        - frame, dmass, dvel: M.ImpulseBurn arguments
+        - controls    [(param, lower, upper), ...] (e.g. ("DX", -dvB, dvB))
+        """
+        self._burns.append({'name' : burnName,
+                            'time' : burnTime,
+                            'cp' : cpName,
+                            'frame' : frame,
+                            'dmass' : dmass,
+                            'dvel' : dvel,
+                            'controls' : list(controls),
+                            })
+
+    #-----------------------------------------------------------------------
+    def addTimeBurn(self, burnName, burnTime, frame="EMO2000", dmass=0 * kg,
+                    dvel=M.Dbl3Vec([1e-5] * 3), dtBound=3600*s, dvBound=0.02*km/s):
+        """ queue a time-based burn (as addTimeBurn) """
+        self._burns.append({'name' : burnName,
+                            'time' : burnTime,
+                            'cp' : None,
+                            'frame' : frame,
+                            'dmass' : dmass,
+                            'dvel' : dvel,
+                            'dtBound' : dtBound,
+                            'dvBound' : dvBound,
+                            'controls' : None,
+                            })
+
+    #-----------------------------------------------------------------------
+    def addCpBurn(self, burnName, cpName, tDelta=1 * s, frame="EMO2000", dmass=0 * kg,
+                  dvel=M.Dbl3Vec([1e-5] * 3), dvBound=0.02*km/s):
+        """ queue a CP-event based burn (as addCpBurn) """
+        self._burns.append({'name' : burnName,
+                            'time' : tDelta,
+                            'cp' : cpName,
+                            'frame' : frame,
+                            'dmass' : dmass,
+                            'dvel' : dvel,
+                            'dtBound' : None,
+                            'dvBound' : dvBound,
+                            'controls' : None,
+                            })
+
+    #-----------------------------------------------------------------------
+    def addCpBurns(self, burnNames, cpNames, dvels, tDelta=1 * s, frame="EMO2000",
+                   dmass=0 * kg, dvBound=0.02*km/s):
+        """ queue CP-event based burns
+
+        = INPUT VARIABLES
+        - burnNames   burn names
+        - cpNames     CP of each burn
+        - dvels       burns DV, (N,3) array (as M.Dbl3Vec(dvel) in addCpBurn)
+        - tDelta, frame, dmass, dvBound: one value, or one per burn
+        """
+        num = len(burnNames)
+        dvels = np.asarray(dvels, dtype=float).reshape(num, 3)
+        for name, cpName, dvel, dt, ff, dm, dvB in zip(
+                burnNames, cpNames, dvels, _perItem(tDelta, num), _perItem(frame, num),
+                _perItem(dmass, num), _perItem(dvBound, num)):
+            self.addCpBurn(name, cpName, dt, ff, dm, M.Dbl3Vec([float(vv) for vv in dvel]), dvB)
+
+    #-----------------------------------------------------------------------
+    def _timelineOrder(self):
+        """ queued CPs/BreakPoints, in epoch order (sort) or in queue order """
+        if not self.sort or len(self._items) < 2:
+            return list(self._items)
+        keys = [M.Epoch(item['time']).julianDate('ET') for item in self._items]
+        return [self._items[ii] for ii in sorted(range(len(keys)), key=lambda ii: (keys[ii], ii))]
+
+    #-----------------------------------------------------------------------
+    def build(self, report=True):
+        """ create the queued CPs, BreakPoints and burns (queue emptied)
+
+        = INPUT VARIABLES
+        - report      print the number of CPs/BreakPoints/burns and the build time
+
+        = RETURN VALUE
+        - build time [sec]
+        """
+        mgr = self.mgr
+        wall0 = time.time()
+        alreadySilent = True
+        if self.silent:
+            alreadySilent = mgrIsSilent(mgr)
+            if not alreadySilent:
+                silenceMgr(mgr)
+        numCps = sum(1 for item in self._items if item['kind'] == _CP)
+        numBps, numBurns = len(self._items) - numCps, len(self._burns)
+        numAutoBps = 0
+        try:
+            timeline = mgr.cosmic.timeline()
+            if self._begin is not None:
+                timeline.setBegin(M.Epoch(self._begin))
+            # BreakPoints in the timeline (e.g. created by Cosmic between CPs)
+            bpNames = set(timeline.breakPoint(ii).name() for ii in range(timeline.numBreak()))
+            for item in self._timelineOrder():
+                if item['kind'] == _BP:
+                    if item['name'] in bpNames:
+                        numAutoBps += 1
+                        continue
+                    mode = getattr(M.BreakPoint.Mode, item['mode'])
+                    timeline.append(M.BreakPoint(mgr.boa, item['name'], item['time'], mode,
+                                                 *item['tols']))
+                    bpNames.add(item['name'])
+                    continue
+
+                # create Control Point and add it to the problem
+                numBreak = timeline.numBreak()
+                cp = M.ControlPoint(
+                    mgr.boa,
+                    item['name'],
+                    item['time'],
+                    item['body'],
+                    item['center'],
+                    item['frame'],
+                    item['state'],
+                    item['mass'],
+                    item['propagator'],
+                )
+                timeline.append(cp)
+                bpNames.update(timeline.breakPoint(ii).name()
+                               for ii in range(numBreak, timeline.numBreak()))
+
+                if item['controls'] is not None:
+                    # Create new control list, add it to the new control point
+                    newControls = M.OptControlList(mgr.boa)
+                    baseStr = "Cosmic/Cosmic/{0}/".format(item['name'])
+                    for param, lower, upper in item['controls']:
+                        newControls.add(baseStr + param, lower, upper)
+                    mgr.cp[item['name']].controls().append(newControls)
+                if not item['active']:
+                    mgr.cp[item['name']].setActive(False)
+
+            if self._end is not None:
+                timeline.setEnd(M.Epoch(self._end))
+
+            if self._burns:
+                # burn manager
+                burnMgr = M.ImpulseBurnMgrBoa.read(mgr.boa, mgr.tl.body())
+                burnBody = mgr.tl.body()
+                optBurns = mgr.cosmic.burns()
+
+            for item in self._burns:
+                if item['cp'] is None:
+                    burnEvent = item['time']
+                else:
+                    # create CP event for burn
+                    burnEvent = M.CosmicEvent(mgr.boa, item['cp'], item['time'])
+
+                # create new burn
+                newBurn = M.ImpulseBurn(item['name'], burnEvent, item['frame'], item['dmass'],
+                                        item['dvel'])
+                newOptBurn = M.OptBurnControl(mgr.boa, "IMPULSE", burnBody, item['name'])
+                controls = item['controls']
+                if controls is None:
+                    controls = [(param, -item['dvBound'], item['dvBound'])
+                                for param in ["DX", "DY", "DZ"]]
+                    if item['dtBound'] is not None:
+                        controls.insert(0, ("TIME", -item['dtBound'], item['dtBound']))
+                for param, lower, upper in controls:
+                    newOptBurn.controls().add(param, lower, upper)
+
+                # insert burn
+                burnMgr.insert(newBurn)
+                optBurns.add(newOptBurn)
+        finally:
+            self._items = []
+            self._burns = []
+            self._begin = None
+            self._end = None
+            # unsilence manager if it was temporarily silenced
+            if not alreadySilent:
+                unsilenceMgr(mgr)
+
+        self.buildTime = time.time() - wall0
+        if report:
+            bpStr = ', {0} BPs'.format(numBps) if numBps else ''
+            if numAutoBps:
+                bpStr += ' ({0} created by Cosmic)'.format(numAutoBps)
+            print('    Timeline: {0} CPs{1}, {2} burns built ({3:.3f} sec)'
+                  .format(numCps, bpStr, numBurns, self.buildTime))
+        return self.buildTime
+
 # ===========================================================================
 # append control point given in Classical Orbital Elements
 # OE: sma + ecc
@@ -149,56 +684,10 @@ def appendCpCoe(
 
     ex: appendCpCoe(mgr,'RP1',t0, ecc,rpAlt,inc,aop,raan,tra)
     """
-
-    # silence manager temporarily for quiet execution
-    silenceMgr(mgr)
-
-    newState = [
-        M.Conic.semiMajorAxis(sma),
-        M.Conic.eccentricity(ecc),
-        M.Conic.inclination(inc),
-        M.Conic.longitudeOfNode(raan),
-        M.Conic.argumentOfPeriapsis(aop),
-        M.Conic.trueAnomaly(tra),
-    ]
-
-    # create Control Point and add it to the problem
-    cp = M.ControlPoint(
-        mgr.boa,
-        cpName,
-        cpTime,
-        body,
-        center,
-        frame,
-        newState,
-        mass,
-        propagator,
-    )
-    mgr.cosmic.timeline().append(cp)
-
-    # Create new control list
-    newControls = M.OptControlList(mgr.boa)
-
-    lbound = -mmath.inf
-    ubound = mmath.inf
-
-    # add controls in
-    baseStr = "Cosmic/Cosmic/{0}/".format(cpName) #may not need this
-    # baseStr = "" #may not need this
-    newControls.add(baseStr + "TIME", -3600 * s, 3600 * s)
-    newControls.add(baseStr +  "Conic.semiMajorAxis", 0.9 * sma, 1.1 * sma)
-    newControls.add(baseStr + "Conic.eccentricity", 1e-5, ubound)
-    newControls.add(baseStr + "Conic.inclination", 0.95 * inc, 1.05 * inc)
-    #newControls.add(baseStr + "Conic.inclination", 88*deg, 108*deg)
-    newControls.add(baseStr + "Conic.longitudeOfNode", lbound, ubound)
-    newControls.add(baseStr + "Conic.argumentOfPeriapsis", lbound, ubound)
-    newControls.add(baseStr + "Conic.trueAnomaly", lbound, ubound)
-
-    # Add the new controls list to the new control point
-    mgr.cp[cpName].controls().append(newControls)
-
-    # un silence manager
-    unsilenceMgr(mgr)
+    builder = TimelineBuilder(mgr)
+    builder.addCpCoe(cpName, cpTime, sma, ecc, inc, aop, raan, tra, mass=mass, center=center,
+                     frame=frame, body=body, propagator=propagator)
+    builder.build(report=False)
 
     # print new CP
     #print(mgr.cp[cpName])
@@ -245,58 +734,10 @@ def appendCpCoe_V2(
 
     ex: appendCpCoe(mgr,'RP1',t0, ecc,rpAlt,inc,aop,raan,tra)
     """
-
-    # silence manager temporarily for quiet execution
-    silenceMgr(mgr)
-
-    newState = [
-        #M.Conic.semiMajorAxis(sma),
-        M.Conic.eccentricity(ecc),
-        M.Conic.periapsisAltitude(rpAlt),
-        M.Conic.inclination(inc),
-        M.Conic.longitudeOfNode(raan),
-        M.Conic.argumentOfPeriapsis(aop),
-        M.Conic.trueAnomaly(tra),
-    ]
-
-    # create Control Point and add it to the problem
-    cp = M.ControlPoint(
-        mgr.boa,
-        cpName,
-        cpTime,
-        body,
-        center,
-        frame,
-        newState,
-        mass,
-        propagator,
-    )
-    mgr.cosmic.timeline().append(cp)
-
-    # Create new control list
-    newControls = M.OptControlList(mgr.boa)
-
-    lbound = -mmath.inf
-    ubound = mmath.inf
-
-    # add controls in
-    baseStr = "Cosmic/Cosmic/{0}/".format(cpName) #may not need this
-    #newControls.add( "TIME", -3600 * s, 3600 * s)
-    newControls.add(baseStr + "TIME", -86400 * s, 86400 * s)
-    newControls.add(baseStr + "Conic.eccentricity", 1e-5, 0.07)
-    #newControls.add(baseStr + "Conic.periapsisAltitude", 10*km, 35*km)
-    newControls.add(baseStr + "Conic.periapsisAltitude", 10*km, ubound)
-    newControls.add(baseStr + "Conic.inclination", 85*deg, 105*deg),
-    newControls.add(baseStr + "Conic.longitudeOfNode", lbound, ubound)
-    newControls.add(baseStr + "Conic.argumentOfPeriapsis", lbound, ubound)
-    newControls.add(baseStr + "Conic.trueAnomaly", lbound, ubound)
-
-
-    # Add the new controls list to the new control point
-    mgr.cp[cpName].controls().append(newControls)
-
-    # un silence manager
-    unsilenceMgr(mgr)
+    builder = TimelineBuilder(mgr)
+    builder.addCpCoeV2(cpName, cpTime, ecc, rpAlt, inc, aop, raan, tra, mass=mass,
+                       center=center, frame=frame, body=body, propagator=propagator)
+    builder.build(report=False)
 
     # print new CP
     #print(mgr.cp[cpName])
@@ -342,59 +783,10 @@ def appendCpCoe_V3(
 
     ex: appendCpCoe(mgr,- ,-,-,...)
     """
-
-    # silence manager temporarily for quiet execution
-    silenceMgr(mgr)
-
-    #Read state from Query
-    cpState= stQuery.state(cpTime).rotate(frame)
-
-    newState = [
-        # Seems redundant, but needed in order to make newState a 'Coordinate' list
-        M.Conic.periapsisAltitude(M.Conic.periapsisAltitude(cpState)),
-        M.Conic.apoapsisAltitude(M.Conic.apoapsisAltitude(cpState)),
-        M.Conic.inclination(M.Conic.inclination(cpState)),
-        M.Conic.longitudeOfNode(M.Conic.longitudeOfNode(cpState)),
-        M.Conic.argumentOfPeriapsis(M.Conic.argumentOfPeriapsis(cpState)),
-        M.Conic.trueAnomaly(M.Conic.trueAnomaly(cpState)),
-    ]
-
-    # create Control Point and add it to the problem
-    cp = M.ControlPoint(
-        mgr.boa,
-        cpName,
-        cpTime,
-        body,
-        center,
-        frame,
-        newState,
-        mass,
-        propagator,
-    )
-    mgr.cosmic.timeline().append(cp)
-
-    # Create new control list
-    newControls = M.OptControlList(mgr.boa)
-    lbound = -mmath.inf
-    ubound = mmath.inf
-
-    # add controls in
-    baseStr = "Cosmic/Cosmic/{0}/".format(cpName) #may not need this
-    # baseStr = "" #may not need this
-    newControls.add(baseStr + "TIME", -5*3600 * s, 5*3600 * s)
-    #newControls.add(baseStr +  "Conic.periapsisAltitude", 0.9 * sma, 1.1 * sma)
-    #newControls.add(baseStr + "Conic.apoapsisAltitude", 1e-5, ubound)
-    #newControls.add(baseStr + "Conic.inclination", 0.95 * inc, 1.05 * inc)
-    #newControls.add(baseStr + "Conic.inclination", 88*deg, 108*deg)
-    newControls.add(baseStr + "Conic.longitudeOfNode", lbound, ubound)
-    newControls.add(baseStr + "Conic.argumentOfPeriapsis", lbound, ubound)
-    newControls.add(baseStr + "Conic.trueAnomaly", lbound, ubound)
-
-    # Add the new controls list to the new control point
-    mgr.cp[cpName].controls().append(newControls)
-
-    # un silence manager
-    unsilenceMgr(mgr)
+    builder = TimelineBuilder(mgr)
+    builder.addCpCoeV3(cpName, cpTime, stQuery, frame=frame, mass=mass, center=center,
+                       body=body, propagator=propagator)
+    builder.build(report=False)
 
 # ===========================================================================
 
@@ -426,69 +818,10 @@ def appendCpCart(
 
     ex: appendCpCoe(mgr,'RP1',t0, xx)
     """
-
-    # silence manager temporarily for quiet execution
-    silenceMgr(mgr)
-
-    newState = [
-        M.Cartesian.x(xx[0]),
-        M.Cartesian.y(xx[1]),
-        M.Cartesian.z(xx[2]),
-        M.Cartesian.dx(xx[3]),
-        M.Cartesian.dy(xx[4]),
-        M.Cartesian.dz(xx[5]),
-    ]
-
-    # create Control Point and add it to the problem
-    cp = M.ControlPoint(
-        mgr.boa,
-        cpName,
-        cpTime,
-        body,
-        center,
-        frame,
-        newState,
-        mass,
-        propagator,
-    )
-    mgr.cosmic.timeline().append(cp)
-
-    if not fixCP:
-        # Create new control list
-        newControls = M.OptControlList(mgr.boa)
-
-        lbound = -mmath.inf
-        ubound = mmath.inf
-
-        posBOX = 20*km
-        velBOX = 0.01*km/s
-
-        # # add controls in
-        baseStr = "Cosmic/Cosmic/{0}/".format(cpName) #may not need this
-        newControls.add(baseStr + "TIME", lbound, ubound)
-        newControls.add(baseStr + "Cartesian.x", xx[0]-posBOX, xx[0]+posBOX)
-        newControls.add(baseStr + "Cartesian.y", xx[1]-posBOX, xx[1]+posBOX)
-        newControls.add(baseStr + "Cartesian.z", xx[2]-posBOX, xx[2]+posBOX)
-        newControls.add(baseStr + "Cartesian.dx", xx[3]-velBOX, xx[3]+velBOX)
-        newControls.add(baseStr + "Cartesian.dy", xx[4]-velBOX, xx[4]+velBOX)
-        newControls.add(baseStr + "Cartesian.dz", xx[5]-velBOX, xx[5]+velBOX)
-
-        # # add controls in
-        # baseStr = "Cosmic/Cosmic/{0}/".format(cpName) #may not need this
-        # newControls.add(baseStr + "TIME", lbound, ubound)
-        # newControls.add(baseStr + "Cartesian.x", 0.9*x[0]*km, 1.1*x[0]*km)
-        # newControls.add(baseStr + "Cartesian.y", 0.9*x[1]*km, 1.1*x[1]*km)
-        # newControls.add(baseStr + "Cartesian.z", 0.9*x[2]*km, 1.1*x[2]*km)
-        # newControls.add(baseStr + "Cartesian.dx", 0.9*x[3]*km/sec, 1.1*x[3]*km/sec)
-        # newControls.add(baseStr + "Cartesian.dy", 0.9*x[4]*km/sec, 1.1*x[4]*km/sec)
-        # newControls.add(baseStr + "Cartesian.dz", 0.9*x[5]*km/sec, 1.1*x[5]*km/sec)
-
-
-        # Add the new controls list to the new control point
-        mgr.cp[cpName].controls().append(newControls)
-
-    # un silence manager
-    unsilenceMgr(mgr)
+    builder = TimelineBuilder(mgr)
+    builder.addCpCart(cpName, cpTime, xx, fixCP, mass=mass, center=center, frame=frame,
+                      body=body, propagator=propagator)
+    builder.build(report=False)
 
     # print new CP
     #print(mgr.cp[cpName])
@@ -530,58 +863,10 @@ def appendCpFBs(
         tra,
         }
     """
-
-    # silence manager temporarily for quiet execution
-    silenceMgr(mgr)
-
-    #Read state from Query
-    cpState= stQuery.state(cpTime).rotate(frame)
-
-    newState = [
-        # Seems redundant, but needed in order to make newState a 'Coordinate' list
-        M.Conic.periapsisAltitude(M.Conic.periapsisAltitude(cpState)),
-        M.Conic.bPlaneTheta(M.Conic.bPlaneTheta(cpState)),
-        M.Conic.vInfinity(M.Conic.vInfinity(cpState)),
-        M.Conic.inboundDec(M.Conic.inboundDec(cpState)),
-        M.Conic.inboundRA(M.Conic.inboundRA(cpState)),
-        M.Conic.trueAnomaly(M.Conic.trueAnomaly(cpState)),
-    ]
-
-    # create Control Point and add it to the problem
-    cp = M.ControlPoint(
-        mgr.boa,
-        cpName,
-        cpTime,
-        body,
-        center,
-        frame,
-        newState,
-        mass,
-        propagator,
-    )
-    mgr.cosmic.timeline().append(cp)
-
-    # Create new control list
-    newControls = M.OptControlList(mgr.boa)
-
-    lbound = -mmath.inf
-    ubound = mmath.inf
-
-    # add controls in
-    baseStr = "Cosmic/Cosmic/{0}/".format(cpName) #may not need this
-    #newControls.add( "TIME", -3600 * s, 3600 * s)
-    newControls.add(baseStr + "TIME", -86400 * s, 86400 * s)
-    newControls.add(baseStr + "Conic.bPlaneTheta", -360*deg, 360*deg)
-    newControls.add(baseStr + "Conic.periapsisAltitude", 40*km, 200*km)
-    newControls.add(baseStr + "Conic.vInfinity", 0.2*km/sec, 1.0*km/sec),
-    newControls.add(baseStr + "Conic.inboundDec", -360*deg, 360*deg)
-    newControls.add(baseStr + "Conic.inboundRA", -360*deg, 360*deg)
-    #newControls.add(baseStr + "Conic.trueAnomaly", lbound, ubound)
-
-    # Add the new controls list to the new control point
-    mgr.cp[cpName].controls().append(newControls)
-    # un silence manager
-    unsilenceMgr(mgr)
+    builder = TimelineBuilder(mgr)
+    builder.addCpFBs(cpName, cpTime, stQuery, frame=frame, mass=mass, center=center,
+                     body=body, propagator=propagator)
+    builder.build(report=False)
 
     #TODO:
     #- input stateParams as strings
@@ -622,34 +907,9 @@ def addTimeBurn(
         silent=True,
     ):
     """
-
-    # silence manager temporarily for quiet execution
-    if silent:
-        if not mgrIsSilent(mgr):
-            silenceMgr(mgr)
-            alreadySilent = False
-        else:
-            alreadySilent = True
-
-    # create burn manager
-    burnMgr = M.ImpulseBurnMgrBoa.read(mgr.boa, mgr.tl.body())
-    burnBody = mgr.tl.body()
-
-    # create new burn
-    newBurn = M.ImpulseBurn(burnName, burnTime, frame, dmass, dvel)
-    newOptBurn = M.OptBurnControl(mgr.boa, "IMPULSE", burnBody, burnName)
-    newOptBurn.controls().add("TIME", -dtBound, dtBound)
-    newOptBurn.controls().add("DX", -dvBound, dvBound)
-    newOptBurn.controls().add("DY", -dvBound, dvBound)
-    newOptBurn.controls().add("DZ", -dvBound, dvBound)
-
-    # insert burn
-    burnMgr.insert(newBurn)
-    mgr.cosmic.burns().add(newOptBurn)
-
-    # unsilence manager if it was temporarily silenced
-    if silent and not alreadySilent:
-        unsilenceMgr(mgr)
+    builder = TimelineBuilder(mgr, silent=silent)
+    builder.addTimeBurn(burnName, burnTime, frame, dmass, dvel, dtBound, dvBound)
+    builder.build(report=False)
 
 
 # ===========================================================================
@@ -681,43 +941,770 @@ def addCpBurn(
     silent=True,
     ):
     """
+    builder = TimelineBuilder(mgr, silent=silent)
+    builder.addCpBurn(burnName, cpName, tDelta, frame, dmass, dvel, dvBound)
+    builder.build(report=False)
+
+# ===========================================================================
+# ===========================================================================
+
+
+
+
+
+# ===========================================================================
+# BINARY CHECKPOINTS
+#
+# mgr.saveChkPt writes the timeline as Python (ControlPoint(...),
+# BreakPoint(...), OptImpulseBurn(...) calls), executed again by loadInput.
+# The binary checkpoint (.npz) keeps the same timeline in arrays: epochs
+# [ET sec, ns, digits], CP states and masses, BreakPoint tolerances, burn DVs and
+# control bounds, with the names/units in a string table. The JSON header
+# references the Cosmic template (file + digest); the timeline is rebuilt on
+# it by TimelineBuilder in one pass, items in the checkpoint order:
+#
+#    >>> mcpUtil.saveChkPtBin(mgr, 'myTraj.npz', template=cosmicTemp)
+#    >>> mgr = mcpUtil.loadChkPtBin('myTraj.npz', boa)
+#    >>> mcpUtil.chkPt2bin('Enceladus_NRHO_B2M.py')      # -> .npz + template
+#    >>> mcpUtil.bin2chkPt('Enceladus_NRHO_B2M.npz', 'Enceladus_NRHO_B2M_2.py')
+#    >>> mcpUtil.checkChkPtBin('Enceladus_NRHO_B2M.npz', 'Enceladus_NRHO_B2M.py', boa)
+#
+# Begin/End are kept as epochs. Timeline items not in the array layout (e.g.
+# scaled controls CI(...)) are kept as source: such checkpoints load through
+# loadInput, as the ones with BreakPoints in a center/frame other than the
+# template BreakPointCenter/BreakPointFrame.
+
+_months = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+           'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+_epochRegex = re.compile(r'^(\d{2})-([A-Z]{3})-(\d{4}) (\d{2}):(\d{2}):(\d{2})\.(\d{1,9}) ET$')
+_j2000Ordinal = datetime.date(2000, 1, 1).toordinal()
+
+# Timeline item kinds (chkPt['order'])
+_CP, _BP, _BURN, _SOURCE, _BEGIN, _END = 0, 1, 2, 3, 4, 5
+
+# saveChkPt keywords of the items in the array layout
+_cpKeys = ['Name', 'Active', 'Propagator', 'Time', 'Body', 'Center', 'Frame', 'Mass',
+           'State', 'Controls']
+_bpKeys = ['Name', 'Mode', 'Time', 'Center?', 'Frame?', 'PosTol', 'VelTol', 'MassTol']
+_burnKeys = ['Body', 'Name', 'Start', 'Frame', 'DeltaMass', 'DeltaVel', 'Controls']
+
+# ---------------------------------------------------------------------------
+def _epochNs(epochStr):
+    """ 'DD-MON-YYYY HH:MM:SS.fffffffff ET' -> [ET sec past J2000, ns, digits] (exact) """
+    res = _epochRegex.match(epochStr)
+    if res is None or res.group(2) not in _months:
+        raise ValueError('not a full ET epoch: ' + epochStr)
+    day, mon, year, hh, mm, ss, frac = res.groups()
+    days = datetime.date(int(year), _months.index(mon) + 1, int(day)).toordinal() - _j2000Ordinal
+    return [days*86400 + int(hh)*3600 + int(mm)*60 + int(ss) - 43200,
+            int(frac.ljust(9, '0')), len(frac)]
+
+# ---------------------------------------------------------------------------
+def _epochStr(epochNs):
+    """ [ET sec past J2000, ns, digits] -> 'DD-MON-YYYY HH:MM:SS.fffffffff ET' """
+    days, secs = divmod(int(epochNs[0]) + 43200, 86400)
+    date = datetime.date.fromordinal(_j2000Ordinal + days)
+    return '{0:02d}-{1}-{2:04d} {3:02d}:{4:02d}:{5:02d}.{6} ET'.format(
+        date.day, _months[date.month - 1], date.year, secs//3600, (secs//60) % 60, secs % 60,
+        '{0:09d}'.format(int(epochNs[1]))[:int(epochNs[2])])
+
+# ---------------------------------------------------------------------------
+def _durationSec(deltaStr):
+    """ Monte duration string ('-00:00:10', '3/00:00:00', '06:00:00.5') -> sec """
+    sign = -1.0 if deltaStr.strip().startswith('-') else 1.0
+    days, hms = ('0', deltaStr.strip().lstrip('+-'))
+    if '/' in hms:
+        days, hms = hms.split('/')
+    hh, mm, ss = hms.split(':')
+    return sign*(float(days)*86400 + float(hh)*3600 + float(mm)*60 + float(ss))
+
+# ---------------------------------------------------------------------------
+def _unitExpr(node):
+    """ unit expression of a quantity (e.g. 'km/sec') """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Div, ast.Mult)):
+        opStr = '/' if isinstance(node.op, ast.Div) else '*'
+        return _unitExpr(node.left) + opStr + _unitExpr(node.right)
+    raise ValueError('unit expression')
+
+# ---------------------------------------------------------------------------
+def _number(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _number(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    if (isinstance(node, ast.Constant) and isinstance(node.value, (int, float))
+            and not isinstance(node.value, bool)):
+        return float(node.value)
+    raise ValueError('number')
 
-    # silence manager temporarily for quiet execution
-    if silent:
-        if not mgrIsSilent(mgr):
-            silenceMgr(mgr)
-            alreadySilent = False
+# ---------------------------------------------------------------------------
+def _quantity(node):
+    """ '1.0e-04 *km/sec' -> (1.0e-04, 'km/sec'); unitless numbers -> (value, '') """
+    if isinstance(node, ast.Constant) and node.value is None:
+        return np.nan, ''            # unbounded control
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Div, ast.Mult)):
+        value, unit = _quantity(node.left)
+        opStr = '/' if isinstance(node.op, ast.Div) else '*'
+        if not unit and opStr == '/':
+            raise ValueError('quantity')
+        return value, (unit + opStr if unit else '') + _unitExpr(node.right)
+    return _number(node), ''
+
+# ---------------------------------------------------------------------------
+def _string(node):
+    if not isinstance(node, ast.Constant) or not isinstance(node.value, str) or "'" in node.value:
+        raise ValueError('string')
+    return node.value
+
+# ---------------------------------------------------------------------------
+def _keywords(node, names):
+    """ keyword values of a saveChkPt call: same keywords, same order ('Frame?':
+        optional, None if missing)
+    """
+    if not isinstance(node, ast.Call) or node.args:
+        raise ValueError('keywords')
+    keywords = list(node.keywords)
+    values = []
+    for name in names:
+        if keywords and keywords[0].arg == name.rstrip('?'):
+            values.append(keywords.pop(0).value)
+        elif name.endswith('?'):
+            values.append(None)
         else:
-            alreadySilent = True
+            raise ValueError('keywords')
+    if keywords:
+        raise ValueError('keywords')
+    return values
+
+# ---------------------------------------------------------------------------
+def _controls(node, prefix=None):
+    """ [[lower, 'param', upper], ...] -> [(param, (lower, unit), (upper, unit))],
+        with or without the 'Cosmic/Cosmic/<CP>/' param prefix (all or none)
+    """
+    if not isinstance(node, ast.List):
+        raise ValueError('controls')
+    rows = []
+    for row in node.elts:
+        if not isinstance(row, ast.List) or len(row.elts) != 3:
+            raise ValueError('controls')
+        rows.append((_string(row.elts[1]), _quantity(row.elts[0]), _quantity(row.elts[2])))
+    prefixed = [param.startswith(prefix) for param, lo, up in rows] if prefix else []
+    hasPrefix = bool(prefixed) and all(prefixed)
+    if any(prefixed) and not hasPrefix:
+        raise ValueError('control prefix')
+    if hasPrefix:
+        rows = [(param[len(prefix):], lo, up) for param, lo, up in rows]
+    return rows, hasPrefix
 
-    # create burn manager
-    burnMgr = M.ImpulseBurnMgrBoa.read(mgr.boa, mgr.tl.body())
-    burnBody = mgr.tl.body()
+# ---------------------------------------------------------------------------
+def _timelineNode(tree):
+    """ 'Timeline = [...]' assignment of a Cosmic input file (None: not found) """
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id == 'Timeline'
+                and isinstance(node.value, ast.List)):
+            return node
+    return None
 
-    # create CP event for burn
-    newEvent = M.CosmicEvent(mgr.boa, cpName, tDelta)
+# ---------------------------------------------------------------------------
+def _splitInput(text, fileName):
+    """ Cosmic input -> (lines before Timeline, Timeline list node, lines after) """
+    tree = ast.parse(text, fileName)
+    node = _timelineNode(tree)
+    if node is None:
+        raise ValueError('No Timeline = [...] in ' + fileName)
+    lines = text.splitlines(True)
+    return lines[:node.lineno - 1], node.value, lines[node.end_lineno:]
 
-    # create new burn
-    newBurn = M.ImpulseBurn(burnName, newEvent, frame, dmass, dvel)
-    newOptBurn = M.OptBurnControl(mgr.boa, "IMPULSE", burnBody, burnName)
-    newOptBurn.controls().add("DX", -dvBound, dvBound)
-    newOptBurn.controls().add("DY", -dvBound, dvBound)
-    newOptBurn.controls().add("DZ", -dvBound, dvBound)
+# ---------------------------------------------------------------------------
+def _segment(lines, node):
+    """ source of a node (ast.get_source_segment, on lines split once) """
+    if node.lineno == node.end_lineno:
+        return lines[node.lineno - 1][node.col_offset:node.end_col_offset]
+    return ''.join([lines[node.lineno - 1][node.col_offset:]]
+                   + lines[node.lineno:node.end_lineno - 1]
+                   + [lines[node.end_lineno - 1][:node.end_col_offset]])
 
-    # insert burn
-    burnMgr.insert(newBurn)
-    mgr.cosmic.burns().add(newOptBurn)
+# ---------------------------------------------------------------------------
+class _ChkPtArrays(object):
+    """ timeline items -> binary checkpoint arrays (string table + numbers) """
+
+    def __init__(self):
+        self.strings = []
+        self._index = {}
+        self.source = []
+        self.cols = {}
+
+    def idx(self, value):
+        if value not in self._index:
+            self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return self._index[value]
+
+    def add(self, kind, **row):
+        self.cols.setdefault('order', []).append(kind)
+        for key, value in row.items():
+            self.cols.setdefault(key, []).append(value)
+
+    def controls(self, owner, controls):
+        """ control rows of a CP/burn (owner: 'cp'/'burn'), rows [start, end) """
+        start = len(self.cols.get('ctrlParam', []))
+        for param, (lower, lowerUnit), (upper, upperUnit) in controls:
+            self.cols.setdefault('ctrlParam', []).append(self.idx(param))
+            self.cols.setdefault('ctrlBounds', []).append([lower, upper])
+            self.cols.setdefault('ctrlUnit', []).append([self.idx(lowerUnit), self.idx(upperUnit)])
+        self.cols.setdefault(owner + 'Ctrl', []).append([start, start + len(controls)])
+
+    def item(self, node, lines):
+        """ add a Timeline item of the input lines (array layout, else source) """
+        name = None
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            name = node.func.id
+        numCols = {key : len(value) for key, value in self.cols.items()}
+        numStrings = len(self.strings)
+        try:
+            if name == 'ControlPoint':
+                self._cp(_keywords(node, _cpKeys))
+            elif name == 'BreakPoint':
+                self._bp(_keywords(node, _bpKeys))
+            elif name == 'OptImpulseBurn':
+                self._burn(_keywords(node, _burnKeys))
+            elif name in ['Begin', 'End'] and len(node.args) == 1 and not node.keywords:
+                kind = _BEGIN if name == 'Begin' else _END
+                epoch = _epochNs(_string(node.args[0]))
+                if kind == _BEGIN:
+                    self.add(kind, beginEpoch=epoch)
+                else:
+                    self.add(kind, endEpoch=epoch)
+            else:
+                raise ValueError(name)
+        except (ValueError, AttributeError, TypeError):
+            # not in the array layout: undo, keep the source
+            self.cols = {key : value[:numCols[key]] for key, value in self.cols.items()
+                         if key in numCols}
+            for value in self.strings[numStrings:]:
+                del self._index[value]
+            del self.strings[numStrings:]
+            self.add(_SOURCE)
+            self.source.append(_segment(lines, node))
+
+    def _cp(self, values):
+        name, active, prop, tt, body, center, frame, mass, state, controls = values
+        if not isinstance(active, ast.Constant) or not isinstance(active.value, bool):
+            raise ValueError('Active')
+        if not isinstance(state, ast.List) or len(state.elts) != 6:
+            raise ValueError('State')
+        coords = []
+        for coord in state.elts:
+            if (not isinstance(coord, ast.Call) or len(coord.args) != 1 or coord.keywords
+                    or not isinstance(coord.func, ast.Attribute)
+                    or not isinstance(coord.func.value, ast.Name)):
+                raise ValueError('State')
+            coords.append((coord.func.value.id + '.' + coord.func.attr, _quantity(coord.args[0])))
+        cpName = _string(name)
+        cpControls, ctrlPrefix = _controls(controls, 'Cosmic/Cosmic/' + cpName + '/')
+        massValue, massUnit = _quantity(mass)
+        self.add(_CP,
+                 cpName=self.idx(cpName),
+                 cpActive=active.value,
+                 cpCtrlPrefix=ctrlPrefix,
+                 cpPropagator=self.idx(_string(prop)),
+                 cpEpoch=_epochNs(_string(tt)),
+                 cpBody=self.idx(_string(body)),
+                 cpCenter=self.idx(_string(center)),
+                 cpFrame=self.idx(_string(frame)),
+                 cpMass=massValue,
+                 cpMassUnit=self.idx(massUnit),
+                 cpParam=[self.idx(param) for param, qq in coords],
+                 cpState=[qq[0] for param, qq in coords],
+                 cpStateUnit=[self.idx(qq[1]) for param, qq in coords],
+                 )
+        self.controls('cp', cpControls)
+
+    def _bp(self, values):
+        name, mode, tt, center, frame, posTol, velTol, massTol = values
+        tols = [_quantity(posTol), _quantity(velTol), _quantity(massTol)]
+        self.add(_BP,
+                 bpName=self.idx(_string(name)),
+                 bpMode=self.idx(_string(mode)),
+                 bpEpoch=_epochNs(_string(tt)),
+                 bpCenter=self.idx(_string(center)) if center is not None else -1,
+                 bpFrame=self.idx(_string(frame)) if frame is not None else -1,
+                 bpTol=[qq[0] for qq in tols],
+                 bpTolUnit=[self.idx(qq[1]) for qq in tols],
+                 )
+
+    def _burn(self, values):
+        body, name, start, frame, dmass, dvel, controls = values
+        if isinstance(start, ast.Call):
+            event, delta = _keywords(start, ['Name', 'Delta'])
+            if not isinstance(start.func, ast.Name) or start.func.id != 'NewCosmicEvent':
+                raise ValueError('Start')
+            burnEvent, burnDelta = self.idx(_string(event)), self.idx(_string(delta))
+            burnEpoch = [0, 0, 0]
+        else:
+            burnEvent, burnDelta, burnEpoch = -1, -1, _epochNs(_string(start))
+        if not isinstance(dvel, ast.List) or len(dvel.elts) != 3:
+            raise ValueError('DeltaVel')
+        dvs = [_quantity(dv) for dv in dvel.elts]
+        burnControls = _controls(controls)[0]
+        dmassValue, dmassUnit = _quantity(dmass)
+        self.add(_BURN,
+                 burnBody=self.idx(_string(body)),
+                 burnName=self.idx(_string(name)),
+                 burnEvent=burnEvent,
+                 burnDelta=burnDelta,
+                 burnEpoch=burnEpoch,
+                 burnFrame=self.idx(_string(frame)),
+                 burnDmass=dmassValue,
+                 burnDmassUnit=self.idx(dmassUnit),
+                 burnDv=[qq[0] for qq in dvs],
+                 burnDvUnit=[self.idx(qq[1]) for qq in dvs],
+                 )
+        self.controls('burn', burnControls)
+
+    def arrays(self):
+        """ numpy arrays of the checkpoint """
+        dtypes = {'order' : np.int8, 'cpActive' : bool, 'cpCtrlPrefix' : bool, 'cpEpoch' : np.int64,
+                  'bpEpoch' : np.int64, 'burnEpoch' : np.int64, 'beginEpoch' : np.int64,
+                  'endEpoch' : np.int64}
+        shapes = {'cpEpoch' : 3, 'bpEpoch' : 3, 'burnEpoch' : 3, 'beginEpoch' : 3,
+                  'endEpoch' : 3, 'cpParam' : 6, 'cpState' : 6,
+                  'cpStateUnit' : 6, 'bpTol' : 3, 'bpTolUnit' : 3, 'burnDv' : 3, 'burnDvUnit' : 3,
+                  'ctrlBounds' : 2, 'ctrlUnit' : 2, 'cpCtrl' : 2, 'burnCtrl' : 2}
+        out = {'order' : np.zeros(0, dtype=np.int8)}
+        for key, values in self.cols.items():
+            dtype = dtypes.get(key, np.float64 if key in ['cpMass', 'cpState', 'bpTol', 'burnDmass',
+                                                          'burnDv', 'ctrlBounds'] else np.int32)
+            out[key] = np.array(values, dtype=dtype)
+            if key in shapes:
+                out[key] = out[key].reshape(-1, shapes[key])
+        return out
 
-    # unsilence manager if it was temporarily silenced
-    if silent and not alreadySilent:
-        unsilenceMgr(mgr)
+# ---------------------------------------------------------------------------
+def _resolveTemplate(header, binFile):
+    template = header['template']
+    if not os.path.isabs(template):
+        template = os.path.join(os.path.dirname(os.path.abspath(binFile)), template)
+    return template
 
-# ===========================================================================
-# ===========================================================================
+# ---------------------------------------------------------------------------
+def _writeTemplate(prefix, suffix, templateFile):
+    """ template of a checkpoint: the checkpoint with an empty Timeline
+        (written only if changed)
+    """
+    text = ''.join(prefix) + 'Timeline = []\n' + ''.join(suffix)
+    if os.path.isfile(templateFile):
+        with open(templateFile, 'r') as inFile:
+            if inFile.read() == text:
+                return
+    with open(templateFile, 'w') as outFile:
+        outFile.write(text)
+
+# ---------------------------------------------------------------------------
+def chkPt2bin(pyFile, binFile=None, template=None):
+    """ Convert a .py checkpoint (mgr.saveChkPt) into a binary checkpoint.
+
+    The timeline is parsed (not executed): no Manager/Boa needed.
+
+    = INPUT VARIABLES
+    - pyFile      .py checkpoint
+    - binFile     binary checkpoint (default: pyFile with .npz)
+    - template    Cosmic template of the binary checkpoint. Default: the
+                  checkpoint without its timeline, saved as <binFile>_template.py
+
+    = RETURN VALUE
+    - binFile
+    """
+    binFile = binFile or os.path.splitext(pyFile)[0] + CHKPT_BIN_SUFFIX
+    with open(pyFile, 'r') as inFile:
+        text = inFile.read()
+    prefix, timelineList, suffix = _splitInput(text, pyFile)
+    lines = text.splitlines(True)
+    if template is None:
+        template = os.path.splitext(binFile)[0] + '_template.py'
+        _writeTemplate(prefix, suffix, template)
+
+    chkPt = _ChkPtArrays()
+    for node in timelineList.elts:
+        chkPt.item(node, lines)
+
+    binDir = os.path.dirname(os.path.abspath(binFile))
+    templatePath = os.path.abspath(template)
+    if os.path.dirname(templatePath) == binDir:
+        templatePath = os.path.basename(templatePath)
+    header = {'format' : CHKPT_BIN_FORMAT,
+              'version' : CHKPT_BIN_VERSION,
+              'template' : templatePath,
+              'templateDigest' : fileDigest(template),
+              'strings' : chkPt.strings,
+              'source' : chkPt.source,
+              }
+    headerBytes = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+    with open(binFile, 'wb') as outFile:
+        np.savez(outFile, header=headerBytes, **chkPt.arrays())
+    return binFile
+
+# ---------------------------------------------------------------------------
+def readChkPtBin(binFile):
+    """ binary checkpoint -> (header dict, dict of arrays) """
+    with np.load(binFile) as data:
+        header = json.loads(data['header'].tobytes().decode('utf-8'))
+        arrays = {key : data[key] for key in data.files if key != 'header'}
+    # version 1: Begin/End kept as source
+    if (header.get('format') != CHKPT_BIN_FORMAT
+            or header.get('version') not in [1, CHKPT_BIN_VERSION]):
+        raise ValueError('Not a binary checkpoint (version ' + str(CHKPT_BIN_VERSION) + '): '
+                         + binFile)
+    return header, arrays
+
+# ---------------------------------------------------------------------------
+def _timelineItems(arrays):
+    """ binary checkpoint items, in timeline order: (kind, index) """
+    counts = [0]*6
+    for kind in arrays['order']:
+        yield int(kind), counts[kind]
+        counts[kind] += 1
+
+# ---------------------------------------------------------------------------
+def _qStr(value, unit):
+    """ saveChkPt quantity: ' 1.000000000000000e+03 *kg' """
+    if np.isnan(value):
+        return 'None'
+    return '{0: .15e}'.format(value) + (' *' + unit if unit else '')
+
+# ---------------------------------------------------------------------------
+def _controlRows(strs, arrays, owner, ii, prefix=''):
+    rows = []
+    for jj in range(*arrays[owner + 'Ctrl'][ii]):
+        (lower, upper), (lowerUnit, upperUnit) = arrays['ctrlBounds'][jj], arrays['ctrlUnit'][jj]
+        rows.append("         [ {0}, '{1}', {2} ],\n".format(
+            _qStr(lower, strs[lowerUnit]), prefix + strs[arrays['ctrlParam'][jj]],
+            _qStr(upper, strs[upperUnit])))
+    return rows
+
+# ---------------------------------------------------------------------------
+def _timelineText(header, arrays):
+    """ saveChkPt text of the Timeline items (list of lines) """
+    strs = header['strings']
+    lines = []
+    for kind, ii in _timelineItems(arrays):
+        if kind == _SOURCE:
+            lines.append('   ' + header['source'][ii] + ',\n')
+        elif kind in [_BEGIN, _END]:
+            lines.append("   {0}( '{1}' ),\n".format(
+                'Begin' if kind == _BEGIN else 'End',
+                _epochStr(arrays['beginEpoch' if kind == _BEGIN else 'endEpoch'][ii])))
+        elif kind == _CP:
+            name = strs[arrays['cpName'][ii]]
+            lines += ["   ControlPoint(\n",
+                      "      Name = '{0}',\n".format(name),
+                      "      Active = {0},\n".format(bool(arrays['cpActive'][ii])),
+                      "      Propagator = '{0}',\n".format(strs[arrays['cpPropagator'][ii]]),
+                      "      Time = '{0}',\n".format(_epochStr(arrays['cpEpoch'][ii])),
+                      "      Body = '{0}',\n".format(strs[arrays['cpBody'][ii]]),
+                      "      Center = '{0}',\n".format(strs[arrays['cpCenter'][ii]]),
+                      "      Frame = '{0}',\n".format(strs[arrays['cpFrame'][ii]]),
+                      "      Mass = {0},\n".format(_qStr(arrays['cpMass'][ii],
+                                                         strs[arrays['cpMassUnit'][ii]])),
+                      "      State = [\n"]
+            for param, value, unit in zip(arrays['cpParam'][ii], arrays['cpState'][ii],
+                                          arrays['cpStateUnit'][ii]):
+                lines.append("         {0}( {1} ),\n".format(strs[param], _qStr(value, strs[unit])))
+            lines += ["         ],\n", "      Controls = [\n"]
+            prefix = 'Cosmic/Cosmic/' + name + '/' if arrays['cpCtrlPrefix'][ii] else ''
+            lines += _controlRows(strs, arrays, 'cp', ii, prefix)
+            lines += ["         ],\n", "      ),\n"]
+        elif kind == _BP:
+            tols = [_qStr(value, strs[unit])
+                    for value, unit in zip(arrays['bpTol'][ii], arrays['bpTolUnit'][ii])]
+            lines += ["   BreakPoint(\n",
+                      "      Name = '{0}',\n".format(strs[arrays['bpName'][ii]]),
+                      "      Mode = '{0}',\n".format(strs[arrays['bpMode'][ii]]),
+                      "      Time = '{0}',\n".format(_epochStr(arrays['bpEpoch'][ii]))]
+            for key in ['Center', 'Frame']:
+                if arrays['bp' + key][ii] >= 0:
+                    lines.append("      {0} = '{1}',\n".format(key, strs[arrays['bp' + key][ii]]))
+            lines += ["      PosTol = {0},\n".format(tols[0]),
+                      "      VelTol = {0},\n".format(tols[1]),
+                      "      MassTol = {0},\n".format(tols[2]),
+                      "      ),\n"]
+        else:
+            lines += ["   OptImpulseBurn(\n",
+                      "      Body = '{0}',\n".format(strs[arrays['burnBody'][ii]]),
+                      "      Name = '{0}',\n".format(strs[arrays['burnName'][ii]])]
+            if arrays['burnEvent'][ii] >= 0:
+                lines += ["      Start = NewCosmicEvent(\n",
+                          "         Name = '{0}',\n".format(strs[arrays['burnEvent'][ii]]),
+                          "         Delta = '{0}',\n".format(strs[arrays['burnDelta'][ii]]),
+                          "         ),\n"]
+            else:
+                lines.append("      Start = '{0}',\n".format(_epochStr(arrays['burnEpoch'][ii])))
+            dv = arrays['burnDv'][ii]
+            dvUnit = strs[arrays['burnDvUnit'][ii][0]]
+            dvMag = np.linalg.norm(dv)
+            dvRA = np.degrees(np.arctan2(dv[1], dv[0])) % 360.0
+            dvDec = np.degrees(np.arcsin(dv[2]/dvMag)) if dvMag > 0 else 0.0
+            lines += ["      Frame = '{0}',\n".format(strs[arrays['burnFrame'][ii]]),
+                      "      DeltaMass = {0},\n".format(_qStr(arrays['burnDmass'][ii],
+                                                              strs[arrays['burnDmassUnit'][ii]])),
+                      "      # DeltaVelMag = {0},\n".format(_qStr(dvMag, dvUnit)),
+                      "      # DeltaVelRA  = {0},\n".format(_qStr(dvRA, 'deg')),
+                      "      # DeltaVelDec = {0},\n".format(_qStr(dvDec, 'deg')),
+                      "      DeltaVel = [\n"]
+            for value, unit in zip(dv, arrays['burnDvUnit'][ii]):
+                lines.append("         {0},\n".format(_qStr(value, strs[unit])))
+            lines += ["         ],\n", "      Controls = [\n"]
+            lines += _controlRows(strs, arrays, 'burn', ii)
+            lines += ["         ],\n", "      ),\n"]
+    return lines
+
+# ---------------------------------------------------------------------------
+def bin2chkPt(binFile, pyFile=None):
+    """ Convert a binary checkpoint into a .py checkpoint (template + Timeline)
+
+    = INPUT VARIABLES
+    - binFile     binary checkpoint
+    - pyFile      .py checkpoint (default: binFile with .py)
+
+    = RETURN VALUE
+    - pyFile
+    """
+    pyFile = pyFile or os.path.splitext(binFile)[0] + '.py'
+    header, arrays = readChkPtBin(binFile)
+    template = _resolveTemplate(header, binFile)
+    with open(template, 'r') as inFile:
+        prefix, timelineList, suffix = _splitInput(inFile.read(), template)
+    items = _timelineText(header, arrays)
+    timeline = ['Timeline = [\n'] + items + ['   ]\n'] if items else ['Timeline = []\n']
+    with open(pyFile, 'w') as outFile:
+        outFile.writelines(prefix + timeline + suffix)
+    return pyFile
+
+# ---------------------------------------------------------------------------
+def saveChkPtBin(mgr, binFile, template=None):
+    """ Save the Manager timeline as a binary checkpoint.
+
+    The timeline is written by mgr.saveChkPt (temporary .py next to binFile),
+    then converted (chkPt2bin).
 
+    = INPUT VARIABLES
+    - mgr         Cosmic Manager
+    - binFile     binary checkpoint
+    - template    Cosmic template of the checkpoint (default: <binFile>_template.py,
+                  from the saved checkpoint)
 
+    = RETURN VALUE
+    - binFile
+    """
+    tmpFile = os.path.splitext(binFile)[0] + '_chkPtTmp.py'
+    mgr.saveChkPt(tmpFile, allowOverwrite=True)
+    try:
+        return chkPt2bin(tmpFile, binFile, template)
+    finally:
+        os.remove(tmpFile)
 
+# ---------------------------------------------------------------------------
+_unitCache = {}
+
+def _unitValue(unitExpr):
+    """ mpy.units quantity of a unit expression (e.g. 'km/sec') """
+    if unitExpr not in _unitCache:
+        import mpy.units as units
+        names = re.split(r'([*/])', unitExpr)
+        value = getattr(units, names[0])
+        for op, name in zip(names[1::2], names[2::2]):
+            value = value/getattr(units, name) if op == '/' else value*getattr(units, name)
+        _unitCache[unitExpr] = value
+    return _unitCache[unitExpr]
 
+# ---------------------------------------------------------------------------
+def _q(value, unit):
+    if np.isnan(value):
+        return None                  # unbounded control
+    return float(value)*_unitValue(unit) if unit else float(value)
+
+# ---------------------------------------------------------------------------
+def _controlList(strs, arrays, owner, ii):
+    out = []
+    for jj in range(*arrays[owner + 'Ctrl'][ii]):
+        (lower, upper), (lowerUnit, upperUnit) = arrays['ctrlBounds'][jj], arrays['ctrlUnit'][jj]
+        out.append((strs[arrays['ctrlParam'][jj]], _q(lower, strs[lowerUnit]),
+                    _q(upper, strs[upperUnit])))
+    return out
+
+# ---------------------------------------------------------------------------
+def _bpDefaults(template):
+    """ BreakPointCenter/BreakPointFrame of a template: {'Center' : ..., 'Frame' : ...} """
+    with open(template, 'r') as inFile:
+        text = inFile.read()
+    out = {}
+    for key in ['Center', 'Frame']:
+        res = re.search(r'\bBreakPoint' + key + r'\s*=\s*[\'"]([^\'"]+)[\'"]', text)
+        if res is not None:
+            out[key] = res.group(1)
+    return out
+
+# ---------------------------------------------------------------------------
+def _buildChkPt(mgr, header, arrays):
+    """ checkpoint timeline on the Manager of its template, in the checkpoint order """
+    strs = header['strings']
+    builder = TimelineBuilder(mgr, sort=False)
+    for kind, ii in _timelineItems(arrays):
+        if kind == _BEGIN:
+            builder.setBounds(begin=_epochStr(arrays['beginEpoch'][ii]))
+        elif kind == _END:
+            builder.setBounds(end=_epochStr(arrays['endEpoch'][ii]))
+        elif kind == _CP:
+            newState = [getattr(getattr(M, mod), name)(_q(value, strs[unit]))
+                        for (mod, name), value, unit in zip(
+                            (strs[pp].split('.') for pp in arrays['cpParam'][ii]),
+                            arrays['cpState'][ii], arrays['cpStateUnit'][ii])]
+            builder.addCp(strs[arrays['cpName'][ii]], _epochStr(arrays['cpEpoch'][ii]),
+                          newState, _controlList(strs, arrays, 'cp', ii) or None,
+                          mass=_q(arrays['cpMass'][ii], strs[arrays['cpMassUnit'][ii]]),
+                          center=strs[arrays['cpCenter'][ii]],
+                          frame=strs[arrays['cpFrame'][ii]],
+                          body=strs[arrays['cpBody'][ii]],
+                          propagator=strs[arrays['cpPropagator'][ii]],
+                          active=bool(arrays['cpActive'][ii]))
+        elif kind == _BP:
+            tols = [_q(value, strs[unit])
+                    for value, unit in zip(arrays['bpTol'][ii], arrays['bpTolUnit'][ii])]
+            builder.addBp(strs[arrays['bpName'][ii]], _epochStr(arrays['bpEpoch'][ii]),
+                          strs[arrays['bpMode'][ii]], *tols)
+        else:
+            if arrays['burnEvent'][ii] >= 0:
+                cpName = strs[arrays['burnEvent'][ii]]
+                burnTime = _durationSec(strs[arrays['burnDelta'][ii]])*sec
+            else:
+                cpName = None
+                burnTime = _epochStr(arrays['burnEpoch'][ii])
+            # DV in km/sec (as M.Dbl3Vec(dvel) in addCpBurn)
+            dvel = M.Dbl3Vec([float(_q(value, strs[unit])/(km/sec)) if strs[unit]
+                              else float(value)
+                              for value, unit in zip(arrays['burnDv'][ii],
+                                                     arrays['burnDvUnit'][ii])])
+            builder.addBurn(strs[arrays['burnName'][ii]], burnTime, cpName,
+                            strs[arrays['burnFrame'][ii]],
+                            _q(arrays['burnDmass'][ii], strs[arrays['burnDmassUnit'][ii]]),
+                            dvel, _controlList(strs, arrays, 'burn', ii))
+    builder.build(report=False)
+
+# ---------------------------------------------------------------------------
+def loadChkPtBin(binFile, boa=None, report=True):
+    """ Manager with a binary checkpoint loaded: the template (warm templateCache
+        Manager, or loadInput), then the timeline in one TimelineBuilder pass.
+
+    Checkpoints with items kept as source, or BreakPoints in a center/frame
+    other than the template ones, are loaded by loadInput (bin2chkPt); so are
+    the ones rebuilt with other CP/BreakPoint counts than saved.
+
+    = INPUT VARIABLES
+    - binFile     binary checkpoint
+    - boa         Boa of the Manager (default: batchU.boaLoad())
+    - report      print the load time
+
+    = RETURN VALUE
+    - Cosmic Manager
+    """
+    import monteCop.utils.batchUtils as batchU
+    import monteCop.utils.templateCache as tmplC
+    wall0 = time.time()
+    header, arrays = readChkPtBin(binFile)
+    template = _resolveTemplate(header, binFile)
+    if fileDigest(template) != header['templateDigest']:
+        print('WARNING: template changed since the checkpoint was saved: ' + template)
+
+    strs = header['strings']
+    defaults = _bpDefaults(template)
+    bpOwnFrame = any(strs[idx] != defaults.get(key) for key in ['Center', 'Frame']
+                     for idx in arrays.get('bp' + key, []) if idx >= 0)
+    order = arrays['order']
+    mgr = None
+    if not header['source'] and not bpOwnFrame:
+        mgr = tmplC.manager(template, boa)
+        timeline = mgr.cosmic.timeline()
+        if (order >= _BEGIN).any() and not (hasattr(timeline, 'setBegin')
+                                            and hasattr(timeline, 'setEnd')):
+            boa, mgr = mgr.boa, None
+        else:
+            _buildChkPt(mgr, header, arrays)
+            numCps, numBps = int((order == _CP).sum()), int((order == _BP).sum())
+            if timeline.numControl() != numCps or timeline.numBreak() != numBps:
+                print('WARNING: {0}: timeline rebuilt with {1} CPs, {2} BPs ({3}, {4} saved),'
+                      ' loading it by loadInput'.format(binFile, timeline.numControl(),
+                                                        timeline.numBreak(), numCps, numBps))
+                boa, mgr = mgr.boa, None
+
+    if mgr is None:
+        # (template already in boa: loaded on a clean copy of the warm Boa, tmplC.cosmicBoa)
+        pyFile = bin2chkPt(binFile, os.path.splitext(binFile)[0] + '_chkPtTmp.py')
+        try:
+            mgr = tmplC.loadTemplate(pyFile, boa if boa is not None else batchU.boaLoad())
+        finally:
+            os.remove(pyFile)
+
+    if report:
+        print('    Checkpoint loaded: ' + binFile + ' ({0:.3f} sec)'.format(time.time() - wall0))
+    return mgr
+
+# ---------------------------------------------------------------------------
+def _chkPtLines(pyFile):
+    """ Timeline of a .py checkpoint in the saveChkPt layout, comments dropped """
+    with open(pyFile, 'r') as inFile:
+        text = inFile.read()
+    prefix, timelineList, suffix = _splitInput(text, pyFile)
+    lines = text.splitlines(True)
+    chkPt = _ChkPtArrays()
+    for node in timelineList.elts:
+        chkPt.item(node, lines)
+    header = {'strings' : chkPt.strings, 'source' : chkPt.source}
+    return [line for line in _timelineText(header, chkPt.arrays())
+            if not line.lstrip().startswith('#')]
+
+# ---------------------------------------------------------------------------
+def compareChkPt(pyFile, otherFile):
+    """ Timeline differences of two .py checkpoints (DeltaVel comments ignored)
+
+    = RETURN VALUE
+    - list of (line number, pyFile line, otherFile line) ('' past the end);
+      empty: same timeline
+    """
+    lines, others = _chkPtLines(pyFile), _chkPtLines(otherFile)
+    num = max(len(lines), len(others))
+    lines += [''] * (num - len(lines))
+    others += [''] * (num - len(others))
+    return [(ii + 1, aa, bb) for ii, (aa, bb) in enumerate(zip(lines, others)) if aa != bb]
+
+# ---------------------------------------------------------------------------
+def checkChkPtBin(binFile, pyFile, boa=None, report=True):
+    """ Check loadChkPtBin against a .py checkpoint: the binary checkpoint is
+        loaded, saved again (mgr.saveChkPt) and compared with pyFile
+
+    = INPUT VARIABLES
+    - binFile     binary checkpoint (e.g. chkPt2bin(pyFile))
+    - pyFile      .py checkpoint of reference
+    - boa         Boa of the Manager (default: batchU.boaLoad())
+    - report      print the differences
+
+    = RETURN VALUE
+    - compareChkPt differences (empty: same timeline)
+    """
+    mgr = loadChkPtBin(binFile, boa, report=False)
+    tmpFile = os.path.splitext(binFile)[0] + '_chkPtCheck.py'
+    mgr.saveChkPt(tmpFile, allowOverwrite=True)
+    try:
+        diffs = compareChkPt(pyFile, tmpFile)
+    finally:
+        os.remove(tmpFile)
+    if report:
+        print('    Checkpoint check: ' + binFile + ' vs ' + pyFile + ': '
+              + ('same timeline' if not diffs else str(len(diffs)) + ' lines differ'))
+        for num, line, other in diffs[:20]:
+            print('      {0}: {1!r} -> {2!r}'.format(num, line.strip(), other.strip()))
+    return diffs
 
 # ===========================================================================
 # TO ADD:
@@ -37,6 +37,10 @@ import os
 from time import process_time
 
 import monteCop.utils.cosmicUtils as  mcpUtil
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.scanHistory as scanH
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.stateTable as stTab
 import mpylab
 
 # ============================================================================
@@ -63,6 +67,10 @@ parser.add_argument("-dv","--minDvSrch", default="100",
                      but some time it can produce  large number of ficticios maneuvers \
                      due to fast angular rotation near peripasis/flybys )")
 parser.add_argument("-dt","--dtDvSrch", default="10", help="Velocity Discontinuity Search Step Size (in sec). Default: 10 (recommended 1)")
+parser.add_argument('-st', '--stateTable', default="0",
+                    help='Step [sec] of the cached state tables (one per coverage window, shared by the tools '
+                         'reading this bsp: ~/.monteCop/stateTables) used by the DV Disc. sweep: states '
+                         'interpolated, exact where the interpolation error is above tolerance. Default: 0 (off)')
 
 
 # TODO: Add S/c Name: e.g. 'encnf5'
@@ -150,18 +158,22 @@ else:
 
 traj_t0 = trajInterval[0].begin() + t0_offset
 if not tl_interval:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 else:
     traj_tf = traj_t0 +tl_interval
 
 if tl_interval == 0:
-    traj_tf = trajInterval[0].end()
+    traj_tf = trajInterval[-1].end()
 searchInterval = TimeInterval(traj_t0,traj_tf)
+# Coverage windows of the sc (ET sec): every window is scanned, gaps skipped
+scanWindows = scanU.coverageWindows(trajBSP, scID, spkE.epoch2et(traj_t0), spkE.epoch2et(traj_tf))
 
 print('... Time Interval for Scaning:')
 print('    t0 = ' + str(traj_t0))
 print('    tf = ' + str(traj_tf))
 print('    dt = ' + str(traj_tf - traj_t0))
+if len(scanWindows) > 1:
+    print('    coverage windows: ' + str(len(scanWindows)) + ' (gaps skipped)')
 
 #------------------------------------------------------
 
@@ -197,41 +209,37 @@ if speedDiscPLot:
 
     t1_cpu = process_time()
     print( '... Searching for DV discontinuities: ')
-    dvSearchDic=[]
     querySat = TrajQuery( boa,scName,dvSrchCenter,dvSrchFrame)
     timeStep = dvSrchtimeStep
-    tList =Epoch.range(traj_t0,traj_tf, timeStep)
-    numDvDisc = 0
-    dvTot = 0
-    dvMag_list = []
-    for tt in tList[:-1]:
-        #dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()/querySat.state(tt).vel().mag()
-        dvMag = (querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()).mag()
-        dvMag_list.append(dvMag)
-        if dvMag > SminDVSrch.value():
-            dv_vec = querySat.state(tt+timeStep).vel() - querySat.state(tt).vel()
-            dvSearchDic.append({
-                'time' : str(tt),
-                'center' : dvSrchCenter ,
-                'frame' : dvSrchFrame,
-                'eventType' : 'dvDisc',
-                'value' : [dv_vec[0],
-                           dv_vec[1],
-                           dv_vec[2]],
-                'dv_mag' : dvMag,
-                'units' : 'km/sec',
-                 })
-            dvTot += dvMag
-            numDvDisc += 1
+    # |DV| of every step streamed to disk (bounded memory)
+    if not  os.path.exists(outputFolder):
+        os.makedirs( outputFolder )
+    dvHist = scanH.DvHistory(outputFolder + '/dvHist')
+    dvDetector = scanU.DvDiscDetector(SminDVSrch.value(), dvSrchCenter, dvSrchFrame,
+                                      keepHistory=False, history=dvHist)
+    # one stream per coverage window
+    if float(args.stateTable) > 0:
+        # interpolated from the state tables (same tables as bsp2cosmic -st)
+        scStates = stTab.StateTableCache(trajBSP).windowTables(
+            scID, dvSrchCenter, dvSrchFrame, scanWindows, float(args.stateTable),
+            scanU.trajQueryStates(querySat), source=[boaPlanets])
+        streamFunc = lambda aa, bb: scStates.stream(aa, bb, timeStep.value())
+    else:
+        streamFunc = lambda aa, bb: scanU.stateStream(querySat.state, spkE.et2epoch(aa),
+                                                      spkE.et2epoch(bb), timeStep)
+    scanU.scanIntervals(streamFunc, scanWindows, [dvDetector])
+    dvSearchDic = dvDetector.events
+    numDvDisc = len(dvSearchDic)
+    dvTot = dvDetector.dvTot
 
     print('     Num of DV Disc. : ' + str(numDvDisc))
     print('     DV Total : ' + str(dvTot) + 'km/s')
     t2_cpu = process_time()
     print(f"     time: {(t2_cpu - t1_cpu)} sec")
 
-    mpylab.ylabel( " Velocity Discontinuities(km/sec)" )
-    mpylab.plot(tList[:-1],dvMag_list)
-    mpylab.show()
+    # decimated (min/max per bin): spikes kept, a few thousand points
+    dvHistEt, dvHistMag = dvHist.arrays()
+    scanH.plotDvHistory(mpylab, dvHistEt, dvHistMag)
 
 
 # # ============================================================================
@@ -0,0 +1,263 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Columnar, time-indexed event store.
+
+All the scan events of a trajectory (Peri, periNoFB, Apo, dvDisc, range,
+soi, ...) live in one store of columns sorted by epoch: ET sec (float64),
+event type, center, frame, value (range [km] or |DV| [km/s]), DV vector,
+search interval, and the original 'time'/'value' strings. The store is saved as one compressed npz (no pickles), and
+epoch range queries are binary searches on the ET column:
+
+    >>> import monteCop.utils.eventStore as evStore
+    >>> store = evStore.EventStore.fromEvents(periEventDic)
+    >>> store.replace('dvDisc', dvSearchDic)
+    >>> store.save('myTraj_TMP/events.npz')
+    >>> store = evStore.EventStore.load('myTraj_TMP/events.npz')
+    >>> store.range(t0_et, tf_et, 'Peri').toEvents()
+    >>> store.exportJson('myTraj_TMP/periEvents_out.json', 'Peri')
+
+toEvents/exportJson give back the scanBSP *Events_out.json schema, so the
+readers of the JSON files (bsp2cosmic, ...) work on either. Events read
+from JSON keep their 'time' and 'value' strings as given (no rounding).
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import json
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+from monteCop.utils.spkReader import epochStr2et, et2epochStr
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+STORE_FILE = 'events.npz'
+STORE_VERSION = 2
+
+# Event keys with their own column (the rest go to 'extra', as json)
+_COLUMN_KEYS = ['time', 'eventType', 'center', 'frame', 'value', 'dv_mag',
+                'units', 'interval']
+
+# Value units -> km
+_KM_FACTOR = {'km' : 1.0, 'm' : 1.0e-3}
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def eventEt(timeStr):
+    """ ET sec of an event 'time' string (Monte Epoch string) """
+    try:
+        return epochStr2et(timeStr)
+    except ValueError:
+        import Monte as M
+        return spkE.epoch2et(M.Epoch(timeStr))
+
+# ----------------------------------------------------------------------------
+def _rangeKm(value):
+    """ range [km] from an event 'value' ('123.4 km', '123.4 * km', float) """
+    if isinstance(value, (float, int)):
+        return float(value)
+    fields = str(value).replace('*', ' ').split()
+    units = fields[1] if len(fields) > 1 else 'km'
+    return float(fields[0])*_KM_FACTOR[units]
+
+# ===========================================================================
+# Event Store:
+# ===========================================================================
+
+class EventStore(object):
+    """ Events as columns, sorted by ET """
+
+    # columns (npz arrays), in constructor order
+    COLUMNS = ['et', 'eventType', 'center', 'frame', 'value', 'vec', 'interval', 'extra',
+               'timeStr', 'valueStr']
+
+    #-----------------------------------------------------------------------
+    def __init__(self, et=(), eventType=(), center=(), frame=(), value=(),
+                 vec=None, interval=None, extra=None, timeStr=None, valueStr=None,
+                 isSorted=False):
+        """ Constructor from columns (sorted by et unless isSorted=True)
+
+        = INPUT VARIABLES
+        - et          (N,) epochs [ET sec]
+        - eventType   (N,) event types ('Peri', 'Apo', 'dvDisc', ...)
+        - center      (N,) event center body
+        - frame       (N,) event frame
+        - value       (N,) range [km] (apsis, range events) or |DV| [km/s]
+        - vec         (N,3) DV [km/s] (nan for non DV events)
+        - interval    (N,) search interval index (-1 if none)
+        - extra       (N,) other event keys, as json ('' if none)
+        - timeStr     (N,) original 'time' strings ('' if none: from et)
+        - valueStr    (N,) original range 'value' strings ('' if none: from value)
+        """
+        nn = len(et)
+        self.et = np.asarray(et, dtype=np.float64).reshape(nn)
+        self.eventType = np.asarray(eventType, dtype=np.str_).reshape(nn)
+        self.center = np.asarray(center, dtype=np.str_).reshape(nn)
+        self.frame = np.asarray(frame, dtype=np.str_).reshape(nn)
+        self.value = np.asarray(value, dtype=np.float64).reshape(nn)
+        self.vec = (np.full((nn, 3), np.nan) if vec is None
+                    else np.asarray(vec, dtype=np.float64).reshape(nn, 3))
+        self.interval = (np.full(nn, -1, dtype=np.int32) if interval is None
+                         else np.asarray(interval, dtype=np.int32).reshape(nn))
+        self.extra = (np.full(nn, '', dtype=np.str_) if extra is None
+                      else np.asarray(extra, dtype=np.str_).reshape(nn))
+        self.timeStr = (np.full(nn, '', dtype=np.str_) if timeStr is None
+                        else np.asarray(timeStr, dtype=np.str_).reshape(nn))
+        self.valueStr = (np.full(nn, '', dtype=np.str_) if valueStr is None
+                         else np.asarray(valueStr, dtype=np.str_).reshape(nn))
+        if not isSorted and nn > 1:
+            self._take(np.argsort(self.et, kind='mergesort'))
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def fromEvents(cls, events):
+        """ store from a list of event dictionaries (*Events_out.json schema) """
+        nn = len(events)
+        et = np.empty(nn)
+        value = np.empty(nn)
+        vec = np.full((nn, 3), np.nan)
+        interval = np.full(nn, -1, dtype=np.int32)
+        eventType, center, frame, extra, timeStr, valueStr = [], [], [], [], [], []
+        for ii, ev in enumerate(events):
+            et[ii] = eventEt(ev['time'])
+            timeStr.append(str(ev['time']))
+            if 'dv_mag' in ev:
+                vec[ii] = ev['value']
+                value[ii] = ev['dv_mag']
+                valueStr.append('')
+            else:
+                value[ii] = _rangeKm(ev['value'])
+                valueStr.append(ev['value'] if isinstance(ev['value'], str) else '')
+            interval[ii] = ev.get('interval', -1)
+            eventType.append(ev['eventType'])
+            center.append(ev['center'])
+            frame.append(ev['frame'])
+            other = {kk: vv for kk, vv in ev.items() if kk not in _COLUMN_KEYS}
+            extra.append(json.dumps(other, sort_keys=True) if other else '')
+        return cls(et, eventType, center, frame, value, vec, interval, extra,
+                   timeStr, valueStr)
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def load(cls, fileName):
+        """ store saved by save() (version 1: without the original strings) """
+        with np.load(fileName, allow_pickle=False) as data:
+            if int(data['version']) not in [1, STORE_VERSION]:
+                raise ValueError('Unsupported event store version: ' + fileName)
+            return cls(*[data[name] if name in data else None for name in cls.COLUMNS],
+                       isSorted=True)
+
+    #-----------------------------------------------------------------------
+    def save(self, fileName):
+        """ write the columns to a compressed npz """
+        np.savez_compressed(fileName, version=STORE_VERSION,
+                            **{name: getattr(self, name) for name in self.COLUMNS})
+
+    #-----------------------------------------------------------------------
+    def _take(self, idx):
+        for name in self.COLUMNS:
+            setattr(self, name, getattr(self, name)[idx])
+
+    #-----------------------------------------------------------------------
+    def subset(self, idx):
+        """ new store with the rows idx (slice, sorted indices or bool mask) """
+        return EventStore(*[getattr(self, name)[idx] for name in self.COLUMNS],
+                          isSorted=True)
+
+    #-----------------------------------------------------------------------
+    def extend(self, other):
+        """ merge another store (or event list) in, keeping the ET order """
+        if not isinstance(other, EventStore):
+            other = EventStore.fromEvents(other)
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+        self._take(np.argsort(self.et, kind='mergesort'))
+
+    #-----------------------------------------------------------------------
+    def remove(self, eventType):
+        """ drop all the events of eventType """
+        self._take(self.eventType != eventType)
+
+    #-----------------------------------------------------------------------
+    def replace(self, eventType, events):
+        """ replace the events of eventType by events (a new scan) """
+        self.remove(eventType)
+        self.extend(events)
+
+    #-----------------------------------------------------------------------
+    def indexRange(self, t0=-np.inf, tf=np.inf):
+        """ (i0, i1) rows with t0 <= et <= tf (binary search) """
+        return (int(np.searchsorted(self.et, t0, side='left')),
+                int(np.searchsorted(self.et, tf, side='right')))
+
+    #-----------------------------------------------------------------------
+    def range(self, t0=-np.inf, tf=np.inf, eventType=None):
+        """ store with the events t0 <= et <= tf [ET sec] (of eventType) """
+        i0, i1 = self.indexRange(t0, tf)
+        if eventType is None:
+            return self.subset(slice(i0, i1))
+        return self.subset(i0 + np.flatnonzero(self.eventType[i0:i1] == eventType))
+
+    #-----------------------------------------------------------------------
+    def byType(self, eventType):
+        """ store with the events of eventType """
+        return self.subset(self.eventType == eventType)
+
+    #-----------------------------------------------------------------------
+    def types(self):
+        """ event types in the store """
+        return [str(tt) for tt in np.unique(self.eventType)]
+
+    #-----------------------------------------------------------------------
+    def toEvents(self):
+        """ list of event dictionaries (*Events_out.json schema) """
+        events = []
+        for ii in range(len(self.et)):
+            ev = {'time' : str(self.timeStr[ii]) or et2epochStr(self.et[ii]),
+                  'center' : str(self.center[ii]),
+                  'frame' : str(self.frame[ii]),
+                  'eventType' : str(self.eventType[ii]),
+                  }
+            if np.isnan(self.vec[ii, 0]):
+                ev['value'] = str(self.valueStr[ii]) or str(float(self.value[ii])) + ' km'
+            else:
+                ev['value'] = [float(xx) for xx in self.vec[ii]]
+                ev['dv_mag'] = float(self.value[ii])
+                ev['units'] = 'km/sec'
+            if self.interval[ii] >= 0:
+                ev['interval'] = int(self.interval[ii])
+            if self.extra[ii]:
+                ev.update(json.loads(str(self.extra[ii])))
+            events.append(ev)
+        return events
+
+    #-----------------------------------------------------------------------
+    def exportJson(self, fileName, eventType=None):
+        """ write the events (of eventType) as a *Events_out.json file """
+        store = self if eventType is None else self.byType(eventType)
+        with open(fileName, 'w+') as outfile:
+            json.dump(store.toEvents(), outfile, indent=4, separators=(',', ': '))
+
+    def __len__(self):
+        return len(self.et)
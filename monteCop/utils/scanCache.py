@@ -0,0 +1,484 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Content-addressed cache of scan products (event lists).
+
+Scan results (dvDisc, Peri, Apo, ... events) are stored in the _TMP folder
+under a key hashed from the kernel content, the sc ID, the search interval
+and all the search parameters. A re-run with identical inputs reads the
+events back; any change (kernel, -dt, -dv, -to/-tl, ...) gives a new key
+and a rescan. Example:
+
+    >>> import monteCop.utils.scanCache as scanC
+    >>> cache = scanC.ScanCache('myTraj_TMP')
+    >>> key = cache.key('myTraj.bsp', -303, t0_et, tf_et, {'eventType' : 'dvDisc', 'dt' : 10.0})
+    >>> events = cache.get(key)
+    >>> if events is None:
+    ...     events = scan()
+    ...     cache.put(key, events)
+
+The manifest (scanCache/manifest.json) keeps the entries (file, size, last
+use) and the kernel digests (re-hashed only if size/mtime change). Least
+recently used entries are evicted above maxEntries or maxBytes.
+
+Incremental rescans: plan() also records the segment/record table of the
+kernel with every entry. When a kernel is extended or revised (new key),
+the latest entry of the same search (same sc and parameters) is the base:
+only the time ranges whose records changed, or outside the base interval,
+are rescanned (plus margins), and the new events are spliced into the base
+events:
+
+    >>> plan = cache.plan('myTraj_v2.bsp', -303, t0_et, tf_et, params, windows, margin=3600.0)
+    >>> events = plan.events
+    >>> if events is None:
+    ...     events = plan.finish(scan(plan.windows))
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.eventStore as evStore
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+CACHE_FOLDER = 'scanCache'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# LRU limits
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_BYTES = 512*1024**2
+
+# File hash read block [bytes]
+HASH_BLOCK_BYTES = 8*1024**2
+
+# Incremental rescans: kernel record tables (cache folder), margin [search steps]
+TABLE_SUFFIX = '_table_v{0}.npz'.format(spkE.TABLE_VERSION)
+INC_MARGIN_STEPS = 4
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def fileDigest(fileName):
+    """ sha256 (hex) of the content of fileName """
+    sha = hashlib.sha256()
+    with open(fileName, 'rb') as inFile:
+        for block in iter(lambda: inFile.read(HASH_BLOCK_BYTES), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+# ----------------------------------------------------------------------------
+def canonical(value):
+    """ JSON-able, order independent copy of the key parameters """
+    if isinstance(value, dict):
+        return {str(kk): canonical(vv) for kk, vv in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(vv) for vv in value]
+    if isinstance(value, float):
+        return repr(value)
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, 'value'):
+        # mpy.units quantity
+        return repr(float(value.value()))
+    return str(value)
+
+# ----------------------------------------------------------------------------
+def writeJson(fileName, data):
+    """ write JSON through a temporary file (no partial files, one per process) """
+    tmpFile = fileName + '.' + str(os.getpid()) + '.tmp'
+    with open(tmpFile, 'w') as outfile:
+        json.dump(data, outfile, indent=1, separators=(',', ': '))
+    os.replace(tmpFile, fileName)
+
+# ----------------------------------------------------------------------------
+def readManifest(manifestFile, empty, name):
+    """ manifest dict of a cache (empty if missing, unreadable or not
+        empty['version']); name: cache name in the warning
+    """
+    if not os.path.exists(manifestFile):
+        return empty
+    try:
+        with open(manifestFile, 'r') as jsonInput:
+            manifest = json.load(jsonInput)
+    except (IOError, ValueError):
+        print('WARNING: unreadable ' + name + ' manifest, reset: ' + manifestFile)
+        return empty
+    if manifest.get('version') != empty['version']:
+        return empty
+    return manifest
+
+# ----------------------------------------------------------------------------
+def knownDigest(files, fileName, digestFunc=fileDigest):
+    """ digest of a file, re-hashed only if its size/mtime changed.
+
+    = INPUT VARIABLES
+    - files        manifest dict abs. path -> {'size', 'mtime', 'sha256'} (updated)
+    - fileName     file to hash
+    - digestFunc   hash function (default: fileDigest, by content)
+
+    = RETURN VALUE
+    - sha256 (hex), True if files was updated
+    """
+    path = os.path.abspath(fileName)
+    stat = os.stat(path)
+    known = files.get(path)
+    if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+        return known['sha256'], False
+    sha = digestFunc(path)
+    files[path] = {'size' : stat.st_size,
+                   'mtime' : stat.st_mtime,
+                   'sha256' : sha,
+                   }
+    return sha, True
+
+# ----------------------------------------------------------------------------
+def _mergeSpans(spans):
+    """ sorted, merged list of [t0, tf] """
+    merged = []
+    for aa, bb in sorted(spans):
+        if merged and aa <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], bb)
+        else:
+            merged.append([aa, bb])
+    return merged
+
+# ----------------------------------------------------------------------------
+def _clipSpans(spans, windows):
+    """ spans intersected with the windows """
+    return [[max(aa, wa), min(bb, wb)] for aa, bb in spans for wa, wb in windows
+            if max(aa, wa) < min(bb, wb)]
+
+# ----------------------------------------------------------------------------
+def rescanWindows(changed, baseInterval, windows, margin):
+    """ Windows to rescan after a kernel revision.
+
+    = INPUT VARIABLES
+    - changed        time ranges with changed records [[t0, tf], ...] (ET sec)
+    - baseInterval   [t0, tf] search interval of the base scan
+    - windows        coverage windows of the new scan
+    - margin         rescan margin [sec] (a few search steps)
+
+    = RETURN VALUE
+    - rescan      windows to scan: changes +- 2*margin, within windows
+    - cores       windows where the base events are replaced: changes +- margin
+                  (events near the rescan window ends come from the base)
+    """
+    dirty = list(changed)
+    for aa, bb in windows:
+        if aa < baseInterval[0]:
+            dirty.append([aa, min(bb, baseInterval[0])])
+        if bb > baseInterval[1]:
+            dirty.append([max(aa, baseInterval[1]), bb])
+    rescan = _clipSpans(_mergeSpans([[aa - 2.0*margin, bb + 2.0*margin] for aa, bb in dirty]), windows)
+    cores = _clipSpans(_mergeSpans([[aa - margin, bb + margin] for aa, bb in dirty]), windows)
+    return rescan, cores
+
+# ----------------------------------------------------------------------------
+def _inSpans(et, spans):
+    return any(aa <= et <= bb for aa, bb in spans)
+
+# ----------------------------------------------------------------------------
+def spliceEvents(baseEvents, newEvents, cores, windows):
+    """ Base events outside the cores plus new events inside the cores, within
+        the windows, sorted by time ('interval': index of the window)
+    """
+    tagged = ([(evStore.eventEt(ev['time']), ev) for ev in baseEvents] +
+              [(evStore.eventEt(ev['time']), ev) for ev in newEvents])
+    isNew = [False]*len(baseEvents) + [True]*len(newEvents)
+    starts = np.array([aa for aa, bb in windows])
+    events = []
+    for (et, ev), new in sorted(zip(tagged, isNew), key=lambda xx: xx[0][0]):
+        if new != _inSpans(et, cores) or not _inSpans(et, windows):
+            continue
+        if 'interval' in ev:
+            ev = dict(ev, interval=int(np.searchsorted(starts, et, side='right')) - 1)
+        events.append(ev)
+    return events
+
+# ===========================================================================
+# Scan Cache:
+# ===========================================================================
+
+class ScanCache(object):
+    """ Scan products cache in outputFolder/scanCache (JSON entries + manifest) """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, outputFolder, maxEntries=CACHE_MAX_ENTRIES, maxBytes=CACHE_MAX_BYTES):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - outputFolder   scan output folder (e.g. baseName + '_TMP')
+        - maxEntries     max. number of cached products
+        - maxBytes       max. size of the cached products [bytes]
+        """
+        self.folder = os.path.join(outputFolder, CACHE_FOLDER)
+        self.manifestFile = os.path.join(self.folder, MANIFEST_FILE)
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        self.manifest = self._readManifest()
+
+    #-----------------------------------------------------------------------
+    def _readManifest(self):
+        """ manifest dict (empty if missing, unreadable or other version) """
+        empty = {'version' : MANIFEST_VERSION, 'files' : {}, 'entries' : {}}
+        return readManifest(self.manifestFile, empty, 'scan cache')
+
+    #-----------------------------------------------------------------------
+    def _saveManifest(self):
+        writeJson(self.manifestFile, self.manifest)
+
+    #-----------------------------------------------------------------------
+    def digest(self, fileName):
+        """ content digest of a kernel, re-hashed only if its size/mtime changed """
+        sha, updated = knownDigest(self.manifest['files'], fileName)
+        if updated:
+            self._saveManifest()
+        return sha
+
+    #-----------------------------------------------------------------------
+    def key(self, kernels, scID, t0, tf, params):
+        """ Cache key of a scan.
+
+        = INPUT VARIABLES
+        - kernels      kernel file (or list): hashed by content
+        - scID         sc SPICE ID
+        - t0, tf       search interval [ET sec]
+        - params       dict of every search parameter (event type, steps,
+                       thresholds, centers, frames, method options, ...)
+
+        = RETURN VALUE
+        - key (sha256 hex)
+        """
+        if isinstance(kernels, str):
+            kernels = [kernels]
+        keyData = {'kernels' : [self.digest(kk) for kk in kernels],
+                   'scID' : int(scID),
+                   'interval' : [repr(float(t0)), repr(float(tf))],
+                   'params' : canonical(params),
+                   }
+        keyStr = json.dumps(keyData, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(keyStr.encode('utf-8')).hexdigest()
+
+    #-----------------------------------------------------------------------
+    def get(self, key):
+        """ cached events of key, or None (miss) """
+        entry = self.manifest['entries'].get(key)
+        if entry is None:
+            return None
+        entryFile = os.path.join(self.folder, entry['file'])
+        try:
+            with open(entryFile, 'r') as jsonInput:
+                events = json.load(jsonInput)
+        except (IOError, ValueError):
+            del self.manifest['entries'][key]
+            self._saveManifest()
+            return None
+        entry['lastUsed'] = time.time()
+        self._saveManifest()
+        return events
+
+    #-----------------------------------------------------------------------
+    def put(self, key, events, info=None, revision=None):
+        """ Store events under key (info: readable description in manifest,
+            revision: kernel revision of the scan, for incremental rescans)
+        """
+        entryFile = key + '.json'
+        writeJson(os.path.join(self.folder, entryFile), events)
+        now = time.time()
+        self.manifest['entries'][key] = {
+            'file' : entryFile,
+            'bytes' : os.path.getsize(os.path.join(self.folder, entryFile)),
+            'created' : now,
+            'lastUsed' : now,
+            'info' : canonical(info) if info is not None else None,
+            }
+        if revision is not None:
+            self.manifest['entries'][key]['revision'] = revision
+        self._evict()
+        self._saveManifest()
+
+    #-----------------------------------------------------------------------
+    def family(self, scID, params):
+        """ key of a search independent of kernel and interval (the scans of
+            every revision of a kernel with the same search parameters)
+        """
+        keyStr = json.dumps({'scID' : int(scID), 'params' : canonical(params)},
+                            sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(keyStr.encode('utf-8')).hexdigest()
+
+    #-----------------------------------------------------------------------
+    def kernelTable(self, fileName):
+        """ segment/record table of a kernel (spkE.recordTable), kept in the
+            cache folder by kernel digest
+        """
+        tableFile = os.path.join(self.folder, self.digest(fileName) + TABLE_SUFFIX)
+        if os.path.exists(tableFile):
+            with np.load(tableFile, allow_pickle=False) as data:
+                return {name: data[name] for name in spkE.TABLE_COLUMNS}
+        table = spkE.recordTable(fileName)
+        np.savez_compressed(tableFile, **table)
+        return table
+
+    #-----------------------------------------------------------------------
+    def latest(self, family):
+        """ (events, revision, table) of the latest scan of family, or None """
+        entries = [(kk, ee) for kk, ee in self.manifest['entries'].items()
+                   if ee.get('revision', {}).get('family') == family]
+        for key, entry in sorted(entries, key=lambda kv: -kv[1]['created']):
+            tableFile = os.path.join(self.folder, entry['revision']['kernel'] + TABLE_SUFFIX)
+            events = self.get(key) if os.path.exists(tableFile) else None
+            if events is not None:
+                with np.load(tableFile, allow_pickle=False) as data:
+                    table = {name: data[name] for name in spkE.TABLE_COLUMNS}
+                return events, entry['revision'], table
+        return None
+
+    #-----------------------------------------------------------------------
+    def plan(self, kernel, scID, t0, tf, params, windows, margin, base=None, rescan=False):
+        """ Scan plan: cached events, or the windows to scan (all of them, or
+            the changes wrt the latest scan of an earlier kernel revision).
+
+        = INPUT VARIABLES
+        - kernel       trajectory kernel (hashed by content, record table)
+        - scID         sc SPICE ID
+        - t0, tf       search interval [ET sec]
+        - params       dict of every search parameter (see key())
+        - windows      coverage windows [[t0, tf], ...] of the search
+        - margin       incremental rescan margin [sec] (INC_MARGIN_STEPS steps)
+        - base         ScanCache with the earlier revisions (default: self,
+                       e.g. the cache of the kernel previous delivery)
+        - rescan       ignore cached and base events (full scan)
+
+        = RETURN VALUE
+        - ScanPlan
+        """
+        key = self.key(kernel, scID, t0, tf, params)
+        revision = {'family' : self.family(scID, params),
+                    'kernel' : self.digest(kernel),
+                    'interval' : [float(t0), float(tf)],
+                    }
+        plan = ScanPlan(self, key, kernel, revision, windows)
+        if rescan:
+            return plan
+        plan.events = self.get(key)
+        if plan.events is not None:
+            return plan
+        prior = (base if base is not None else self).latest(revision['family'])
+        if prior is not None:
+            baseEvents, baseRevision, baseTable = prior
+            changed = spkE.changedRanges(baseTable, self.kernelTable(kernel))
+            plan.windows, plan.cores = rescanWindows(changed, baseRevision['interval'],
+                                                     windows, margin)
+            plan.baseEvents = baseEvents
+        return plan
+
+    #-----------------------------------------------------------------------
+    def _evict(self):
+        """ remove least recently used entries above maxEntries/maxBytes """
+        entries = self.manifest['entries']
+        lru = sorted(entries, key=lambda kk: entries[kk]['lastUsed'])
+        totBytes = sum(entry['bytes'] for entry in entries.values())
+        while lru and (len(entries) > self.maxEntries or totBytes > self.maxBytes):
+            key = lru.pop(0)
+            totBytes -= entries[key]['bytes']
+            self._remove(key)
+
+    #-----------------------------------------------------------------------
+    def _remove(self, key):
+        entry = self.manifest['entries'].pop(key)
+        entryFile = os.path.join(self.folder, entry['file'])
+        if os.path.exists(entryFile):
+            os.remove(entryFile)
+        # kernel table: removed with the last entry of that kernel
+        kernel = entry.get('revision', {}).get('kernel')
+        if kernel and not any(ee.get('revision', {}).get('kernel') == kernel
+                              for ee in self.manifest['entries'].values()):
+            tableFile = os.path.join(self.folder, kernel + TABLE_SUFFIX)
+            if os.path.exists(tableFile):
+                os.remove(tableFile)
+
+    #-----------------------------------------------------------------------
+    def clear(self):
+        """ remove all cached products """
+        for key in list(self.manifest['entries']):
+            self._remove(key)
+        self._saveManifest()
+
+
+class ScanPlan(object):
+    """ What a scan has to do (ScanCache.plan):
+            events not None    cached, nothing to scan
+            baseEvents None    full scan of windows
+            otherwise          incremental: scan windows (the changes), finish()
+                               splices the new events into baseEvents
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, cache, key, kernel, revision, windows):
+        self.cache = cache
+        self.key = key
+        self.kernel = kernel
+        self.revision = revision
+        self.fullWindows = [list(ww) for ww in windows]
+        self.windows = self.fullWindows
+        self.cores = self.fullWindows
+        self.events = None
+        self.baseEvents = None
+
+    @property
+    def incremental(self):
+        return self.baseEvents is not None
+
+    #-----------------------------------------------------------------------
+    def finish(self, newEvents, info=None):
+        """ events of the scan (new events spliced into the base events for
+            incremental scans), stored in the cache with the kernel revision
+        """
+        if self.incremental:
+            events = spliceEvents(self.baseEvents, newEvents, self.cores, self.fullWindows)
+        else:
+            events = newEvents
+        self.cache.kernelTable(self.kernel)
+        self.cache.put(self.key, events, info=info, revision=self.revision)
+        self.events = events
+        return events
+
+    #-----------------------------------------------------------------------
+    def summary(self):
+        """ one line description (scanBSP messages) """
+        if self.events is not None:
+            return 'cached'
+        if not self.incremental:
+            return 'full scan'
+        span = sum(bb - aa for aa, bb in self.windows)
+        total = sum(bb - aa for aa, bb in self.fullWindows)
+        return ('incremental: {0} window(s), {1:.1f} of {2:.1f} days'
+                .format(len(self.windows), span/86400.0, total/86400.0))
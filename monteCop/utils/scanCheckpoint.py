@@ -0,0 +1,277 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Checkpointed, resumable stream scans with progress and ETA.
+
+A ScanMonitor is the last detector of a scan (scanU.scanIntervals). The
+events of the other detectors are appended to an NDJSON log (one event per
+line) as they are found, and the last completed epoch is checkpointed
+periodically. Throughput (epochs/s) and ETA are reported on the way:
+
+    >>> import monteCop.utils.scanCheckpoint as scanK
+    >>> monitor = scanK.ScanMonitor('myTraj_TMP/dvScan', scanWindows, [dvDetector],
+    ...                             key=dvKey, history=dvHist)
+    >>> resume = monitor.resume() if args.resume else monitor.start()
+    >>> scanU.scanIntervals(streamFunc, scanWindows, [dvDetector, monitor], resume=resume)
+    >>> events = monitor.events      # logged + new events
+    >>> monitor.close()              # scan done (cached): log and checkpoint removed
+
+After a crash or preemption, resume() reads the logged events up to the
+checkpoint back, and returns the (window, epoch) to restart the scan from.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import json
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+from monteCop.utils.scanUtils import StreamDetector
+from monteCop.utils.spkReader import et2epochStr
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Wall clock periods [sec]: progress report, checkpoint
+PROGRESS_SEC = 10.0
+CHECKPOINT_SEC = 60.0
+
+# Epochs between clock reads
+CLOCK_EVERY = 256
+
+CHECKPOINT_VERSION = 1
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def _et(epoch):
+    """ ET sec of a stream epoch (ET sec or Monte Epoch) """
+    if isinstance(epoch, (float, int, np.floating)):
+        return float(epoch)
+    return spkE.epoch2et(epoch)
+
+# ----------------------------------------------------------------------------
+def _writeJson(fileName, data):
+    """ write JSON through a temporary file (no partial checkpoints) """
+    tmpFile = fileName + '.tmp'
+    with open(tmpFile, 'w') as outfile:
+        json.dump(data, outfile, indent=1)
+    os.replace(tmpFile, fileName)
+
+# ----------------------------------------------------------------------------
+def readLog(logFile, numEvents=None):
+    """ events of an NDJSON log (the first numEvents) """
+    events = []
+    if not os.path.exists(logFile):
+        return events
+    with open(logFile, 'r') as logInput:
+        for line in logInput:
+            if numEvents is not None and len(events) == numEvents:
+                break
+            events.append(json.loads(line))
+    return events
+
+# ----------------------------------------------------------------------------
+def removeCheckpoint(fileBase):
+    """ remove the event log and checkpoint of a scan (completed, results saved) """
+    for ff in [fileBase + '_events.ndjson', fileBase + '_checkpoint.json']:
+        if os.path.exists(ff):
+            os.remove(ff)
+
+# ===========================================================================
+# Scan Monitor:
+# ===========================================================================
+
+class ScanMonitor(StreamDetector):
+    """ Event log, checkpoints and progress of a scan (last detector) """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, fileBase, windows, detectors, key=None, history=None,
+                 progressSec=PROGRESS_SEC, checkpointSec=CHECKPOINT_SEC):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - fileBase       files fileBase + '_events.ndjson', '_checkpoint.json'
+        - windows        scan windows [[t0, tf], ...] [ET sec]
+        - detectors      detectors whose events are logged
+        - key            scan key (e.g. scanCache key): a checkpoint of another
+                         scan is not resumed
+        - history        scanHistory.DvHistory of the scan (truncated back to
+                         the checkpoint on resume)
+        - progressSec    progress report period [sec] (0: no reports)
+        - checkpointSec  checkpoint period [sec]
+        """
+        StreamDetector.__init__(self)
+        self.fileBase = fileBase
+        self.logFile = fileBase + '_events.ndjson'
+        self.checkpointFile = fileBase + '_checkpoint.json'
+        self.windows = [list(ww) for ww in windows]
+        self.detectors = detectors
+        self.key = key
+        self.history = history
+        self.progressSec = progressSec
+        self.checkpointSec = checkpointSec
+        self._starts = np.array([aa for aa, bb in self.windows])
+        self._spans = np.array([bb - aa for aa, bb in self.windows])
+        self._log = None
+
+    #-----------------------------------------------------------------------
+    def start(self, resume=None):
+        """ start (or resume at (window, et)) the scan clock and the log.
+
+        = RETURN VALUE
+        - resume (scanU.scanIntervals argument)
+        """
+        mode = 'a' if resume is not None else 'w'
+        self._log = open(self.logFile, mode)
+        self._numSeen = [len(det.events) for det in self.detectors]
+        self._last = None
+        self._epochs = 0
+        self._count = 0
+        self._done0 = self._done(*resume) if resume is not None else 0.0
+        self._wall0 = time.time()
+        self._lastReport = self._wall0
+        self._lastCheckpoint = self._wall0
+        return resume
+
+    #-----------------------------------------------------------------------
+    def resume(self):
+        """ Restart from the checkpoint of the same scan (key): logged events
+            read back, log and history truncated to the checkpoint.
+
+        = RETURN VALUE
+        - (window, et) to restart from, or None (no checkpoint: new scan)
+        """
+        ckpt = None
+        if os.path.exists(self.checkpointFile):
+            with open(self.checkpointFile, 'r') as jsonInput:
+                ckpt = json.load(jsonInput)
+            if ckpt.get('version') != CHECKPOINT_VERSION or ckpt.get('key') != self.key:
+                print(' ... Checkpoint of another scan, not resumed: ' + self.checkpointFile)
+                ckpt = None
+        if ckpt is None:
+            if self.history is not None:
+                self.history.truncate(0)
+            return self.start()
+
+        self.events = readLog(self.logFile, ckpt['numEvents'])
+        with open(self.logFile, 'w') as logOut:
+            for ev in self.events:
+                logOut.write(json.dumps(ev) + '\n')
+        if self.history is not None:
+            self.history.truncate(ckpt['historySize'])
+        print(' ... Resuming scan at ' + et2epochStr(ckpt['et']) + ' ('
+              + str(len(self.events)) + ' events logged)')
+        return self.start((ckpt['window'], ckpt['et']))
+
+    #-----------------------------------------------------------------------
+    def _done(self, window, et):
+        """ scanned span [sec] up to et in window """
+        return float(self._spans[:window].sum()) + (et - self.windows[window][0])
+
+    #-----------------------------------------------------------------------
+    def _window(self, et):
+        return max(int(np.searchsorted(self._starts, et, side='right')) - 1, 0)
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        self._epochs += 1
+        self._last = window[-1][0]
+        for ii, det in enumerate(self.detectors):
+            if len(det.events) > self._numSeen[ii]:
+                self._logEvents(det.events[self._numSeen[ii]:])
+                self._numSeen[ii] = len(det.events)
+        self._count += 1
+        if self._count < CLOCK_EVERY:
+            return
+        self._count = 0
+        now = time.time()
+        if self.progressSec and now - self._lastReport > self.progressSec:
+            self._lastReport = now
+            print(self.progress(now))
+        if now - self._lastCheckpoint > self.checkpointSec:
+            self._lastCheckpoint = now
+            self.checkpoint()
+
+    #-----------------------------------------------------------------------
+    def _logEvents(self, events):
+        et = _et(self._last)
+        for ev in events:
+            ev.setdefault('interval', self._window(et))
+            self.events.append(ev)
+            self._log.write(json.dumps(ev) + '\n')
+        self._log.flush()
+
+    #-----------------------------------------------------------------------
+    def checkpoint(self):
+        """ write the checkpoint: last completed epoch, events logged so far """
+        if self._last is None or self._log is None:
+            return
+        et = _et(self._last)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        historySize = 0
+        if self.history is not None:
+            self.history.flush()
+            historySize = len(self.history)
+        _writeJson(self.checkpointFile, {'version' : CHECKPOINT_VERSION,
+                                         'key' : self.key,
+                                         'window' : self._window(et),
+                                         'et' : et,
+                                         'epoch' : et2epochStr(et),
+                                         'numEvents' : len(self.events),
+                                         'historySize' : historySize,
+                                         })
+
+    #-----------------------------------------------------------------------
+    def progress(self, now=None):
+        """ progress line: % of the windows span, epoch, epochs/s, ETA """
+        now = time.time() if now is None else now
+        elapsed = max(now - self._wall0, 1e-9)
+        total = float(self._spans.sum())
+        if self._last is None or total <= 0.0:
+            return '     0.0%'
+        et = _et(self._last)
+        done = self._done(self._window(et), et)
+        rate = (done - self._done0)/elapsed          # scanned sec per wall sec
+        eta = (total - done)/rate if rate > 0.0 else float('inf')
+        etaStr = str(timedelta(seconds=int(eta))) if np.isfinite(eta) else '--'
+        return ('     {0:5.1f}% | {1} | {2:.3g} epochs/s | {3} events | ETA {4}'
+                .format(100.0*done/total, et2epochStr(et)[:20], self._epochs/elapsed,
+                        len(self.events), etaStr))
+
+    #-----------------------------------------------------------------------
+    def finish(self):
+        self.checkpoint()
+        elapsed = time.time() - self._wall0
+        print('     scan: {0} epochs in {1} ({2:.3g} epochs/s)'
+              .format(self._epochs, timedelta(seconds=int(elapsed)),
+                      self._epochs/max(elapsed, 1e-9)))
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """ scan completed (results saved): remove the log and checkpoint """
+        if self._log is not None:
+            self._log.close()
+        removeCheckpoint(self.fileBase)
@@ -0,0 +1,486 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Fused single-pass scan engine.
+
+All the searches of a BSP scan (apsides wrt several bodies, range
+thresholds, SOI crossings, DV discontinuities) run as detectors on one
+shared state stream: the sc states wrt every engine body are evaluated
+once per epoch, stacked as (numBodies,6), and every detector gets the same
+window. Example, from the scanBSP searchBodies schema:
+
+    >>> import monteCop.utils.scanEngine as scanE
+    >>> engine = scanE.fromSearchBodies(searchBodies, minDv=0.001, dvCenter='Saturn')
+    >>> events = engine.run(engine.nativeStream('Enceladus_2048.bsp', -1, 100.0), windows)
+    >>> engine.eventsByType()['Peri']
+
+searchBodies entries: {'bodyName', 'minAlt', 'searchType', 'searchFrame'},
+searchType in:
+    'Peri'      periapsis wrt bodyName, range < minAlt
+    'periNoFB'  periapsis wrt bodyName, range wrt 'flybyBody' > minAlt
+                (default flyby body: the body of the first 'Peri' entry)
+    'Apo'       apoapsis wrt bodyName
+    'range'     bodyName range crosses minAlt ('rangeIn'/'rangeOut' events)
+    'soi'       SOI crossings among the engine bodies
+    'dvDisc'    DV discontinuities ('minDv' [km/s]), states wrt bodyName
+
+Apsis and crossing epochs are refined inside the step on the true states
+(regula falsi on the engine statesFunc, set by nativeStream/monteStream, to
+ROOT_TOL), so the stream step only has to bracket the events. Each coverage
+window is closed with a sample at its end (events in the last partial step).
+Without statesFunc, the events are refined on the cubic Hermite interpolant
+of the two bracketing states, valid for steps short wrt the dynamics.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.scanUtils as scanU
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Bisection iterations inside a step (step/2^ROOT_ITER), Hermite refinement
+ROOT_ITER = 50
+
+# Event epoch tolerance [sec], refinement on the true states
+ROOT_TOL = 1.0e-3
+
+# Engine results version (scan cache keys): 2 = refined on the true states
+ENGINE_VERSION = 2
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def _et(epoch):
+    """ ET sec of ET sec or Monte Epoch """
+    if isinstance(epoch, (float, int, np.floating)):
+        return float(epoch)
+    return spkE.epoch2et(epoch)
+
+# ----------------------------------------------------------------------------
+def _km(value):
+    """ km of a float or of an mpy.units distance """
+    if value is None:
+        return None
+    return float(value.value()) if hasattr(value, 'value') else float(value)
+
+# ----------------------------------------------------------------------------
+def hermiteState(s1, s2, hh, tau):
+    """ State at t1 + tau*hh on the cubic Hermite of the states s1 (t1), s2 (t1+hh) """
+    t2 = tau*tau
+    t3 = t2*tau
+    pos = ((2*t3 - 3*t2 + 1)*s1[:3] + (t3 - 2*t2 + tau)*hh*s1[3:]
+           + (-2*t3 + 3*t2)*s2[:3] + (t3 - t2)*hh*s2[3:])
+    vel = ((6*t2 - 6*tau)*s1[:3]/hh + (3*t2 - 4*tau + 1)*s1[3:]
+           + (-6*t2 + 6*tau)*s2[:3]/hh + (3*t2 - 2*tau)*s2[3:])
+    return np.concatenate((pos, vel))
+
+# ----------------------------------------------------------------------------
+def _bisect(func, lo=0.0, hi=1.0, numIter=ROOT_ITER):
+    """ root of func on [lo, hi] (func(lo), func(hi) of different sign) """
+    flo = func(lo)
+    for _ in range(numIter):
+        mid = 0.5*(lo + hi)
+        fmid = func(mid)
+        if (fmid < 0) == (flo < 0):
+            lo, flo = mid, fmid
+        else:
+            hi = mid
+    return 0.5*(lo + hi)
+
+# ----------------------------------------------------------------------------
+def _regulaFalsi(func, aa, fa, bb, fb, tol=ROOT_TOL):
+    """ root of func on [aa, bb] (fa, fb of different sign), Illinois regula falsi """
+    if fb == 0.0:
+        return bb
+    side = 0
+    while bb - aa > tol:
+        cc = (aa*fb - bb*fa)/(fb - fa)
+        cc = min(max(cc, aa + 0.5*tol), bb - 0.5*tol)
+        fc = func(cc)
+        if fc == 0.0:
+            return cc
+        if (fc < 0.0) == (fa < 0.0):
+            aa, fa = cc, fc
+            if side == -1:
+                fb *= 0.5
+            side = -1
+        else:
+            bb, fb = cc, fc
+            if side == 1:
+                fa *= 0.5
+            side = 1
+    return (aa*fb - bb*fa)/(fb - fa) if fb != fa else bb
+
+# ----------------------------------------------------------------------------
+def eventDic(et, value, center, frame, eventType, **extra):
+    """ event entry (scanBSP *Events_out.json schema): value [km] """
+    ev = {'time' : scanU._epochStr(et),
+          'value' : str(value) + ' km',
+          'center' : center,
+          'frame' : frame,
+          'eventType' : eventType,
+          }
+    ev.update(extra)
+    return ev
+
+# ===========================================================================
+# Detectors:
+# ===========================================================================
+
+class BodyDetector(scanU.StreamDetector):
+    """ Detector on the stacked states (numBodies,6) of the engine bodies.
+
+    bind() is called by ScanEngine.add, with the engine bodies, to resolve
+    the body names into state indices. statesFunc (ET sec -> (numBodies,6)
+    true states) is set by ScanEngine.run, for the event refinement.
+    """
+
+    def __init__(self):
+        scanU.StreamDetector.__init__(self)
+        self.eventEpochs = []
+        self.statesFunc = None
+
+    def bind(self, bodies):
+        pass
+
+    def _emit(self, et, ev):
+        self.events.append(ev)
+        self.eventEpochs.append(et)
+
+    def _root(self, gFunc, t1, S1, t2, S2):
+        """ root of gFunc (of the (numBodies,6) states) in the step [t1, t2], on
+            the true states (statesFunc) or on the Hermite interpolant:
+            (et, (numBodies,6) states at et)
+        """
+        et1 = _et(t1)
+        et2 = _et(t2)
+        if self.statesFunc is not None:
+            et = _regulaFalsi(lambda et: gFunc(self.statesFunc(et)), et1, gFunc(S1), et2, gFunc(S2))
+            return et, self.statesFunc(et)
+        hh = et2 - et1
+        stacked = lambda tau: np.array([hermiteState(s1, s2, hh, tau) for s1, s2 in zip(S1, S2)])
+        tau = _bisect(lambda tau: gFunc(stacked(tau)))
+        return et1 + tau*hh, stacked(tau)
+
+    @staticmethod
+    def _index(bodies, body):
+        if body not in bodies:
+            raise ValueError('Body ' + str(body) + ' not in the scan engine bodies ' + str(bodies))
+        return bodies.index(body)
+
+
+class ApsisDetector(BodyDetector):
+    """ Periapsis/apoapsis wrt body: sign change of r.v on a step """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, body, apsis='Peri', frame='EMO2000', maxRange=None, altBody=None,
+                 minAltBody=None, eventType=None, eventCenter=None):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - body          apsis center (engine body)
+        - apsis         'Peri' or 'Apo'
+        - frame         frame name (output only)
+        - maxRange      keep apsides with range < maxRange [km]
+        - altBody       keep apsides with range wrt altBody > minAltBody [km]
+        - eventType, eventCenter   written to the events (default: apsis, body)
+        """
+        BodyDetector.__init__(self)
+        self.body = body
+        self.apsis = apsis
+        self.frame = frame
+        self.maxRange = _km(maxRange)
+        self.altBody = altBody
+        self.minAltBody = _km(minAltBody)
+        self.eventType = eventType or apsis
+        self.eventCenter = eventCenter or body
+
+    def bind(self, bodies):
+        self.ib = self._index(bodies, self.body)
+        self.ia = self._index(bodies, self.altBody) if self.altBody else None
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        (t1, S1), (t2, S2) = window[-2:]
+        s1 = S1[self.ib]
+        s2 = S2[self.ib]
+        f1 = np.dot(s1[:3], s1[3:])
+        f2 = np.dot(s2[:3], s2[3:])
+        if self.apsis == 'Peri':
+            found = f1 < 0.0 <= f2
+        else:
+            found = f1 > 0.0 >= f2
+        if not found:
+            return
+        ib = self.ib
+        et, SS = self._root(lambda SS: np.dot(SS[ib][:3], SS[ib][3:]), t1, S1, t2, S2)
+        rng = float(np.linalg.norm(SS[ib][:3]))
+        if self.maxRange is not None and rng >= self.maxRange:
+            return
+        if self.ia is not None:
+            alt = np.linalg.norm(SS[self.ia][:3])
+            if alt <= self.minAltBody:
+                return
+        self._emit(et, eventDic(et, rng, self.eventCenter, self.frame, self.eventType))
+
+
+class RangeDetector(BodyDetector):
+    """ Range wrt body crossing a threshold: eventType + 'In' / 'Out' """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, body, threshold, frame='EMO2000', eventType='range'):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - body          engine body
+        - threshold     range [km]
+        - frame         frame name (output only)
+        """
+        BodyDetector.__init__(self)
+        self.body = body
+        self.threshold = _km(threshold)
+        self.frame = frame
+        self.eventType = eventType
+
+    def bind(self, bodies):
+        self.ib = self._index(bodies, self.body)
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        (t1, S1), (t2, S2) = window[-2:]
+        s1 = S1[self.ib]
+        s2 = S2[self.ib]
+        g1 = np.linalg.norm(s1[:3]) - self.threshold
+        g2 = np.linalg.norm(s2[:3]) - self.threshold
+        if not (g1 > 0.0) != (g2 > 0.0) or np.isnan(g1) or np.isnan(g2):
+            return
+        ib = self.ib
+        et, SS = self._root(lambda SS: np.linalg.norm(SS[ib][:3]) - self.threshold, t1, S1, t2, S2)
+        self._emit(et, eventDic(et, self.threshold, self.body, self.frame,
+                                self.eventType + ('In' if g1 > 0.0 else 'Out')))
+
+
+class SoiDetector(BodyDetector):
+    """ SOI crossings: change of the SOI center (scanUtils.soiCenter) """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, frame='EMO2000', soi=None, eventType='soiCrossing'):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - frame         frame name (output only)
+        - soi           {body: SOI [km]} (default: scanUtils.bodySOI)
+        """
+        BodyDetector.__init__(self)
+        self.frame = frame
+        self.soiTable = soi or scanU.bodySOI
+        self.eventType = eventType
+
+    def bind(self, bodies):
+        self.bodies = list(bodies)
+        self.soi = np.array([self.soiTable.get(bb, np.inf) for bb in self.bodies])
+        self.primary = int(np.argmax(self.soi))
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        (t1, S1), (t2, S2) = window[-2:]
+        c1 = scanU.soiCenter(S1, self.soi, self.primary)
+        c2 = scanU.soiCenter(S2, self.soi, self.primary)
+        if c1 == c2:
+            return
+        # boundary crossed: SOI of the smaller body (entered or left)
+        bb = c2 if self.soi[c2] < self.soi[c1] else c1
+        et, SS = self._root(lambda SS: np.linalg.norm(SS[bb][:3]) - self.soi[bb], t1, S1, t2, S2)
+        self._emit(et, eventDic(et, self.soi[bb], self.bodies[c2], self.frame, self.eventType,
+                                fromCenter=self.bodies[c1]))
+
+# ===========================================================================
+# Scan Engine:
+# ===========================================================================
+
+class ScanEngine(object):
+    """ Single-pass scan: detectors fed from one stacked state stream.
+
+    BodyDetectors get the (numBodies,6) states. Other stream detectors
+    (e.g. scanUtils.DvDiscDetector) are added with body=name and get the
+    (6,) states wrt that body.
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, bodies, frame='EMO2000'):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - bodies     body names: sc states wrt each (stream order)
+        - frame      states frame
+        """
+        self.bodies = list(bodies)
+        self.frame = frame
+        self.detectors = []
+        self.windowSize = 2
+        # ET sec -> (numBodies,6) true states: event refinement, window ends
+        self.statesFunc = None
+
+    #-----------------------------------------------------------------------
+    def add(self, detector, body=None):
+        """ register a detector (body: state index of non-BodyDetectors) """
+        if isinstance(detector, BodyDetector):
+            detector.bind(self.bodies)
+            ib = None
+        else:
+            ib = BodyDetector._index(self.bodies, body)
+        self.detectors.append((detector, ib))
+        self.windowSize = max(self.windowSize, detector.windowSize)
+        return detector
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        for det, ib in self.detectors:
+            win = window[-det.windowSize:]
+            if ib is not None:
+                win = tuple((tt, ss[ib]) for tt, ss in win)
+            det.update(win)
+
+    #-----------------------------------------------------------------------
+    def finish(self):
+        for det, ib in self.detectors:
+            det.finish()
+
+    #-----------------------------------------------------------------------
+    @property
+    def events(self):
+        """ events of all detectors, time ordered """
+        allEvents = []
+        for det, ib in self.detectors:
+            allEvents.extend(zip([_et(ep) for ep in det.eventEpochs], det.events))
+        return [ev for et, ev in sorted(allEvents, key=lambda item: item[0])]
+
+    #-----------------------------------------------------------------------
+    def eventsByType(self):
+        """ {eventType: time ordered events} """
+        byType = {}
+        for ev in self.events:
+            byType.setdefault(ev['eventType'], []).append(ev)
+        return byType
+
+    #-----------------------------------------------------------------------
+    def nativeStream(self, ephem, scID, dt, blockSize=100000):
+        """ streamFunc(t0, tf) of the native (SpkEphem) stacked states on t0:dt:tf """
+        query = spkE.SpkQuery(ephem, scID, self.bodies, self.frame)
+        self.statesFunc = lambda et: query.states(np.array([float(et)]))[0]
+        return lambda t0, tf: scanU.blockStream(query, t0, tf, dt, blockSize)
+
+    #-----------------------------------------------------------------------
+    def monteStream(self, boa, scName, dt):
+        """ streamFunc(t0, tf) [ET sec] of Monte TrajQuery states (one query
+            per body) on the Epoch grid t0:dt:tf (dt: Monte Duration)
+        """
+        import Monte as M
+        stateFunc = scanU.multiStateFunc([M.TrajQuery(boa, scName, bb, self.frame).state
+                                          for bb in self.bodies])
+        self.statesFunc = lambda et: stateFunc(spkE.et2epoch(et))
+        return lambda t0, tf: scanU.stateStream(stateFunc, spkE.et2epoch(t0), spkE.et2epoch(tf), dt)
+
+    #-----------------------------------------------------------------------
+    def _closedStream(self, streamFunc):
+        """ streamFunc with a last sample at tf (grid ending before tf) """
+        def stream(t0, tf):
+            last = None
+            for item in streamFunc(t0, tf):
+                last = item
+                yield item
+            if last is not None and _et(last[0]) < tf - ROOT_TOL:
+                epoch = tf if isinstance(last[0], (float, int, np.floating)) else spkE.et2epoch(tf)
+                yield epoch, self.statesFunc(tf)
+        return stream
+
+    #-----------------------------------------------------------------------
+    def run(self, streamFunc, windows):
+        """ Single pass over the coverage windows [[t0, tf], ...] [ET sec]
+
+        = INPUT VARIABLES
+        - streamFunc   (t0, tf) -> (epoch, (numBodies,6) states) stream:
+                       nativeStream() or monteStream()
+
+        = RETURN VALUE
+        - time ordered events (annotated with the window index 'interval')
+        """
+        if self.statesFunc is not None:
+            streamFunc = self._closedStream(streamFunc)
+        for det, ib in self.detectors:
+            if isinstance(det, BodyDetector):
+                det.statesFunc = self.statesFunc
+        scanU.scanIntervals(streamFunc, windows, [self])
+        return self.events
+
+# ----------------------------------------------------------------------------
+def fromSearchBodies(searchBodies, frame=None, minDv=None, dvCenter=None, soi=False):
+    """ ScanEngine with the detectors of a scanBSP searchBodies list.
+
+    = INPUT VARIABLES
+    - searchBodies   list of {'bodyName', 'minAlt', 'searchType', 'searchFrame'}
+                     (see module doc; 'dvDisc' entries use 'minDv')
+    - frame          engine frame (default: searchFrame of the first entry)
+    - minDv, dvCenter   add a DV discontinuity detector [km/s] wrt dvCenter
+    - soi            add a SOI crossings detector
+    """
+    frame = frame or searchBodies[0].get('searchFrame', 'EMO2000')
+    periBodies = [sb['bodyName'] for sb in searchBodies if sb['searchType'] == 'Peri']
+    bodies = []
+    for sb in searchBodies:
+        for bb in [sb['bodyName'], sb.get('flybyBody')]:
+            if bb and bb not in bodies:
+                bodies.append(bb)
+    if dvCenter and dvCenter not in bodies:
+        bodies.append(dvCenter)
+    if any(sb['searchType'] == 'periNoFB' and not sb.get('flybyBody') for sb in searchBodies):
+        if not periBodies:
+            raise ValueError("searchBodies: 'periNoFB' needs a 'flybyBody' or a 'Peri' entry")
+
+    engine = ScanEngine(bodies, frame)
+    for sb in searchBodies:
+        body = sb['bodyName']
+        sFrame = sb.get('searchFrame', frame)
+        searchType = sb['searchType']
+        if searchType == 'Peri':
+            engine.add(ApsisDetector(body, 'Peri', sFrame, maxRange=sb.get('minAlt'),
+                                     eventType=searchType))
+        elif searchType == 'periNoFB':
+            engine.add(ApsisDetector(body, 'Peri', sFrame, altBody=sb.get('flybyBody') or periBodies[0],
+                                     minAltBody=sb['minAlt'], eventType=searchType))
+        elif searchType == 'Apo':
+            engine.add(ApsisDetector(body, 'Apo', sFrame, eventType=searchType))
+        elif searchType == 'range':
+            engine.add(RangeDetector(body, sb['minAlt'], sFrame))
+        elif searchType == 'soi':
+            soi = True
+        elif searchType == 'dvDisc':
+            engine.add(scanU.DvDiscDetector(sb['minDv'], body, frame, keepHistory=False), body=body)
+        else:
+            raise ValueError('Unknown searchType: ' + str(searchType))
+    if minDv is not None:
+        engine.add(scanU.DvDiscDetector(minDv, dvCenter, frame, keepHistory=False), body=dvCenter)
+    if soi:
+        engine.add(SoiDetector(frame))
+    return engine
@@ -0,0 +1,240 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Disk-backed scan histories and decimated plotting.
+
+The |DV| of every step of a DV discontinuity sweep is streamed to disk
+(epochs float64 ET sec, |DV| float32 km/s) through a small buffer, so months
+at 1 sec steps do not live in memory. The history is read back as np.memmap,
+and decimated (min/max per bin, or LTTB) to a few thousand points to plot:
+
+    >>> import monteCop.utils.scanHistory as scanH
+    >>> hist = scanH.DvHistory('myTraj_TMP/dvHist')
+    >>> dvDetector = scanU.DvDiscDetector(0.02, 'Moon', 'EMO2000', history=hist)
+    >>> scanU.scanStream(stream, [dvDetector])
+    >>> et, dvMag = hist.arrays()
+    >>> xx, yy = scanH.decimate(et, dvMag, 4000)
+
+Both decimations keep the spikes (DV discontinuities) of the history.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import os
+import shutil
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+from monteCop.utils.spkReader import et2epochStr
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Samples buffered in memory before writing to disk
+HIST_BUFFER_SIZE = 65536
+
+# Plot points
+DECIMATE_POINTS = 4000
+
+# ===========================================================================
+# DV History:
+# ===========================================================================
+
+class DvHistory(object):
+    """ |DV| history on disk: fileName_et.f64 (ET sec) and fileName_dv.f32 (km/s) """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, fileName, bufferSize=HIST_BUFFER_SIZE, append=False):
+        """ Constructor (new history, or append=True to extend an existing one)
+
+        = INPUT VARIABLES
+        - fileName     base file name (e.g. outputFolder + '/dvHist')
+        - bufferSize   samples kept in memory between writes
+        """
+        self.fileName = fileName
+        self.etFile = fileName + '_et.f64'
+        self.dvFile = fileName + '_dv.f32'
+        mode = 'ab' if append else 'wb'
+        self._etOut = open(self.etFile, mode)
+        self._dvOut = open(self.dvFile, mode)
+        self._etBuf = np.empty(bufferSize, dtype=np.float64)
+        self._dvBuf = np.empty(bufferSize, dtype=np.float32)
+        self._numBuf = 0
+        self.size = os.path.getsize(self.dvFile)//4 if append else 0
+
+    #-----------------------------------------------------------------------
+    def append(self, epoch, dvMag):
+        """ add one sample (epoch: ET sec or Monte Epoch) """
+        if self._numBuf == self._dvBuf.size:
+            self.flush()
+        if not isinstance(epoch, (float, int, np.floating)):
+            epoch = spkE.epoch2et(epoch)
+        self._etBuf[self._numBuf] = epoch
+        self._dvBuf[self._numBuf] = dvMag
+        self._numBuf += 1
+        self.size += 1
+
+    #-----------------------------------------------------------------------
+    def extend(self, et, dvMag):
+        """ add arrays of samples (ET sec, km/s) """
+        self.flush()
+        np.asarray(et, dtype=np.float64).tofile(self._etOut)
+        np.asarray(dvMag, dtype=np.float32).tofile(self._dvOut)
+        self.size += len(et)
+
+    #-----------------------------------------------------------------------
+    def appendHistory(self, other):
+        """ add the samples of another (closed) DvHistory, copied file to file """
+        self.flush()
+        other.close()
+        for src, dst in [(other.etFile, self._etOut), (other.dvFile, self._dvOut)]:
+            with open(src, 'rb') as inFile:
+                shutil.copyfileobj(inFile, dst)
+        self.size += other.size
+
+    #-----------------------------------------------------------------------
+    def flush(self):
+        """ write the buffered samples """
+        if self._etOut.closed:
+            return
+        if self._numBuf:
+            self._etBuf[:self._numBuf].tofile(self._etOut)
+            self._dvBuf[:self._numBuf].tofile(self._dvOut)
+            self._numBuf = 0
+        self._etOut.flush()
+        self._dvOut.flush()
+
+    #-----------------------------------------------------------------------
+    def truncate(self, size):
+        """ keep the first size samples (e.g. back to a scan checkpoint) """
+        self.flush()
+        self._etOut.truncate(size*8)
+        self._dvOut.truncate(size*4)
+        self.size = min(self.size, size)
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        self.flush()
+        self._etOut.close()
+        self._dvOut.close()
+
+    #-----------------------------------------------------------------------
+    def arrays(self):
+        """ (et, dvMag) read-only np.memmap of the history """
+        self.flush()
+        if self.size == 0:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        return (np.memmap(self.etFile, dtype=np.float64, mode='r', shape=(self.size,)),
+                np.memmap(self.dvFile, dtype=np.float32, mode='r', shape=(self.size,)))
+
+    #-----------------------------------------------------------------------
+    def remove(self):
+        """ close and delete the history files """
+        self.close()
+        for ff in [self.etFile, self.dvFile]:
+            if os.path.exists(ff):
+                os.remove(ff)
+
+    def __len__(self):
+        return self.size
+
+# ===========================================================================
+# Decimation:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def minMaxDecimate(xx, yy, numBins):
+    """ Min and max sample of each of numBins index bins (<= 2*numBins points).
+
+    Bins are read one at a time (np.memmap friendly).
+    """
+    nn = len(yy)
+    if nn <= 2*numBins:
+        return np.asarray(xx, dtype=float), np.asarray(yy, dtype=float)
+    edges = np.linspace(0, nn, numBins + 1).astype(int)
+    idx = np.empty(2*numBins, dtype=np.int64)
+    for ii in range(numBins):
+        chunk = yy[edges[ii]:edges[ii + 1]]
+        idx[2*ii] = edges[ii] + np.argmin(chunk)
+        idx[2*ii + 1] = edges[ii] + np.argmax(chunk)
+    idx = np.unique(idx)
+    return np.asarray(xx[idx], dtype=float), np.asarray(yy[idx], dtype=float)
+
+# ----------------------------------------------------------------------------
+def lttbDecimate(xx, yy, numOut):
+    """ Largest-Triangle-Three-Buckets decimation to numOut points.
+
+    First and last samples are kept, one sample per bucket (the one making
+    the largest triangle with the previous pick and the next bucket mean).
+    """
+    nn = len(yy)
+    if nn <= numOut or numOut < 3:
+        return np.asarray(xx, dtype=float), np.asarray(yy, dtype=float)
+    edges = np.linspace(1, nn - 1, numOut - 1).astype(int)
+    idx = np.empty(numOut, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = nn - 1
+    ax, ay = float(xx[0]), float(yy[0])
+    for ii in range(numOut - 2):
+        b0, b1 = edges[ii], edges[ii + 1]
+        if ii < numOut - 3:
+            n0, n1 = edges[ii + 1], edges[ii + 2]
+            cx = float(np.mean(xx[n0:n1]))
+            cy = float(np.mean(yy[n0:n1]))
+        else:
+            cx, cy = float(xx[nn - 1]), float(yy[nn - 1])
+        bx = np.asarray(xx[b0:b1], dtype=float)
+        by = np.asarray(yy[b0:b1], dtype=float)
+        area = np.abs((ax - cx)*(by - ay) - (ax - bx)*(cy - ay))
+        jj = int(np.argmax(area))
+        idx[ii + 1] = b0 + jj
+        ax, ay = bx[jj], by[jj]
+    return np.asarray(xx[idx], dtype=float), np.asarray(yy[idx], dtype=float)
+
+# ----------------------------------------------------------------------------
+def decimate(xx, yy, numPoints=DECIMATE_POINTS, method='minmax'):
+    """ Decimated (xx, yy) for plotting, about numPoints points
+
+    = INPUT VARIABLES
+    - xx, yy       arrays (or np.memmap)
+    - method       'minmax' (min/max per bin) or 'lttb'
+    """
+    if not isinstance(xx, np.ndarray):
+        xx, yy = np.asarray(xx, dtype=float), np.asarray(yy, dtype=float)
+    if method == 'lttb':
+        return lttbDecimate(xx, yy, numPoints)
+    if method == 'minmax':
+        return minMaxDecimate(xx, yy, max(1, numPoints//2))
+    raise ValueError('Unknown decimation method: ' + str(method))
+
+# ----------------------------------------------------------------------------
+def plotDvHistory(plotModule, et, dvMag, numPoints=DECIMATE_POINTS, method='minmax'):
+    """ Decimated |DV| history plot, time in days from the first sample
+
+    = INPUT VARIABLES
+    - plotModule   mpylab or matplotlib.pyplot
+    - et, dvMag    history arrays (e.g. DvHistory.arrays())
+    """
+    if len(et) == 0:
+        return
+    xx, yy = decimate(et, dvMag, numPoints, method)
+    plotModule.xlabel(" Days from " + et2epochStr(float(et[0])))
+    plotModule.ylabel(" Velocity Discontinuities(km/sec)")
+    plotModule.plot((xx - float(et[0]))/86400.0, yy)
+    plotModule.show()
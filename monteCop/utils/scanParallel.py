@@ -0,0 +1,330 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Parallel BSP scans (process pool, time chunks).
+
+The search interval is split in chunks scanned by a
+concurrent.futures.ProcessPoolExecutor. Each worker opens its own kernels
+(native SpkEphem or Monte Boa), events are merged and de-duplicated at the
+chunk seams. Example:
+
+    >>> import monteCop.utils.scanParallel as scanP
+    >>> events = scanP.dvDiscParallel(['Enceladus_2048.bsp'], -1, 'Saturn', 'EMO2000',
+    ...                               t0_et, tf_et, 60.0, 0.001, numWorkers=8)
+
+Gapped coverage: with windows=[[a, b], ...] (scanU.coverageWindows) the
+chunks are taken inside each window, gaps are skipped, and the events are
+annotated with the window index ('interval').
+
+Chunks are aligned to the scan grid (t0 + k*dt): a chunk owns the steps
+that start in it, so the parallel scan returns the same events as the
+serial one. Apsis searches overlap the chunks by one search step on each
+side, and keep the events inside the chunk.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+import monteCop.utils.scanUtils as scanU
+import monteCop.utils.scanHistory as scanH
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Chunks per worker (load balance)
+CHUNKS_PER_WORKER = 4
+
+# Events closer than this are the same event (seams) [sec]
+SEAM_TOL = 1.0e-3
+
+# ===========================================================================
+# Chunks:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def poolSize(workers):
+    """ worker count: int, or 0/None -> all cores """
+    workers = int(workers) if workers else 0
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+# ----------------------------------------------------------------------------
+def chunkIntervals(t0, tf, numChunks, step=None):
+    """ Split [t0, tf] [ET sec] in contiguous chunks [a, b].
+
+    With step, chunk bounds are on the grid t0 + k*step, and consecutive
+    chunks share their bound (the step crossing a seam is in one chunk).
+    """
+    if step:
+        numSteps = spkE.epochGrid(t0, tf, step).size - 1
+        bounds = np.unique(np.linspace(0, numSteps, numChunks + 1).round().astype(int))
+        return [[t0 + step*b0, t0 + step*b1] for b0, b1 in zip(bounds[:-1], bounds[1:])]
+    bounds = np.linspace(t0, tf, numChunks + 1)
+    return [[b0, b1] for b0, b1 in zip(bounds[:-1], bounds[1:])]
+
+# ----------------------------------------------------------------------------
+def windowChunks(windows, numChunks, step=None):
+    """ Chunks of several coverage windows (gaps excluded).
+
+    Chunks are shared among the windows by duration (at least one each).
+
+    = RETURN VALUE
+    - list of (windowIndex, [a, b], lastChunkOfWindow)
+    """
+    spans = np.array([bb - aa for aa, bb in windows], dtype=float)
+    counts = np.maximum(1, np.round(numChunks*spans/max(spans.sum(), 1.0))).astype(int)
+    chunks = []
+    for ii, ((aa, bb), nn) in enumerate(zip(windows, counts)):
+        winChunks = chunkIntervals(aa, bb, nn, step)
+        for jj, chunk in enumerate(winChunks):
+            chunks.append((ii, chunk, jj == len(winChunks) - 1))
+    return chunks
+
+# ----------------------------------------------------------------------------
+def mergeEvents(chunkEvents, tol=SEAM_TOL):
+    """ Merge lists of (et, event) of all chunks: sorted, de-duplicated """
+    merged = []
+    for et, ev in sorted((item for events in chunkEvents for item in events),
+                         key=lambda item: item[0]):
+        if merged and et - merged[-1][0] <= tol:
+            continue
+        merged.append((et, ev))
+    return merged
+
+# ----------------------------------------------------------------------------
+def runChunks(worker, tasks, workers):
+    """ Run worker(task) for every task, in a process pool (in order) """
+    workers = poolSize(workers)
+    if workers == 1 or len(tasks) == 1:
+        return [worker(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(worker, tasks))
+
+# ===========================================================================
+# Workers (module level, picklable):
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def _loadBoa(task):
+    """ Monte Boa of a worker: kernels, default frames/bodies and sc name """
+    import Monte as M
+    import mpy.io.data as defaultData
+    boa = M.BoaLoad()
+    for boaFile in task['boaFiles']:
+        boa.load(boaFile)
+    defaultData.loadInto(boa, task.get('boaData') or ["frame", "body"])
+    if task.get('scID') is not None:
+        M.SpiceName.bodyInsert(task['scID'], task['scName'])
+    return boa
+
+# ----------------------------------------------------------------------------
+def _dvDiscChunk(task):
+    """ DV discontinuities on one chunk -> ([(et, event)], etHist, dvHist) """
+    aa, bb = task['interval']
+    if task['native']:
+        query = spkE.SpkQuery(task['bspFiles'], task['body'], task['center'], task['frame'])
+        stream = scanU.blockStream(query, aa, bb, task['dt'])
+    else:
+        import Monte as M
+        from mpy.units import sec
+        boa = _loadBoa(task)
+        query = M.TrajQuery(boa, task['scName'], task['center'], task['frame'])
+        stream = scanU.stateStream(query.state, spkE.et2epoch(aa), spkE.et2epoch(bb),
+                                   task['dt']*sec)
+    hist = scanH.DvHistory(task['historyFile']) if task['historyFile'] else None
+    dvDetector = scanU.DvDiscDetector(task['minDv'], task['center'], task['frame'],
+                                      keepHistory=bool(task['history']), history=hist)
+    scanU.scanStream(stream, [dvDetector])
+
+    # chunk owns the steps starting in [aa, bb) (detector: step start epochs)
+    toET = lambda ep: ep if isinstance(ep, float) else spkE.epoch2et(ep)
+    for ev in dvDetector.events:
+        ev['interval'] = task['window']
+    events = [(toET(ep), ev) for ep, ev in zip(dvDetector.eventEpochs, dvDetector.events)]
+    if hist is not None:
+        # history on disk (part file of the chunk)
+        hist.close()
+        return events, None, None
+    etHist = np.array([toET(ep) for ep in dvDetector.epochs])
+    return events, etHist, np.array(dvDetector.dvMag)
+
+# ----------------------------------------------------------------------------
+def _apsisChunk(task):
+    """ Apsides on one chunk (Monte ApsisEvent) -> [(et, event)]
+
+    Search on the chunk extended by one step on both sides (inside its
+    coverage window), keep the events in [a, b) ([a, b] on the last chunk
+    of the window). Optional altitude filters:
+    value < maxAlt, and/or altitude wrt altBody > minAltBody (periNoFB).
+    """
+    import Monte as M
+    from mpy.units import sec, km
+    aa, bb = task['interval']
+    boa = _loadBoa(task)
+    apsisType = M.ApsisEvent.PERIAPSIS if task['apsis'] == 'Peri' else M.ApsisEvent.APOAPSIS
+    ev = M.ApsisEvent(M.TrajQuery(boa, task['scName'], task['center']), apsisType)
+    step = task['step']
+    t0 = spkE.et2epoch(max(aa - step, task['searchInterval'][0]))
+    tf = spkE.et2epoch(min(bb + step, task['searchInterval'][1]))
+    found = ev.search(M.TimeInterval(t0, tf), step*sec)
+
+    if task.get('altBody'):
+        altQuery = M.TrajQuery(boa, task['scName'], task['altBody'])
+    events = []
+    for pp in found:
+        et = spkE.epoch2et(pp.time())
+        if et < aa or et > bb or (et == bb and not task['last']):
+            continue
+        if task.get('maxAlt') is not None and pp.value() >= task['maxAlt']*km:
+            continue
+        if task.get('altBody'):
+            alt = altQuery.state(pp.time(), task['frame'], 3).posMag()
+            if alt <= task['minAltBody']*km:
+                continue
+        events.append((et, {'time' : str(pp.time()),
+                            'value': str(pp.value()),
+                            'center' : task['eventCenter'],
+                            'frame' : task['frame'],
+                            'eventType' : task['eventType'],
+                            'interval' : task['window'],
+                            }))
+    return events
+
+# ===========================================================================
+# Parallel Scans:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def dvDiscParallel(bspFiles, body, center, frame, t0, tf, dt, minDv, numWorkers=0,
+                   native=True, boaFiles=None, boaData=None, scName=None, history=False,
+                   windows=None):
+    """ Parallel DV discontinuity sweep (same events as DvDiscDetector serial).
+
+    = INPUT VARIABLES
+    - bspFiles     SPK kernel(s) (native), also loaded in the Boa if Monte
+    - body         SPICE ID
+    - center       center name, frame  'EME2000'/'EMO2000' (native)
+    - t0, tf, dt   ET sec
+    - minDv        min. DV [km/s]
+    - numWorkers   processes (0: all cores)
+    - native       SpkEphem (True) or Monte TrajQuery per worker (False)
+    - boaFiles     extra Boa files (Monte)
+    - boaData      mpy.io.data entries loaded in the Boa (default: frame, body)
+    - scName       sc name inserted for body (Monte)
+    - history      return the |DV| history as well: True (arrays), or a
+                   base file name (scanHistory.DvHistory on disk, chunk
+                   parts merged in order)
+    - windows      coverage windows [[a, b], ...] [ET sec] scanned inside
+                   [t0, tf] (gaps skipped). Default: [[t0, tf]]
+
+    = RETURN VALUE
+    - list of dvDisc events (dvDiscEvents_out.json entries), time ordered,
+      'interval': index of the coverage window
+    - if history: (events, etHist, dvHist), or (events, DvHistory) if a
+      history file is given
+    """
+    histFile = history if isinstance(history, str) else None
+    if isinstance(bspFiles, str):
+        bspFiles = [bspFiles]
+    workers = poolSize(numWorkers)
+    windows = scanU.clipWindows(windows or [[t0, tf]], t0, tf)
+    chunks = windowChunks(windows, workers*CHUNKS_PER_WORKER, dt)
+    tasks = [{'interval' : chunk,
+              'window' : ii,
+              'native' : native,
+              'bspFiles' : bspFiles,
+              'boaFiles' : list(boaFiles or []) + list(bspFiles),
+              'boaData' : boaData,
+              'scID' : body if scName else None,
+              'scName' : scName,
+              'body' : body,
+              'center' : center,
+              'frame' : frame,
+              'dt' : dt,
+              'minDv' : minDv,
+              'history' : history,
+              'historyFile' : histFile + '_part' + str(kk) if histFile else None,
+              } for kk, (ii, chunk, last) in enumerate(chunks)]
+    results = runChunks(_dvDiscChunk, tasks, workers)
+
+    events = [ev for et, ev in mergeEvents([res[0] for res in results])]
+    if not history:
+        return events
+    if histFile:
+        hist = scanH.DvHistory(histFile)
+        for task in tasks:
+            part = scanH.DvHistory(task['historyFile'], append=True)
+            hist.appendHistory(part)
+            part.remove()
+        hist.flush()
+        return events, hist
+    # seams: the shared epoch has no step in the previous chunk
+    etHist = np.concatenate([res[1] for res in results])
+    dvHist = np.concatenate([res[2] for res in results])
+    return events, etHist, dvHist
+
+# ----------------------------------------------------------------------------
+def apsisParallel(boaFiles, scID, scName, center, apsis, t0, tf, step, numWorkers=0,
+                  frame='EMO2000', eventCenter=None, eventType=None, maxAlt=None,
+                  altBody=None, minAltBody=None, boaData=None, windows=None):
+    """ Parallel Monte ApsisEvent search (scanBSP searchBodies entries).
+
+    = INPUT VARIABLES
+    - boaFiles        Boa files (trajectory bsp, planets, satellites)
+    - scID, scName    sc SPICE ID and name
+    - center          apsis center body
+    - apsis           'Peri' or 'Apo'
+    - t0, tf, step    ET sec
+    - maxAlt          keep apsides with value < maxAlt [km]
+    - altBody         keep apsides far from altBody: altitude > minAltBody [km]
+    - eventCenter, eventType   written to the events (default: center, apsis)
+    - boaData         mpy.io.data entries loaded in the Boa (default: frame, body)
+    - windows         coverage windows [[a, b], ...] [ET sec] searched inside
+                      [t0, tf] (gaps skipped). Default: [[t0, tf]]
+
+    = RETURN VALUE
+    - list of events, as in scanBSP (*Events_out.json entries), time ordered,
+      'interval': index of the coverage window
+    """
+    workers = poolSize(numWorkers)
+    windows = scanU.clipWindows(windows or [[t0, tf]], t0, tf)
+    chunks = windowChunks(windows, workers*CHUNKS_PER_WORKER)
+    tasks = [{'interval' : chunk,
+              'window' : ii,
+              'last' : last,
+              'searchInterval' : windows[ii],
+              'boaFiles' : list(boaFiles),
+              'boaData' : boaData,
+              'scID' : scID,
+              'scName' : scName,
+              'center' : center,
+              'apsis' : apsis,
+              'step' : step,
+              'frame' : frame,
+              'eventCenter' : eventCenter or center,
+              'eventType' : eventType or apsis,
+              'maxAlt' : maxAlt,
+              'altBody' : altBody,
+              'minAltBody' : minAltBody,
+              } for ii, chunk, last in chunks]
+    results = runChunks(_apsisChunk, tasks, workers)
+    return [ev for et, ev in mergeEvents(results)]
@@ -0,0 +1,864 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" BSP scanning utilities (maneuver detection on SPK kernels).
+
+State stream: lazy (epoch, state) generator, each epoch evaluated once, fed
+through a sliding window to pluggable detectors (e.g. DV discontinuities):
+
+    >>> querySat = TrajQuery(boa, 'mySC', 'Moon', 'EMO2000')
+    >>> dvDetector = scanU.DvDiscDetector(0.02, 'Moon', 'EMO2000')
+    >>> scanU.scanStream(scanU.stateStream(querySat.state, t0, tf, 10*sec), [dvDetector])
+    >>> dvDetector.events
+
+Boundary-driven DV discontinuity search: impulsive maneuvers of Monte and
+Copernicus kernels show up at segment boundaries, or at the record boundaries
+inside a segment. Left and right limits of the states are compared only at
+those epochs, instead of sweeping the whole span with a fixed step:
+
+    >>> import monteCop.utils.spkEphem as spkE
+    >>> import monteCop.utils.scanUtils as scanU
+    >>> eph = spkE.SpkEphem('gen_LLO_to_NRHO_imp_BSP.bsp')
+    >>> events = scanU.findDvBoundaries(eph, -30100, t0_et, tf_et, 0.02, frame='EMO2000')
+
+Apsis search with a conic predictor: the osculating conic at each apsis
+predicts the next one, checked on a small bracket (sweep fallback):
+
+    >>> apsides = scanU.findApsides(query.states, t0_et, tf_et, scanU.bodyGM['Enceladus'], 'Peri', 8640.0)
+
+Flyby periapses: a coarse pass of the range gates the search to the
+windows below the altitude threshold (rangeWindows, gatedApsides).
+
+Gapped kernels (merged kernels) are scanned per coverage window, see
+coverageWindows and scanIntervals: events carry the window index 'interval'.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+from collections import deque
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+from monteCop.utils.spkReader import et2epochStr
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Min. ratio |DV| / prediction error, record boundaries of types 5/9/13
+DV_BOUNDARY_SNR = 10.0
+
+# Coarse-to-fine DV search: coarse threshold = DV_COARSE_RELAX*minDv
+DV_COARSE_RELAX = 0.5
+
+# Apsis finder: predicted apsis bracket half-width [fraction of the osculating period]
+APSIS_BRACKET = 0.02
+
+# Apsis finder: prediction used if the conic position error at the bracket ends is
+# below APSIS_PREDICT_TOL*a*e (a*e: radial amplitude of the conic)
+APSIS_PREDICT_TOL = 0.5
+
+# Apsis finder sweep (fallback): max. step = osculating period/APSIS_PERIOD_STEPS,
+# APSIS_SWEEP_BLOCK epochs per states call
+APSIS_PERIOD_STEPS = 16
+APSIS_SWEEP_BLOCK = 32
+
+# Point mass GM [km^3/s^2] (DE430, sat375, jup310)
+bodyGM = {
+    'Sun'       : 132712440041.9394,
+    'Mercury'   : 22031.78,
+    'Venus'     : 324858.592,
+    'Earth'     : 398600.435436,
+    'Moon'      : 4902.800066,
+    'Mars'      : 42828.375214,
+    'Jupiter'   : 126686531.9,
+    'Io'        : 5959.916,
+    'Europa'    : 3202.739,
+    'Ganymede'  : 9887.834,
+    'Callisto'  : 7179.289,
+    'Saturn'    : 37931206.2,
+    'Enceladus' : 7.211292,
+    'Dione'     : 73.116,
+    'Rhea'      : 153.94,
+    'Titan'     : 8978.14,
+}
+
+# Sphere of influence [km] (Laplace: a*(GM/GMprimary)^0.4)
+bodySOI = {
+    'Mercury'   : 1.12e5,
+    'Venus'     : 6.16e5,
+    'Earth'     : 9.25e5,
+    'Moon'      : 6.61e4,
+    'Mars'      : 5.77e5,
+    'Jupiter'   : 4.82e7,
+    'Io'        : 7.84e3,
+    'Europa'    : 9.73e3,
+    'Ganymede'  : 2.41e4,
+    'Callisto'  : 3.78e4,
+    'Saturn'    : 5.48e7,
+    'Enceladus' : 4.88e2,
+    'Dione'     : 3.54e3,
+    'Rhea'      : 6.22e3,
+    'Titan'     : 4.34e4,
+}
+
+# ===========================================================================
+# State Stream:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def stateStream(stateFunc, t0, tf, dt):
+    """ Lazy stream of (epoch, state) on the grid t0, t0+dt, ... <= tf
+        (same grid as Epoch.range), each epoch evaluated once.
+
+    = INPUT VARIABLES
+    - stateFunc    state at one epoch (e.g. TrajQuery(...).state)
+    - t0, tf, dt   Monte Epochs and Duration, or ET sec floats
+    """
+    ii = 0
+    tt = t0
+    while tt <= tf:
+        yield tt, stateFunc(tt)
+        ii += 1
+        tt = t0 + ii*dt
+
+# ----------------------------------------------------------------------------
+def blockStream(query, t0, tf, dt, blockSize=100000):
+    """ Lazy stream of (et, state) from SpkQuery.blocks (vectorized by blocks)
+
+    = INPUT VARIABLES
+    - query        spkEphem.SpkQuery, or list of queries (e.g. one per
+                   center): states stacked as (numQueries,6)
+    - t0, tf, dt   ET sec
+    """
+    if isinstance(query, (list, tuple)):
+        blocks = (_stackBlocks(blks) for blks in
+                  zip(*[qq.blocks(t0, tf, dt, blockSize) for qq in query]))
+    else:
+        blocks = query.blocks(t0, tf, dt, blockSize)
+    first = True
+    for etBlk, stBlk in blocks:
+        # blocks share their boundary epoch
+        i0 = 0 if first else 1
+        first = False
+        for ii in range(i0, etBlk.size):
+            yield float(etBlk[ii]), stBlk[ii]
+
+# ----------------------------------------------------------------------------
+def _stackBlocks(blocks):
+    """ (etBlk, stBlk) of several queries -> (etBlk, (n,numQueries,6)) """
+    return blocks[0][0], np.stack([stBlk for etBlk, stBlk in blocks], axis=1)
+
+# ----------------------------------------------------------------------------
+def multiStateFunc(stateFuncs):
+    """ state function of several queries (e.g. TrajQuery(...).state of one
+        sc wrt several centers): epoch -> (numQueries,6) array
+    """
+    def statesFunc(epoch):
+        return np.array([stateArray(func(epoch)) for func in stateFuncs])
+    return statesFunc
+
+# ----------------------------------------------------------------------------
+def slidingWindow(stream, size=2):
+    """ Windows (tuples) of the last size items of stream """
+    window = deque(maxlen=size)
+    for item in stream:
+        window.append(item)
+        if len(window) == size:
+            yield tuple(window)
+
+# ----------------------------------------------------------------------------
+def scanStream(stream, detectors):
+    """ Feed the (epoch, state) stream to detectors, in a single pass
+
+    = RETURN VALUE
+    - detectors (events in detector.events)
+    """
+    size = max(det.windowSize for det in detectors)
+    for window in slidingWindow(stream, size):
+        for det in detectors:
+            det.update(window)
+    for det in detectors:
+        det.finish()
+    return detectors
+
+# ----------------------------------------------------------------------------
+def scanIntervals(streamFunc, windows, detectors, resume=None):
+    """ scanStream over each coverage window (no step across the gaps)
+
+    = INPUT VARIABLES
+    - streamFunc   (t0, tf) [ET sec] -> (epoch, state) stream on the window
+    - windows      coverage windows [[t0, tf], ...] (see coverageWindows)
+    - detectors    StreamDetectors, events annotated with 'interval' (window index)
+    - resume       (window index, ET sec): restart a scan there (earlier
+                   windows skipped, see scanCheckpoint)
+    """
+    size = max(det.windowSize for det in detectors)
+    for ii, (aa, bb) in enumerate(windows):
+        if resume is not None:
+            if ii < resume[0]:
+                continue
+            if ii == resume[0]:
+                aa = resume[1]
+        numEvents = [len(det.events) for det in detectors]
+        for window in slidingWindow(streamFunc(aa, bb), size):
+            for det in detectors:
+                det.update(window)
+        for det, n0 in zip(detectors, numEvents):
+            for ev in det.events[n0:]:
+                ev['interval'] = ii
+    for det in detectors:
+        det.finish()
+    return detectors
+
+# ----------------------------------------------------------------------------
+def stateArray(state):
+    """ (6,) array of a Monte State (or state array) [km, km/s] """
+    if isinstance(state, np.ndarray):
+        return state
+    pos = state.pos()
+    vel = state.vel()
+    return np.array([pos[0], pos[1], pos[2], vel[0], vel[1], vel[2]])
+
+# ----------------------------------------------------------------------------
+def _velocity(state):
+    """ velocity (3,) of a Monte State or of an (6,) state array """
+    if isinstance(state, np.ndarray):
+        return state[3:]
+    vel = state.vel()
+    return np.array([vel[0], vel[1], vel[2]])
+
+# ----------------------------------------------------------------------------
+def _epochStr(epoch):
+    """ Monte Epoch string of an Epoch or ET sec """
+    if isinstance(epoch, (float, int, np.floating)):
+        return et2epochStr(epoch)
+    return str(epoch)
+
+# ===========================================================================
+# Detectors:
+# ===========================================================================
+
+class StreamDetector(object):
+    """ Detector of events on a state stream (see scanStream).
+
+    update() is called with every window of the last windowSize
+    (epoch, state) pairs, events are appended to self.events.
+    """
+    windowSize = 2
+
+    def __init__(self):
+        self.events = []
+
+    def update(self, window):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class DvDiscDetector(StreamDetector):
+    """ Velocity discontinuities: |v(t+dt)-v(t)| > minDv.
+        Events as dvDiscEvents_out.json entries (time = t).
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, minDv, center, frame, keepHistory=True, history=None):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - minDv         min. DV magnitude [km/s]
+        - center        center name (output only, as the stream states)
+        - frame         frame name (output only)
+        - keepHistory   keep the epochs and |DV| of every step (plots)
+        - history       scanHistory.DvHistory: |DV| of every step streamed
+                        to disk instead of the in-memory lists
+        """
+        StreamDetector.__init__(self)
+        self.minDv = minDv
+        self.center = center
+        self.frame = frame
+        self.keepHistory = keepHistory and history is None
+        self.history = history
+        self.epochs = []
+        self.dvMag = []
+        self.eventEpochs = []
+        self.dvTot = 0.0
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        (t1, s1), (t2, s2) = window[-2:]
+        self._record(t1, _velocity(s2) - _velocity(s1), self.center)
+
+    #-----------------------------------------------------------------------
+    def _record(self, t1, dv, center):
+        """ history sample and event of the step starting at t1 """
+        dvMag = float(np.linalg.norm(dv))
+        if self.history is not None:
+            self.history.append(t1, dvMag)
+        elif self.keepHistory:
+            self.epochs.append(t1)
+            self.dvMag.append(dvMag)
+        if dvMag > self.minDv:
+            self.events.append(dvDiscEvent(t1, dv, center, self.frame))
+            self.eventEpochs.append(t1)
+            self.dvTot += dvMag
+
+    #-----------------------------------------------------------------------
+    def finish(self):
+        if self.history is not None:
+            self.history.flush()
+
+
+class GravDvDiscDetector(DvDiscDetector):
+    """ Gravity-compensated velocity discontinuities, center by SOI.
+
+    Stream states: (numBodies,6) states of the sc wrt each of bodies (see
+    multiStateFunc, or blockStream with a list of queries). On each step:
+      - center: body of smallest SOI containing the sc at t (else the body
+        of largest SOI, the primary). Bodies without states (NaN) are skipped
+      - DV = v(t+dt) - two-body prediction wrt center (prop2b), minus the
+        velocity change due to the other bodies (third-body point masses,
+        trapezoid over the step)
+    Natural acceleration is removed, so coarse steps near periapsis do not
+    produce fictitious DVs. Event center is the SOI center of the step.
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, minDv, bodies, frame, dt, gm=None, soi=None, keepHistory=True,
+                 history=None):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - minDv         min. DV magnitude [km/s]
+        - bodies        body names, in the order of the stream states
+        - frame         frame name (output only)
+        - dt            stream step [sec]
+        - gm, soi       {body: GM [km^3/s^2]}, {body: SOI [km]}
+                        (default: bodyGM, bodySOI)
+        - keepHistory, history   as DvDiscDetector
+        """
+        DvDiscDetector.__init__(self, minDv, None, frame, keepHistory, history)
+        gm = gm or bodyGM
+        soi = soi or bodySOI
+        self.bodies = list(bodies)
+        self.dt = float(dt)
+        self.gm = np.array([gm[bb] for bb in self.bodies])
+        self.soi = np.array([soi.get(bb, np.inf) for bb in self.bodies])
+        self.primary = int(np.argmax(self.soi))
+
+    #-----------------------------------------------------------------------
+    def _center(self, states):
+        """ index of the SOI center of the sc """
+        return soiCenter(states, self.soi, self.primary)
+
+    #-----------------------------------------------------------------------
+    def _thirdBodyAcc(self, states, cc):
+        """ acceleration wrt center cc due to the other bodies (point masses) """
+        acc = np.zeros(3)
+        for bb in range(len(self.bodies)):
+            if bb == cc or np.isnan(states[bb, 0]):
+                continue
+            rScB = states[bb, :3]                        # sc wrt body
+            rCB = states[bb, :3] - states[cc, :3]        # center wrt body
+            acc -= self.gm[bb]*(rScB/np.linalg.norm(rScB)**3 - rCB/np.linalg.norm(rCB)**3)
+        return acc
+
+    #-----------------------------------------------------------------------
+    def update(self, window):
+        (t1, s1), (t2, s2) = window[-2:]
+        cc = self._center(s1)
+        pred = spkE.prop2b(self.gm[cc], s1[cc:cc+1], np.array([self.dt]))[0]
+        dv = (s2[cc, 3:] - pred[3:]
+              - 0.5*self.dt*(self._thirdBodyAcc(s1, cc) + self._thirdBodyAcc(s2, cc)))
+        self._record(t1, dv, self.bodies[cc])
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def soiCenter(states, soi, primary=0):
+    """ SOI center of the sc: index of the body of smallest SOI containing it
+
+    = INPUT VARIABLES
+    - states     (numBodies,6) sc states wrt the bodies (nan: no data)
+    - soi        (numBodies,) SOI radius [km] (inf: primary)
+    - primary    index used when no body has states
+    """
+    rr = np.linalg.norm(states[:, :3], axis=1)
+    inside = np.nonzero(rr < soi)[0]
+    if inside.size == 0:
+        # primary (largest SOI of the bodies with states)
+        valid = np.nonzero(~np.isnan(rr))[0]
+        return int(valid[np.argmax(soi[valid])]) if valid.size else primary
+    return int(inside[np.argmin(soi[inside])])
+
+# ----------------------------------------------------------------------------
+def clipWindows(windows, t0=None, tf=None):
+    """ windows [[a, b], ...] clipped to [t0, tf], empty ones removed """
+    t0 = -np.inf if t0 is None else t0
+    tf = np.inf if tf is None else tf
+    return [[max(aa, t0), min(bb, tf)] for aa, bb in windows if min(bb, tf) > max(aa, t0)]
+
+# ----------------------------------------------------------------------------
+def coverageWindows(ephem, body, t0=None, tf=None):
+    """ Coverage windows of body in [t0, tf] [ET sec] (gaps excluded)
+
+    = INPUT VARIABLES
+    - ephem      SpkEphem, or SPK kernel / list of kernels
+    - body       SPICE ID or name
+    """
+    if not isinstance(ephem, spkE.SpkEphem):
+        ephem = spkE.SpkEphem(ephem)
+    return clipWindows(ephem.coverage(body), t0, tf)
+
+# ----------------------------------------------------------------------------
+def activePieces(ephem, body, t0, tf):
+    """ Time pieces of [t0, tf] and the segment used there (SPICE priority)
+
+    = RETURN VALUE
+    - list of (seg, a, b), sorted by a
+    """
+    claimed = []
+    pieces = []
+    for seg in ephem.segmentsFor(body):
+        free = [[max(t0, seg.t0), min(tf, seg.tf)]]
+        for c0, c1 in claimed:
+            cut = []
+            for a, b in free:
+                if c1 <= a or c0 >= b:
+                    cut.append([a, b])
+                    continue
+                if a < c0:
+                    cut.append([a, c0])
+                if c1 < b:
+                    cut.append([c1, b])
+            free = cut
+        for a, b in free:
+            if b > a:
+                pieces.append((seg, a, b))
+                claimed.append([a, b])
+    return sorted(pieces, key=lambda pp: pp[1])
+
+# ----------------------------------------------------------------------------
+def _toJ2000(seg, states):
+    """ segment states (seg.frame) -> EME2000 """
+    if seg.frame == 1:
+        return states
+    if seg.frame not in spkE.frameRotToJ2000:
+        raise NotImplementedError('SPK frame ID ' + str(seg.frame) + ' not supported')
+    return spkE.rotateStates(states, spkE.frameRotToJ2000[seg.frame])
+
+# ----------------------------------------------------------------------------
+def findDvBoundaries(ephem, body, t0, tf, minDv, frame='EME2000', dtSweep=None,
+                     snr=DV_BOUNDARY_SNR):
+    """ Velocity discontinuities of body at SPK segment and record boundaries.
+
+    Candidate epochs are read from the segment summaries and the record
+    epochs (see spkEphem.segmentLimits), the DV is the difference between the
+    right and left limits of the velocity there. Pieces of a segment without
+    record boundaries in [t0, tf] are swept with step dtSweep instead (if
+    given), as done by the brute-force search.
+
+    = INPUT VARIABLES
+    - ephem      SpkEphem (or SPK kernel / list of kernels)
+    - body       SPICE ID or name
+    - t0, tf     search interval [ET sec]
+    - minDv      min. DV magnitude [km/s]
+    - frame      DV frame: 'EME2000' or 'EMO2000'
+    - dtSweep    sweep step [sec] of pieces without boundaries (None: no sweep)
+    - snr        min. ratio DV/prediction error (types 5/9/13 records)
+
+    = RETURN VALUE
+    - list of events, sorted by epoch:
+        {'et': epoch [ET sec], 'dv': (3,) DV [km/s], 'dv_mag': |DV|,
+         'source': 'segment', 'record' or 'sweep'}
+    """
+    if not isinstance(ephem, spkE.SpkEphem):
+        ephem = spkE.SpkEphem(ephem)
+    rotOut = spkE.frameRotToJ2000[spkE.passFrameID(frame)].T
+
+    events = []
+    def addEvents(etArr, dvArr, source, tol=None):
+        dvArr = dvArr @ rotOut.T
+        dvMag = np.linalg.norm(dvArr, axis=1)
+        found = dvMag > minDv
+        if tol is not None:
+            found &= dvMag > snr*tol
+        for kk in np.nonzero(found)[0]:
+            events.append({'et' : float(etArr[kk]),
+                           'dv' : dvArr[kk],
+                           'dv_mag' : float(dvMag[kk]),
+                           'source' : source,
+                           })
+
+    pieces = activePieces(ephem, body, t0, tf)
+
+    # Segment boundaries: contiguous pieces of different segments
+    for (segL, aL, bL), (segR, aR, bR) in zip(pieces[:-1], pieces[1:]):
+        if segL is segR or bL != aR:
+            continue
+        tb = np.array([aR])
+        left = _toJ2000(segL, spkE.evalSegment(segL, tb))
+        right = _toJ2000(segR, spkE.evalSegment(segR, tb))
+        if segL.center != segR.center:
+            left = left + ephem.states(segL.center, segR.center, tb)
+            if np.isnan(left).any():
+                print('  WARNING: no ephemeris of ' + str(segL.center) + ' wrt '
+                      + str(segR.center) + ', skipping boundary at ' + et2epochStr(aR))
+                continue
+        addEvents(tb, right[:, 3:] - left[:, 3:], 'segment')
+
+    # Record boundaries (or sweep) inside each piece
+    for seg, aa, bb in pieces:
+        etArr, left, right, tol = spkE.segmentLimits(seg, aa, bb)
+        if etArr.size:
+            dvArr = _toJ2000(seg, right)[:, 3:] - _toJ2000(seg, left)[:, 3:]
+            addEvents(etArr, dvArr, 'record', tol)
+        elif dtSweep:
+            etArr = spkE.epochGrid(aa, bb, dtSweep)
+            if etArr.size < 2:
+                continue
+            vel = _toJ2000(seg, spkE.evalSegment(seg, etArr))[:, 3:]
+            addEvents(etArr[:-1], vel[1:] - vel[:-1], 'sweep')
+
+    return sorted(events, key=lambda ev: ev['et'])
+
+# ----------------------------------------------------------------------------
+def trajQueryStates(query):
+    """ states function (ET sec array -> (N,6) array) from a Monte TrajQuery,
+        to run the scans of this module on a Monte boa
+    """
+    def statesFunc(etArr):
+        out = np.empty((len(etArr), 6))
+        for ii, et in enumerate(etArr):
+            st = query.state(spkE.et2epoch(et))
+            out[ii, :3] = [st.pos()[0], st.pos()[1], st.pos()[2]]
+            out[ii, 3:] = [st.vel()[0], st.vel()[1], st.vel()[2]]
+        return out
+    return statesFunc
+
+# ----------------------------------------------------------------------------
+def findDvCoarseFine(statesFunc, t0, tf, minDv, dtCoarse=600.0, dtFine=1.0,
+                     relax=DV_COARSE_RELAX):
+    """ Coarse-to-fine DV discontinuity search.
+
+    A coarse sweep (step dtCoarse) flags the windows whose velocity change,
+    corrected by the gravity acceleration at both ends (one-sided differences
+    of step dtFine, outside the window; inside it at t0 and tf: the stencil
+    never leaves [t0, tf]), is above relax*minDv. Each window is
+    then bisected, keeping the half with the largest corrected change, down to
+    a step <= dtFine, and snapped to the step of the fine sweep grid
+    t0 + k*dtFine holding the discontinuity. The DV is v(t+dtFine)-v(t) on
+    that step, as in the fine sweep, which costs (tf-t0)/dtFine evaluations
+    instead of about 3*(tf-t0)/dtCoarse + 3*log2(dtCoarse/dtFine) per window.
+
+    = INPUT VARIABLES
+    - statesFunc   function of an ET array [sec] -> (N,6) states [km, km/s]
+                   (e.g. SpkQuery.states, or trajQueryStates(TrajQuery))
+    - t0, tf       search interval [ET sec]
+    - minDv        min. DV magnitude [km/s]
+    - dtCoarse     coarse sweep step [sec]
+    - dtFine       refinement tolerance [sec] (step of the equivalent sweep)
+    - relax        coarse threshold factor
+
+    = RETURN VALUE
+    - list of events, sorted by epoch:
+        {'et': fine step start t0 + k*dtFine [ET sec], 'dv': (3,) DV [km/s],
+         'dv_mag': |DV|, 'source': 'coarseFine'}
+    """
+    def velAcc(etArr):
+        """ velocity at etArr, and accelerations before/after each epoch
+            (stencil clamped to [t0, tf]: the other side at the ends)
+        """
+        etArr = np.asarray(etArr, dtype=float)
+        etL = np.maximum(etArr - dtFine, t0)
+        etR = np.minimum(etArr + dtFine, tf)
+        vel = statesFunc(np.concatenate((etL, etArr, etR)))[:, 3:]
+        vel = vel.reshape(3, etArr.size, 3)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            accL = (vel[1] - vel[0])/(etArr - etL)[:, None]
+            accR = (vel[2] - vel[1])/(etR - etArr)[:, None]
+        accL = np.where((etArr > etL)[:, None], accL, accR)
+        accR = np.where((etR > etArr)[:, None], accR, accL)
+        return vel[1], accL, accR
+
+    def residual(vA, accA, vB, accB, length):
+        """ velocity change over [a, b] not explained by gravity (trapezoid) """
+        return vB - vA - 0.5*length*(accA + accB)
+
+    # Coarse sweep:
+    etGrid = spkE.epochGrid(t0, tf, dtCoarse)
+    if etGrid[-1] < tf:
+        etGrid = np.append(etGrid, tf)
+    vel, accL, accR = velAcc(etGrid)
+    res = residual(vel[:-1], accR[:-1], vel[1:], accL[1:], np.diff(etGrid)[:, None])
+    flagged = np.nonzero(np.linalg.norm(res, axis=1) > relax*minDv)[0]
+
+    # Refinement (bisection):
+    events = []
+    for kk in flagged:
+        aa, bb = etGrid[kk], etGrid[kk+1]
+        vA, aA, vB, aB = vel[kk], accR[kk], vel[kk+1], accL[kk+1]
+        while bb - aa > dtFine:
+            mm = 0.5*(aa + bb)
+            vM, aML, aMR = [xx[0] for xx in velAcc([mm])]
+            resL = residual(vA, aA, vM, aML, mm - aa)
+            resR = residual(vM, aMR, vB, aB, bb - mm)
+            if np.linalg.norm(resL) >= np.linalg.norm(resR):
+                bb, vB, aB = mm, vM, aML
+            else:
+                aa, vA, aA = mm, vM, aMR
+        # fine grid step holding the discontinuity (a grid node inside [aa, bb]: split there)
+        step = int(np.floor((aa - t0)/dtFine))
+        node = t0 + (step + 1)*dtFine
+        if node < bb:
+            vM, aML, aMR = [xx[0] for xx in velAcc([node])]
+            resL = residual(vA, aA, vM, aML, node - aa)
+            resR = residual(vM, aMR, vB, aB, bb - node)
+            if np.linalg.norm(resL) < np.linalg.norm(resR):
+                step += 1
+        g0 = t0 + step*dtFine
+        g1 = min(g0 + dtFine, tf)
+        vel01 = statesFunc(np.array([g0, g1]))[:, 3:]
+        dv = vel01[1] - vel01[0]
+        if np.linalg.norm(dv) > minDv:
+            events.append({'et' : float(g0),
+                           'dv' : dv,
+                           'dv_mag' : float(np.linalg.norm(dv)),
+                           'source' : 'coarseFine',
+                           })
+    return events
+
+# ----------------------------------------------------------------------------
+def conicApsisTime(gm, state, apsis='Peri'):
+    """ Time to the next apsis of the osculating conic
+
+    = INPUT VARIABLES
+    - gm        gravitational parameter of the center [km^3/s^2]
+    - state     (6,) state wrt the center [km, km/s]
+    - apsis     'Peri' or 'Apo'
+
+    = RETURN VALUE
+    - (dtNext [sec], period [sec], a*e [km]): period = inf on open conics,
+      dtNext = None if there is no next apsis (open conic past periapsis,
+      apoapsis of an open conic, circular orbit, no state)
+    """
+    rr, vv = state[:3], state[3:]
+    rMag = np.linalg.norm(rr)
+    rdv = np.dot(rr, vv)
+    energy = 0.5*np.dot(vv, vv) - gm/rMag
+    ecc = np.linalg.norm(np.cross(vv, np.cross(rr, vv))/gm - rr/rMag)
+    if not np.isfinite(energy) or ecc < 1e-8 or energy == 0.0:
+        return None, np.inf, 0.0
+    sma = 0.5*gm/abs(energy)
+    if energy < 0.0:
+        nn = np.sqrt(gm/sma**3)
+        eccAnom = np.arctan2(rdv/np.sqrt(gm*sma)/ecc, (1.0 - rMag/sma)/ecc)
+        meanAnom = eccAnom - ecc*np.sin(eccAnom)
+        target = 0.0 if apsis == 'Peri' else np.pi
+        return ((target - meanAnom) % (2*np.pi))/nn, 2*np.pi/nn, sma*ecc
+    if apsis != 'Peri' or rdv >= 0.0:
+        return None, np.inf, sma*ecc
+    sinhH = rdv/np.sqrt(gm*sma)/ecc
+    return -(ecc*sinhH - np.arcsinh(sinhH))/np.sqrt(gm/sma**3), np.inf, sma*ecc
+
+# ----------------------------------------------------------------------------
+def findApsides(statesFunc, t0, tf, gm, apsis='Peri', searchStep=None, tol=1e-3,
+                bracket=APSIS_BRACKET):
+    """ Apsis search with a conic predictor.
+
+    The osculating conic at each apsis found (and at t0) predicts the epoch
+    of the next one: only a bracket of +-bracket*period around it is checked
+    for the r.v sign change, if the conic still matches the states at the
+    bracket ends (APSIS_PREDICT_TOL). When the prediction fails (strong
+    perturbations, flybys, open conics), r.v is swept from the last apsis with the step
+    min(searchStep, period/APSIS_PERIOD_STEPS) until the sign change. Roots
+    are refined by regula falsi (Illinois) to tol. The cost scales with the
+    number of apsides, not with (tf-t0)/searchStep.
+
+    = INPUT VARIABLES
+    - statesFunc   function of an ET array [sec] -> (N,6) states wrt the
+                   apsis center (e.g. SpkQuery.states, or trajQueryStates)
+    - t0, tf       search interval [ET sec]
+    - gm           gravitational parameter of the center [km^3/s^2] (bodyGM)
+    - apsis        'Peri' or 'Apo'
+    - searchStep   max. sweep step [sec] (None: period based only)
+    - tol          apsis epoch tolerance [sec]
+    - bracket      predicted bracket half-width [fraction of the period]
+
+    = RETURN VALUE
+    - list of apsides, sorted by epoch:
+        {'et': [ET sec], 'range': [km], 'source': 'predict' or 'sweep'}
+    """
+    sign = 1.0 if apsis == 'Peri' else -1.0
+
+    def rDot(etArr):
+        """ sign*r.v (goes from - to + at the apsis), and the states """
+        states = statesFunc(np.asarray(etArr, dtype=float))
+        return sign*np.einsum('ij,ij->i', states[:, :3], states[:, 3:]), states
+
+    def refine(aa, fa, bb, fb, sb):
+        """ root of rDot in [aa, bb]: (et, state at the bracket end after it) """
+        side = 0
+        while bb - aa > tol:
+            cc = (aa*fb - bb*fa)/(fb - fa)
+            cc = min(max(cc, aa + 0.5*tol), bb - 0.5*tol)
+            fc, sc = rDot([cc])
+            if fc[0] < 0.0:
+                aa, fa = cc, fc[0]
+                if side == -1:
+                    fb *= 0.5
+                side = -1
+            else:
+                bb, fb, sb = cc, fc[0], sc[0]
+                if side == 1:
+                    fa *= 0.5
+                side = 1
+        return (aa*fb - bb*fa)/(fb - fa) if fb != fa else bb, bb, sb
+
+    apsides = []
+    tt = float(t0)
+    state = statesFunc(np.array([tt]))[0]
+    while tt < tf:
+        found = None
+        dtNext, period, focal = conicApsisTime(gm, state, apsis)
+        if dtNext is not None:
+            half = max(bracket*(period if np.isfinite(period) else dtNext), tol)
+            if dtNext <= half and np.isfinite(period):
+                # apsis just passed (tt): next revolution
+                dtNext += period
+            lo = max(tt + tol, tt + dtNext - half)
+            hi = min(tt + dtNext + half, tf)
+            if hi > lo:
+                ff, states = rDot([lo, hi])
+                conic = spkE.prop2b(gm, np.repeat(state[None, :], 2, axis=0),
+                                    np.array([lo - tt, hi - tt]))
+                err = np.max(np.linalg.norm(states[:, :3] - conic[:, :3], axis=1))
+                if ff[0] < 0.0 <= ff[1] and err < APSIS_PREDICT_TOL*focal:
+                    found = refine(lo, ff[0], hi, ff[1], states[1]) + ('predict',)
+        if found is None:
+            if searchStep is None and not np.isfinite(period):
+                break
+            step = min(searchStep or np.inf, period/APSIS_PERIOD_STEPS)
+            aa = tt
+            fa = sign*np.dot(state[:3], state[3:])
+            while found is None and aa < tf:
+                grid = np.minimum(aa + step*np.arange(1, APSIS_SWEEP_BLOCK + 1), tf)
+                grid = grid[:np.searchsorted(grid, tf) + 1]
+                ff, states = rDot(grid)
+                fPrev = np.concatenate(([fa], ff[:-1]))
+                cross = np.nonzero((fPrev < 0.0) & (ff >= 0.0))[0]
+                if cross.size:
+                    kk = cross[0]
+                    a0 = aa if kk == 0 else grid[kk-1]
+                    found = refine(a0, fPrev[kk], grid[kk], ff[kk], states[kk]) + ('sweep',)
+                aa, fa = grid[-1], ff[-1]
+        if found is None:
+            break
+        et, tt, state, source = found
+        apsides.append({'et' : float(et),
+                        'range' : float(np.linalg.norm(state[:3])),
+                        'source' : source,
+                        })
+    return apsides
+
+# ----------------------------------------------------------------------------
+def coarseStates(statesFunc, t0, tf, dt):
+    """ (etGrid, states) on t0:dt:tf, tf included [ET sec, km, km/s] """
+    etGrid = spkE.epochGrid(t0, tf, dt)
+    if etGrid[-1] < tf:
+        etGrid = np.append(etGrid, tf)
+    return etGrid, statesFunc(etGrid)
+
+# ----------------------------------------------------------------------------
+def rangeWindows(etGrid, states, threshold, gm=0.0):
+    """ Windows where the range may be below threshold (e.g. minAlt, or SOI)
+
+    Lower bound of the range on each step: (r1 + r2 - vMax*dt)/2, with vMax
+    the largest speed at the step ends, raised by the two-body energy gain
+    down to the threshold (2*gm/threshold). Steps without states (nan) are
+    flagged too. Flagged steps are merged into windows.
+
+    = INPUT VARIABLES
+    - etGrid, states   coarse pass (coarseStates) [ET sec, km, km/s]
+    - threshold        range [km]
+    - gm               gravitational parameter of the body [km^3/s^2]
+
+    = RETURN VALUE
+    - windows [[a, b], ...] [ET sec]
+    """
+    rr = np.linalg.norm(states[:, :3], axis=1)
+    vv2 = (states[:, 3:]**2).sum(axis=1)
+    vMax = np.sqrt(np.maximum(vv2[:-1], vv2[1:]) + 2.0*gm/threshold)
+    lower = 0.5*(rr[:-1] + rr[1:] - vMax*np.diff(etGrid))
+    flagged = np.nonzero(~(lower >= threshold))[0]
+    windows = []
+    for kk in flagged:
+        if windows and windows[-1][1] == etGrid[kk]:
+            windows[-1][1] = etGrid[kk+1]
+        else:
+            windows.append([etGrid[kk], etGrid[kk+1]])
+    return windows
+
+# ----------------------------------------------------------------------------
+def inWindows(et, windows):
+    """ True if et is inside one of the sorted windows [[a, b], ...] """
+    starts = [aa for aa, bb in windows]
+    kk = np.searchsorted(starts, et, side='right') - 1
+    return kk >= 0 and et <= windows[kk][1]
+
+# ----------------------------------------------------------------------------
+def gatedApsides(statesFunc, windows, gm, apsis='Peri', searchStep=None, tol=1e-3):
+    """ Apsides (findApsides) inside the gate windows only (rangeWindows)
+
+    = INPUT VARIABLES
+    - windows      gate windows [[a, b], ...] [ET sec]
+    - searchStep   max. sweep step [sec] (e.g. the coarse pass step)
+    - others       as findApsides
+
+    = RETURN VALUE
+    - list of apsides, as findApsides, with the gate window index 'gate'
+    """
+    apsides = []
+    for kk, (aa, bb) in enumerate(windows):
+        for ap in findApsides(statesFunc, aa, bb, gm, apsis,
+                              min(searchStep or np.inf, (bb - aa)/APSIS_PERIOD_STEPS), tol):
+            ap['gate'] = kk
+            apsides.append(ap)
+    return apsides
+
+# ----------------------------------------------------------------------------
+def dvDiscEvent(epoch, dv, center, frame):
+    """ dvDiscEvents_out.json entry (as written by bsp2cosmic)
+
+    = INPUT VARIABLES
+    - epoch     Monte Epoch or ET sec
+    - dv        (3,) DV [km/s]
+    """
+    return {'time' : _epochStr(epoch),
+            'center' : center,
+            'frame' : frame,
+            'eventType' : 'dvDisc',
+            'value' : [float(dv[0]),
+                       float(dv[1]),
+                       float(dv[2])],
+            'dv_mag' : float(np.linalg.norm(dv)),
+            'units' : 'km/sec',
+            }
@@ -0,0 +1,964 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Vectorized SPK ephemeris (bulk state sampling).
+
+Evaluate SPK segments directly from the memory-mapped kernel(s) for a numpy
+array of ET epochs, returning an (N,6) state array [km, km/s]. Supported
+segment types:
+    1  Modified Difference Arrays (Monte/DPTRAJ)
+    2  Chebyshev (position only)
+    3  Chebyshev (position and velocity)
+    5  Discrete states (two-body propagation)
+    9  Lagrange interpolation, unequal time steps
+    13 Hermite interpolation, unequal time steps
+
+Epochs are grouped per segment, and the records of each segment are gathered
+and evaluated in a single vectorized call. Example:
+
+    >>> import monteCop.utils.spkEphem as spkE
+    >>> eph = spkE.SpkEphem(['Enceladus_NRHO.bsp'])
+    >>> query = spkE.SpkQuery(eph, -303, 'Enceladus', 'EME2000')
+    >>> etArr, stArr = query.sample(t0_et, tf_et, 60.0)
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import numpy as np
+
+from monteCop.utils.spkReader import SpkFile, jd2et, et2epochStr
+from monteCop.utils.spiceIDs import SpiceBodyName
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Obliquity of the ecliptic at J2000 (IAU 1976): J2000 -> ECLIPJ2000
+_eps = np.radians(84381.448/3600.0)
+_rotEclip = np.array([[1.0, 0.0, 0.0],
+                      [0.0, np.cos(_eps), np.sin(_eps)],
+                      [0.0, -np.sin(_eps), np.cos(_eps)]])
+
+# Rotation from frame to EME2000 (J2000), by SPICE frame ID
+frameRotToJ2000 = {
+    1  : np.eye(3),
+    17 : _rotEclip.T,
+}
+
+# Frame names (Monte and SPICE) -> SPICE frame ID
+frameIDs = {
+    'EME2000' : 1,
+    'J2000' : 1,
+    'EMO2000' : 17,
+    'ECLIPJ2000' : 17,
+}
+
+# Record tables (kernel revisions): records per block, hash seed, columns, version
+RECORD_BLOCK = 64
+HASH_SEED = 392
+TABLE_COLUMNS = ['target', 'center', 'frame', 'type', 't0', 'tf', 'hash']
+TABLE_VERSION = 2
+
+# ===========================================================================
+# Utils Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def passBodyID(body):
+    """ SPICE body ID from name or ID (e.g. 'Saturn', 699, '-303') """
+    if isinstance(body, str):
+        try:
+            return int(body)
+        except ValueError:
+            if body.upper() in SpiceBodyName:
+                return SpiceBodyName[body.upper()]
+            raise KeyError('Invalid SPICE Body Name: ' + body)
+    return int(body)
+
+# ----------------------------------------------------------------------------
+def passFrameID(frame):
+    """ SPICE (inertial) frame ID from name or ID (e.g. 'EMO2000', 17) """
+    if isinstance(frame, str):
+        if frame.upper() in frameIDs:
+            return frameIDs[frame.upper()]
+        raise KeyError('Unsupported frame: ' + frame + ' (inertial EME2000/EMO2000 only)')
+    return int(frame)
+
+# ----------------------------------------------------------------------------
+def epoch2et(epoch):
+    """ Monte Epoch -> ET seconds past J2000 """
+    return jd2et(epoch.julianDate('ET'))
+
+# ----------------------------------------------------------------------------
+def et2epoch(et):
+    """ ET seconds past J2000 -> Monte Epoch """
+    import Monte as M
+    return M.Epoch(et2epochStr(et))
+
+# ----------------------------------------------------------------------------
+def rotateStates(states, rotMat):
+    """ rotate (N,6) states by a constant 3x3 matrix """
+    out = np.empty_like(states)
+    out[:, :3] = states[:, :3] @ rotMat.T
+    out[:, 3:] = states[:, 3:] @ rotMat.T
+    return out
+
+# ===========================================================================
+# Segment Evaluators (vectorized):
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def _chebyshev(coeffs, ss):
+    """ Chebyshev series and derivative wrt s.
+
+    = INPUTS
+    - coeffs    (N,deg+1) coefficients
+    - ss        (N,) normalized time in [-1,1]
+    """
+    nCoef = coeffs.shape[1]
+    tt = np.empty((coeffs.shape[0], nCoef))
+    dt = np.empty_like(tt)
+    tt[:, 0] = 1.0
+    dt[:, 0] = 0.0
+    if nCoef > 1:
+        tt[:, 1] = ss
+        dt[:, 1] = 1.0
+    for kk in range(2, nCoef):
+        tt[:, kk] = 2.0*ss*tt[:, kk-1] - tt[:, kk-2]
+        dt[:, kk] = 2.0*tt[:, kk-1] + 2.0*ss*dt[:, kk-1] - dt[:, kk-2]
+    return (coeffs*tt).sum(axis=1), (coeffs*dt).sum(axis=1)
+
+# ----------------------------------------------------------------------------
+def _evalType2or3(data, et, segType, recIdx=None):
+    """ SPK types 2 and 3: Chebyshev polynomials, fixed length records
+        (recIdx: force the record used for each epoch)
+    """
+    init, intLen, rSize, nRec = data[-4:]
+    rSize = int(rSize)
+    nRec = int(nRec)
+    nCoef = (rSize - 2)//(3 if segType == 2 else 6)
+    records = data[:rSize*nRec].reshape(nRec, rSize)
+
+    if recIdx is None:
+        recIdx = np.clip(np.floor((et - init)/intLen).astype(int), 0, nRec - 1)
+    recs = records[recIdx]
+    mid = recs[:, 0]
+    radius = recs[:, 1]
+    ss = (et - mid)/radius
+
+    states = np.empty((et.size, 6))
+    for ii in range(3):
+        cc = recs[:, 2 + ii*nCoef: 2 + (ii+1)*nCoef]
+        pos, dpos = _chebyshev(cc, ss)
+        states[:, ii] = pos
+        if segType == 2:
+            states[:, ii+3] = dpos/radius
+    if segType == 3:
+        for ii in range(3):
+            cc = recs[:, 2 + (ii+3)*nCoef: 2 + (ii+4)*nCoef]
+            states[:, ii+3] = _chebyshev(cc, ss)[0]
+    return states
+
+# ----------------------------------------------------------------------------
+def _windowStart(epochs, et, winSize):
+    """ first index of an interpolation window of winSize epochs around et
+        (as in SPICE SPKR09/SPKR13)
+    """
+    nRec = epochs.size
+    if winSize % 2 == 0:
+        # last epoch <= et, window centered between records
+        near = np.searchsorted(epochs, et, side='right') - 1
+        first = near - winSize//2 + 1
+    else:
+        # nearest epoch, window centered on it
+        right = np.clip(np.searchsorted(epochs, et, side='left'), 1, nRec - 1)
+        left = right - 1
+        near = np.where(et - epochs[left] <= epochs[right] - et, left, right)
+        first = near - winSize//2
+    return np.clip(first, 0, max(nRec - winSize, 0))
+
+# ----------------------------------------------------------------------------
+def _evalType9(data, et):
+    """ SPK type 9: Lagrange interpolation (unequal time steps) """
+    degree = int(data[-2])
+    nRec = int(data[-1])
+    states = data[:6*nRec].reshape(nRec, 6)
+    epochs = data[6*nRec:7*nRec]
+    winSize = min(degree + 1, nRec)
+
+    first = _windowStart(epochs, et, winSize)
+    idx = first[:, None] + np.arange(winSize)[None, :]
+    return _lagrange(epochs[idx], states[idx], et)
+
+# ----------------------------------------------------------------------------
+def _lagrange(tw, sw, et):
+    """ Lagrange interpolation, vectorized.
+
+    = INPUTS
+    - tw      (N,W) abscissas
+    - sw      (N,W,6) states
+    - et      (N,) evaluation epochs
+    """
+    winSize = tw.shape[1]
+    weights = np.ones(tw.shape)
+    for jj in range(winSize):
+        for kk in range(winSize):
+            if kk != jj:
+                weights[:, jj] *= (et - tw[:, kk])/(tw[:, jj] - tw[:, kk])
+    return np.einsum('nw,nwk->nk', weights, sw)
+
+# ----------------------------------------------------------------------------
+def _hermite(tw, yy, dy, et):
+    """ Hermite interpolation (value and derivative), vectorized.
+
+    = INPUTS
+    - tw      (N,W) abscissas
+    - yy, dy  (N,W) values and derivatives
+    - et      (N,) evaluation epochs
+    """
+    nPts, winSize = tw.shape
+    zz = np.repeat(tw, 2, axis=1)              # (N,2W) doubled nodes
+    coef = np.repeat(yy, 2, axis=1)
+
+    # First divided differences:
+    first = np.empty((nPts, 2*winSize - 1))
+    first[:, 0::2] = dy
+    first[:, 1::2] = (yy[:, 1:] - yy[:, :-1])/(tw[:, 1:] - tw[:, :-1])
+    table = [coef[:, 0]]
+    diff = first
+    table.append(diff[:, 0])
+    for order in range(2, 2*winSize):
+        diff = (diff[:, 1:] - diff[:, :-1])/(zz[:, order:] - zz[:, :-order])
+        table.append(diff[:, 0])
+
+    # Newton form (Horner), value and derivative:
+    val = table[-1].copy()
+    der = np.zeros(nPts)
+    for kk in range(2*winSize - 2, -1, -1):
+        der = der*(et - zz[:, kk]) + val
+        val = val*(et - zz[:, kk]) + table[kk]
+    return val, der
+
+# ----------------------------------------------------------------------------
+def _evalType13(data, et):
+    """ SPK type 13: Hermite interpolation (unequal time steps) """
+    winSize = int(data[-2]) + 1
+    nRec = int(data[-1])
+    states = data[:6*nRec].reshape(nRec, 6)
+    epochs = data[6*nRec:7*nRec]
+    winSize = min(winSize, nRec)
+
+    first = _windowStart(epochs, et, winSize)
+    idx = first[:, None] + np.arange(winSize)[None, :]
+    return _hermiteStates(epochs[idx], states[idx], et)
+
+# ----------------------------------------------------------------------------
+def _hermiteStates(tw, sw, et):
+    """ Hermite interpolation of (N,W,6) states at et (N,) """
+    out = np.empty((et.size, 6))
+    for ii in range(3):
+        out[:, ii], out[:, ii+3] = _hermite(tw, sw[:, :, ii], sw[:, :, ii+3], et)
+    return out
+
+# ----------------------------------------------------------------------------
+def _evalType1(data, et, recIdx=None):
+    """ SPK type 1: Modified Difference Arrays (as SPICE SPKE01)
+        (recIdx: force the record used for each epoch)
+    """
+    nRec = int(data[-1])
+    records = data[:71*nRec].reshape(nRec, 71)
+    epochs = data[71*nRec:72*nRec]
+
+    if recIdx is None:
+        recIdx = np.clip(np.searchsorted(epochs, et, side='left'), 0, nRec - 1)
+    states = np.empty((et.size, 6))
+
+    # Group by max. integration order (usually constant per segment)
+    kqmax = records[recIdx, 67].astype(int)
+    for kqMax1 in np.unique(kqmax):
+        sel = np.nonzero(kqmax == kqMax1)[0]
+        rec = records[recIdx[sel]]
+        tl = rec[:, 0]
+        gg = rec[:, 1:16]
+        refPos = rec[:, 16:22:2]
+        refVel = rec[:, 17:22:2]
+        dt = rec[:, 22:67].reshape(-1, 3, 15)          # DT(15,3), column major
+        kq = rec[:, 68:71].astype(int)
+
+        delta = et[sel] - tl
+        nSel = sel.size
+        mq2 = kqMax1 - 2
+        fc = np.ones((nSel, 15))
+        wc = np.zeros((nSel, 14))
+        tp = delta.copy()
+        for jj in range(mq2):
+            fc[:, jj+1] = tp/gg[:, jj]
+            wc[:, jj] = delta/gg[:, jj]
+            tp = delta + gg[:, jj]
+
+        ww = np.zeros((nSel, 18))
+        ww[:, :kqMax1] = 1.0/np.arange(1, kqMax1 + 1)
+
+        # Fortran 1-based indexes kept in ks, ks1, jx
+        ks = kqMax1 - 1
+        ks1 = ks - 1
+        jx = 0
+        while ks >= 2:
+            jx += 1
+            for jj in range(1, jx + 1):
+                ww[:, jj+ks-1] = fc[:, jj]*ww[:, jj+ks1-1] - wc[:, jj-1]*ww[:, jj+ks-1]
+            ks = ks1
+            ks1 = ks1 - 1
+
+        jIdx = np.arange(15)
+        for ii in range(3):
+            mask = jIdx[None, :] < kq[:, ii][:, None]
+            summ = (np.where(mask, dt[:, ii, :], 0.0)*ww[:, ks:ks+15]).sum(axis=1)
+            states[sel, ii] = refPos[:, ii] + delta*(refVel[:, ii] + delta*summ)
+
+        for jj in range(1, jx + 1):
+            ww[:, jj+ks-1] = fc[:, jj]*ww[:, jj+ks1-1] - wc[:, jj-1]*ww[:, jj+ks-1]
+        ks = ks - 1
+
+        for ii in range(3):
+            mask = jIdx[None, :] < kq[:, ii][:, None]
+            summ = (np.where(mask, dt[:, ii, :], 0.0)*ww[:, ks:ks+15]).sum(axis=1)
+            states[sel, ii+3] = refVel[:, ii] + delta*summ
+
+    return states
+
+# ----------------------------------------------------------------------------
+def _stumpff(psi):
+    """ Stumpff functions c2(psi), c3(psi), vectorized """
+    c2 = np.empty_like(psi)
+    c3 = np.empty_like(psi)
+    pos = psi > 1e-6
+    neg = psi < -1e-6
+    mid = ~(pos | neg)
+    sp = np.sqrt(psi[pos])
+    c2[pos] = (1.0 - np.cos(sp))/psi[pos]
+    c3[pos] = (sp - np.sin(sp))/(sp**3)
+    sn = np.sqrt(-psi[neg])
+    c2[neg] = (1.0 - np.cosh(sn))/psi[neg]
+    c3[neg] = (np.sinh(sn) - sn)/(sn**3)
+    pm = psi[mid]
+    c2[mid] = 0.5 - pm/24.0 + pm**2/720.0
+    c3[mid] = 1.0/6.0 - pm/120.0 + pm**2/5040.0
+    return c2, c3
+
+# ----------------------------------------------------------------------------
+def _keplerUV(chi, alpha, rMag, rdv, sqmu, dt):
+    """ universal Kepler equation F(chi) and r(chi) = dF/dchi """
+    psi = chi*chi*alpha
+    c2, c3 = _stumpff(psi)
+    rNew = chi*chi*c2 + rdv/sqmu*chi*(1.0 - psi*c3) + rMag*(1.0 - psi*c2)
+    fun = chi**3*c3 + rdv/sqmu*chi*chi*c2 + rMag*chi*(1.0 - psi*c3) - sqmu*dt
+    return fun, rNew, psi, c2, c3
+
+# ----------------------------------------------------------------------------
+def prop2b(gm, states, dt, maxIter=200, tol=1e-14):
+    """ Two-body propagation (universal variables), vectorized.
+
+    Kepler's equation is solved by Newton iterations safeguarded with
+    bisection on the bracket [0, sqrt(gm)*dt/rp] (dF/dchi = r >= rp).
+
+    = INPUTS
+    - gm        gravitational parameter [km^3/s^2]
+    - states    (N,6) initial states
+    - dt        (N,) propagation times [s]
+    """
+    rr = states[:, :3]
+    vv = states[:, 3:]
+    rMag = np.linalg.norm(rr, axis=1)
+    vMag2 = (vv*vv).sum(axis=1)
+    rdv = (rr*vv).sum(axis=1)
+    sqmu = np.sqrt(gm)
+    alpha = 2.0/rMag - vMag2/gm                 # 1/a
+
+    # Periapsis radius -> bracket of chi
+    hh = np.cross(rr, vv)
+    eVec = np.cross(vv, hh)/gm - rr/rMag[:, None]
+    ecc = np.linalg.norm(eVec, axis=1)
+    rp = np.minimum((hh*hh).sum(axis=1)/gm/(1.0 + ecc), rMag)
+    lo = np.where(dt >= 0.0, 0.0, sqmu*dt/rp)
+    hi = np.where(dt >= 0.0, sqmu*dt/rp, 0.0)
+
+    chi = np.clip(sqmu*dt/rMag, lo, hi)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for _ in range(maxIter):
+            fun, rNew, psi, c2, c3 = _keplerUV(chi, alpha, rMag, rdv, sqmu, dt)
+            # overflow only happens beyond the root (chi too large)
+            fun = np.where(np.isfinite(fun), fun, np.sign(chi)*np.inf)
+            lo = np.where(fun < 0.0, chi, lo)
+            hi = np.where(fun > 0.0, chi, hi)
+            chiNew = chi - fun/rNew
+            bad = ~np.isfinite(chiNew) | (chiNew <= lo) | (chiNew >= hi)
+            chiNew = np.where(bad, 0.5*(lo + hi), chiNew)
+            chiNew = np.where(fun == 0.0, chi, chiNew)
+            done = np.abs(chiNew - chi) <= tol*np.maximum(1.0, np.abs(chi))
+            chi = chiNew
+            if np.all(done):
+                break
+
+    fun, rNew, psi, c2, c3 = _keplerUV(chi, alpha, rMag, rdv, sqmu, dt)
+    ff = 1.0 - chi*chi/rMag*c2
+    gg = dt - chi**3/sqmu*c3
+    gDot = 1.0 - chi*chi/rNew*c2
+    fDot = sqmu/(rNew*rMag)*chi*(psi*c3 - 1.0)
+
+    out = np.empty_like(states)
+    out[:, :3] = ff[:, None]*rr + gg[:, None]*vv
+    out[:, 3:] = fDot[:, None]*rr + gDot[:, None]*vv
+    return out
+
+# ----------------------------------------------------------------------------
+def _evalType5(data, et):
+    """ SPK type 5: discrete states, two-body propagation (as SPICE SPKE05) """
+    gm = data[-2]
+    nRec = int(data[-1])
+    states = data[:6*nRec].reshape(nRec, 6)
+    epochs = data[6*nRec:7*nRec]
+
+    states_out = np.empty((et.size, 6))
+    if nRec == 1:
+        return prop2b(gm, np.repeat(states, et.size, axis=0), et - epochs[0])
+
+    # bracketing records: epochs[i1] <= et < epochs[i2]
+    i1 = np.clip(np.searchsorted(epochs, et, side='right') - 1, 0, nRec - 2)
+    i2 = i1 + 1
+    t1 = epochs[i1]
+    t2 = epochs[i2]
+
+    exact1 = et == t1
+    exact2 = et == t2
+    outside = (et < epochs[0]) | (et > epochs[-1])
+    single = exact1 | exact2 | outside
+
+    # Single state: at the epoch (or nearest one outside coverage)
+    if np.any(single):
+        iSingle = np.where(exact2 | (et > epochs[-1]), i2, i1)[single]
+        states_out[single] = prop2b(gm, states[iSingle], et[single] - epochs[iSingle])
+
+    blend = ~single
+    if np.any(blend):
+        s1 = prop2b(gm, states[i1[blend]], et[blend] - t1[blend])
+        s2 = prop2b(gm, states[i2[blend]], et[blend] - t2[blend])
+        dtRec = t2[blend] - t1[blend]
+        arg = (et[blend] - t1[blend])*np.pi/dtRec
+        ww = 0.5 + 0.5*np.cos(arg)
+        dwdt = -0.5*np.pi*np.sin(arg)/dtRec
+        states_out[blend, :3] = ww[:, None]*s1[:, :3] + (1.0 - ww[:, None])*s2[:, :3]
+        states_out[blend, 3:] = (ww[:, None]*s1[:, 3:] + (1.0 - ww[:, None])*s2[:, 3:]
+                                 + dwdt[:, None]*(s1[:, :3] - s2[:, :3]))
+    return states_out
+
+# ----------------------------------------------------------------------------
+def evalSegment(seg, et):
+    """ Evaluate SPK segment at epochs et (N,), return (N,6) states
+        relative to seg.center, in seg.frame
+    """
+    data = seg.data()
+    if seg.type in [2, 3]:
+        return _evalType2or3(data, et, seg.type)
+    elif seg.type == 9:
+        return _evalType9(data, et)
+    elif seg.type == 13:
+        return _evalType13(data, et)
+    elif seg.type == 1:
+        return _evalType1(data, et)
+    elif seg.type == 5:
+        return _evalType5(data, et)
+    else:
+        raise NotImplementedError('SPK segment type ' + str(seg.type) + ' not supported')
+
+# ----------------------------------------------------------------------------
+def segmentLimits(seg, t0=-np.inf, tf=np.inf):
+    """ Left and right limits of the segment states at its internal record
+        boundaries in (t0, tf), where the data of one record ends and the next
+        one starts (candidate epochs of impulsive maneuvers):
+            1      MDA record end epochs: record i and i+1 evaluated there
+            2, 3   Chebyshev record bounds: record i and i+1 evaluated there
+            5      discrete states: two-body propagation of state i-1 vs state i
+                   (tol: mismatch at the neighbor records)
+            9, 13  discrete states: extrapolation of the interpolation window
+                   ending at state i-1 vs state i (window starting at state i
+                   vs state i-1 near the segment start). Segments with fewer
+                   records than one window plus one have no record boundaries,
+                   and only the most significant boundary within one window
+                   is kept (a jump spoils the next extrapolations).
+
+    = RETURN VALUE
+    - epochs      (M,) boundary epochs [ET sec]
+    - left        (M,6) states before the boundary (seg.center, seg.frame)
+    - right       (M,6) states after the boundary
+    - tol         (M,) velocity uncertainty of right-left [km/s] (prediction
+                  error estimate for types 5, 9 and 13, zero otherwise)
+    """
+    data = seg.data()
+    t0 = max(t0, seg.t0)
+    tf = min(tf, seg.tf)
+    empty = (np.empty(0), np.empty((0, 6)), np.empty((0, 6)), np.empty(0))
+
+    if seg.type in [2, 3]:
+        init, intLen, rSize, nRec = data[-4:]
+        nRec = int(nRec)
+        recIdx = np.arange(1, nRec)
+        epochs = init + intLen*recIdx
+        sel = (epochs > t0) & (epochs < tf)
+        epochs, recIdx = epochs[sel], recIdx[sel]
+        left = _evalType2or3(data, epochs, seg.type, recIdx - 1)
+        right = _evalType2or3(data, epochs, seg.type, recIdx)
+
+    elif seg.type == 1:
+        nRec = int(data[-1])
+        recEpochs = data[71*nRec:72*nRec]
+        recIdx = np.nonzero((recEpochs[:-1] > t0) & (recEpochs[:-1] < tf))[0]
+        epochs = recEpochs[recIdx]
+        left = _evalType1(data, epochs, recIdx)
+        right = _evalType1(data, epochs, recIdx + 1)
+
+    elif seg.type in [5, 9, 13]:
+        nRec = int(data[-1])
+        states = data[:6*nRec].reshape(nRec, 6)
+        recEpochs = data[6*nRec:7*nRec]
+        recIdx = np.nonzero((recEpochs > t0) & (recEpochs < tf))[0]
+        recIdx = recIdx[recIdx > 0]
+        if seg.type == 5:
+            # two-body mismatch of every record: a maneuver stands out of
+            # the mismatch of its neighbors (perturbations vary smoothly)
+            allLeft = prop2b(data[-2], states[:-1], np.diff(recEpochs))
+            miss = np.linalg.norm(states[1:, 3:] - allLeft[:, 3:], axis=1)
+            near = np.maximum(np.r_[0.0, miss[:-1]], np.r_[miss[1:], 0.0])
+            epochs = recEpochs[recIdx]
+            left = allLeft[recIdx - 1]
+            right = states[recIdx].copy()
+            return epochs, left, right, near[recIdx - 1]
+        else:
+            # full windows only: forward from the records before the boundary,
+            # or backward from the records after it (segment start)
+            winSize = int(data[-2]) + 1
+            interp = _lagrange if seg.type == 9 else _hermiteStates
+            fwd = recIdx[recIdx >= winSize]
+            bwd = recIdx[(recIdx < winSize) & (recIdx + winSize <= nRec)]
+            idxF = fwd[:, None] - winSize + np.arange(winSize)[None, :]
+            idxB = bwd[:, None] + np.arange(winSize)[None, :]
+            epochs = np.concatenate((recEpochs[bwd - 1], recEpochs[fwd]))
+            left = np.concatenate((states[bwd - 1],
+                                   interp(recEpochs[idxF], states[idxF], recEpochs[fwd])))
+            right = np.concatenate((interp(recEpochs[idxB], states[idxB], recEpochs[bwd - 1]),
+                                    states[fwd]))
+            # extrapolation error: same prediction with one record less
+            idxF = idxF[:, 1:]
+            idxB = idxB[:, :-1]
+            pred = np.concatenate((interp(recEpochs[idxB], states[idxB], recEpochs[bwd - 1]),
+                                   interp(recEpochs[idxF], states[idxF], recEpochs[fwd])))
+            tol = np.linalg.norm(pred[:, 3:] - np.concatenate((right[:bwd.size], left[bwd.size:]))[:, 3:],
+                                 axis=1)
+
+            # a jump spoils the predictions of the next records: keep only the
+            # most significant boundary within one window
+            recIdx = np.concatenate((bwd, fwd))
+            sig = np.linalg.norm(right[:, 3:] - left[:, 3:], axis=1)/np.maximum(tol, 1e-300)
+            keep = np.ones(recIdx.size, dtype=bool)
+            for kk in np.argsort(-sig):
+                if keep[kk]:
+                    near = np.abs(recIdx - recIdx[kk]) <= winSize
+                    near[kk] = False
+                    keep[near] = False
+            return epochs[keep], left[keep], right[keep], tol[keep]
+    else:
+        return empty
+
+    return epochs, left, right, np.zeros(epochs.size)
+
+# ===========================================================================
+# Record Tables:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def segmentRecords(seg):
+    """ Data records of an SPK segment and the time span each one affects:
+            1      MDA records (+ final epoch): (previous final epoch, final epoch)
+            2, 3   Chebyshev records: [init + k*intLen, init + (k+1)*intLen]
+            5      discrete states (+ epoch): previous to next state epoch
+                   (the states propagated from state k)
+            9, 13  discrete states (+ epoch): half a window of states on each
+                   side (the Lagrange/Hermite windows that include state k)
+        other types: the whole segment is one record.
+        The segment metadata (window size, epoch directory, ...) is in
+        segmentMeta().
+
+    = RETURN VALUE
+    - records     (N,M) record double words
+    - t0, tf      (N,) time span of each record [ET sec]
+    """
+    data = seg.data()
+    if seg.type in [2, 3]:
+        init, intLen, rSize, nRec = data[-4:]
+        nRec = int(nRec)
+        records = data[:int(rSize)*nRec].reshape(nRec, int(rSize))
+        t0 = init + intLen*np.arange(nRec)
+        return records, t0, t0 + intLen
+    if seg.type in [1, 5, 9, 13]:
+        nRec = int(data[-1])
+        rSize = 71 if seg.type == 1 else 6
+        epochs = data[rSize*nRec:(rSize + 1)*nRec]
+        records = np.hstack([data[:rSize*nRec].reshape(nRec, rSize), epochs[:, None]])
+        if seg.type == 1:
+            return records, np.concatenate([[seg.t0], epochs[:-1]]), epochs.copy()
+        half = (int(data[-2]) + 2)//2 if seg.type in [9, 13] else 1
+        padded = np.concatenate([np.full(half, seg.t0), epochs, np.full(half, seg.tf)])
+        return records, padded[:nRec], padded[2*half:]
+    return data.reshape(1, -1), np.array([seg.t0]), np.array([seg.tf])
+
+# ----------------------------------------------------------------------------
+def segmentMeta(seg):
+    """ Segment words out of the records (segmentRecords): Chebyshev init/
+        interval/record size, epoch directories, window size (degree), GM and
+        number of records. A change affects the whole segment.
+    """
+    data = seg.data()
+    if seg.type in [2, 3]:
+        return data[-4:]
+    if seg.type in [1, 5, 9, 13]:
+        nRec = int(data[-1])
+        rSize = 71 if seg.type == 1 else 6
+        return data[(rSize + 1)*nRec:]
+    return np.empty(0)
+
+_hashMult = {}
+
+# ----------------------------------------------------------------------------
+def _hashMultipliers(size):
+    """ fixed odd 64-bit multipliers (one per record word) """
+    if size not in _hashMult:
+        rng = np.random.RandomState(HASH_SEED)
+        _hashMult[size] = rng.randint(0, 2**62, size=size, dtype=np.uint64)*np.uint64(2) + np.uint64(1)
+    return _hashMult[size]
+
+# ----------------------------------------------------------------------------
+def hashRows(rows):
+    """ 64-bit hash of every row of a (N,M) array (bitwise content) """
+    words = np.ascontiguousarray(rows, dtype=np.float64).view(np.uint64)
+    hh = (words*_hashMultipliers(words.shape[1])).sum(axis=1, dtype=np.uint64)
+    # splitmix64 finalizer
+    hh ^= hh >> np.uint64(30)
+    hh *= np.uint64(0xbf58476d1ce4e5b9)
+    hh ^= hh >> np.uint64(27)
+    hh *= np.uint64(0x94d049bb133111eb)
+    hh ^= hh >> np.uint64(31)
+    return hh
+
+# ----------------------------------------------------------------------------
+def recordTable(bspFile, blockSize=RECORD_BLOCK):
+    """ Segment/record table of an SPK kernel: the records of every segment,
+        in blocks of blockSize records, with their time span and content hash.
+        Two revisions of a kernel are compared with changedRanges().
+
+    = RETURN VALUE
+    - dictionary of (B,) arrays: 'target', 'center', 'frame', 'type',
+      't0', 'tf' (block span [ET sec]) and 'hash' (uint64)
+    """
+    cols = {name: [] for name in TABLE_COLUMNS}
+    with SpkFile(bspFile) as spk:
+        for seg in spk.segments:
+            records, t0, tf = segmentRecords(seg)
+            # metadata hashed into every block: a change is a full-segment change
+            meta = np.concatenate([[seg.t0, seg.tf], segmentMeta(seg)])
+            recHash = hashRows(records) ^ hashRows(meta[None, :])[0]
+            nBlock = -(-recHash.size//blockSize)
+            pad = nBlock*blockSize - recHash.size
+            blocks = np.concatenate([recHash, np.zeros(pad, dtype=np.uint64)]).reshape(nBlock, blockSize)
+            starts = np.arange(nBlock)*blockSize
+            cols['hash'].append(hashRows(blocks.view(np.float64)))
+            cols['t0'].append(np.minimum.reduceat(t0, starts))
+            cols['tf'].append(np.maximum.reduceat(tf, starts))
+            for name in ['target', 'center', 'frame', 'type']:
+                cols[name].append(np.full(nBlock, getattr(seg, name), dtype=np.int64))
+    return {name: (np.concatenate(vv) if vv else np.empty(0)) for name, vv in cols.items()}
+
+# ----------------------------------------------------------------------------
+def changedRanges(oldTable, newTable):
+    """ Time ranges where two record tables differ (blocks in one table and
+        not in the other): merged list of [t0, tf] [ET sec]
+    """
+    def blockSet(table):
+        return set(zip(*[table[name].tolist() for name in TABLE_COLUMNS]))
+    oldBlocks = blockSet(oldTable)
+    newBlocks = blockSet(newTable)
+    iT0 = TABLE_COLUMNS.index('t0')
+    iTf = TABLE_COLUMNS.index('tf')
+    spans = sorted([bb[iT0], bb[iTf]] for bb in oldBlocks.symmetric_difference(newBlocks))
+    merged = []
+    for span in spans:
+        if merged and span[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], span[1])
+        else:
+            merged.append(span)
+    return merged
+
+# ===========================================================================
+# SPK Ephemeris:
+# ===========================================================================
+
+class SpkEphem(object):
+    """ Set of SPK kernels evaluated with numpy.
+
+    As in SPICE, segments in later loaded kernels, and later segments in a
+    kernel, have priority over earlier ones.
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, bspFiles=[]):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - bspFiles     SPK kernel or list of kernels
+        """
+        self.spkFiles = []
+        self.segments = []
+        if isinstance(bspFiles, str):
+            bspFiles = [bspFiles]
+        for ff in bspFiles:
+            self.load(ff)
+
+    #-----------------------------------------------------------------------
+    def load(self, bspFile):
+        """ load an SPK kernel """
+        spk = SpkFile(bspFile)
+        self.spkFiles.append(spk)
+        self.segments.extend(spk.segments)
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        for spk in self.spkFiles:
+            spk.close()
+
+    #-----------------------------------------------------------------------
+    def objects(self):
+        """ list of object IDs with data """
+        objs = []
+        for seg in self.segments:
+            if seg.target not in objs:
+                objs.append(seg.target)
+        return objs
+
+    #-----------------------------------------------------------------------
+    def coverage(self, body):
+        """ Coverage windows of body: merged list of [t0_et, tf_et] """
+        target = passBodyID(body)
+        windows = sorted([seg.t0, seg.tf] for seg in self.segments if seg.target == target)
+        merged = []
+        for win in windows:
+            if merged and win[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], win[1])
+            else:
+                merged.append(win)
+        return merged
+
+    #-----------------------------------------------------------------------
+    def segmentsFor(self, body):
+        """ Segments of body, highest priority first """
+        target = passBodyID(body)
+        return [seg for seg in reversed(self.segments) if seg.target == target]
+
+    #-----------------------------------------------------------------------
+    def _stepStates(self, target, et):
+        """ states of target relative to its segment center (in EME2000)
+
+        = RETURN VALUE
+        - states     (N,6), nan where no data
+        - centers    (N,) int, segment center (-1 if no data)
+        """
+        states = np.full((et.size, 6), np.nan)
+        centers = np.full(et.size, -1, dtype=int)
+        todo = np.ones(et.size, dtype=bool)
+        for seg in self.segmentsFor(target):
+            sel = np.nonzero(todo & (et >= seg.t0) & (et <= seg.tf))[0]
+            if sel.size == 0:
+                continue
+            st = evalSegment(seg, et[sel])
+            if seg.frame != 1:
+                if seg.frame not in frameRotToJ2000:
+                    raise NotImplementedError('SPK frame ID ' + str(seg.frame) + ' not supported')
+                st = rotateStates(st, frameRotToJ2000[seg.frame])
+            states[sel] = st
+            centers[sel] = seg.center
+            todo[sel] = False
+            if not todo.any():
+                break
+        return states, centers
+
+    #-----------------------------------------------------------------------
+    def _chain(self, body, et):
+        """ states of body relative to every node of its center chain
+
+        = RETURN VALUE
+        - dictionary {nodeID: (N,6) states of body wrt node (nan if not on chain)}
+        """
+        nPts = et.size
+        chain = {body: np.zeros((nPts, 6))}
+        acc = np.zeros((nPts, 6))
+        cur = np.full(nPts, body, dtype=int)
+        active = np.ones(nPts, dtype=bool)
+        for _ in range(20):
+            if not active.any():
+                break
+            for node in np.unique(cur[active]):
+                sel = np.nonzero(active & (cur == node))[0]
+                st, cen = self._stepStates(int(node), et[sel])
+                found = cen >= 0
+                active[sel[~found]] = False
+                sel = sel[found]
+                acc[sel] += st[found]
+                cur[sel] = cen[found]
+                for cc in np.unique(cen[found]):
+                    cc = int(cc)
+                    if cc not in chain:
+                        chain[cc] = np.full((nPts, 6), np.nan)
+                    idx = sel[cen[found] == cc]
+                    chain[cc][idx] = acc[idx]
+        return chain
+
+    #-----------------------------------------------------------------------
+    def states(self, body, center, et, frame='EME2000'):
+        """ States of body relative to center at epochs et.
+
+        = INPUT VARIABLES
+        - body, center   SPICE IDs or names (e.g. -303, 'Enceladus')
+        - et             epochs, ET seconds past J2000 (array-like)
+        - frame          inertial frame: 'EME2000' or 'EMO2000'
+
+        = RETURN VALUE
+        - (N,6) numpy array [km, km/s]. nan where there is no data
+        """
+        et = np.atleast_1d(np.asarray(et, dtype=float))
+        chainT = self._chain(passBodyID(body), et)
+        return self._relative(chainT, passBodyID(center), et, frame)
+
+    #-----------------------------------------------------------------------
+    def statesMulti(self, body, centers, et, frame='EME2000'):
+        """ States of body relative to each of centers at epochs et (the
+            chain of body is evaluated once for all the centers)
+
+        = RETURN VALUE
+        - (N,numCenters,6) numpy array [km, km/s]. nan where there is no data
+        """
+        et = np.atleast_1d(np.asarray(et, dtype=float))
+        chainT = self._chain(passBodyID(body), et)
+        return np.stack([self._relative(chainT, passBodyID(cc), et, frame)
+                         for cc in centers], axis=1)
+
+    #-----------------------------------------------------------------------
+    def unresolved(self, body, centers, et):
+        """ centers without states of body at some of the epochs et (center
+            chain not in the loaded kernels, e.g. planetary kernel missing)
+        """
+        states = self.statesMulti(body, centers, et)
+        return [cc for ii, cc in enumerate(centers) if np.isnan(states[:, ii, 0]).any()]
+
+    #-----------------------------------------------------------------------
+    def _relative(self, chainT, cent, et, frame):
+        """ states of the chainT body wrt cent, rotated to frame """
+        if cent in chainT and not np.isnan(chainT[cent]).any():
+            out = chainT[cent].copy()
+        else:
+            chainC = self._chain(cent, et)
+            out = np.full((et.size, 6), np.nan)
+            for node in chainT:
+                if node not in chainC:
+                    continue
+                rel = chainT[node] - chainC[node]
+                fill = np.isnan(out[:, 0]) & ~np.isnan(rel[:, 0])
+                out[fill] = rel[fill]
+
+        frameID = passFrameID(frame)
+        if frameID != 1:
+            out = rotateStates(out, frameRotToJ2000[frameID].T)
+        return out
+
+# ===========================================================================
+# SPK Query:
+# ===========================================================================
+
+class SpkQuery(object):
+    """ Vectorized counterpart of M.TrajQuery( boa, body, center, frame ) """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, ephem, body, center, frame='EME2000'):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - ephem      SpkEphem (or SPK kernel / list of kernels)
+        - body       SPICE ID or name
+        - center     SPICE ID or name, or list of centers: states (N,numCenters,6)
+        - frame      'EME2000' or 'EMO2000'
+        """
+        if not isinstance(ephem, SpkEphem):
+            ephem = SpkEphem(ephem)
+        self.ephem = ephem
+        self.body = passBodyID(body)
+        if isinstance(center, (list, tuple)):
+            self.center = [passBodyID(cc) for cc in center]
+        else:
+            self.center = passBodyID(center)
+        self.frame = frame
+
+    #-----------------------------------------------------------------------
+    def states(self, et):
+        """ (N,6) states at epochs et [ET sec] ((N,numCenters,6) for a center list) """
+        if isinstance(self.center, list):
+            return self.ephem.statesMulti(self.body, self.center, et, self.frame)
+        return self.ephem.states(self.body, self.center, et, self.frame)
+
+    #-----------------------------------------------------------------------
+    def sample(self, t0, tf, dt, blockSize=100000):
+        """ States on a uniform grid t0:dt:tf [ET sec], evaluated in blocks
+
+        = RETURN VALUE
+        - etArr     (N,) epochs
+        - stArr     (N,6) states
+        """
+        etArr = epochGrid(t0, tf, dt)
+        stArr = None
+        for ii in range(0, etArr.size, blockSize):
+            stBlk = self.states(etArr[ii:ii+blockSize])
+            if stArr is None:
+                stArr = np.empty((etArr.size,) + stBlk.shape[1:])
+            stArr[ii:ii+blockSize] = stBlk
+        return etArr, stArr
+
+    #-----------------------------------------------------------------------
+    def blocks(self, t0, tf, dt, blockSize=100000):
+        """ Generator of states on the grid t0:dt:tf, by blocks of blockSize steps.
+            Consecutive blocks share their boundary epoch, so differences
+            between neighbor states never miss a step.
+
+        = YIELDS
+        - etBlk     (n+1,) epochs
+        - stBlk     (n+1,6) states
+        """
+        nStep = epochGrid(t0, tf, dt).size - 1
+        for i0 in range(0, max(nStep, 1), blockSize):
+            etBlk = t0 + dt*np.arange(i0, min(i0 + blockSize, nStep) + 1)
+            yield etBlk, self.states(etBlk)
+
+# ----------------------------------------------------------------------------
+def epochGrid(t0, tf, dt):
+    """ uniform ET grid t0, t0+dt, ..., <= tf (same as Epoch.range) """
+    nStep = int(np.floor((tf - t0)/dt + 1e-9))
+    return t0 + dt*np.arange(nStep + 1)
@@ -0,0 +1,323 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Native SPK/DAF reader (memory-mapped).
+
+Read the DAF summary records of an SPK kernel (*.bsp) directly from a
+memory-mapped file, without calling 'brief' or writing temporary files.
+Used to obtain the coverage windows of the objects in a bsp, e.g.:
+
+    >>> import monteCop.utils.spkReader as spkR
+    >>> cov = spkR.getCoverage('Enceladus_NRHO.bsp', -303)
+    >>> cov['t0_et'], cov['t0_jd'], cov['t0_cal']
+
+Times are TDB (same as 'brief' default output): ET seconds past J2000,
+Julian dates (JDTDB), and calendar strings with milliseconds.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import mmap
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+J2000_JD = 2451545.0
+SEC_PER_DAY = 86400.0
+J2000_DATETIME = datetime(2000, 1, 1, 12, 0, 0)
+
+DAF_RECORD_BYTES = 1024
+DAF_DOUBLE_BYTES = 8
+
+# DAF binary formats:  LOCFMT -> struct byte order
+dafByteOrder = {
+    'LTL-IEEE' : '<',
+    'BIG-IEEE' : '>',
+}
+
+# SPICE inertial frame codes (SPK summary) -> Monte frame names
+spkFrameName = {
+    1  : 'EME2000',    # J2000
+    2  : 'EME1950',    # B1950
+    3  : 'FK4',
+    13 : 'Galactic',
+    17 : 'EMO2000',    # ECLIPJ2000
+    18 : 'EMO1950',    # ECLIPB1950
+}
+
+monthNames = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+              'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+# ===========================================================================
+# Time Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def et2jd(et):
+    """ ET seconds past J2000 -> Julian Date (JDTDB) """
+    return J2000_JD + et/SEC_PER_DAY
+
+# ----------------------------------------------------------------------------
+def jd2et(jd):
+    """ Julian Date (JDTDB) -> ET seconds past J2000 """
+    return (jd - J2000_JD)*SEC_PER_DAY
+
+# ----------------------------------------------------------------------------
+def et2datetime(et, digits=3):
+    """ ET seconds past J2000 -> datetime (TDB calendar, rounded to digits
+        decimals of a second: 3 = ms, at most 6)
+    """
+    return J2000_DATETIME + timedelta(microseconds=10**(6 - digits)*round(et*10.0**digits))
+
+# ----------------------------------------------------------------------------
+def et2cal(et):
+    """ ET seconds past J2000 -> TDB calendar dictionary, as read from brief.
+
+    = OUTPUTS
+    - dictionary {'yy': '2047', 'mm': 'JUL', 'dd': '16', 'hh': '17:53:20.000'}
+    """
+    tt = et2datetime(et)
+    return {'yy' : str(tt.year),
+            'mm' : monthNames[tt.month - 1],
+            'dd' : str(tt.day).zfill(2),
+            'hh' : tt.strftime('%H:%M:%S.') + str(tt.microsecond//1000).zfill(3),
+            }
+
+# ----------------------------------------------------------------------------
+def et2epochStr(et):
+    """ ET seconds past J2000 -> Monte Epoch string (e.g. '16-JUL-2047 17:53:20.0000 ET') """
+    tt = et2datetime(et, 4)
+    return (str(tt.day).zfill(2) + '-' + monthNames[tt.month - 1] + '-' + str(tt.year)
+            + tt.strftime(' %H:%M:%S.') + str(tt.microsecond//100).zfill(4) + ' ET')
+
+# ----------------------------------------------------------------------------
+def epochStr2et(epochStr):
+    """ Monte Epoch string (ET/TDB, e.g. '16-JUL-2047 17:53:20.0000 ET') -> ET sec
+
+    Inverse of et2epochStr (no Monte needed). Other time systems raise ValueError.
+    """
+    fields = epochStr.split()
+    if len(fields) == 3:
+        if fields[2].upper() not in ['ET', 'TDB']:
+            raise ValueError('Unsupported time system (ET/TDB only): ' + epochStr)
+    elif len(fields) != 2:
+        raise ValueError('Unsupported epoch string: ' + epochStr)
+    dd, mon, yy = fields[0].split('-')
+    hh, mm, ss = fields[1].split(':')
+    day = datetime(int(yy), monthNames.index(mon.upper()) + 1, int(dd))
+    return ((day - J2000_DATETIME).total_seconds()
+            + 3600.0*int(hh) + 60.0*int(mm) + float(ss))
+
+# ===========================================================================
+# DAF File:
+# ===========================================================================
+
+class DafFile(object):
+    """ Memory-mapped DAF file (SPK kernels: ND = 2, NI = 6).
+
+    The file is mapped read-only, only summary records are parsed on open.
+    Segment data is read on demand with readDoubles().
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, fileName):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - fileName     DAF file (*.bsp)
+        """
+        self.fileName = fileName
+        self._file = open(fileName, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # File record:
+        self.idWord = self._map[0:8].decode('ascii', 'replace')
+        if not self.idWord.startswith('DAF/') and not self.idWord.startswith('NAIF/DAF'):
+            self.close()
+            raise IOError('Not a DAF file: ' + str(fileName))
+
+        locFmt = self._map[88:96].decode('ascii', 'replace')
+        if locFmt not in dafByteOrder:
+            self.close()
+            raise IOError('Unsupported DAF binary format (' + locFmt + '): ' + str(fileName))
+        self.byteOrder = dafByteOrder[locFmt]
+        self.dtype = np.dtype(self.byteOrder + 'f8')
+
+        self.nd, self.ni = struct.unpack(self.byteOrder + '2i', self._map[8:16])
+        self.internalName = self._map[16:76].decode('ascii', 'replace').strip()
+        self.fward, self.bward, self.free = struct.unpack(self.byteOrder + '3i', self._map[76:88])
+
+        # Summary size in doubles:
+        self.ss = self.nd + (self.ni + 1)//2
+
+        self.summaries = self._readSummaries()
+
+    #-----------------------------------------------------------------------
+    def _readSummaries(self):
+        """ Walk the summary records linked list, return list of (dc, ic) """
+        summaries = []
+        recNum = self.fward
+        while recNum > 0:
+            offset = (recNum - 1)*DAF_RECORD_BYTES
+            nextRec, prevRec, nSum = struct.unpack(self.byteOrder + '3d',
+                                                   self._map[offset:offset + 24])
+            for ii in range(int(nSum)):
+                sOffset = offset + 24 + ii*self.ss*DAF_DOUBLE_BYTES
+                dc = struct.unpack(self.byteOrder + str(self.nd) + 'd',
+                                   self._map[sOffset:sOffset + self.nd*DAF_DOUBLE_BYTES])
+                iOffset = sOffset + self.nd*DAF_DOUBLE_BYTES
+                ic = struct.unpack(self.byteOrder + str(self.ni) + 'i',
+                                   self._map[iOffset:iOffset + self.ni*4])
+                summaries.append((dc, ic))
+            recNum = int(nextRec)
+        return summaries
+
+    #-----------------------------------------------------------------------
+    def readDoubles(self, startAddr, endAddr):
+        """ Read DAF double words [startAddr, endAddr] (1-based, inclusive).
+
+        Returns a read-only numpy view on the memory map (no copy).
+        """
+        return np.frombuffer(self._map, dtype=self.dtype,
+                             count=endAddr - startAddr + 1,
+                             offset=(startAddr - 1)*DAF_DOUBLE_BYTES)
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """ Close memory map and file """
+        if self._map is not None and not self._map.closed:
+            try:
+                self._map.close()
+            except BufferError:
+                # numpy views still alive, the map is released with them
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# ===========================================================================
+# SPK File:
+# ===========================================================================
+
+class SpkSegment(object):
+    """ SPK segment descriptor (from DAF summary) """
+
+    def __init__(self, spk, dc, ic):
+        self.spk = spk
+        self.t0, self.tf = dc
+        self.target, self.center, self.frame, self.type, self.startAddr, self.endAddr = ic
+
+    def __repr__(self):
+        return ('SpkSegment(target={0}, center={1}, frame={2}, type={3}, t0={4}, tf={5})'
+                .format(self.target, self.center, self.frame, self.type, self.t0, self.tf))
+
+    def data(self):
+        """ segment double words (numpy view) """
+        return self.spk.readDoubles(self.startAddr, self.endAddr)
+
+
+class SpkFile(DafFile):
+    """ Memory-mapped SPK kernel: segment list and coverage windows """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, fileName):
+        DafFile.__init__(self, fileName)
+        if self.nd != 2 or self.ni != 6:
+            self.close()
+            raise IOError('Not an SPK file (ND={0}, NI={1}): {2}'.format(self.nd, self.ni, fileName))
+        self.segments = [SpkSegment(self, dc, ic) for dc, ic in self.summaries]
+
+    #-----------------------------------------------------------------------
+    def objects(self):
+        """ list of object IDs in kernel (order of first appearance) """
+        objs = []
+        for seg in self.segments:
+            if seg.target not in objs:
+                objs.append(seg.target)
+        return objs
+
+    #-----------------------------------------------------------------------
+    def coverage(self, objID):
+        """ Coverage windows of objID: merged list of [t0_et, tf_et] """
+        windows = sorted([seg.t0, seg.tf] for seg in self.segments if seg.target == objID)
+        merged = []
+        for win in windows:
+            if merged and win[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], win[1])
+            else:
+                merged.append(win)
+        return merged
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def objectID(objID):
+    """ SPICE ID of objID: int, numeric string or SPICE body name (None: unknown name) """
+    try:
+        return int(objID)
+    except ValueError:
+        from monteCop.utils.spiceIDs import SpiceBodyName
+        return SpiceBodyName.get(str(objID).upper())
+
+# ----------------------------------------------------------------------------
+def bspObjects(bspFile):
+    """ list of object IDs on a bsp file """
+    with SpkFile(bspFile) as spk:
+        return spk.objects()
+
+# ----------------------------------------------------------------------------
+def getCoverage(bspFile, objID):
+    """ Coverage of objID on bspFile (replaces: brief bspFile -t -n -sec/-etsec)
+
+    = INPUT VARIABLES
+    - bspFile     SPK kernel
+    - objID       SPICE ID (int or str, e.g. -159, '-159' or 'Europa Clipper')
+
+    = RETURN VALUE
+    - dictionary with the full coverage span of objID, or None if not found:
+        't0_et', 'tf_et'      ET seconds past J2000
+        't0_jd', 'tf_jd'      Julian Dates (JDTDB)
+        't0_cal', 'tf_cal'    calendar dicts {'yy','mm','dd','hh'} (as from brief)
+        'intervals'           list of coverage windows [t0_et, tf_et] (gaps excluded)
+    """
+    objID = objectID(objID)
+    with SpkFile(bspFile) as spk:
+        windows = spk.coverage(objID)
+    if not windows:
+        return None
+
+    t0_et = windows[0][0]
+    tf_et = windows[-1][1]
+    return {'t0_et' : t0_et,
+            'tf_et' : tf_et,
+            't0_jd' : et2jd(t0_et),
+            'tf_jd' : et2jd(tf_et),
+            't0_cal' : et2cal(t0_et),
+            'tf_cal' : et2cal(tf_et),
+            'intervals' : windows,
+            }
@@ -0,0 +1,523 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Dense state tables: cached on disk, memory-mapped, Hermite interpolated.
+
+A state table samples the states of a body wrt a center (frame) once on a
+uniform ET grid ending on the span end. Tables are kept in one folder per
+kernel content (TABLE_ROOT/<kernel digest>, env. MONTECOP_STATE_TABLES
+overrides the root), under a key of the body, center, frame, step and
+tolerances: every run and tool reading the same kernels (scanBSP,
+bsp2cosmic, scanForRp, devDiscPlots) shares them, wherever its outputs go.
+A table is loaded memory-mapped (no copy), and states between nodes are
+cubic Hermite interpolated from the node positions and velocities, in O(1)
+per epoch. Gapped kernels get one table per coverage window (WindowTables):
+no table spans a gap.
+
+Bounded error: when the table is built, the interpolant is compared with the
+exact states at two points of every step: the midpoint (max. position error
+of a cubic Hermite) and 1/2 - 1/(2*sqrt(3)) (max. velocity error, the
+velocity being the derivative of the position cubic). Steps above posTol/velTol
+(velocity jumps, segment boundaries, a step too large for the dynamics) are
+flagged, and epochs in flagged steps are evaluated exactly by the source
+statesFunc. Example:
+
+    >>> import monteCop.utils.stateTable as stTab
+    >>> tables = stTab.StateTableCache('myTraj.bsp')
+    >>> scStates = tables.windowTables(-303, 'Enceladus', 'EME2000', scanWindows, 60.0)
+    >>> states = scStates.states(etArr)        # (N,6) [km, km/s]
+    >>> scanU.findApsides(scStates.states, t0_et, tf_et, gm, 'Peri')
+
+Note: a DV discontinuity sweep on a table sees the burns exactly (their steps
+are flagged), elsewhere its DV error is below 2*velTol: keep velTol well
+below minDv.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+import monteCop.utils.spkEphem as spkE
+from monteCop.utils.scanCache import knownDigest, readManifest, writeJson
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Tables root (env. MONTECOP_STATE_TABLES overrides): one folder per kernel content
+TABLE_ROOT = os.environ.get('MONTECOP_STATE_TABLES',
+                            os.path.join(os.path.expanduser('~'), '.monteCop', 'stateTables'))
+KERNELS_FILE = 'kernels.json'
+KEY_CHARS = 16
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 2
+
+# Interpolation tolerances (checked at CHECK_POINTS of every step): [km], [km/s]
+POS_TOL = 1.0e-3
+VEL_TOL = 1.0e-6
+
+# Eviction: total size [bytes], age since last use [days]
+TABLE_MAX_BYTES = 1024**3
+TABLE_MAX_AGE_DAYS = 30.0
+
+# Epochs per statesFunc call while building
+BUILD_BLOCK = 100000
+
+# Check points in a step (normalized): max. position / velocity errors
+CHECK_POINTS = [0.5, 0.5 - 0.5/np.sqrt(3.0)]
+
+# Epochs this fraction of a step past the last node are on the last step (rounding)
+END_TOL = 1.0e-9
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def hermite(s0, s1, ss, step):
+    """ Cubic Hermite interpolation of states on a step.
+
+    = INPUT VARIABLES
+    - s0, s1     (N,6) states at the step ends [km, km/s]
+    - ss         (N,) normalized epochs in the step, 0 <= ss <= 1
+    - step       step [sec]
+
+    = RETURN VALUE
+    - (N,6) states: interpolated positions, and their time derivative
+    """
+    ss = ss[:, None]
+    s2 = ss*ss
+    s3 = s2*ss
+    m0 = step*s0[:, 3:]
+    m1 = step*s1[:, 3:]
+    pos = ((2.0*s3 - 3.0*s2 + 1.0)*s0[:, :3] + (s3 - 2.0*s2 + ss)*m0
+           + (3.0*s2 - 2.0*s3)*s1[:, :3] + (s3 - s2)*m1)
+    vel = ((6.0*s2 - 6.0*ss)*(s0[:, :3] - s1[:, :3]) + (3.0*s2 - 4.0*ss + 1.0)*m0
+           + (3.0*s2 - 2.0*ss)*m1)/step
+    return np.hstack([pos, vel])
+
+# ===========================================================================
+# State Table:
+# ===========================================================================
+
+class StateTable(object):
+    """ States on a uniform ET grid, Hermite interpolated, exact on flagged steps """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, nodes, flagged, t0, step, exactFunc=None, info=None):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - nodes      (N,6) states at t0 + step*k [km, km/s] (array or memmap)
+        - flagged    (N-1,) bool, steps evaluated exactly
+        - t0, step   grid start and step [ET sec]
+        - exactFunc  exact states function (ET array -> (N,6)), for flagged
+                     steps and epochs out of the table (None: nan)
+        - info       table description (manifest entry)
+        """
+        self.nodes = nodes
+        self.flagged = flagged
+        self.t0 = float(t0)
+        self.step = float(step)
+        self.tf = self.t0 + self.step*(len(nodes) - 1)
+        self.exactFunc = exactFunc
+        self.info = info or {}
+
+    #-----------------------------------------------------------------------
+    def states(self, et):
+        """ (N,6) states at epochs et [ET sec] """
+        et = np.atleast_1d(np.asarray(et, dtype=float))
+        out = np.full((et.size, 6), np.nan)
+        kk = np.floor((et - self.t0)/self.step).astype(np.int64)
+        # last node (up to rounding): end of the last step
+        kk[(kk >= len(self.nodes) - 1) & (et <= self.tf + END_TOL*self.step)] = len(self.nodes) - 2
+        inside = (kk >= 0) & (kk < len(self.nodes) - 1)
+        fast = np.zeros(et.size, dtype=bool)
+        fast[inside] = ~self.flagged[kk[inside]]
+
+        idx = np.nonzero(fast)[0]
+        if idx.size:
+            k0 = kk[idx]
+            ss = (et[idx] - (self.t0 + self.step*k0))/self.step
+            out[idx] = hermite(self.nodes[k0], self.nodes[k0 + 1], ss, self.step)
+
+        idx = np.nonzero(~fast)[0]
+        if idx.size and self.exactFunc is not None:
+            out[idx] = self.exactFunc(et[idx])
+        return out
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def build(cls, statesFunc, t0, tf, step, posTol=POS_TOL, velTol=VEL_TOL,
+              nodesOut=None, flaggedOut=None):
+        """ Sample statesFunc on t0:step:(>= tf), check the interpolant at the
+            CHECK_POINTS of every step, flag the steps above posTol/velTol.
+            A last node on tf up to rounding is sampled at tf (not past the
+            span: see gridStep).
+
+        = INPUT VARIABLES
+        - statesFunc   function of an ET array [sec] -> (N,6) states
+        - t0, tf       table span [ET sec]
+        - step         grid step [sec]
+        - posTol       max. position error [km]
+        - velTol       max. velocity error [km/s]
+        - nodesOut     (N,6) output array (e.g. a memmap), default: new array
+        - flaggedOut   (N-1,) bool output array, default: new array
+
+        = RETURN VALUE
+        - StateTable (exactFunc = statesFunc), info: max. errors, flagged steps
+        """
+        numNodes = numTableNodes(t0, tf, step)
+        nodes = np.empty((numNodes, 6)) if nodesOut is None else nodesOut
+        flagged = np.empty(numNodes - 1, dtype=bool) if flaggedOut is None else flaggedOut
+        maxPos, maxVel = 0.0, 0.0
+        lastNode = t0 + step*(numNodes - 1)
+        if abs(lastNode - tf) <= END_TOL*step:
+            lastNode = tf
+
+        # blocks share their last node (next block first node)
+        for k0 in range(0, numNodes - 1, BUILD_BLOCK):
+            k1 = min(k0 + BUILD_BLOCK, numNodes - 1)
+            etNodes = np.minimum(t0 + step*np.arange(k0, k1 + 1), lastNode)
+            nodes[k0:k1 + 1] = statesFunc(etNodes)
+            errPos = np.zeros(k1 - k0)
+            errVel = np.zeros(k1 - k0)
+            for sc in CHECK_POINTS:
+                exact = statesFunc(etNodes[:-1] + sc*step)
+                interp = hermite(nodes[k0:k1], nodes[k0 + 1:k1 + 1],
+                                 np.full(k1 - k0, sc), step)
+                errPos = np.fmax(errPos, np.linalg.norm(interp[:, :3] - exact[:, :3], axis=1))
+                errVel = np.fmax(errVel, np.linalg.norm(interp[:, 3:] - exact[:, 3:], axis=1))
+                errPos[np.isnan(exact[:, 0]) | np.isnan(interp[:, 0])] = np.nan
+            good = (errPos <= posTol) & (errVel <= velTol)      # nan: flagged
+            flagged[k0:k1] = ~good
+            if good.any():
+                maxPos = max(maxPos, float(errPos[good].max()))
+                maxVel = max(maxVel, float(errVel[good].max()))
+
+        info = {'numNodes' : numNodes,
+                'numFlagged' : int(flagged.sum()),
+                'maxPosErr' : maxPos,
+                'maxVelErr' : maxVel,
+                }
+        return cls(nodes, flagged, t0, step, statesFunc, info)
+
+# ----------------------------------------------------------------------------
+def numTableNodes(t0, tf, step):
+    """ nodes of the grid t0:step covering [t0, tf] (at least 2) """
+    return max(int(np.ceil((tf - t0)/step - 1e-9)) + 1, 2)
+
+# ----------------------------------------------------------------------------
+def gridStep(t0, tf, step):
+    """ step <= step of the uniform grid from t0 to tf exactly """
+    return (tf - t0)/(numTableNodes(t0, tf, step) - 1)
+
+# ----------------------------------------------------------------------------
+def kernelKey(kernels, root=None):
+    """ folder name of the tables of kernels: digest of their contents (file
+        digests memo: root/kernels.json, re-hashed only if size/mtime changed)
+    """
+    root = TABLE_ROOT if root is None else root
+    kernelsFile = os.path.join(root, KERNELS_FILE)
+    memo = readManifest(kernelsFile, {'version' : MANIFEST_VERSION, 'files' : {}}, 'state table kernels')
+    digests = []
+    updated = False
+    for kk in kernels:
+        sha, new = knownDigest(memo['files'], kk)
+        digests.append(sha)
+        updated = updated or new
+    if updated:
+        writeJson(kernelsFile, memo)
+    return hashlib.sha256('\n'.join(digests).encode()).hexdigest()[:KEY_CHARS]
+
+# ===========================================================================
+# Window Tables:
+# ===========================================================================
+
+class WindowTables(object):
+    """ States from one state table per coverage window (built on first use) """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, windows, tableFunc, exactFunc=None):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - windows    coverage windows [[t0, tf], ...] [ET sec]
+        - tableFunc  (t0, tf) -> StateTable of the window
+        - exactFunc  exact states function (ET array -> (N,6)), for epochs
+                     out of the windows (None: nan)
+        """
+        self.windows = [(float(aa), float(bb)) for aa, bb in windows]
+        self.tableFunc = tableFunc
+        self.exactFunc = exactFunc
+        self._tables = [None]*len(self.windows)
+
+    #-----------------------------------------------------------------------
+    def table(self, ii):
+        """ StateTable of window ii """
+        if self._tables[ii] is None:
+            self._tables[ii] = self.tableFunc(*self.windows[ii])
+        return self._tables[ii]
+
+    #-----------------------------------------------------------------------
+    def states(self, et):
+        """ (N,6) states at epochs et [ET sec] """
+        et = np.atleast_1d(np.asarray(et, dtype=float))
+        out = np.full((et.size, 6), np.nan)
+        done = np.zeros(et.size, dtype=bool)
+        for ii, (aa, bb) in enumerate(self.windows):
+            inside = ~done & (et >= aa) & (et <= bb)
+            if inside.any():
+                out[inside] = self.table(ii).states(et[inside])
+                done |= inside
+        if not done.all() and self.exactFunc is not None:
+            out[~done] = self.exactFunc(et[~done])
+        return out
+
+    #-----------------------------------------------------------------------
+    def stream(self, t0, tf, dt, blockSize=BUILD_BLOCK):
+        """ Lazy stream of (et, state) on the grid t0, t0+dt, ... <= tf (as
+            spkEphem.epochGrid), states interpolated by blocks (scanIntervals)
+        """
+        numEpochs = int(np.floor((tf - t0)/dt + 1e-9)) + 1
+        for k0 in range(0, numEpochs, blockSize):
+            etBlk = t0 + dt*np.arange(k0, min(k0 + blockSize, numEpochs))
+            for et, state in zip(etBlk, self.states(etBlk)):
+                yield float(et), state
+
+# ===========================================================================
+# State Table Cache:
+# ===========================================================================
+
+class StateTableCache(object):
+    """ State tables of some kernels in TABLE_ROOT/<kernel digest> (.npy tables
+        + manifest), shared by the tools and runs reading these kernels
+    """
+
+    #-----------------------------------------------------------------------
+    def __init__(self, kernels, root=None, maxBytes=TABLE_MAX_BYTES,
+                 maxAgeDays=TABLE_MAX_AGE_DAYS):
+        """ Constructor.
+
+        = INPUT VARIABLES
+        - kernels        kernel file (or list) of the trajectory (bsp, or the
+                         Cosmic input it is propagated from): hashed by content
+        - root           tables root folder (default: TABLE_ROOT)
+        - maxBytes       max. size of the tables of these kernels [bytes]
+        - maxAgeDays     tables not used for maxAgeDays are removed
+        """
+        self.kernels = [kernels] if isinstance(kernels, str) else list(kernels)
+        self.root = TABLE_ROOT if root is None else root
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self.folder = os.path.join(self.root, kernelKey(self.kernels, self.root))
+        self.manifestFile = os.path.join(self.folder, MANIFEST_FILE)
+        self.maxBytes = maxBytes
+        self.maxAgeDays = maxAgeDays
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        self._removed = set()
+        self.manifest = self._readManifest()
+
+    #-----------------------------------------------------------------------
+    def _readManifest(self):
+        """ manifest dict (empty if missing, unreadable or other version) """
+        empty = {'version' : MANIFEST_VERSION,
+                 'kernels' : [os.path.abspath(kk) for kk in self.kernels],
+                 'tables' : {},
+                 }
+        return readManifest(self.manifestFile, empty, 'state table')
+
+    #-----------------------------------------------------------------------
+    def _saveManifest(self):
+        """ write the manifest, merged with the tables saved meanwhile by
+            other processes (tools, batch workers) on the same kernels
+        """
+        saved = self._readManifest()['tables']
+        for name, entry in saved.items():
+            if name not in self.manifest['tables'] and name not in self._removed:
+                self.manifest['tables'][name] = entry
+        writeJson(self.manifestFile, self.manifest)
+
+    #-----------------------------------------------------------------------
+    def spec(self, body, center, frame, step, posTol=POS_TOL, velTol=VEL_TOL, source=None):
+        """ table specification (without span): tables of the same spec are
+            interchangeable on their common span
+        """
+        return {'body' : str(body),
+                'center' : str(center),
+                'frame' : str(frame),
+                'step' : repr(float(step)),
+                'tol' : [repr(float(posTol)), repr(float(velTol))],
+                'source' : source,
+                }
+
+    #-----------------------------------------------------------------------
+    def find(self, spec, t0, tf):
+        """ name of a table of spec covering [t0, tf], or None """
+        for name, entry in self.manifest['tables'].items():
+            if entry['spec'] == spec and entry['t0'] <= t0 and entry['tf'] >= tf:
+                return name
+        return None
+
+    #-----------------------------------------------------------------------
+    def table(self, body, center, frame, t0, tf, step, statesFunc=None,
+              posTol=POS_TOL, velTol=VEL_TOL, source=None):
+        """ State table of body wrt center covering [t0, tf]: loaded, or built
+            (and saved) with statesFunc on a miss, on the grid from t0 to tf
+            exactly (gridStep: never sampled past tf).
+
+        = INPUT VARIABLES
+        - body, center SPICE IDs or names
+        - frame        frame of the states
+        - t0, tf       span [ET sec], in the kernels coverage (see WindowTables)
+        - step         max. grid step [sec]
+        - statesFunc   exact states (ET array -> (N,6)), e.g. trajQueryStates
+                       (default: native SpkQuery on the kernels)
+        - posTol       max. position error [km]
+        - velTol       max. velocity error [km/s]
+        - source       description of statesFunc, part of the key (e.g. the
+                       ephemerides loaded in Boa)
+
+        = RETURN VALUE
+        - StateTable
+        """
+        if tf <= t0:
+            raise ValueError('State table: empty span [{0}, {1}]'.format(t0, tf))
+        if statesFunc is None:
+            statesFunc = spkE.SpkQuery(self.kernels, body, center, frame).states
+        spec = self.spec(body, center, frame, step, posTol, velTol, source)
+        name = self.find(spec, t0, tf)
+        if name is not None:
+            table = self._load(name, statesFunc)
+            if table is not None:
+                return table
+
+        wall0 = time.time()
+        name = self._newName()
+        tableStep = gridStep(t0, tf, step)
+        numNodes = numTableNodes(t0, tf, tableStep)
+        nodesFile, flaggedFile = self._files(name)
+        nodesOut = np.lib.format.open_memmap(nodesFile + '.tmp', mode='w+',
+                                             dtype=np.float64, shape=(numNodes, 6))
+        flaggedOut = np.zeros(numNodes - 1, dtype=bool)
+        table = StateTable.build(statesFunc, t0, tf, tableStep, posTol, velTol, nodesOut, flaggedOut)
+        nodesOut.flush()
+        del nodesOut
+        os.replace(nodesFile + '.tmp', nodesFile)
+        np.save(flaggedFile, flaggedOut)
+
+        now = time.time()
+        self.manifest['tables'][name] = {
+            'spec' : spec,
+            't0' : float(t0),
+            'tf' : float(tf),
+            'step' : tableStep,
+            'bytes' : os.path.getsize(nodesFile) + os.path.getsize(flaggedFile),
+            'created' : now,
+            'lastUsed' : now,
+            'info' : table.info,
+            }
+        self._evict(keep=name)
+        self._saveManifest()
+        print(' ... State table built: {0} nodes, {1} steps exact, {2:.1f} sec'
+              .format(table.info['numNodes'], table.info['numFlagged'], time.time() - wall0))
+        return self._load(name, statesFunc)
+
+    #-----------------------------------------------------------------------
+    def windowTables(self, body, center, frame, windows, step, statesFunc=None,
+                     posTol=POS_TOL, velTol=VEL_TOL, source=None):
+        """ States of body wrt center from one table per coverage window
+            (see table; empty windows skipped, epochs out of the windows:
+            statesFunc)
+
+        = INPUT VARIABLES
+        - windows      coverage windows [[t0, tf], ...] [ET sec] (scanUtils.coverageWindows)
+        - others       as table
+
+        = RETURN VALUE
+        - WindowTables
+        """
+        if statesFunc is None:
+            statesFunc = spkE.SpkQuery(self.kernels, body, center, frame).states
+        def tableFunc(t0, tf):
+            return self.table(body, center, frame, t0, tf, step, statesFunc,
+                              posTol, velTol, source)
+        return WindowTables([ww for ww in windows if ww[1] > ww[0]], tableFunc, statesFunc)
+
+    #-----------------------------------------------------------------------
+    def _newName(self):
+        name = 'table_{0}_{1}'.format(os.getpid(), int(time.time()*1e6))
+        while name in self.manifest['tables']:
+            name += '_'
+        return name
+
+    #-----------------------------------------------------------------------
+    def _files(self, name):
+        base = os.path.join(self.folder, name)
+        return base + '_nodes.npy', base + '_flagged.npy'
+
+    #-----------------------------------------------------------------------
+    def _load(self, name, statesFunc):
+        """ memory-mapped table (None if its files are gone) """
+        entry = self.manifest['tables'][name]
+        nodesFile, flaggedFile = self._files(name)
+        try:
+            nodes = np.load(nodesFile, mmap_mode='r')
+            flagged = np.load(flaggedFile)
+        except (IOError, ValueError):
+            self._remove(name)
+            self._saveManifest()
+            return None
+        entry['lastUsed'] = time.time()
+        self._saveManifest()
+        return StateTable(nodes, flagged, entry['t0'], entry['step'], statesFunc, entry['info'])
+
+    #-----------------------------------------------------------------------
+    def _evict(self, keep=None):
+        """ remove the tables unused for maxAgeDays, then least recently used
+            tables above maxBytes (keep: never removed)
+        """
+        tables = self.manifest['tables']
+        oldest = time.time() - self.maxAgeDays*86400.0
+        for name in [nn for nn in tables if nn != keep and tables[nn]['lastUsed'] < oldest]:
+            self._remove(name)
+        lru = sorted([nn for nn in tables if nn != keep], key=lambda nn: tables[nn]['lastUsed'])
+        totBytes = sum(entry['bytes'] for entry in tables.values())
+        while lru and totBytes > self.maxBytes:
+            name = lru.pop(0)
+            totBytes -= tables[name]['bytes']
+            self._remove(name)
+
+    #-----------------------------------------------------------------------
+    def _remove(self, name):
+        self.manifest['tables'].pop(name, None)
+        self._removed.add(name)
+        for ff in self._files(name):
+            if os.path.exists(ff):
+                os.remove(ff)
+
+    #-----------------------------------------------------------------------
+    def clear(self):
+        """ remove all the tables of these kernels """
+        for name in set(self._readManifest()['tables']) | set(self.manifest['tables']):
+            self._remove(name)
+        self._saveManifest()
@@ -0,0 +1,273 @@
+# ===========================================================================
+# Section 392 Navigation and Mission Design
+#
+# Copyright (C) 2021, California Institute of Technology.
+# U.S. Government Sponsorship under NASA Contract NAS7-03001 is acknowledged.
+#
+# ===========================================================================
+
+""" Warm Cosmic templates: Manager start-up without re-running the template.
+
+mgr.loadInput(cosmicTemp) executes the whole template (frames, gravity
+models, DIVA propagators, SNOPT/IPOPT/DBLSE optimizers, scalers) for every
+Manager. Monte objects cannot be serialized, so the template is resolved
+once into a warm Manager instead, in the long-lived process (conversion
+server, batch parent), next to the warm Boa of batchUtils. The jobs are
+forked from that process: each one inherits its own copy of the warm
+Manager, and takes it instead of running the template again:
+
+    >>> import monteCop.utils.templateCache as tmplC
+    >>> tmplC.warmTemplate(cosmicTemp)          # server / batch parent
+    >>> mgr = tmplC.manager(cosmicTemp, boa)    # job: warm copy, or loadInput
+
+A warm template is keyed by its dependencies: the template file, the
+modules it imports (not installed packages) and the existing files
+named in it (e.g. Boa files). A dependency changed on disk (size/mtime,
+then content for Python files) invalidates the warm Manager: refresh()
+rebuilds it, and manager() falls back to loadInput.
+
+A Cosmic input creates Boa objects (frames, bodies, ...): it is executed
+once per Boa. A Boa that already has one (e.g. the warm Boa with a warm
+template) is replaced by a clean copy of the warm Boa (same ephemerides)
+for the next load: the Manager returned may be on another Boa than the
+one given, use mgr.boa.
+"""
+
+from __future__ import print_function
+
+__version__ = "0.1"
+__author__ = "Ricardo L. Restrepo (392M)"
+
+# ===========================================================================
+# imports here:
+
+import ast
+import hashlib
+import importlib.util
+import os
+import sysconfig
+import time
+
+import monteCop.utils.batchUtils as batchU
+from monteCop.utils.scanCache import fileDigest
+
+# ===========================================================================
+
+
+#==============================================================================
+# Defaults:
+#==============================================================================
+
+# Dependencies hashed by content (others: size/mtime, e.g. ephemerides)
+SOURCE_SUFFIXES = ('.py', '.json')
+
+# Warm templates of this process: abs. path -> {'key', 'stamps', 'mgr', 'used', 'wall'}
+_warm = {}
+
+# Boas with a Cosmic input loaded (not loaded again), and copies of the warm Boa
+_loadedBoas = []
+_copyBoas = []
+
+# Installed packages (stdlib, site-packages): not template dependencies
+_installed = tuple(set(os.path.realpath(sysconfig.get_paths()[kk]) + os.sep
+                       for kk in ['stdlib', 'platstdlib', 'purelib', 'platlib']))
+
+# ===========================================================================
+# Functions:
+# ===========================================================================
+
+# ----------------------------------------------------------------------------
+def _moduleFile(name):
+    """ source file of an imported module (None: builtin, installed or not found) """
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError, AttributeError):
+        return None
+    origin = getattr(spec, 'origin', None) if spec is not None else None
+    if not origin or not os.path.isfile(origin):
+        return None
+    if os.path.realpath(origin).startswith(_installed):
+        return None
+    return os.path.abspath(origin)
+
+# ----------------------------------------------------------------------------
+def templateDeps(templateFile):
+    """ Dependencies of a template: the template, the source of its imports
+        and the existing files named in string literals (abs. paths, in order)
+    """
+    templateFile = os.path.abspath(templateFile)
+    with open(templateFile, 'r') as inFile:
+        tree = ast.parse(inFile.read(), templateFile)
+
+    deps = [templateFile]
+    baseDir = os.path.dirname(templateFile)
+    for node in ast.walk(tree):
+        files = []
+        if isinstance(node, ast.Import):
+            files = [_moduleFile(alias.name) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            files = [_moduleFile(node.module)]
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            value = node.value.strip()
+            if value and len(value) < 4096 and '\n' not in value:
+                for path in [value, os.path.join(baseDir, value)]:
+                    if os.path.isfile(path):
+                        files = [os.path.abspath(path)]
+                        break
+        deps += [ff for ff in files if ff and ff not in deps]
+    return deps
+
+# ----------------------------------------------------------------------------
+def _stamps(deps):
+    """ (size, mtime) of each dependency (None: missing) """
+    stamps = []
+    for dep in deps:
+        try:
+            stat = os.stat(dep)
+            stamps.append((stat.st_size, stat.st_mtime))
+        except OSError:
+            stamps.append(None)
+    return stamps
+
+# ----------------------------------------------------------------------------
+def templateKey(templateFile, deps=None):
+    """ sha256 (hex) of a template and its dependencies (sources by content,
+        other files by size/mtime)
+    """
+    deps = deps if deps is not None else templateDeps(templateFile)
+    sha = hashlib.sha256()
+    for dep, stamp in zip(deps, _stamps(deps)):
+        sha.update(dep.encode('utf-8'))
+        if stamp is None:
+            sha.update(b'missing')
+        elif dep.endswith(SOURCE_SUFFIXES):
+            sha.update(fileDigest(dep).encode('utf-8'))
+        else:
+            sha.update(repr(stamp).encode('utf-8'))
+    return sha.hexdigest()
+
+# ----------------------------------------------------------------------------
+def cosmicBoa(boa):
+    """ boa, if no Cosmic input was loaded into it, else a clean copy of the
+        warm Boa (RuntimeError if boa is not the warm Boa or one of its copies)
+    """
+    if not any(bb is boa for bb in _loadedBoas):
+        return boa
+    if not (batchU.isWarmBoa(boa) or any(bb is boa for bb in _copyBoas)):
+        raise RuntimeError('A Cosmic input is already loaded into this Boa:'
+                           ' load the template on a new Boa')
+    boa = batchU.boaCopy()
+    _copyBoas.append(boa)
+    return boa
+
+# ----------------------------------------------------------------------------
+def loadTemplate(templateFile, boa):
+    """ new Manager with the template loaded (mgr.loadInput), on boa or on a
+        clean copy of the warm Boa (cosmicBoa)
+    """
+    from mpy.opt.cosmic import Manager
+    boa = cosmicBoa(boa)
+    _loadedBoas.append(boa)
+    mgr = Manager(boa)
+    # quiet manager to avoid: WARNING COSMIC/Output:0 control points, when loadInput
+    mgr.quiet = True
+    mgr.loadInput(templateFile)
+    mgr.quiet = False
+    return mgr
+
+# ----------------------------------------------------------------------------
+def warmTemplate(templateFile, boa=None):
+    """ resolve a template once into a warm Manager (on the warm Boa by default)
+
+    = INPUT VARIABLES
+    - templateFile  Cosmic template
+    - boa           Boa of the warm Manager (default: batchU.boaLoad(), the warm Boa;
+                    a copy of it if a template is already loaded, see cosmicBoa)
+
+    = RETURN VALUE
+    - template key
+    """
+    path = os.path.abspath(templateFile)
+    deps = templateDeps(path)
+    key = templateKey(path, deps)
+    entry = _warm.get(path)
+    if entry is not None and entry['key'] == key:
+        entry['stamps'] = _stamps(deps)
+        return key
+
+    wall0 = time.time()
+    boa = boa if boa is not None else batchU.boaLoad()
+    mgr = loadTemplate(path, boa)
+    _warm[path] = {'key' : key,
+                   'deps' : deps,
+                   'stamps' : _stamps(deps),
+                   'mgr' : mgr,
+                   'used' : False,
+                   'wall' : time.time() - wall0,
+                   }
+    print(' ... Warm template: ' + path + ' ({0:.1f} sec, {1} dependencies)'
+          .format(_warm[path]['wall'], len(deps)))
+    return key
+
+# ----------------------------------------------------------------------------
+def _isFresh(entry):
+    """ dependencies unchanged since the template was warmed """
+    stamps = _stamps(entry['deps'])
+    if stamps == entry['stamps']:
+        return True
+    if templateKey(None, entry['deps']) != entry['key']:
+        return False
+    entry['stamps'] = stamps        # touched, same content
+    return True
+
+# ----------------------------------------------------------------------------
+def refresh():
+    """ rebuild the warm templates whose dependencies changed (server/batch parent),
+        each on a clean copy of the warm Boa (the old one has the old template)
+
+    = RETURN VALUE
+    - list of the templates rebuilt
+    """
+    rebuilt = []
+    for path, entry in list(_warm.items()):
+        if _isFresh(entry):
+            continue
+        oldBoa = entry['mgr'].boa
+        del _warm[path]
+        if any(bb is oldBoa for bb in _copyBoas):
+            # copy of the warm Boa only used by this template: released
+            _loadedBoas[:] = [bb for bb in _loadedBoas if bb is not oldBoa]
+            _copyBoas[:] = [bb for bb in _copyBoas if bb is not oldBoa]
+        print(' ... Template changed, reloading: ' + path)
+        if os.path.isfile(path):
+            warmTemplate(path)
+        rebuilt.append(path)
+    return rebuilt
+
+# ----------------------------------------------------------------------------
+def warmTemplates():
+    """ warm templates of this process: list of (path, key, load time [sec]) """
+    return [(path, entry['key'], entry['wall']) for path, entry in sorted(_warm.items())]
+
+# ----------------------------------------------------------------------------
+def manager(templateFile, boa=None):
+    """ Manager with templateFile loaded (use mgr.boa: see cosmicBoa).
+
+    In a job forked from a process with the template warm (warm Boa, template
+    unchanged), the inherited warm Manager is returned (once per process).
+    Otherwise a new Manager is created and the template is loaded, on a
+    clean copy of the warm Boa if boa already has a Cosmic input.
+
+    = INPUT VARIABLES
+    - templateFile  Cosmic template
+    - boa           Boa of the Manager (default: batchU.boaLoad())
+    """
+    boa = boa if boa is not None else batchU.boaLoad()
+    entry = _warm.get(os.path.abspath(templateFile))
+    if (entry is not None and not entry['used']
+            and (entry['mgr'].boa is boa or batchU.isWarmBoa(boa))
+            and _isFresh(entry)):
+        # job copy of the warm Manager (the parent keeps its own copy unused)
+        entry['used'] = True
+        return entry['mgr']
+    return loadTemplate(templateFile, boa)